@@ -86,6 +86,13 @@ PROJECT_INFO = {
 # --- 核心配置 ----------------------------------------------------
 CHUNK_SIZE = 40
 MAX_RETRIES = 2
+# 失败批次二分重试：整批尝试该次数仍失败后对半拆分、递归重试，直到隔离出问题条目。
+# 健康的一半立即提交，只有最终无法翻译的条目回退为原文。设为 0 关闭 (整批重试 MAX_RETRIES 次)，默认关闭。
+BATCH_BISECT_AFTER_ATTEMPTS = 0
+# 部分结果抢救：要求模型为每条译文附带输入编号 (id)，保留所有格式正确的条目，
+# 只对缺失或无效的编号发起补充请求，而不是整批重试。
+# 会改变所有 Provider 的输出格式要求 (带编号的对象数组)，默认关闭。
+PARTIAL_SALVAGE = False
 
 # --- Gemini CLI 特定配置 -----------------------------------------
 GEMINI_CLI_CHUNK_SIZE = 100
@@ -94,6 +101,187 @@ GEMINI_CLI_MAX_RETRIES = 2
 # --- Ollama 特定配置 ---------------------------------------------
 OLLAMA_CHUNK_SIZE = 20
 OLLAMA_MAX_RETRIES = 2
+# 多节点：每项为 {"url": ..., "max_concurrency": ...}，请求路由到 占用/并发上限 最低的健康节点。
+# 空列表表示只使用 OLLAMA_BASE_URL (或 base_url) 一个节点，并发为 OLLAMA_ENDPOINT_CONCURRENCY。
+OLLAMA_ENDPOINTS = []
+OLLAMA_ENDPOINT_CONCURRENCY = 1
+# 连续失败 (连接错误、超时、HTTP 错误) 这么多次的节点移出轮转，冷却后放行一个探测请求，成功即恢复
+OLLAMA_ENDPOINT_MAX_FAILURES = 3
+OLLAMA_ENDPOINT_COOLDOWN_SECONDS = 60
+# /api/chat 参数：keep_alive 让模型在批次之间常驻显存；num_ctx 为上下文长度 (需容纳提示词与输出，Ollama 默认仅 2048)
+OLLAMA_KEEP_ALIVE = "30m"
+OLLAMA_NUM_CTX = 8192
+
+# --- Token 预算批次规划 ---------------------------------------------
+# 每个请求的 token 预算 = 提示词开销 + 输入文本 + 预期输出。
+# Provider 可以在 API_PROVIDERS 中通过 "batch_budget" 覆盖其中任意一项。
+DEFAULT_BATCH_BUDGET = {
+    "max_batch_tokens": 12000,       # 单次请求的总预算 (prompt + input + expected output)
+    "max_output_tokens": 3500,       # 预期输出上限，请求的 max_tokens 在此基础上留出余量 (OUTPUT_TOKEN_HEADROOM)
+    "max_batch_items": 200,          # 单批次条目上限
+    "prompt_overhead_tokens": 1500,  # 系统提示词/格式说明/词典的固定开销
+    "output_ratio": 1.5,             # 译文相对原文的 token 膨胀系数
+    "per_item_overhead_tokens": 6,   # 编号、引号与 JSON 分隔符的开销
+}
+# 请求的输出上限 (max_tokens)：Provider 未配置 "max_output_tokens" 时，取批次预算的 max_output_tokens 乘以该系数
+# (规划使用的是估算值，留出余量以免批次的最后几条译文被截断)。
+OUTPUT_TOKEN_HEADROOM = 1.2
+
+# 请求耗时模型：预计耗时 = 固定延迟 + 输入 token / 输入吞吐 + 输出 token / 输出吞吐。
+# Provider 可以在 API_PROVIDERS 中通过 "latency_model" 覆盖其中任意一项。
+DEFAULT_LATENCY_MODEL = {
+    "base_seconds": 2.0,
+    "input_tokens_per_second": 5000.0,
+    "output_tokens_per_second": 60.0,
+}
+
+# 批次调度策略："lpt" 预计耗时最长的批次优先 (缩短整体完成时间)，"fifo" 按文件发现顺序。
+BATCH_SCHEDULING = "lpt"
+# lpt 调度时向前规划的批次数 (排序窗口)。越大越接近全局最优，但会提前读取更多文件并占用内存。
+# fifo 调度不向前规划，仍以在途批次上限 (MAX_PENDING_BATCHES) 作为背压。
+SCHEDULING_LOOKAHEAD_BATCHES = 200
+
+# 源文件流式读取：解析结果逐文件分块写入源版本快照，不再整体驻留内存。
+# 上限内的解析结果被缓存供翻译阶段复用，超出部分在轮到该文件时重新解析 (0 表示始终重新解析)。
+SOURCE_MEMORY_CEILING_MB = 256
+# 写入源版本快照时每次提交的条目数
+SOURCE_SNAPSHOT_CHUNK_SIZE = 5000
+
+# 跨文件打包：允许多个小文件的条目合并进同一个请求。
+# 打包后一个请求的失败会波及多个文件，默认关闭。
+CROSS_FILE_PACKING = False
+
+# 多目标语言模式：多语言任务中，一次请求同时返回所有目标语言的译文
+# (系统提示词、词典与原文只发送一次)。缺失或条数不符的语言会回退到单语言请求。
+MULTI_TARGET_MODE = False
+
+# 翻译记忆：发送请求前先在 mods_cache.sqlite 中查找完全相同的原文 (同语言/模型/提示词/词典)。
+# 命中的条目直接复用以前的译文而不再请求模型，默认关闭。
+TRANSLATION_MEMORY_ENABLED = False
+
+# 运行内去重：同一次运行中完全相同的原文只翻译一次，结果回填到所有出现位置。
+# 相同原文在不同上下文中会得到同一译文，默认关闭。
+INTRA_RUN_DEDUP = False
+
+# 批次级断点日志：每个完成的批次追加写入 .remis_batch_journal.jsonl，
+# 中断后续传时只重新发送缺失的批次；文件完成后对应记录即被清除。默认关闭。
+BATCH_JOURNAL_ENABLED = False
+
+# 对冲请求 (Hedged Requests)：一次请求的耗时超过该 Provider 近期延迟的 HEDGE_LATENCY_PERCENTILE 分位时，
+# 再发送一个相同的请求 (Provider 可在 API_PROVIDERS 中通过 "hedge_model" 指定备用模型)，
+# 采用先通过校验的响应，另一个被取消 (asyncio) 或忽略 (线程)。默认关闭。
+HEDGED_REQUESTS = False
+# 对冲预算：额外请求数不超过主请求数的百分比
+HEDGE_BUDGET_PERCENT = 5
+HEDGE_LATENCY_PERCENTILE = 95
+# 开始对冲前至少需要观测到的成功请求数，以及参与分位计算的最近请求数
+HEDGE_MIN_SAMPLES = 20
+HEDGE_LATENCY_WINDOW = 200
+
+# 流式响应：支持流式输出的 Provider 边生成边校验 JSON，输出已无法挽救时立即中断，不再等待生成到 max_tokens。
+# 条目边生成边交给所属文件 (publish_early_results) 需要抢救模式 (PARTIAL_SALVAGE)：条目带编号，完成即交付，中断前完成的条目会被保留。
+# 默认格式 (纯字符串数组) 下位置要等数组闭合、条数确认后才能确定，届时一次交付整批。
+# Provider 可在 API_PROVIDERS 中设置 "streaming": False 关闭。默认关闭。
+STREAMING_RESPONSES = False
+STREAM_PREAMBLE_LIMIT = 200      # JSON 开始前允许的说明文字字符数，超过视为格式错误
+STREAM_REPETITION_LIMIT = 4      # 连续这么多条原文不同、译文相同的条目视为复读
+STREAM_ITEM_LENGTH_RATIO = 10    # 单条译文长度超过最长原文的该倍数 (另加 200 字符) 视为失控
+
+# 提示词布局："classic" 按原有顺序拼接 (每批的词典与条目数穿插在指令之间，请求之间没有长的相同前缀)；
+# "stable_prefix" 把系统提示、格式与语法规则、整个文件的词典和标点规则放在最前面，同一文件的所有批次前缀逐字节相同，
+# 本批次的条目数、额外词典条目和编号原文放在最后，可命中 OpenAI/DeepSeek/Qwen 等的自动前缀缓存。
+PROMPT_LAYOUT = "classic"
+PROMPT_PREFIX_GLOSSARY_MAX_TERMS = 200   # 前缀中文件级词典的条目上限，其余相关条目按批次放在末尾
+# 显式缓存句柄 (stable_prefix 布局下生效)：支持的 Provider (Gemini context caching、mock) 为前缀创建缓存并在 TTL 内复用。
+# 前缀短于最小长度时不创建；Provider 可在 API_PROVIDERS 中通过 "prompt_cache_min_tokens" 覆盖 (不同模型的下限不同)。
+PROMPT_CACHE_EXPLICIT = False
+PROMPT_CACHE_TTL_SECONDS = 600
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# 离线批量模式 (Bulk Mode)：对延迟不敏感的整 Mod 任务，先规划全部请求并一次性提交到 Provider 的批处理接口
+# (API_PROVIDERS 中 "batch_api" 为 "openai" 或 "gemini"；"local" 为测试用的本地文件后端)，价格约为实时请求的一半且不受限流约束。
+# 作业 ID 写入各目标语言的断点，服务重启后再次运行同一任务会继续轮询；结果缺失或无效的批次退回实时请求。
+# 任务可通过 bulk_mode 参数覆盖。不支持批处理接口的 Provider 仍使用实时请求。默认关闭。
+BULK_MODE = False
+BULK_POLL_INTERVAL_SECONDS = 60
+BULK_MAX_WAIT_SECONDS = 26 * 3600  # 超过 Provider 的 24 小时完成窗口；超时后任务报错，作业保留在断点中
+
+# 批次遥测：每次 API 请求尝试 (token、耗时、重试、异常类型、解析结果) 写入 mods_cache.sqlite 的 batch_telemetry 表，
+# 可通过 /api/telemetry/{task_id} 查看汇总。每次尝试都会写一次数据库，默认关闭。
+TELEMETRY_ENABLED = False
+
+# Provider 故障转移链：主 Provider 之后依次尝试的 Provider，例如 ["openai", "ollama"]。空列表表示不启用。
+# 任务可通过 failover_providers 参数覆盖。每个 Provider 连续 FAILOVER_BREAKER_THRESHOLD 个批次整批失败后熔断，
+# 新批次转给下一个 Provider；FAILOVER_BREAKER_COOLDOWN_SECONDS 秒后放行一个探测批次。
+FAILOVER_CHAIN = []
+FAILOVER_BREAKER_THRESHOLD = 3
+FAILOVER_BREAKER_COOLDOWN_SECONDS = 300
+
+# --- 试运行估算 (Dry Run) ---------------------------------------------
+# 本地价格表，单位：美元 / 百万 token (输入, 输出)。"*" 为该 Provider 未单独列出的模型的价格。
+# 价格会变动，仅用于估算，请按各家官方价目表更新；未列出的 Provider/模型在报告中不给出费用。
+PRICE_TABLE = {
+    "gemini": {"gemini-3-flash-preview": (0.50, 3.00), "gemini-3-pro-preview": (2.00, 12.00)},
+    "gemini_cli": {"*": (0.0, 0.0)},  # 免费额度
+    "openai": {"gpt-5.2": (1.75, 14.00), "gpt-5-mini": (0.25, 2.00), "gpt-5-nano": (0.05, 0.40)},
+    "qwen": {"qwen-plus": (0.40, 1.20), "qwen-max": (1.60, 6.40), "qwen-flash": (0.05, 0.40)},
+    "grok": {"*": (0.20, 0.50)},
+    "deepseek": {"*": (0.28, 0.42)},
+    "ollama": {"*": (0.0, 0.0)},     # 本地模型
+    "mock": {"*": (0.0, 0.0)},       # 模拟 LLM
+}
+# 估算时实际构建 (含词典注入) 并计数的提示词数量上限；批次更多时按抽样的平均开销外推。
+DRY_RUN_PROMPT_SAMPLE = 100
+
+# --- 模拟 LLM (压测) -----------------------------------------------------
+# Provider "mock" 返回格式正确的伪译文，用于不花费 API 费用地压测并行处理、重试与断点续传。
+# 默认在进程内运行；设置 MOCK_LLM_BASE_URL 后改为连接 `python -m scripts.core.mock_llm` 启动的本地 OpenAI 兼容服务。
+# 故障由 (seed, 提示词, 第几次请求) 决定，同一配置下结果可复现。
+MOCK_LLM_BEHAVIOUR = {
+    "latency_distribution": "lognormal",  # fixed / uniform / lognormal
+    "latency_mean_seconds": 0.5,
+    "latency_sigma": 0.5,
+    "latency_min_seconds": 0.0,
+    "latency_max_seconds": 30.0,
+    "seconds_per_item": 0.0,
+    "error_rate": 0.0,          # 返回 500 的概率
+    "rate_limit_rate": 0.0,     # 返回 429 (带 Retry-After) 的概率
+    "retry_after_seconds": 1.0,
+    "truncate_rate": 0.0,       # 返回被截断的 JSON 的概率
+    "wrong_count_rate": 0.0,    # 少返回或多返回一条的概率
+    "preamble_rate": 0.0,       # 在 JSON 前输出长篇说明文字的概率
+    "runaway_rate": 0.0,        # 输出若干条后不停复读同一条译文的概率
+    "stream_chunk_chars": 16,   # 流式响应每个分块的字符数
+    "prompt_cache_min_chars": 4096,  # 模拟自动前缀缓存的最小前缀长度，0 表示关闭
+    "prompt_cache_block_chars": 512,
+    "seed": 0,
+}
+
+# --- 自适应限流 (每个 Provider/模型 共享) ---------------------------------
+# None 表示不限制。Provider 可以在 API_PROVIDERS 中通过 "rate_limit" 覆盖其中任意一项，
+# 例如 "rate_limit": {"requests_per_minute": 15, "tokens_per_minute": 1000000}
+DEFAULT_RATE_LIMIT = {
+    "requests_per_minute": None,
+    "tokens_per_minute": None,
+    "initial_concurrency": 8,    # AIMD 起始并发窗口
+    "min_concurrency": 1,
+    "max_concurrency": 64,
+    "default_retry_after": 5.0,  # 服务端未返回 Retry-After 时的暂停秒数
+}
+
+# --- HTTP 连接池 (每个 Provider 共享) --------------------------------------
+# 所有基于 HTTP 的 Provider 复用长连接，避免每个批次重新进行 TCP/TLS 握手。
+# Provider 可以在 API_PROVIDERS 中通过 "http_pool" 覆盖其中任意一项。
+DEFAULT_HTTP_POOL = {
+    "connect_timeout": 10.0,
+    "read_timeout": 300.0,       # 大批次的生成可能很慢
+    "write_timeout": 30.0,
+    "pool_timeout": 60.0,        # 等待空闲连接的最长秒数
+    "keepalive_expiry": 60.0,    # 空闲连接保留的秒数
+    "max_connections": None,     # None 表示按调度并发 (线程数 / ASYNC_MAX_CONCURRENCY) 自动确定
+    "http2": True,               # 需要安装 h2 (pip install httpx[http2])，否则使用 HTTP/1.1
+    "trust_env": True,           # 是否使用系统代理等环境变量
+}
 
 # --- 智能线程池配置 ----------------------------------------------------
 def get_smart_max_workers():
@@ -101,6 +289,22 @@ def get_smart_max_workers():
     return min(32, cpu_count * 2)
 
 RECOMMENDED_MAX_WORKERS = get_smart_max_workers()
+
+# --- CPU 密集阶段进程池 ----------------------------------------------------
+# 词典匹配 (模糊/音近)、词典一致性校验、标点清理与后处理格式校验在独立进程中运行，
+# 避免与等待网络 I/O 的工作线程争抢 GIL。None 表示 CPU 核数 - 1；单核机器与打包版 (frozen) 不启用。
+# 会额外启动工作进程，默认关闭。
+CPU_POOL_ENABLED = False
+CPU_POOL_WORKERS = None
+# 低于这些规模时进程间传输的开销大于收益，仍在当前线程内执行
+CPU_POOL_MIN_GLOSSARY_ENTRIES = 2000  # 词典条目数
+CPU_POOL_MIN_TEXTS = 500              # 单个文件的待清理条目数
+
+# --- 执行模式 ----------------------------------------------------
+# "thread": 每个在途请求占用一个线程 (受 RECOMMENDED_MAX_WORKERS 限制)
+# "async":  请求以协程方式运行在事件循环上，并发数由 ASYNC_MAX_CONCURRENCY 决定，与 CPU 核数无关
+EXECUTION_MODE = os.getenv("REMIS_EXECUTION_MODE", "thread")
+ASYNC_MAX_CONCURRENCY = 64
 BATCH_SIZE = CHUNK_SIZE
 
 # --- 路径配置 ----------------------------------------------------
@@ -172,6 +376,8 @@ API_PROVIDERS = {
         "base_url": "https://generativelanguage.googleapis.com",
         "enable_thinking": False,
         "thinking_budget": 0,
+        "batch_budget": {"max_batch_tokens": 40000, "max_output_tokens": 16000},
+        "batch_api": "gemini",  # 离线批量模式使用的批处理接口 (见 BULK_MODE)
     },
     "gemini_cli": {
         "cli_path": "gemini",
@@ -185,6 +391,7 @@ API_PROVIDERS = {
         "chunk_size": GEMINI_CLI_CHUNK_SIZE,
         "max_retries": GEMINI_CLI_MAX_RETRIES,
         "max_daily_calls": 1000,
+        "batch_budget": {"max_batch_tokens": 40000, "max_output_tokens": 16000, "max_batch_items": GEMINI_CLI_CHUNK_SIZE},
         "name": "Gemini CLI",
         "description": "通过Google Gemini CLI调用，每天1000次免费，使用2.5 Pro模型，支持并行处理"
     },
@@ -199,7 +406,11 @@ API_PROVIDERS = {
             "gpt-5-nano"
         ],
         "enable_thinking": False,
-        "reasoning_effort": "minimal"
+        "reasoning_effort": "minimal",
+        "max_output_tokens": 4000,
+        "batch_budget": {"max_batch_tokens": 16000, "max_output_tokens": 3500},
+        "tokenizer": "o200k_base",  # 试运行估算使用的 tiktoken 编码 (未安装 tiktoken 时按字符估算)
+        "batch_api": "openai",
     },
     "qwen": {
         "api_key_env": "DASHSCOPE_API_KEY",
@@ -256,6 +467,12 @@ API_PROVIDERS = {
         "enable_thinking": False,
         "chunk_size": OLLAMA_CHUNK_SIZE,
         "max_retries": OLLAMA_MAX_RETRIES,
+        "batch_budget": {"max_batch_tokens": 4000, "max_output_tokens": 2000, "prompt_overhead_tokens": 1200, "max_batch_items": OLLAMA_CHUNK_SIZE},
+        "latency_model": {"base_seconds": 1.0, "input_tokens_per_second": 1500.0, "output_tokens_per_second": 25.0},
+        "http_pool": {"trust_env": False},  # 本地服务不走系统代理
+        "endpoints": OLLAMA_ENDPOINTS,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "num_ctx": OLLAMA_NUM_CTX,
         "name": "Ollama (Local)",
         "description": "本地Ollama模型，无需API密钥"
     },
@@ -286,6 +503,17 @@ API_PROVIDERS = {
         "name": "Custom (OpenAI Compatible)",
         "description": "（需要技术知识）连接到您自选的任何兼容OpenAI的API服务"
     },
+    "mock": {
+        "base_url_env": "MOCK_LLM_BASE_URL",
+        "default_model": "mock-echo",
+        "available_models": ["mock-echo"],
+        "mock_behaviour": MOCK_LLM_BEHAVIOUR,
+        "http_pool": {"trust_env": False},
+        "batch_api": "local",  # 本地文件后端，作业在第 batch_complete_after_polls 次轮询时完成
+        "batch_complete_after_polls": 1,
+        "name": "Mock LLM (Load Testing)",
+        "description": "模拟LLM，返回伪译文并按配置注入延迟与错误，用于压测，无需API密钥"
+    },
 }
 
 # --- 语言数据库 --------------------------------------------------
@@ -410,3 +638,9 @@ GAME_ID_ALIASES = {
 
 # --- 保底格式提示模板 ---------------------------------------------
 FALLBACK_FORMAT_PROMPT = prompts.FALLBACK_FORMAT_PROMPT
+MULTI_TARGET_FORMAT_PROMPT = prompts.MULTI_TARGET_FORMAT_PROMPT
+SALVAGE_FORMAT_PROMPT = prompts.SALVAGE_FORMAT_PROMPT
+STABLE_PREFIX_MARKER = prompts.STABLE_PREFIX_MARKER
+STABLE_PREFIX_ITEM_COUNT = prompts.STABLE_PREFIX_ITEM_COUNT
+STABLE_PREFIX_LIST_NOTE = prompts.STABLE_PREFIX_LIST_NOTE
+STABLE_PREFIX_BATCH_PROMPT = prompts.STABLE_PREFIX_BATCH_PROMPT
@@ -161,6 +161,38 @@ FALLBACK_FORMAT_PROMPT = """    "CRITICAL FORMATTING: Your response MUST be a va
     "--- INPUT LIST ---\n{numbered_list}\n--- END OF INPUT LIST ---"
 """
 
+# 多目标语言模式：追加在格式提示之后，覆盖其中"返回 JSON 数组"的要求
+MULTI_TARGET_FORMAT_PROMPT = (
+    "\n🚨 MULTI-LANGUAGE OUTPUT OVERRIDE: Translate the input list into EACH of these languages: {language_list}.\n"
+    "Instead of a single JSON array, your response MUST be one JSON object of the form\n"
+    "{{\"translations\": {{{example_keys}}}}}\n"
+    "Use EXACTLY these language codes as keys: {language_codes}.\n"
+    "Every list MUST contain exactly {chunk_size} items, in the same order as the input list. "
+    "All rules above apply to every language.\n"
+)
+
+# 部分结果抢救模式：追加在格式提示之后，要求每条译文携带输入编号，
+# 以便只重新请求缺失或格式错误的条目
+SALVAGE_FORMAT_PROMPT = (
+    "\n🚨 OUTPUT ID OVERRIDE: Instead of an array of plain strings, your response MUST be a JSON array of objects\n"
+    "[{{\"id\": 1, \"text\": \"translation for item 1\"}}, {{\"id\": 2, \"text\": \"translation for item 2\"}}]\n"
+    "\"id\" is the number of the item in the input list (1 to {chunk_size}). Return exactly one object per input item. "
+    "All rules above apply to every \"text\" value.\n"
+)
+
+# 稳定前缀布局 (PROMPT_LAYOUT = "stable_prefix")：格式提示中的条目数以 N 代替、编号原文换成下面的说明，
+# 使前缀在同一文件的所有批次间逐字节相同；本批次的条目数、额外词典条目与编号原文统一放在末尾
+STABLE_PREFIX_MARKER = "--- BATCH INPUT ---"
+STABLE_PREFIX_ITEM_COUNT = "N"
+STABLE_PREFIX_LIST_NOTE = "(the N input items are listed under \"--- BATCH INPUT ---\" at the end of this prompt)"
+STABLE_PREFIX_BATCH_PROMPT = (
+    "\n\n--- BATCH INPUT ---\n"
+    "N = {chunk_size}\n"
+    "{glossary}"
+    "{numbered_list}\n"
+    "--- END OF BATCH INPUT ---\n"
+)
+
 
 # --- Steam Workshop Description Generator Prompts ---
 STEAM_BBCODE_PROMPT_TEMPLATE = """You are an expert Steam Workshop page layout designer. Your task is to receive user-provided text, reformat it into a professionally structured game mod workshop description page using BBCode, and translate the content into {target_language_name}.
@@ -17,6 +17,7 @@ from .ollama_handler import OllamaHandler
 from .modelscope_handler import ModelScopeHandler
 from .siliconflow_handler import SiliconFlowHandler
 from .yourfavourite_handler import YourFavouriteHandler
+from .mock_handler import MockHandler
 
 
 def get_handler(provider_name: str, model_name: str = None) -> 'BaseApiHandler':
@@ -45,6 +46,8 @@ def get_handler(provider_name: str, model_name: str = None) -> 'BaseApiHandler':
             return SiliconFlowHandler(provider_name, model_id=model_name)
         elif provider_name == "your_favourite_api":
             return YourFavouriteHandler(provider_name, model_id=model_name)
+        elif provider_name == "mock":
+            return MockHandler(provider_name, model_id=model_name)
         else:
             # 默认返回 Gemini
             logging.warning(f"Unknown provider '{provider_name}', falling back to 'gemini'.")
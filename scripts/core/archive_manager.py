@@ -3,11 +3,11 @@ import sqlite3
 import os
 import logging
 import hashlib
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterable, List, Optional, Tuple, Any
 import json
 
 from scripts.utils import i18n
-from scripts.app_settings import PROJECT_ROOT, MODS_CACHE_DB_PATH
+from scripts.app_settings import PROJECT_ROOT, MODS_CACHE_DB_PATH, SOURCE_SNAPSHOT_CHUNK_SIZE
 
 class ArchiveManager:
     """
@@ -45,7 +45,11 @@ class ArchiveManager:
         cursor.execute("CREATE TABLE IF NOT EXISTS mod_identities (identity_id INTEGER PRIMARY KEY AUTOINCREMENT, mod_id INTEGER NOT NULL, remote_file_id TEXT NOT NULL UNIQUE, FOREIGN KEY (mod_id) REFERENCES mods (mod_id))")
         cursor.execute("CREATE TABLE IF NOT EXISTS source_versions (version_id INTEGER PRIMARY KEY AUTOINCREMENT, mod_id INTEGER NOT NULL, snapshot_hash TEXT NOT NULL UNIQUE, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY (mod_id) REFERENCES mods (mod_id))")
         cursor.execute("CREATE TABLE IF NOT EXISTS source_entries (source_entry_id INTEGER PRIMARY KEY AUTOINCREMENT, version_id INTEGER NOT NULL, entry_key TEXT NOT NULL, source_text TEXT NOT NULL, UNIQUE(version_id, entry_key), FOREIGN KEY (version_id) REFERENCES source_versions (version_id))")
-        cursor.execute("CREATE TABLE IF NOT EXISTS translated_entries (translated_entry_id INTEGER PRIMARY KEY AUTOINCREMENT, source_entry_id INTEGER NOT NULL, language_code TEXT NOT NULL, translated_text TEXT NOT NULL, last_translated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, UNIQUE(source_entry_id, language_code), FOREIGN KEY (source_entry_id) REFERENCES source_entries (source_entry_id))")
+        cursor.execute("CREATE TABLE IF NOT EXISTS translated_entries (translated_entry_id INTEGER PRIMARY KEY AUTOINCREMENT, source_entry_id INTEGER NOT NULL, language_code TEXT NOT NULL, translated_text TEXT NOT NULL, last_translated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, provider TEXT DEFAULT '', UNIQUE(source_entry_id, language_code), FOREIGN KEY (source_entry_id) REFERENCES source_entries (source_entry_id))")
+        # Databases created before per-entry provenance lack the provider column
+        cursor.execute("PRAGMA table_info(translated_entries)")
+        if 'provider' not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE translated_entries ADD COLUMN provider TEXT DEFAULT ''")
         conn.commit()
 
     def get_or_create_mod_entry(self, mod_name: str, remote_file_id: str) -> Optional[int]:
@@ -78,26 +82,47 @@ class ArchiveManager:
             self.connection.rollback()
             return None
 
-    def create_source_version(self, mod_id: int, all_files_data: List[Dict]) -> Optional[int]:
-        """阶段二: 计算哈希，如果不存在则创建源版本快照"""
+    def create_source_version(self, mod_id: int, all_files_data: Iterable[Dict], chunk_size: int = SOURCE_SNAPSHOT_CHUNK_SIZE) -> Optional[int]:
+        """
+        阶段二: 计算哈希，如果不存在则创建源版本快照
+        all_files_data 可以是列表 (按文件名排序后计算哈希)，也可以是已按文件名排序的迭代器：
+        条目每 chunk_size 条写入一次临时表，快照不需要整体驻留内存。
+        """
         if not self.connection: return None
 
-        # 1. 计算总哈希
-        hasher = hashlib.sha256()
-        # Sort by filename to ensure consistent hash
-        sorted_files = sorted(all_files_data, key=lambda x: x['filename'])
-        for file_data in sorted_files:
-            # Use texts_to_translate for hash
-            for text in file_data.get('texts_to_translate', []):
-                hasher.update(text.encode('utf-8'))
-        snapshot_hash = hasher.hexdigest()
+        if isinstance(all_files_data, list):
+            # Sort by filename to ensure consistent hash
+            all_files_data = sorted(all_files_data, key=lambda x: x['filename'])
 
+        hasher = hashlib.sha256()
         cursor = self.connection.cursor()
         try:
+            # 1. 逐文件计算总哈希，同时把源条目分块暂存
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS staged_source_entries (entry_key TEXT NOT NULL, source_text TEXT NOT NULL, file_path TEXT)")
+            cursor.execute("DELETE FROM staged_source_entries")
+            staged_sql = "INSERT INTO staged_source_entries (entry_key, source_text, file_path) VALUES (?, ?, ?)"
+            chunk = []
+            for file_data in all_files_data:
+                texts = file_data.get('texts_to_translate', [])
+                # Use texts_to_translate for hash
+                for text in texts:
+                    hasher.update(text.encode('utf-8'))
+                filename = file_data.get('filename', 'unknown')
+                for key, text in zip(file_data.get('key_map', []), texts):
+                    chunk.append((key, text, filename))
+                    if len(chunk) >= chunk_size:
+                        cursor.executemany(staged_sql, chunk)
+                        chunk = []
+            if chunk:
+                cursor.executemany(staged_sql, chunk)
+            snapshot_hash = hasher.hexdigest()
+
             # 2. 检查哈希是否存在
             cursor.execute("SELECT version_id FROM source_versions WHERE snapshot_hash = ?", (snapshot_hash,))
             result = cursor.fetchone()
             if result:
+                cursor.execute("DELETE FROM staged_source_entries")
+                self.connection.commit()
                 logging.info(i18n.t("log_info_source_version_exists", hash=snapshot_hash[:7], version_id=result['version_id']))
                 return result['version_id']
 
@@ -106,38 +131,34 @@ class ArchiveManager:
             version_id = cursor.lastrowid
             logging.info(i18n.t("log_info_created_source_version", version_id=version_id, mod_id=mod_id, hash=snapshot_hash[:7]))
 
-            # 4. 插入所有源条目
-            source_entries = []
-            for file_data in all_files_data:
-                # We need to store the file path somehow? The original schema didn't have file_path in source_entries.
-                # It seems the original schema was key-centric, assuming unique keys across the mod version.
-                # However, for the "Project" flow, we need file-based retrieval.
-                # I will ADD a 'file_path' column to source_entries if it doesn't exist?
-                # Or simpler: For now, I will assume keys are unique enough or I will rely on the structure.
-                # Wait, the key map is needed.
-                # The previous code: zip(file_data['key_map'], file_data['texts_to_translate'])
-                for key, text in zip(file_data['key_map'], file_data['texts_to_translate']):
-                    # We are losing file_path here. This is a flaw in the original schema for my new requirement.
-                    # I will modify the schema to include file_path.
-                    source_entries.append((version_id, key, text, file_data.get('filename', 'unknown')))
-
             # Check if file_path column exists, if not add it
+            # (the original schema was key-centric; the Project flow needs file-based retrieval)
             cursor.execute("PRAGMA table_info(source_entries)")
             columns = [col['name'] for col in cursor.fetchall()]
             if 'file_path' not in columns:
                 cursor.execute("ALTER TABLE source_entries ADD COLUMN file_path TEXT DEFAULT ''")
 
-            cursor.executemany("INSERT OR IGNORE INTO source_entries (version_id, entry_key, source_text, file_path) VALUES (?, ?, ?, ?)", source_entries)
+            # 4. 插入所有源条目
+            cursor.execute("""
+                INSERT OR IGNORE INTO source_entries (version_id, entry_key, source_text, file_path)
+                SELECT ?, entry_key, source_text, file_path FROM staged_source_entries ORDER BY rowid
+            """, (version_id,))
+            archived_count = cursor.rowcount
+            cursor.execute("DELETE FROM staged_source_entries")
             self.connection.commit()
-            logging.info(i18n.t("log_info_archived_source_entries", count=len(source_entries), version_id=version_id))
+            logging.info(i18n.t("log_info_archived_source_entries", count=archived_count, version_id=version_id))
             return version_id
         except Exception as e:
             logging.error(i18n.t("log_error_db_create_source_version", error=e))
             self.connection.rollback()
             return None
 
-    def archive_translated_results(self, version_id: int, file_results: Dict[str, Any], all_files_data: List[Dict], target_lang_code: str):
-        """阶段三: 将指定语言的翻译结果存入或更新到数据库"""
+    def archive_translated_results(self, version_id: int, file_results: Dict[str, Any], all_files_data: List[Dict], target_lang_code: str,
+                                   providers: Optional[Dict[str, List[str]]] = None):
+        """
+        阶段三: 将指定语言的翻译结果存入或更新到数据库
+        providers 可按文件给出每个条目的来源 Provider ("" 表示回退为原文)。
+        """
         if not self.connection or not version_id: return
 
         cursor = self.connection.cursor()
@@ -148,7 +169,8 @@ class ArchiveManager:
                 file_data = next((fd for fd in all_files_data if fd['filename'] == filename), None)
                 if not file_data or not translated_texts: continue
 
-                for key, translated_text in zip(file_data['key_map'], translated_texts):
+                file_providers = (providers or {}).get(filename) or []
+                for i, (key, translated_text) in enumerate(zip(file_data['key_map'], translated_texts)):
                     # Find source entry
                     cursor.execute(
                         "SELECT source_entry_id FROM source_entries WHERE version_id = ? AND entry_key = ? AND file_path = ?",
@@ -157,16 +179,18 @@ class ArchiveManager:
                     row = cursor.fetchone()
                     if row:
                         source_entry_id = row['source_entry_id']
-                        upsert_data.append((source_entry_id, target_lang_code, translated_text))
+                        provider = file_providers[i] if i < len(file_providers) else ''
+                        upsert_data.append((source_entry_id, target_lang_code, translated_text, provider))
 
             if not upsert_data:
                 return
 
             cursor.executemany("""
-                INSERT INTO translated_entries (source_entry_id, language_code, translated_text)
-                VALUES (?, ?, ?)
+                INSERT INTO translated_entries (source_entry_id, language_code, translated_text, provider)
+                VALUES (?, ?, ?, ?)
                 ON CONFLICT(source_entry_id, language_code) DO UPDATE SET
                 translated_text = excluded.translated_text,
+                provider = excluded.provider,
                 last_translated_at = CURRENT_TIMESTAMP
             """, upsert_data)
 
@@ -1,16 +1,211 @@
 # scripts/core/base_handler.py
+import math
 import time
+import asyncio
+import hashlib
 import logging
+import threading
+import contextvars
+import contextlib
+from typing import Iterator, AsyncIterator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import replace
 from abc import ABC, abstractmethod
 
 from scripts.utils import i18n
-from scripts.app_settings import MAX_RETRIES, FALLBACK_FORMAT_PROMPT
-from scripts.core.parallel_processor import BatchTask
+from scripts.app_settings import MAX_RETRIES, BATCH_BISECT_AFTER_ATTEMPTS, PARTIAL_SALVAGE, FALLBACK_FORMAT_PROMPT, MULTI_TARGET_FORMAT_PROMPT, SALVAGE_FORMAT_PROMPT
+from scripts.app_settings import HEDGED_REQUESTS, HEDGE_BUDGET_PERCENT, HEDGE_LATENCY_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_LATENCY_WINDOW, RECOMMENDED_MAX_WORKERS
+from scripts.app_settings import STREAMING_RESPONSES, STREAM_PREAMBLE_LIMIT, STREAM_REPETITION_LIMIT, STREAM_ITEM_LENGTH_RATIO
+from scripts.app_settings import PROMPT_LAYOUT, PROMPT_PREFIX_GLOSSARY_MAX_TERMS, STABLE_PREFIX_MARKER, STABLE_PREFIX_ITEM_COUNT, STABLE_PREFIX_LIST_NOTE, STABLE_PREFIX_BATCH_PROMPT
+from scripts.app_settings import PROMPT_CACHE_EXPLICIT, PROMPT_CACHE_TTL_SECONDS, PROMPT_CACHE_MIN_TOKENS, OUTPUT_TOKEN_HEADROOM
+from scripts.core.parallel_processor import BatchTask, publish_early_results
 from scripts.utils.punctuation_handler import generate_punctuation_prompt
 from scripts.core.glossary_manager import glossary_manager
-from scripts.utils.structured_parser import parse_response
+from scripts.utils.structured_parser import parse_response, parse_identified_response, IncrementalResponseParser
+from scripts.core.schemas import MultiTargetTranslationResponse
 from scripts.utils.text_clean import mask_special_tokens
 from scripts.core.prompt_manager import prompt_manager
+from scripts.core.rate_limiter import rate_limit_registry, parse_rate_limit_error, release_batch_slot
+from scripts.core.http_transport import transport_registry, HttpTransport
+from scripts.core.batch_planner import BatchPlanner, BatchBudget, estimate_tokens
+from scripts.core.telemetry_ledger import OUTCOME_OK, OUTCOME_PARTIAL, OUTCOME_PARSE_ERROR, OUTCOME_ERROR, percentile
+
+# 当前请求的 token 用量，由子类在 _call_api 中通过 _report_usage 填写。
+# 存放的是可变字典，asyncio.to_thread 复制上下文后仍写回同一个对象。
+_call_usage: contextvars.ContextVar = contextvars.ContextVar("call_usage", default=None)
+
+
+def _effective_name(lang: dict) -> str:
+    return lang.get("custom_name", lang["name"]) if lang.get("is_shell") else lang["name"]
+
+
+def _glossary_part(texts: list[str], source_lang: dict, target_langs: list[dict], limit: int | None = None,
+                   exclude: dict[str, set] | None = None) -> tuple[str, dict[str, set]]:
+    """
+    每个目标语言只取其相关的词典子集，多语言时按语言分段合并。
+    返回 (提示词片段, {语言代码: 已写入的词条 id})；exclude 中的词条不再重复写入。
+    """
+    part = ""
+    included: dict[str, set] = {}
+    if not glossary_manager.get_glossary_for_translation():
+        return part, included
+    is_multi_target = len(target_langs) > 1
+    for lang in target_langs:
+        skip = (exclude or {}).get(lang["code"], set())
+        relevant_terms = [
+            term for term in glossary_manager.extract_relevant_terms(texts, source_lang["code"], lang["code"])
+            if term["id"] not in skip
+        ][:limit]
+        included[lang["code"]] = {term["id"] for term in relevant_terms}
+        if relevant_terms:
+            header = f"[{_effective_name(lang)} ({lang['code']})]\n" if is_multi_target else ""
+            part += header + glossary_manager.create_dynamic_glossary_prompt(
+                relevant_terms, source_lang["code"], lang["code"]
+            ) + "\n\n"
+    return part, included
+
+
+def split_prompt_prefix(prompt: str) -> tuple[str | None, str]:
+    """
+    把 stable_prefix 布局的提示词拆成 (可缓存的静态前缀, 本批次内容)，供显式缓存使用；
+    其他布局的提示词返回 (None, prompt)。
+    """
+    prefix, separator, payload = prompt.partition("\n\n" + STABLE_PREFIX_MARKER)
+    if not separator:
+        return None, prompt
+    return prefix, STABLE_PREFIX_MARKER + payload
+
+
+def bulk_request_key(prompt: str) -> str:
+    """离线批量模式中请求的键：规划阶段与回放阶段为同一批次构建的提示词逐字节相同，按摘要对应结果。"""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+def build_batch_prompt(task: BatchTask, logger: logging.Logger | None = None) -> str:
+    """
+    【通用逻辑】根据任务构建完整的翻译提示。
+    多目标语言模式下 (file_task.companion_langs 非空)，原文与系统提示只出现一次，
+    词典与标点规则按语言合并，并要求返回以语言代码为键的 JSON 对象。
+    PROMPT_LAYOUT = "stable_prefix" 时静态部分在前、本批次内容在后 (见 _build_stable_prefix)。
+    不依赖 API 客户端，试运行估算 (run_estimator) 用它构建与真实请求相同的提示词。
+    """
+    logger = logger or logging.getLogger(__name__)
+    chunk = task.texts
+    source_lang = task.file_task.source_lang
+    target_langs = [task.file_task.target_lang] + list(task.file_task.companion_langs)
+    batch_num = task.batch_index + 1
+
+    # Apply Token Masking (Newlines & Quotes)
+    masked_chunk = [mask_special_tokens(txt) for txt in chunk]
+    numbered_list = "\n".join(f'{j + 1}. "{txt}"' for j, txt in enumerate(masked_chunk))
+
+    if PROMPT_LAYOUT == "stable_prefix":
+        prefix, prefix_terms = _build_stable_prefix(task.file_task, target_langs, logger)
+        # 跨文件打包的批次等情况下，前缀词典未覆盖的相关词条放在本批次内容中
+        glossary_prompt_part, batch_terms = _glossary_part(chunk, source_lang, target_langs, exclude=prefix_terms)
+        for code, ids in batch_terms.items():
+            if ids:
+                logger.info(i18n.t("batch_translation_glossary_injected", batch_num=batch_num, count=len(ids)))
+        batch_part = STABLE_PREFIX_BATCH_PROMPT.format(
+            chunk_size=len(chunk), glossary=glossary_prompt_part, numbered_list=numbered_list
+        )
+        return prefix + batch_part + _final_warning(task.file_task.game_profile)
+
+    glossary_prompt_part, batch_terms = _glossary_part(chunk, source_lang, target_langs)
+    for code, ids in batch_terms.items():
+        if ids:
+            logger.info(i18n.t("batch_translation_glossary_injected", batch_num=batch_num, count=len(ids)))
+    instructions, format_prompt_part, punctuation_prompt_part = _prompt_sections(
+        task.file_task, target_langs, len(chunk), numbered_list
+    )
+    return instructions + glossary_prompt_part + format_prompt_part + punctuation_prompt_part + _final_warning(task.file_task.game_profile)
+
+
+def _prompt_sections(file_task, target_langs: list[dict], chunk_size, numbered_list: str) -> tuple[str, str, str]:
+    """返回 (基础提示 + 模组上下文, 格式提示, 标点规则)；stable_prefix 布局以占位说明代替条目数与编号原文。"""
+    source_lang = file_task.source_lang
+    is_multi_target = len(target_langs) > 1
+    game_profile = file_task.game_profile
+    effective_target_lang_name = ", ".join(_effective_name(lang) for lang in target_langs)
+
+    # Use PromptManager to get the effective prompt (handling overrides)
+    prompt_template = prompt_manager.get_effective_prompt(game_profile["id"])
+    if not prompt_template:
+        # Fallback if for some reason it's missing (shouldn't happen if game_profile is valid)
+        prompt_template = game_profile.get("prompt_template", "")
+
+    base_prompt = prompt_template.format(
+        source_lang_name=source_lang["name"],
+        target_lang_name=effective_target_lang_name,
+    )
+    context_prompt_part = (
+        f"CRITICAL CONTEXT: The mod you are translating is '{file_task.mod_context}'. "
+        "Use this information to ensure all translations are thematically appropriate.\n"
+    )
+
+    punctuation_prompts = []
+    for lang in target_langs:
+        punctuation_prompt = generate_punctuation_prompt(source_lang["code"], lang["code"])
+        if punctuation_prompt:
+            punctuation_prompts.append(f"[{lang['code']}] {punctuation_prompt}" if is_multi_target else punctuation_prompt)
+    punctuation_prompt = "\n".join(punctuation_prompts)
+
+    effective_format_prompt = prompt_manager.get_effective_format_prompt(game_profile["id"])
+    format_prompt_part = (effective_format_prompt or FALLBACK_FORMAT_PROMPT).format(
+        chunk_size=chunk_size,
+        numbered_list=numbered_list
+    )
+
+    if PARTIAL_SALVAGE and not is_multi_target:
+        format_prompt_part += SALVAGE_FORMAT_PROMPT.format(chunk_size=chunk_size)
+
+    if is_multi_target:
+        codes = [lang["code"] for lang in target_langs]
+        format_prompt_part += MULTI_TARGET_FORMAT_PROMPT.format(
+            language_list=", ".join(f"{_effective_name(lang)} ({lang['code']})" for lang in target_langs),
+            example_keys=", ".join(f'"{code}": [...]' for code in codes),
+            language_codes=", ".join(codes),
+            chunk_size=chunk_size
+        )
+
+    punctuation_prompt_part = f"\nPUNCTUATION CONVERSION:\n{punctuation_prompt}\n" if punctuation_prompt else ""
+    return base_prompt + context_prompt_part, format_prompt_part, punctuation_prompt_part
+
+
+def _final_warning(game_profile: dict) -> str:
+    # Add a "Final Warning" section for Victoria 3 specifically
+    if game_profile["id"] == "victoria3":
+        return (
+            "\n🚨 FINAL MANDATORY REMINDER FOR VICTORIA 3:\n"
+            "- DO NOT translate the label inside [Concept('key', 'Label')]. Keep it English.\n"
+            "- DO NOT translate anything inside [SCOPE...].\n"
+            "- Ensure the JSON format is strictly followed.\n"
+        )
+    return ""
+
+
+def _build_stable_prefix(file_task, target_langs: list[dict], logger: logging.Logger) -> tuple[str, dict[str, set]]:
+    """
+    stable_prefix 布局的静态前缀：基础提示、模组上下文、整个文件的词典 (最多 PROMPT_PREFIX_GLOSSARY_MAX_TERMS 条)、
+    格式与标点规则。按目标语言缓存在 FileTask 上，同一文件的所有批次共用同一个字符串。
+    返回 (前缀, {语言代码: 前缀中的词条 id})。
+    """
+    key = ",".join(lang["code"] for lang in target_langs)
+    cached = file_task.prompt_prefixes.get(key)
+    if cached is not None:
+        return cached
+    glossary_prompt_part, terms = _glossary_part(
+        file_task.texts_to_translate, file_task.source_lang, target_langs, limit=PROMPT_PREFIX_GLOSSARY_MAX_TERMS
+    )
+    if any(terms.values()):
+        logger.info(f"Stable prompt prefix for {file_task.filename}: {sum(len(ids) for ids in terms.values())} file-level glossary terms.")
+    instructions, format_prompt_part, punctuation_prompt_part = _prompt_sections(
+        file_task, target_langs, STABLE_PREFIX_ITEM_COUNT, STABLE_PREFIX_LIST_NOTE
+    )
+    # 并发批次可能同时计算，结果相同，后写入的覆盖先写入的即可
+    file_task.prompt_prefixes[key] = cached = (instructions + glossary_prompt_part + format_prompt_part + punctuation_prompt_part, terms)
+    return cached
 
 
 class BaseApiHandler(ABC):
@@ -24,6 +219,36 @@ class BaseApiHandler(ABC):
         self.model_id = model_id
         self.logger = logging.getLogger(self.__class__.__name__)
         self.client = self.initialize_client()
+        # Native async clients are bound to the event loop that first used them,
+        # so they are created lazily per loop (see _get_async_client).
+        self._async_client = None
+        self._async_client_loop = None
+        self._rate_limiter = None
+        # 部分结果抢救统计：保留的条目、补充请求的条目，以及相对整批重试节省的 token
+        self.salvage_stats = {"salvaged_items": 0, "rerequested_items": 0, "saved_tokens": 0}
+        self._salvage_lock = threading.Lock()
+        # 遥测账本会话 (由工作流设置)；为 None 时不记录
+        self.telemetry = None
+        # 对冲请求：近期成功请求的耗时窗口与统计 (requests 为主请求数，用于预算)
+        self.hedge_stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "budget_exhausted": 0}
+        self._latencies = deque(maxlen=HEDGE_LATENCY_WINDOW)
+        self._hedge_lock = threading.Lock()
+        self._hedge_pool = None
+        self._hedge_handler = None
+        # 流式响应：条目完成即通过 publish_early_results 交给所属文件
+        self.stream_stats = {"streams": 0, "aborted": 0, "abort_reasons": {}, "items_streamed": 0, "mean_first_item_seconds": None}
+        self._stream_lock = threading.Lock()
+        self._first_items = 0
+        # 提示词缓存：requests 为上报了用量的请求数，hits/cached_tokens 为 Provider 报告的缓存命中；
+        # 显式缓存句柄按前缀摘要保存 {digest: (句柄或 None, 过期时间)}
+        self.prompt_cache_stats = {"requests": 0, "hits": 0, "prompt_tokens": 0, "cached_tokens": 0, "explicit_caches": 0}
+        self._prompt_caches = {}
+        self._prompt_cache_lock = threading.Lock()
+        # 离线批量模式：批处理作业的结果 {提示词摘要: [响应文本]} (由工作流加载，None 表示未启用)；
+        # replayed 为直接使用作业结果的请求数，realtime 为结果缺失、改为实时发送的请求数
+        self.bulk_responses = None
+        self.bulk_stats = {"replayed": 0, "realtime": 0}
+        self._bulk_lock = threading.Lock()
 
     def get_provider_config(self) -> dict:
         """
@@ -66,85 +291,539 @@ class BaseApiHandler(ABC):
         """【必须由子类实现】执行对特定API的调用并返回原始文本响应。"""
         pass
 
-    def _build_prompt(self, task: BatchTask) -> str:
+    @property
+    def rate_limiter(self):
+        """该 Provider/模型 共享的自适应限流器。"""
+        if self._rate_limiter is None:
+            model_name = self.model_id or self.get_provider_config().get("default_model")
+            self._rate_limiter = rate_limit_registry.get(self.provider_name, model_name)
+        return self._rate_limiter
+
+    @property
+    def transport(self) -> HttpTransport:
+        """该 Provider 共享的 HTTP 长连接池；基于 HTTP 的子类用它创建 SDK 客户端或直接发送请求。"""
+        return transport_registry.get(self.provider_name)
+
+    def _note_rate_limit(self, error: Exception) -> bool:
+        """如果异常是 429 / 配额错误，回报给限流器并返回 True。"""
+        is_rate_limited, retry_after = parse_rate_limit_error(error)
+        if is_rate_limited:
+            self.rate_limiter.on_rate_limited(retry_after)
+        return is_rate_limited
+
+    def _retry_delay(self, attempt: int, rate_limited: bool) -> float:
+        """限流错误遵守 Retry-After，其他错误沿用线性退避。"""
+        if rate_limited:
+            return self.rate_limiter.retry_delay()
+        return (attempt + 1) * 2
+
+    def _max_output_tokens(self) -> int:
         """
-        【通用逻辑】根据任务构建完整的翻译提示。
+        单次请求的输出上限：Provider 配置的 max_output_tokens；
+        未配置时按批次预算的 max_output_tokens (规划批次时使用的同一个值) 加 OUTPUT_TOKEN_HEADROOM 余量。
         """
-        chunk = task.texts
-        source_lang = task.file_task.source_lang
-        target_lang = task.file_task.target_lang
-        game_profile = task.file_task.game_profile
-        mod_context = task.file_task.mod_context
-        batch_num = task.batch_index + 1
+        configured = self.get_provider_config().get("max_output_tokens")
+        if configured:
+            return int(configured)
+        return math.ceil(BatchBudget.for_provider(self.provider_name).max_output_tokens * OUTPUT_TOKEN_HEADROOM)
 
+    def _estimate_request_tokens(self, task: BatchTask) -> int:
+        input_tokens, output_tokens = BatchPlanner.for_provider(self.provider_name).estimate_request_tokens(task.texts)
+        return input_tokens + output_tokens
 
+    @contextlib.contextmanager
+    def _own_slot(self, task: BatchTask, batch_success: bool):
+        """
+        批次内的额外请求 (单语言回退、拆分、补请求) 各自占用一个限流名额并计入 RPM/TPM。
+        先归还批次的名额 (首个请求已结束)，持有名额时不会再等待名额。
+        yield 的 dict 中 "success" 决定归还名额时是否计为成功。
+        """
+        release_batch_slot(batch_success)
+        self.rate_limiter.acquire(self._estimate_request_tokens(task))
+        result = {"success": False}
+        try:
+            yield result
+        finally:
+            self.rate_limiter.release(success=result["success"])
 
-        # Apply Token Masking (Newlines & Quotes)
-        masked_chunk = [mask_special_tokens(txt) for txt in chunk]
-        numbered_list = "\n".join(f'{j + 1}. "{txt}"' for j, txt in enumerate(masked_chunk))
+    @contextlib.asynccontextmanager
+    async def _own_slot_async(self, task: BatchTask, batch_success: bool):
+        release_batch_slot(batch_success)
+        await self.rate_limiter.acquire_async(self._estimate_request_tokens(task))
+        result = {"success": False}
+        try:
+            yield result
+        finally:
+            self.rate_limiter.release(success=result["success"])
 
-        effective_target_lang_name = target_lang.get("custom_name", target_lang["name"]) if target_lang.get("is_shell") else target_lang["name"]
+    def _report_usage(self, prompt_tokens: int | None, completion_tokens: int | None, cached_tokens: int | None = None):
+        """【供子类调用】记录当前请求由 Provider 返回的实际 token 用量；cached_tokens 为其中命中提示词缓存的部分。"""
+        usage = _call_usage.get()
+        if usage is not None and prompt_tokens is not None and completion_tokens is not None:
+            usage["prompt_tokens"] = int(prompt_tokens)
+            usage["completion_tokens"] = int(completion_tokens)
+            usage["cached_tokens"] = int(cached_tokens or 0)
 
-        effective_target_lang_name = target_lang.get("custom_name", target_lang["name"]) if target_lang.get("is_shell") else target_lang["name"]
+    def _report_openai_usage(self, response: any):
+        """OpenAI 兼容接口的 response.usage；缓存命中取 prompt_tokens_details.cached_tokens (DeepSeek 为 prompt_cache_hit_tokens)。"""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", None) or getattr(usage, "prompt_cache_hit_tokens", None)
+            self._report_usage(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None), cached_tokens)
 
-        # Use PromptManager to get the effective prompt (handling overrides)
-        prompt_template = prompt_manager.get_effective_prompt(game_profile["id"])
-        if not prompt_template:
-            # Fallback if for some reason it's missing (shouldn't happen if game_profile is valid)
-            prompt_template = game_profile.get("prompt_template", "")
+    @staticmethod
+    def _openai_stream_kwargs() -> dict:
+        """OpenAI 兼容接口的流式参数；最后一个分块携带用量。"""
+        return {"stream": True, "stream_options": {"include_usage": True}}
 
-        base_prompt = prompt_template.format(
-            source_lang_name=source_lang["name"],
-            target_lang_name=effective_target_lang_name,
-        )
-        context_prompt_part = (
-            f"CRITICAL CONTEXT: The mod you are translating is '{mod_context}'. "
-            "Use this information to ensure all translations are thematically appropriate.\n"
-        )
+    def _iter_openai_stream(self, stream: any) -> Iterator[str]:
+        """逐段产出 OpenAI 兼容流式响应的 delta.content，关闭生成器时关闭连接。"""
+        try:
+            for chunk in stream:
+                self._report_openai_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
 
-        glossary_prompt_part = ""
-        if glossary_manager.get_glossary_for_translation():
-            relevant_terms = glossary_manager.extract_relevant_terms(
-                chunk, source_lang["code"], target_lang["code"]
-            )
-            if relevant_terms:
-                glossary_prompt_part = glossary_manager.create_dynamic_glossary_prompt(
-                    relevant_terms, source_lang["code"], target_lang["code"]
-                ) + "\n\n"
-                self.logger.info(i18n.t("batch_translation_glossary_injected", batch_num=batch_num, count=len(relevant_terms)))
+    async def _aiter_openai_stream(self, request: any) -> AsyncIterator[str]:
+        """_iter_openai_stream 的异步版本；request 为尚未 await 的 create(stream=True) 调用。"""
+        stream = await request
+        try:
+            async for chunk in stream:
+                self._report_openai_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
 
-        punctuation_prompt = generate_punctuation_prompt(
-            source_lang["code"],
-            target_lang["code"]
-        )
+    @staticmethod
+    def _attempt_outcome(task: BatchTask, raw_response: str | None, translated: dict | None) -> str:
+        if translated:
+            return OUTCOME_OK if len(translated) == len(task.texts) else OUTCOME_PARTIAL
+        return OUTCOME_PARSE_ERROR if raw_response is not None else OUTCOME_ERROR
 
-        effective_format_prompt = prompt_manager.get_effective_format_prompt(game_profile["id"])
-        
-        if effective_format_prompt:
-             format_prompt_part = effective_format_prompt.format(
-                chunk_size=len(chunk),
-                numbered_list=numbered_list
-            )
+    def _record_attempt(self, task: BatchTask, attempt: int, started: float, usage: dict,
+                        raw_response: str | None, outcome: str, error: Exception | None = None):
+        """把一次请求尝试写入遥测账本；Provider 未返回用量时按批次规划器估算。"""
+        self._count_prompt_cache(usage)
+        if self.telemetry is None:
+            return
+        estimated = "prompt_tokens" not in usage
+        if estimated:
+            prompt_tokens = BatchPlanner.for_provider(self.provider_name).estimate_request_tokens(task.texts)[0]
+            completion_tokens = estimate_tokens(raw_response or "")
         else:
-            format_prompt_part = FALLBACK_FORMAT_PROMPT.format(
-                chunk_size=len(chunk),
-                numbered_list=numbered_list
+            prompt_tokens, completion_tokens = usage["prompt_tokens"], usage["completion_tokens"]
+        try:
+            self.telemetry.record(
+                batch_index=task.batch_index,
+                batch_size=len(task.texts),
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                tokens_estimated=estimated,
+                latency_ms=int((time.monotonic() - started) * 1000),
+                attempt=attempt,
+                outcome=outcome,
+                error_class=type(error).__name__ if error is not None else None
             )
+        except Exception as e:
+            self.logger.warning(f"Failed to record telemetry for batch {task.batch_index + 1}: {e}")
 
-        punctuation_prompt_part = f"\nPUNCTUATION CONVERSION:\n{punctuation_prompt}\n" if punctuation_prompt else ""
-        
-        # Add a "Final Warning" section for Victoria 3 specifically
-        final_warning = ""
-        if game_profile["id"] == "victoria3":
-            final_warning = (
-                "\n🚨 FINAL MANDATORY REMINDER FOR VICTORIA 3:\n"
-                "- DO NOT translate the label inside [Concept('key', 'Label')]. Keep it English.\n"
-                "- DO NOT translate anything inside [SCOPE...].\n"
-                "- Ensure the JSON format is strictly followed.\n"
+    # ───────────── 提示词缓存 (Prompt Caching) ─────────────
+    def _count_prompt_cache(self, usage: dict):
+        if "prompt_tokens" not in usage:
+            return
+        cached_tokens = usage.get("cached_tokens", 0)
+        with self._prompt_cache_lock:
+            self.prompt_cache_stats["requests"] += 1
+            self.prompt_cache_stats["prompt_tokens"] += usage["prompt_tokens"]
+            if cached_tokens:
+                self.prompt_cache_stats["hits"] += 1
+                self.prompt_cache_stats["cached_tokens"] += cached_tokens
+
+    def _create_prompt_cache(self, client: any, prefix: str, ttl_seconds: int) -> str | None:
+        """
+        【可由子类实现】为 stable_prefix 布局的静态前缀创建 Provider 端显式缓存并返回句柄。
+        默认不支持 (返回 None)；OpenAI 兼容接口的前缀缓存是自动的，无需句柄。
+        """
+        return None
+
+    def _prompt_cache_handle(self, prefix: str | None) -> str | None:
+        """前缀对应的显式缓存句柄，TTL 到期前复用；未启用、前缀过短或创建失败时返回 None。"""
+        if not (PROMPT_CACHE_EXPLICIT and prefix):
+            return None
+        if estimate_tokens(prefix) < self.get_provider_config().get("prompt_cache_min_tokens", PROMPT_CACHE_MIN_TOKENS):
+            return None
+        digest = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        with self._prompt_cache_lock:
+            entry = self._prompt_caches.get(digest)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            # 持锁创建，同一前缀的并发批次只创建一次；失败也记下，到期前不再重试
+            try:
+                handle = self._create_prompt_cache(self.client, prefix, PROMPT_CACHE_TTL_SECONDS)
+            except Exception as e:
+                self.logger.warning(f"Failed to create prompt cache, sending full prompts instead: {e}")
+                handle = None
+            # 留出余量，避免使用即将过期的句柄
+            self._prompt_caches[digest] = (handle, time.monotonic() + PROMPT_CACHE_TTL_SECONDS * 0.9)
+            if handle is not None:
+                self.prompt_cache_stats["explicit_caches"] += 1
+            return handle
+
+    def _split_cached_prompt(self, prompt: str) -> tuple[str | None, str]:
+        """【供子类调用】返回 (显式缓存句柄, 需要发送的内容)；有句柄时只发送本批次内容，否则发送完整提示词。"""
+        prefix, payload = split_prompt_prefix(prompt)
+        handle = self._prompt_cache_handle(prefix)
+        return (handle, payload) if handle is not None else (None, prompt)
+
+    async def _split_cached_prompt_async(self, prompt: str) -> tuple[str | None, str]:
+        if not PROMPT_CACHE_EXPLICIT:
+            return None, prompt
+        return await asyncio.to_thread(self._split_cached_prompt, prompt)
+
+    # ───────────── 流式响应 (Streaming) ─────────────
+    def _stream_api(self, client: any, prompt: str) -> Iterator[str]:
+        """
+        【可由子类实现】流式执行 API 调用，逐段产出响应文本；Provider 返回的用量同样通过 _report_usage 上报。
+        未实现的 Provider 不使用流式模式。
+        """
+        raise NotImplementedError
+
+    async def _stream_api_async(self, client: any, prompt: str) -> AsyncIterator[str]:
+        """
+        【可由子类覆盖】_stream_api 的异步版本。
+        默认实现在线程中逐段读取同步流。
+        """
+        stream = self._stream_api(client, prompt)
+        try:
+            while (chunk := await asyncio.to_thread(next, stream, None)) is not None:
+                yield chunk
+        finally:
+            stream.close()
+
+    def _streaming_enabled(self) -> bool:
+        return (STREAMING_RESPONSES and type(self)._stream_api is not BaseApiHandler._stream_api
+                and self.get_provider_config().get("streaming", True))
+
+    def _stream_parser(self, task: BatchTask) -> IncrementalResponseParser:
+        return IncrementalResponseParser(
+            len(task.texts), identified=PARTIAL_SALVAGE, source_texts=task.texts,
+            target_lang=task.file_task.target_lang["code"], preamble_limit=STREAM_PREAMBLE_LIMIT,
+            repetition_limit=STREAM_REPETITION_LIMIT, item_length_ratio=STREAM_ITEM_LENGTH_RATIO,
+        )
+
+    def _hand_off(self, task: BatchTask, parser: IncrementalResponseParser, items: dict[int, str], started: float, first: bool):
+        """
+        把流中新完成的条目交给所属文件 (publish_early_results)，并记录首个条目的到达时间。
+        逐条提前交付需要 PARTIAL_SALVAGE；默认格式在数组闭合时整批交付。
+        """
+        if not items:
+            return
+        with self._stream_lock:
+            self.stream_stats["items_streamed"] += len(items)
+            if first:
+                self._first_items += 1
+                elapsed = time.monotonic() - started
+                previous = self.stream_stats["mean_first_item_seconds"] or 0.0
+                self.stream_stats["mean_first_item_seconds"] = round(previous + (elapsed - previous) / self._first_items, 3)
+        # 带编号的条目 (PARTIAL_SALVAGE) 完成即交付；纯字符串数组在条数确认前可能错位，
+        # 数组闭合且条数一致时一次交付之前完成的全部条目 (已交付的位置由 publish_early_results 跳过)
+        if parser.positions_final:
+            publish_early_results(task, items if parser.identified_items else dict(parser.completed))
+
+    def _finish_stream(self, task: BatchTask, parser: IncrementalResponseParser, started: float) -> str:
+        first = not parser.completed
+        self._hand_off(task, parser, parser.finish(), started, first)
+        if parser.abort_reason:
+            with self._stream_lock:
+                self.stream_stats["aborted"] += 1
+                reasons = self.stream_stats["abort_reasons"]
+                reasons[parser.abort_reason] = reasons.get(parser.abort_reason, 0) + 1
+            self.logger.warning(
+                f"Aborted streamed response for batch {task.batch_index + 1} ({parser.abort_reason}) "
+                f"after {len(parser.buffer)} chars, keeping {len(parser.completed)}/{len(task.texts)} items."
             )
+        return parser.result_text()
 
-        prompt = base_prompt + context_prompt_part + glossary_prompt_part + format_prompt_part + punctuation_prompt_part + final_warning
-        return prompt
+    def _call_streaming(self, target: "BaseApiHandler", task: BatchTask, prompt: str) -> str:
+        """
+        流式调用：边接收边校验，条目完成即交给下游，输出无法挽救时立即关闭流。
+        返回交给常规解析的响应文本 (中断时只包含中断前完成的条目)。
+        """
+        parser = self._stream_parser(task)
+        with self._stream_lock:
+            self.stream_stats["streams"] += 1
+        started = time.monotonic()
+        stream = target._stream_api(target.client, prompt)
+        try:
+            for chunk in stream:
+                first = not parser.completed
+                self._hand_off(task, parser, parser.feed(chunk), started, first)
+                if parser.abort_reason:
+                    break
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return self._finish_stream(task, parser, started)
+
+    async def _call_streaming_async(self, target: "BaseApiHandler", task: BatchTask, prompt: str) -> str:
+        parser = self._stream_parser(task)
+        with self._stream_lock:
+            self.stream_stats["streams"] += 1
+        started = time.monotonic()
+        stream = target._stream_api_async(target.client, prompt)
+        try:
+            async for chunk in stream:
+                first = not parser.completed
+                self._hand_off(task, parser, parser.feed(chunk), started, first)
+                if parser.abort_reason:
+                    break
+        finally:
+            await stream.aclose()
+        return self._finish_stream(task, parser, started)
+
+    def load_bulk_responses(self, responses: dict[str, list[str]]):
+        """加载批处理作业的结果 (见 scripts/core/bulk_jobs.py)；之后的请求先按提示词摘要回放，没有结果时才实时发送。"""
+        with self._bulk_lock:
+            if self.bulk_responses is None:
+                self.bulk_responses = {}
+            for key, texts in responses.items():
+                self.bulk_responses.setdefault(key, []).extend(texts)
+
+    def _take_bulk_response(self, prompt: str) -> str | None:
+        """取出 (并移除) 提示词对应的一个作业结果；重试时结果已被取走，改为实时请求。"""
+        if self.bulk_responses is None:
+            return None
+        key = bulk_request_key(prompt)
+        with self._bulk_lock:
+            texts = self.bulk_responses.get(key)
+            if not texts:
+                self.bulk_stats["realtime"] += 1
+                return None
+            self.bulk_stats["replayed"] += 1
+            response = texts.pop(0)
+            if not texts:
+                del self.bulk_responses[key]
+            return response
+
+    def _request(self, target: "BaseApiHandler", task: BatchTask, prompt: str) -> str:
+        """
+        执行一次批次请求，返回原始响应文本；启用流式响应时边接收边校验。离线批量模式下先回放作业结果。
+        多目标语言请求不走流式：增量解析器只校验单个条目数组，按语言分组的响应要完整返回后再解析。
+        """
+        if target is self and (response := self._take_bulk_response(prompt)) is not None:
+            return response
+        if target._streaming_enabled() and not task.file_task.companion_langs:
+            return self._call_streaming(target, task, prompt)
+        return target._call_api(target.client, prompt)
+
+    async def _request_async(self, target: "BaseApiHandler", task: BatchTask, prompt: str) -> str:
+        if target is self and (response := self._take_bulk_response(prompt)) is not None:
+            return response
+        if target._streaming_enabled() and not task.file_task.companion_langs:
+            return await self._call_streaming_async(target, task, prompt)
+        return await target._call_api_async(target.client, prompt)
+
+    # ───────────── 对冲请求 (Hedged Requests) ─────────────
+    def _hedge_delay(self) -> float | None:
+        """近期成功请求耗时的 HEDGE_LATENCY_PERCENTILE 分位 (秒)；样本不足时返回 None (不对冲)。"""
+        with self._hedge_lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return percentile(sorted(self._latencies), HEDGE_LATENCY_PERCENTILE)
+
+    def _observe_latency(self, seconds: float):
+        with self._hedge_lock:
+            self._latencies.append(seconds)
+
+    def _hedge_target(self) -> "BaseApiHandler":
+        """对冲请求的目标：配置了 hedge_model 时使用该模型的 Handler，否则与主请求相同。"""
+        hedge_model = self.get_provider_config().get("hedge_model")
+        if not hedge_model:
+            return self
+        with self._hedge_lock:
+            if self._hedge_handler is None:
+                from scripts.core import api_handler
+                self._hedge_handler = api_handler.get_handler(self.provider_name, model_name=hedge_model) or self
+            return self._hedge_handler
+
+    def _take_hedge_budget(self, target: "BaseApiHandler") -> bool:
+        """在预算 (HEDGE_BUDGET_PERCENT) 与目标限流器都允许时占用一次对冲；对冲从不排队等待名额。"""
+        with self._hedge_lock:
+            if (self.hedge_stats["hedged"] + 1) * 100 > self.hedge_stats["requests"] * HEDGE_BUDGET_PERCENT:
+                self.hedge_stats["budget_exhausted"] += 1
+                return False
+            self.hedge_stats["hedged"] += 1
+        if target.rate_limiter.try_acquire():
+            return True
+        with self._hedge_lock:
+            self.hedge_stats["hedged"] -= 1
+        return False
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        # Thread mode can't interrupt a request, so a slow primary keeps its thread until it returns.
+        with self._hedge_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=RECOMMENDED_MAX_WORKERS * 4, thread_name_prefix="hedge")
+            return self._hedge_pool
+
+    def _timed_call(self, target: "BaseApiHandler", task: BatchTask, prompt: str) -> tuple:
+        """执行一次调用，返回 (raw_response, usage, error)；成功的耗时计入延迟窗口。"""
+        usage = {}
+        _call_usage.set(usage)
+        started = time.monotonic()
+        try:
+            raw_response = self._request(target, task, prompt)
+        except Exception as e:
+            return None, usage, e
+        self._observe_latency(time.monotonic() - started)
+        return raw_response, usage, None
+
+    async def _timed_call_async(self, target: "BaseApiHandler", task: BatchTask, prompt: str) -> tuple:
+        usage = {}
+        _call_usage.set(usage)
+        started = time.monotonic()
+        try:
+            raw_response = await self._request_async(target, task, prompt)
+        except Exception as e:
+            return None, usage, e
+        self._observe_latency(time.monotonic() - started)
+        return raw_response, usage, None
+
+    @staticmethod
+    def _finish_hedge(target: "BaseApiHandler", future):
+        """对冲请求结束 (包括被取消) 时归还目标限流器的名额。"""
+        error = None if future.cancelled() else future.result()[2]
+        if error is not None:
+            target._note_rate_limit(error)
+        target.rate_limiter.release(success=not future.cancelled() and error is None)
+
+    def _consider_response(self, task: BatchTask, result: tuple, attempt: int, start_time: float) -> tuple:
+        """
+        Validates one finished call. Returns (raw_response, translated, error, usage).
+        For a multi-target batch `translated` holds the languages returned in full; the task is left untouched.
+        """
+        raw_response, usage, error = result
+        if error is not None:
+            return None, None, error, usage
+        if task.file_task.companion_langs:
+            parsed_model = parse_response(raw_response, MultiTargetTranslationResponse) if raw_response else None
+            return raw_response, parsed_model.complete_languages(len(task.texts)) if parsed_model else {}, None, usage
+        try:
+            return raw_response, self._apply_response(task, raw_response, attempt, start_time), None, usage
+        except ValueError as e:
+            return raw_response, None, e, usage
+
+    @staticmethod
+    def _response_rank(candidate: tuple) -> int:
+        raw_response, translated = candidate[0], candidate[1]
+        if translated:
+            return len(translated)
+        return -1 if raw_response is not None else -2
+
+    def _pick_hedged(self, task: BatchTask, candidate: tuple, best: tuple | None, is_hedge: bool) -> tuple[tuple, bool]:
+        """Keeps the more useful of two responses; returns (best, complete)."""
+        expected = 1 + len(task.file_task.companion_langs) if task.file_task.companion_langs else len(task.texts)
+        complete = candidate[1] is not None and len(candidate[1]) == expected
+        if complete and is_hedge:
+            with self._hedge_lock:
+                self.hedge_stats["hedge_wins"] += 1
+        if best is None or self._response_rank(candidate) > self._response_rank(best):
+            best = candidate
+        return best, complete
+
+    def _call_hedged(self, task: BatchTask, prompt: str, attempt: int, start_time: float, usage: dict) -> tuple:
+        """
+        发送主请求；超过近期延迟分位仍未返回时再发送一个对冲请求。
+        返回第一个完整通过校验的响应 (raw_response, translated, error)，否则返回两者中更有用的一个。
+        """
+        with self._hedge_lock:
+            self.hedge_stats["requests"] += 1
+        delay = self._hedge_delay()
+        pool = self._get_hedge_pool()
+        # 每个请求在当前上下文的副本中运行，批次的提前交付通道 (publish_early_results) 在对冲线程中同样可见
+        primary = pool.submit(contextvars.copy_context().run, self._timed_call, self, task, prompt)
+        pending = {primary}
+        if delay is not None and not wait(pending, timeout=delay).done:
+            target = self._hedge_target()
+            if self._take_hedge_budget(target):
+                self.logger.info(f"Batch {task.batch_index + 1} exceeded p{HEDGE_LATENCY_PERCENTILE} latency ({delay:.1f}s), sending a hedged request.")
+                hedge = pool.submit(contextvars.copy_context().run, self._timed_call, target, task, prompt)
+                hedge.add_done_callback(lambda future: self._finish_hedge(target, future))
+                pending.add(hedge)
+
+        best, complete = None, False
+        while pending and not complete:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate = self._consider_response(task, future.result(), attempt, start_time)
+                best, complete = self._pick_hedged(task, candidate, best, future is not primary)
+                if complete:
+                    break
+        # A slower request still in flight is ignored
+        usage.update(best[3])
+        return best[:3]
+
+    async def _call_hedged_async(self, task: BatchTask, prompt: str, attempt: int, start_time: float, usage: dict) -> tuple:
+        """_call_hedged 的协程版本；较慢的请求会被取消。"""
+        with self._hedge_lock:
+            self.hedge_stats["requests"] += 1
+        delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self._timed_call_async(self, task, prompt))
+        pending = {primary}
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            target = self._hedge_target()
+            if not done and self._take_hedge_budget(target):
+                self.logger.info(f"Batch {task.batch_index + 1} exceeded p{HEDGE_LATENCY_PERCENTILE} latency ({delay:.1f}s), sending a hedged request.")
+                hedge = asyncio.ensure_future(self._timed_call_async(target, task, prompt))
+                hedge.add_done_callback(lambda future: self._finish_hedge(target, future))
+                pending.add(hedge)
+
+        best, complete = None, False
+        try:
+            while pending and not complete:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    candidate = self._consider_response(task, future.result(), attempt, start_time)
+                    best, complete = self._pick_hedged(task, candidate, best, future is not primary)
+                    if complete:
+                        break
+        finally:
+            for future in pending:
+                future.cancel()
+        usage.update(best[3])
+        return best[:3]
+
+    def initialize_async_client(self):
+        """
+        【可由子类实现】返回基于 SDK 异步客户端的实例。
+        返回 None 表示该 Provider 没有原生异步实现，_call_api_async 将在线程中运行 _call_api。
+        """
+        return None
+
+    def _get_async_client(self):
+        """Returns the native async client for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = self.initialize_async_client()
+            self._async_client_loop = loop
+        return self._async_client
+
+    async def _call_api_async(self, client: any, prompt: str) -> str:
+        """
+        【可由子类覆盖】异步执行 API 调用并返回原始文本响应。
+        默认实现把同步的 _call_api 放进线程池执行。
+        """
+        return await asyncio.to_thread(self._call_api, client, prompt)
+
+    def _build_prompt(self, task: BatchTask) -> str:
+        """【通用逻辑】根据任务构建完整的翻译提示 (见 build_batch_prompt)。"""
+        return build_batch_prompt(task, self.logger)
 
     def _parse_response(self, response: str, original_texts: list[str], target_lang_code: str) -> list[str] | None:
         """
@@ -158,46 +837,398 @@ class BaseApiHandler(ABC):
             return parsed_model.translations
         return None
 
+    def _apply_response(self, task: BatchTask, raw_response: str, attempt: int, start_time: float) -> dict[int, str]:
+        """
+        【通用逻辑】解析一次响应并写回任务。
+        返回已取得译文的位置 {position: text}：整批成功时覆盖全部条目；
+        抢救模式下可能只包含部分条目。没有任何可用条目时抛出 ValueError 以触发重试。
+        """
+        batch_num = task.batch_index + 1
+        target_code = task.file_task.target_lang["code"]
+        if PARTIAL_SALVAGE:
+            translated = parse_identified_response(raw_response, len(task.texts), target_code)
+        else:
+            translated_texts = self._parse_response(raw_response, task.texts, target_code)
+            # Check for success: must not be None, must not be the original list, and length must match.
+            usable = translated_texts is not None and translated_texts is not task.texts and len(translated_texts) == len(task.texts)
+            translated = dict(enumerate(translated_texts)) if usable else {}
+
+        if len(translated) == len(task.texts):
+            task.translated_texts = [translated[i] for i in range(len(task.texts))]
+            elapsed_time = time.time() - start_time # <--- 计算耗时
+            self.logger.info(i18n.t("batch_success", batch_num=batch_num, attempt=attempt + 1, elapsed_time=elapsed_time)) # <--- 传递参数
+            return translated
+
+        if translated:
+            self.logger.warning(
+                f"Partial response for batch {batch_num} on attempt {attempt + 1}: "
+                f"salvaged {len(translated)}/{len(task.texts)} items, re-requesting the rest."
+            )
+            return translated
+
+        self.logger.warning(
+            f"Response parsing failed for batch {batch_num} on attempt {attempt + 1}. "
+            f"Expected {len(task.texts)} items, got none usable."
+        )
+        raise ValueError("Response parsing failed, triggering retry.")
+
+    def _salvage_follow_up(self, task: BatchTask, salvaged: dict[int, str]) -> BatchTask:
+        """为抢救后缺失或无效的条目构建补充请求，并记录相对整批重试节省的 token。"""
+        missing = [i for i in range(len(task.texts)) if i not in salvaged]
+        planner = BatchPlanner.for_provider(self.provider_name)
+        saved_tokens = sum(sum(planner.entry_cost(text)) for i, text in enumerate(task.texts) if i in salvaged)
+        with self._salvage_lock:
+            self.salvage_stats["salvaged_items"] += len(salvaged)
+            self.salvage_stats["rerequested_items"] += len(missing)
+            self.salvage_stats["saved_tokens"] += saved_tokens
+        return BatchTask(
+            file_task=task.file_task,
+            batch_index=task.batch_index,
+            start_index=task.start_index,
+            end_index=task.end_index,
+            texts=[task.texts[i] for i in missing],
+            origins=[task.origins[i] for i in missing] if task.origins else []
+        )
+
+    @staticmethod
+    def _merge_salvaged(task: BatchTask, salvaged: dict[int, str], follow_up: BatchTask) -> BatchTask:
+        """把抢救的条目与补充请求的结果按原位置合并。"""
+        missing = [i for i in range(len(task.texts)) if i not in salvaged]
+        merged = dict(salvaged)
+        merged.update(zip(missing, follow_up.translated_texts or follow_up.texts))
+        task.translated_texts = [merged.get(i, task.texts[i]) for i in range(len(task.texts))]
+        task.failed_positions = [missing[j] for j in follow_up.failed_positions]
+        task.failed = False
+        return task
+
+    def _mark_batch_failed(self, task: BatchTask) -> BatchTask:
+        self.logger.error(f"Batch {task.batch_index + 1} failed after {MAX_RETRIES} attempts. Falling back to original texts.")
+        task.failed = True
+        task.translated_texts = task.texts
+        task.failed_positions = list(range(len(task.texts)))
+        # We still return the task object so the aggregator can see it failed but has text
+        return task
+
+    @staticmethod
+    def _attempts_before_split(task: BatchTask) -> int:
+        """整批尝试次数：可拆分的批次在 BATCH_BISECT_AFTER_ATTEMPTS 次失败后对半拆分，单条目用满 MAX_RETRIES。"""
+        if BATCH_BISECT_AFTER_ATTEMPTS and len(task.texts) > 1:
+            return min(BATCH_BISECT_AFTER_ATTEMPTS, MAX_RETRIES)
+        return MAX_RETRIES
+
+    @staticmethod
+    def _split_task(task: BatchTask) -> tuple[BatchTask, BatchTask]:
+        """把批次对半拆成两个子批次 (共享 file_task 与 batch_index)。"""
+        middle = len(task.texts) // 2
+
+        def half(start: int, end: int) -> BatchTask:
+            return BatchTask(
+                file_task=task.file_task,
+                batch_index=task.batch_index,
+                start_index=task.start_index + start,
+                end_index=task.start_index + end,
+                texts=task.texts[start:end],
+                origins=task.origins[start:end]
+            )
+        return half(0, middle), half(middle, len(task.texts))
+
+    def _merge_halves(self, task: BatchTask, left: BatchTask, right: BatchTask) -> BatchTask:
+        """合并两个子批次的结果；只有最终失败的条目记入 failed_positions。"""
+        task.translated_texts = left.translated_texts + right.translated_texts
+        task.failed_positions = left.failed_positions + [len(left.texts) + p for p in right.failed_positions]
+        task.failed = len(task.failed_positions) == len(task.texts)
+        if task.failed_positions and not task.failed:
+            self.logger.warning(
+                f"Batch {task.batch_index + 1}: isolated {len(task.failed_positions)}/{len(task.texts)} failing entries, "
+                f"the rest of the batch was translated."
+            )
+        return task
+
+    def _log_split(self, task: BatchTask, left: BatchTask, right: BatchTask):
+        self.logger.warning(
+            f"Batch {task.batch_index + 1} failed, bisecting {len(task.texts)} entries "
+            f"into {len(left.texts)} + {len(right.texts)} to isolate the failing entries."
+        )
+
+    def _apply_multi_target_response(self, task: BatchTask, raw_response: str | None) -> list[dict]:
+        """
+        【通用逻辑】解析多目标语言响应并写回任务。
+        返回缺失或条数不符、需要回退到单语言请求的目标语言。
+        """
+        target_langs = [task.file_task.target_lang] + list(task.file_task.companion_langs)
+        parsed_model = parse_response(raw_response, MultiTargetTranslationResponse) if raw_response else None
+        complete = parsed_model.complete_languages(len(task.texts)) if parsed_model else {}
+
+        missing = []
+        for lang in target_langs:
+            texts = complete.get(lang["code"])
+            if texts is None:
+                missing.append(lang)
+            elif lang is task.file_task.target_lang:
+                task.translated_texts = texts
+            else:
+                task.companion_results[lang["code"]] = texts
+
+        self.logger.info(
+            f"Multi-target batch {task.batch_index + 1}: {len(target_langs) - len(missing)}/{len(target_langs)} languages returned"
+            + (f", falling back for {[lang['code'] for lang in missing]}" if missing else "")
+        )
+        return missing
+
+    @staticmethod
+    def _single_language_task(task: BatchTask, lang: dict) -> BatchTask:
+        """为回退路径构建只含一个目标语言的批次副本。"""
+        return BatchTask(
+            file_task=replace(task.file_task, target_lang=lang, companion_langs=[]),
+            batch_index=task.batch_index,
+            start_index=task.start_index,
+            end_index=task.end_index,
+            texts=task.texts,
+            origins=task.origins
+        )
+
+    @staticmethod
+    def _merge_language_result(task: BatchTask, lang: dict, single_task: BatchTask):
+        if lang is task.file_task.target_lang:
+            task.translated_texts = single_task.translated_texts
+            task.failed = single_task.failed
+            task.failed_positions = single_task.failed_positions
+        else:
+            task.companion_results[lang["code"]] = single_task.translated_texts
+            if single_task.failed:
+                task.companion_failed.append(lang["code"])
+            elif single_task.failed_positions:
+                task.companion_failed_positions[lang["code"]] = single_task.failed_positions
+
+    def _record_multi_target_attempt(self, task: BatchTask, attempt: int, started: float, usage: dict,
+                                     raw_response: str | None, missing: list[dict], error: Exception | None):
+        """Languages missing from the response count as a partial outcome; none returned as a parse error."""
+        if raw_response is None:
+            outcome = OUTCOME_ERROR
+        elif len(missing) == 1 + len(task.file_task.companion_langs):
+            outcome = OUTCOME_PARSE_ERROR
+        else:
+            outcome = OUTCOME_PARTIAL if missing else OUTCOME_OK
+        self._record_attempt(task, attempt, started, usage, raw_response, outcome, error)
+
+    def _multi_target_attempt_done(self, task: BatchTask, attempt: int, started: float, usage: dict,
+                                   raw_response: str | None, error: Exception | None) -> tuple[list[dict], bool]:
+        """Applies one combined attempt. Returns (missing languages, whether to stop retrying)."""
+        missing = self._apply_multi_target_response(task, raw_response)
+        self._record_multi_target_attempt(task, attempt, started, usage, raw_response, missing, error)
+        return missing, len(missing) < 1 + len(task.file_task.companion_langs)
+
+    def _translate_multi_target(self, task: BatchTask) -> BatchTask:
+        """
+        【核心工作流】一次请求翻译所有目标语言。合并请求与普通批次一样重试 (限流错误遵守 Retry-After)，
+        同样经过 _request 发送 (离线批量回放) 并支持对冲请求；仍然缺失的语言再逐个走普通路径，每个单语言请求各自占用限流名额。
+        """
+        prompt = self._build_prompt(task)
+        batch_num = task.batch_index + 1
+        for attempt in range(MAX_RETRIES):
+            raw_response, error, rate_limited = None, None, False
+            usage = {}
+            _call_usage.set(usage)
+            started = time.monotonic()
+            try:
+                if HEDGED_REQUESTS:
+                    raw_response, _, error = self._call_hedged(task, prompt, attempt, started, usage)
+                    if error is not None:
+                        raise error
+                else:
+                    raw_response = self._request(self, task, prompt)
+            except Exception as e:
+                error = e
+                self.logger.exception(f"Multi-target API call failed for batch {batch_num} on attempt {attempt + 1}: {e}")
+                rate_limited = self._note_rate_limit(e)
+            missing, done = self._multi_target_attempt_done(task, attempt, started, usage, raw_response, error)
+            if done:
+                break
+            if attempt < MAX_RETRIES - 1:
+                delay = self._retry_delay(attempt, rate_limited)
+                self.logger.warning(i18n.t("retrying_batch", batch_num=batch_num, attempt=attempt + 1, max_retries=MAX_RETRIES, delay=delay))
+                time.sleep(delay)
+
+        for lang in missing:
+            single_task = self._single_language_task(task, lang)
+            self._merge_language_result(task, lang, self._translate_bisecting(single_task, own_slot=True))
+        return task
+
+    async def _translate_multi_target_async(self, task: BatchTask) -> BatchTask:
+        prompt = await asyncio.to_thread(self._build_prompt, task)
+        batch_num = task.batch_index + 1
+        for attempt in range(MAX_RETRIES):
+            raw_response, error, rate_limited = None, None, False
+            usage = {}
+            _call_usage.set(usage)
+            started = time.monotonic()
+            try:
+                if HEDGED_REQUESTS:
+                    raw_response, _, error = await self._call_hedged_async(task, prompt, attempt, started, usage)
+                    if error is not None:
+                        raise error
+                else:
+                    raw_response = await self._request_async(self, task, prompt)
+            except Exception as e:
+                error = e
+                self.logger.exception(f"Multi-target API call failed for batch {batch_num} on attempt {attempt + 1}: {e}")
+                rate_limited = self._note_rate_limit(e)
+            missing, done = self._multi_target_attempt_done(task, attempt, started, usage, raw_response, error)
+            if done:
+                break
+            if attempt < MAX_RETRIES - 1:
+                delay = self._retry_delay(attempt, rate_limited)
+                self.logger.warning(i18n.t("retrying_batch", batch_num=batch_num, attempt=attempt + 1, max_retries=MAX_RETRIES, delay=delay))
+                await asyncio.sleep(delay)
+
+        for lang in missing:
+            single_task = self._single_language_task(task, lang)
+            self._merge_language_result(task, lang, await self._translate_bisecting_async(single_task, own_slot=True))
+        return task
+
     def translate_batch(self, task: BatchTask) -> BatchTask:
         """
         【核心工作流】处理单个批次的翻译任务，包含重试逻辑。
         """
+        if task.file_task.companion_langs:
+            return self._translate_multi_target(task)
+        return self._translate_bisecting(task)
+
+    def _translate_bisecting(self, task: BatchTask, own_slot: bool = False) -> BatchTask:
+        """
+        整批重试失败后对半拆分递归翻译，健康的一半照常提交；部分响应只补请求缺失条目。
+        own_slot=True 表示这是批次内的额外请求，需要自己占用限流名额 (见 _own_slot)。
+        """
+        if own_slot:
+            with self._own_slot(task, batch_success=False) as slot:
+                translated = self._attempt_batch(task, self._attempts_before_split(task))
+                slot["success"] = len(translated) == len(task.texts)
+        else:
+            translated = self._attempt_batch(task, self._attempts_before_split(task))
+        if len(translated) == len(task.texts):
+            if own_slot:
+                # 拆分出的健康部分立即交给下游，不等其他部分的递归结束
+                publish_early_results(task, translated)
+            return task
+        if translated:
+            # 补充请求是新的请求，同样占用自己的限流名额
+            follow_up = self._translate_bisecting(self._salvage_follow_up(task, translated), own_slot=True)
+            return self._merge_salvaged(task, translated, follow_up)
+        if len(task.texts) <= 1 or not BATCH_BISECT_AFTER_ATTEMPTS:
+            return self._mark_batch_failed(task)
+
+        left, right = self._split_task(task)
+        self._log_split(task, left, right)
+        # 每一半都是新的请求，各自占用限流名额
+        return self._merge_halves(task, self._translate_bisecting(left, own_slot=True), self._translate_bisecting(right, own_slot=True))
+
+    def _attempt_batch(self, task: BatchTask, max_attempts: int) -> dict[int, str]:
+        """
+        整批请求最多 max_attempts 次；限流错误不计入拆分判断，会用满 MAX_RETRIES。
+        返回已取得译文的位置 (全部、部分或空)。
+        """
         prompt = self._build_prompt(task)
         batch_num = task.batch_index + 1
         start_time = time.time() # <--- 添加时间记录
 
         for attempt in range(MAX_RETRIES):
+            rate_limited = False
+            raw_response = None
+            usage = {}
+            _call_usage.set(usage)
+            started = time.monotonic()
             try:
+                if HEDGED_REQUESTS:
+                    raw_response, translated, error = self._call_hedged(task, prompt, attempt, start_time, usage)
+                    if error is not None:
+                        raise error
+                else:
+                    raw_response = self._request(self, task, prompt)
+                    translated = self._apply_response(task, raw_response, attempt, start_time)
+                self._record_attempt(task, attempt, started, usage, raw_response, self._attempt_outcome(task, raw_response, translated))
+                return translated
+            except Exception as e:
+                self._record_attempt(task, attempt, started, usage, raw_response, self._attempt_outcome(task, raw_response, None), e)
+                self.logger.exception(f"API call failed for batch {batch_num} on attempt {attempt + 1}: {e}")
+                rate_limited = self._note_rate_limit(e)
 
-                raw_response = self._call_api(self.client, prompt)
-                translated_texts = self._parse_response(raw_response, task.texts, task.file_task.target_lang["code"])
+            if attempt + 1 >= max_attempts and not rate_limited:
+                return {}
+            if attempt < MAX_RETRIES - 1:
+                delay = self._retry_delay(attempt, rate_limited)
+                self.logger.warning(i18n.t("retrying_batch", batch_num=batch_num, attempt=attempt + 1, max_retries=MAX_RETRIES, delay=delay))
+                time.sleep(delay)
 
-                # Check for success: must not be None, must not be the original list, and length must match.
-                if translated_texts is not None and translated_texts is not task.texts and len(translated_texts) == len(task.texts):
-                    task.translated_texts = translated_texts
-                    elapsed_time = time.time() - start_time # <--- 计算耗时
-                    self.logger.info(i18n.t("batch_success", batch_num=batch_num, attempt=attempt + 1, elapsed_time=elapsed_time)) # <--- 传递参数
-                    return task
-                else:
-                    self.logger.warning(
-                        f"Response parsing failed for batch {batch_num} on attempt {attempt + 1}. "
-                        f"Expected {len(task.texts)} items, got {len(translated_texts) if translated_texts else 0}."
-                    )
-                    raise ValueError("Response parsing failed, triggering retry.")
+        return {}
+
+    async def translate_batch_async(self, task: BatchTask) -> BatchTask:
+        """
+        【核心工作流 - 异步版】与 translate_batch 相同的重试逻辑，但 API 调用与退避都不占用线程。
+        重写了 translate_batch 的子类（如 Gemini CLI）会在线程中运行其同步实现。
+        """
+        if type(self).translate_batch is not BaseApiHandler.translate_batch:
+            return await asyncio.to_thread(self.translate_batch, task)
+        if task.file_task.companion_langs:
+            return await self._translate_multi_target_async(task)
+        return await self._translate_bisecting_async(task)
+
+    async def _translate_bisecting_async(self, task: BatchTask, own_slot: bool = False) -> BatchTask:
+        if own_slot:
+            async with self._own_slot_async(task, batch_success=False) as slot:
+                translated = await self._attempt_batch_async(task, self._attempts_before_split(task))
+                slot["success"] = len(translated) == len(task.texts)
+        else:
+            translated = await self._attempt_batch_async(task, self._attempts_before_split(task))
+        if len(translated) == len(task.texts):
+            if own_slot:
+                publish_early_results(task, translated)
+            return task
+        if translated:
+            follow_up = await self._translate_bisecting_async(self._salvage_follow_up(task, translated), own_slot=True)
+            return self._merge_salvaged(task, translated, follow_up)
+        if len(task.texts) <= 1 or not BATCH_BISECT_AFTER_ATTEMPTS:
+            return self._mark_batch_failed(task)
+
+        left, right = self._split_task(task)
+        self._log_split(task, left, right)
+        left, right = await asyncio.gather(self._translate_bisecting_async(left, own_slot=True),
+                                           self._translate_bisecting_async(right, own_slot=True))
+        return self._merge_halves(task, left, right)
 
+    async def _attempt_batch_async(self, task: BatchTask, max_attempts: int) -> dict[int, str]:
+        prompt = await asyncio.to_thread(self._build_prompt, task)
+        batch_num = task.batch_index + 1
+        start_time = time.time()
+
+        for attempt in range(MAX_RETRIES):
+            rate_limited = False
+            raw_response = None
+            usage = {}
+            _call_usage.set(usage)
+            started = time.monotonic()
+            try:
+                if HEDGED_REQUESTS:
+                    raw_response, translated, error = await self._call_hedged_async(task, prompt, attempt, start_time, usage)
+                    if error is not None:
+                        raise error
+                else:
+                    raw_response = await self._request_async(self, task, prompt)
+                    translated = self._apply_response(task, raw_response, attempt, start_time)
+                self._record_attempt(task, attempt, started, usage, raw_response, self._attempt_outcome(task, raw_response, translated))
+                return translated
             except Exception as e:
+                self._record_attempt(task, attempt, started, usage, raw_response, self._attempt_outcome(task, raw_response, None), e)
                 self.logger.exception(f"API call failed for batch {batch_num} on attempt {attempt + 1}: {e}")
+                rate_limited = self._note_rate_limit(e)
 
+            if attempt + 1 >= max_attempts and not rate_limited:
+                return {}
             if attempt < MAX_RETRIES - 1:
-                delay = (attempt + 1) * 2
+                delay = self._retry_delay(attempt, rate_limited)
                 self.logger.warning(i18n.t("retrying_batch", batch_num=batch_num, attempt=attempt + 1, max_retries=MAX_RETRIES, delay=delay))
-                time.sleep(delay)
+                await asyncio.sleep(delay)
 
-        self.logger.error(f"Batch {batch_num} failed after {MAX_RETRIES} attempts. Falling back to original texts.")
-        task.failed = True
-        task.translated_texts = task.texts
-        # We still return the task object so the aggregator can see it failed but has text
-        return task
+        return {}
 
     def _build_single_text_prompt(self, text: str, task_description: str, mod_name: str, source_lang: dict, target_lang: dict, mod_context: str, game_profile: dict) -> str:
         """【通用逻辑】为单条文本构建专用的翻译提示。"""
@@ -0,0 +1,146 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+
+class BatchJournal:
+    """
+    Append-only journal of completed batch results, used to resume a file
+    mid-way instead of retranslating it from the start.
+
+    Every record covers the entries of one file and one target language that
+    came back in the same batch:
+        {"file": ..., "lang": ..., "batch": ..., "idx": [...], "hash": ..., "texts": [...]}
+    `hash` is computed over the source texts at `idx`, so results are only replayed
+    while the source slice is unchanged. A {"done": file, "lang": ...} tombstone
+    drops a file's records once its output has been written and checkpointed.
+
+    Each append is flushed and fsynced under a lock, so records written by
+    parallel workers are never interleaved; a torn last line after a crash is skipped.
+    """
+
+    JOURNAL_FILENAME = ".remis_batch_journal.jsonl"
+
+    def __init__(self, output_dir: str, journal_filename: str = JOURNAL_FILENAME):
+        self.output_dir = output_dir
+        self.journal_path = os.path.join(output_dir, journal_filename)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # (filename, lang_code) -> records still live
+        self._records: Dict[Tuple[str, str], List[dict]] = {}
+        self._load()
+
+    @staticmethod
+    def source_hash(texts: List[str]) -> str:
+        return hashlib.sha256("\x1f".join(texts).encode("utf-8")).hexdigest()
+
+    def _load(self):
+        """Loads live records and rewrites the journal without discarded files."""
+        if not os.path.exists(self.journal_path):
+            return
+        skipped = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        skipped += 1
+                        continue
+                    if "done" in record:
+                        self._records.pop((record["done"], record["lang"]), None)
+                    else:
+                        self._records.setdefault((record["file"], record["lang"]), []).append(record)
+        except Exception as e:
+            self.logger.warning(f"Failed to load batch journal: {e}. Starting fresh.")
+            self._records = {}
+            return
+
+        entries = sum(len(r["idx"]) for records in self._records.values() for r in records)
+        self.logger.info(f"Loaded batch journal: {entries} translated entries in {len(self._records)} unfinished files"
+                         + (f" ({skipped} torn lines skipped)" if skipped else ""))
+        self._rewrite()
+
+    def _rewrite(self):
+        """Compacts the journal down to its live records."""
+        if not self._records:
+            self._remove_file()
+            return
+        tmp_path = self.journal_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for records in self._records.values():
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+        except Exception as e:
+            self.logger.error(f"Failed to compact batch journal: {e}")
+
+    def _append(self, record: dict):
+        # Caller holds self._lock
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            self.logger.error(f"Failed to append to batch journal: {e}")
+
+    def _remove_file(self):
+        if os.path.exists(self.journal_path):
+            try:
+                os.remove(self.journal_path)
+            except Exception as e:
+                self.logger.warning(f"Failed to remove batch journal: {e}")
+
+    def record(self, filename: str, lang_code: str, batch_index: int, indices: List[int], sources: List[str], texts: List[str]):
+        """Appends the translated `texts` of a file's entries at `indices`."""
+        if not indices:
+            return
+        record = {
+            "file": filename,
+            "lang": lang_code,
+            "batch": batch_index,
+            "idx": list(indices),
+            "hash": self.source_hash(sources),
+            "texts": list(texts),
+        }
+        with self._lock:
+            self._records.setdefault((filename, lang_code), []).append(record)
+            self._append(record)
+
+    def replay(self, filename: str, lang_code: str, source_texts: List[str]) -> Dict[int, str]:
+        """Returns {entry_index: translation} for journaled entries whose source is unchanged."""
+        with self._lock:
+            records = list(self._records.get((filename, lang_code), []))
+        results: Dict[int, str] = {}
+        for record in records:
+            indices = record["idx"]
+            if any(i >= len(source_texts) for i in indices):
+                continue
+            if record["hash"] != self.source_hash([source_texts[i] for i in indices]):
+                continue
+            results.update(zip(indices, record["texts"]))
+        return results
+
+    def discard(self, filename: str, lang_code: str):
+        """Drops a finished file's records; the journal is removed once nothing is left in it."""
+        with self._lock:
+            if self._records.pop((filename, lang_code), None) is None:
+                return
+            if self._records:
+                self._append({"done": filename, "lang": lang_code})
+            else:
+                self._remove_file()
+
+    def clear(self):
+        """Deletes the journal upon successful completion."""
+        with self._lock:
+            self._records = {}
+            self._remove_file()
@@ -0,0 +1,221 @@
+# scripts/core/batch_planner.py
+"""
+批次规划器
+按照每个 Provider 的 token 预算（提示词 + 预期输出）切分待翻译文本，
+取代固定的 CHUNK_SIZE 切片：短文本可以装满一个大批次，长文本则拆成小批次。
+"""
+
+import re
+import math
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple, Dict, Any, Optional
+
+from scripts.app_settings import API_PROVIDERS, DEFAULT_BATCH_BUDGET, DEFAULT_LATENCY_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+def _is_wide_char(ch: str) -> bool:
+    """CJK / Kana / Hangul 字符在大多数分词器中约等于一个 token。"""
+    code = ord(ch)
+    return (
+        0x3040 <= code <= 0x30FF      # Hiragana / Katakana
+        or 0x3400 <= code <= 0x4DBF   # CJK Ext A
+        or 0x4E00 <= code <= 0x9FFF   # CJK Unified
+        or 0xAC00 <= code <= 0xD7AF   # Hangul
+        or 0xF900 <= code <= 0xFAFF   # CJK Compatibility
+        or 0xFF00 <= code <= 0xFFEF   # Fullwidth forms
+    )
+
+
+# Same ranges as _is_wide_char; counting with one regex scan keeps estimates cheap on huge mods.
+_WIDE_CHARS = re.compile("[\u3040-\u30FF\u3400-\u4DBF\u4E00-\u9FFF\uAC00-\uD7AF\uF900-\uFAFF\uFF00-\uFFEF]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap, tokenizer-free token estimate.
+    Latin-script text averages ~4 characters per token; CJK characters ~1 token each.
+    """
+    if not text:
+        return 0
+    if text.isascii():
+        return math.ceil(len(text) / 4)
+    wide = len(_WIDE_CHARS.findall(text))
+    narrow = len(text) - wide
+    return wide + math.ceil(narrow / 4)
+
+
+@dataclass
+class BatchBudget:
+    """单个 Provider 的批次预算"""
+    max_batch_tokens: int
+    max_output_tokens: int
+    max_batch_items: int
+    prompt_overhead_tokens: int
+    output_ratio: float
+    per_item_overhead_tokens: int
+
+    @classmethod
+    def for_provider(cls, provider_name: str, overrides: Optional[Dict[str, Any]] = None) -> "BatchBudget":
+        """Merges DEFAULT_BATCH_BUDGET with the provider's `batch_budget` block and optional overrides."""
+        merged = dict(DEFAULT_BATCH_BUDGET)
+        merged.update(API_PROVIDERS.get(provider_name, {}).get("batch_budget", {}))
+        if overrides:
+            merged.update(overrides)
+        return cls(
+            max_batch_tokens=int(merged["max_batch_tokens"]),
+            max_output_tokens=int(merged["max_output_tokens"]),
+            max_batch_items=int(merged["max_batch_items"]),
+            prompt_overhead_tokens=int(merged["prompt_overhead_tokens"]),
+            output_ratio=float(merged["output_ratio"]),
+            per_item_overhead_tokens=int(merged["per_item_overhead_tokens"]),
+        )
+
+
+@dataclass
+class LatencyModel:
+    """单个 Provider 的请求耗时模型"""
+    base_seconds: float
+    input_tokens_per_second: float
+    output_tokens_per_second: float
+
+    @classmethod
+    def for_provider(cls, provider_name: str) -> "LatencyModel":
+        """Merges DEFAULT_LATENCY_MODEL with the provider's `latency_model` block."""
+        merged = dict(DEFAULT_LATENCY_MODEL)
+        merged.update(API_PROVIDERS.get(provider_name, {}).get("latency_model", {}))
+        return cls(
+            base_seconds=float(merged["base_seconds"]),
+            input_tokens_per_second=float(merged["input_tokens_per_second"]),
+            output_tokens_per_second=float(merged["output_tokens_per_second"]),
+        )
+
+    def estimate_seconds(self, input_tokens: int, output_tokens: int) -> float:
+        return (
+            self.base_seconds
+            + input_tokens / self.input_tokens_per_second
+            + output_tokens / self.output_tokens_per_second
+        )
+
+
+class BatchPlanner:
+    """
+    Greedy token-budget batch planner.
+    Each batch is filled until adding the next entry would exceed the total
+    request budget (prompt overhead + input + expected output), the output
+    budget, or the item cap. An entry larger than the budget gets its own batch.
+    """
+
+    def __init__(self, budget: BatchBudget, latency: Optional[LatencyModel] = None):
+        self.budget = budget
+        self.latency = latency or LatencyModel.for_provider("")
+
+    @classmethod
+    def for_provider(cls, provider_name: str, overrides: Optional[Dict[str, Any]] = None) -> "BatchPlanner":
+        return cls(BatchBudget.for_provider(provider_name, overrides), LatencyModel.for_provider(provider_name))
+
+    def entry_cost(self, text: str) -> Tuple[int, int]:
+        """Returns (input_tokens, expected_output_tokens) for a single entry."""
+        tokens = estimate_tokens(text)
+        input_tokens = tokens + self.budget.per_item_overhead_tokens
+        output_tokens = math.ceil(tokens * self.budget.output_ratio) + self.budget.per_item_overhead_tokens
+        return input_tokens, output_tokens
+
+    def plan(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """Splits `texts` into contiguous (start, end) ranges that respect the budget."""
+        ranges: List[Tuple[int, int]] = []
+        if not texts:
+            return ranges
+
+        budget = self.budget
+        start = 0
+        batch_input = 0
+        batch_output = 0
+
+        for i, text in enumerate(texts):
+            input_tokens, output_tokens = self.entry_cost(text)
+            count = i - start
+            if count > 0:
+                total = budget.prompt_overhead_tokens + batch_input + input_tokens + batch_output + output_tokens
+                if (count >= budget.max_batch_items
+                        or total > budget.max_batch_tokens
+                        or batch_output + output_tokens > budget.max_output_tokens):
+                    ranges.append((start, i))
+                    start = i
+                    batch_input = 0
+                    batch_output = 0
+            batch_input += input_tokens
+            batch_output += output_tokens
+
+        ranges.append((start, len(texts)))
+        return ranges
+
+    def count_batches(self, texts: List[str]) -> int:
+        return len(self.plan(texts))
+
+    def count_batches_for_files(self, files_texts: List[List[str]], pack: bool = False, deduplicate: bool = False) -> int:
+        """Total batch count for several files, optionally packed across file boundaries."""
+        counter = BatchCounter(self, pack=pack, deduplicate=deduplicate)
+        for texts in files_texts:
+            counter.add(texts)
+        return counter.total
+
+    def estimate_request_seconds(self, texts: List[str]) -> float:
+        """Estimated wall time of a single request carrying `texts` (used for scheduling)."""
+        return self.latency.estimate_seconds(*self.estimate_request_tokens(texts))
+
+    def estimate_request_tokens(self, texts: List[str]) -> Tuple[int, int]:
+        """Returns the estimated (input, output) tokens of a single request carrying `texts`."""
+        input_tokens = self.budget.prompt_overhead_tokens
+        output_tokens = 0
+        for text in texts:
+            i, o = self.entry_cost(text)
+            input_tokens += i
+            output_tokens += o
+        return input_tokens, output_tokens
+
+
+class BatchCounter:
+    """
+    Streaming form of `BatchPlanner.count_batches_for_files`.
+    Files are added one at a time, so the batch total can be planned while the
+    sources are parsed without keeping their texts; deduplication only keeps
+    a hash of each text already seen.
+    """
+
+    def __init__(self, planner: BatchPlanner, pack: bool = False, deduplicate: bool = False):
+        self.planner = planner
+        self.pack = pack
+        self.deduplicate = deduplicate
+        self.total = 0
+        self._seen = set()
+        # Open batch: (items, input tokens, output tokens)
+        self._count = 0
+        self._input = 0
+        self._output = 0
+
+    def add(self, texts: List[str]):
+        budget = self.planner.budget
+        if not self.pack:
+            self._count = self._input = self._output = 0
+        for text in texts:
+            if self.deduplicate:
+                # Only the first occurrence of each text is sent.
+                key = hash(text)
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+            input_tokens, output_tokens = self.planner.entry_cost(text)
+            if self._count > 0:
+                total = budget.prompt_overhead_tokens + self._input + input_tokens + self._output + output_tokens
+                if (self._count >= budget.max_batch_items
+                        or total > budget.max_batch_tokens
+                        or self._output + output_tokens > budget.max_output_tokens):
+                    self._count = self._input = self._output = 0
+            if self._count == 0:
+                self.total += 1
+            self._count += 1
+            self._input += input_tokens
+            self._output += output_tokens
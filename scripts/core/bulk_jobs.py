@@ -0,0 +1,355 @@
+# scripts/core/bulk_jobs.py
+"""
+离线批量模式 (Bulk Mode)
+对延迟不敏感的整 Mod 任务：规划阶段按真实运行的同一套规则 (去重、翻译记忆、跨文件打包、token 预算批次) 走一遍
+ParallelProcessor，只构建每个批次的提示词而不调用 API；全部请求序列化为 Provider 的批处理文件一次性提交，
+作业 ID 写入断点 (CheckpointManager 元数据)，服务重启后再次运行同一任务会继续轮询。
+
+作业完成后，结果按提示词摘要交给 Handler (BaseApiHandler.load_bulk_responses)，再正常运行一遍工作流：
+每个批次构建出相同的提示词，直接回放作业结果，解析、抢救、拆分、翻译记忆与 file_builder 写文件流程与实时模式完全相同；
+结果缺失或无效的批次退回实时请求。
+
+后端由 API_PROVIDERS 中的 "batch_api" 选择：
+- "openai": OpenAI Batch API (/v1/batches，JSONL 中每行一个 /v1/chat/completions 请求)
+- "gemini": Gemini Batch API (上传 JSONL 文件后创建批处理作业)
+- "local":  本地文件后端，作业目录保存在输出目录中，用 Handler 的实时接口逐条处理，供测试与压测使用
+"""
+
+import io
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from scripts.core.base_handler import BaseApiHandler, bulk_request_key
+from scripts.core.parallel_processor import BatchTask
+
+logger = logging.getLogger(__name__)
+
+# 断点元数据中保存作业记录的键
+CHECKPOINT_KEY = "bulk_job"
+
+JOB_PENDING = "pending"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class BulkRequest:
+    """批处理文件中的一个请求；custom_id 为 "<提示词摘要>-<序号>"，相同提示词的多个批次各有一个结果。"""
+    custom_id: str
+    prompt: str
+
+
+def request_key(custom_id: str) -> str:
+    """custom_id 中的提示词摘要部分。"""
+    return custom_id.rsplit("-", 1)[0]
+
+
+def _request_index(custom_id: str) -> int:
+    suffix = custom_id.rsplit("-", 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def responses_by_prompt(results: Dict[str, Optional[str]]) -> Dict[str, List[str]]:
+    """把 {custom_id: 响应文本} 按提示词摘要分组 (同一摘要按提交顺序)；失败的请求 (None) 不回放。"""
+    grouped: Dict[str, List[str]] = {}
+    for custom_id in sorted(results, key=_request_index):
+        text = results[custom_id]
+        if text is not None:
+            grouped.setdefault(request_key(custom_id), []).append(text)
+    return grouped
+
+
+class BulkCollector:
+    """
+    规划阶段使用的翻译函数：按目标语言记录每个批次的提示词，并返回原文占位结果而不调用 API
+    (配合只读的翻译记忆会话，占位结果不会写入记忆库)。
+    """
+
+    def __init__(self, handler: BaseApiHandler):
+        self.handler = handler
+        self.requests: Dict[str, List[BulkRequest]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, batch_task: BatchTask) -> BatchTask:
+        prompt = self.handler._build_prompt(batch_task)
+        key = bulk_request_key(prompt)
+        with self._lock:
+            requests = self.requests.setdefault(batch_task.file_task.target_lang["code"], [])
+            requests.append(BulkRequest(f"{key}-{len(requests)}", prompt))
+        batch_task.translated_texts = list(batch_task.texts)
+        return batch_task
+
+
+# ───────────── 后端 ─────────────
+
+class BulkBackend(ABC):
+    """Provider 批处理接口：提交一组请求、查询作业状态、取回 {custom_id: 响应文本 或 None}。"""
+
+    name = ""
+
+    def __init__(self, handler: BaseApiHandler, work_dir: str):
+        self.handler = handler
+        self.work_dir = work_dir
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @abstractmethod
+    def submit(self, requests: List[BulkRequest]) -> str:
+        """上传请求并创建作业，返回作业 ID。"""
+
+    @abstractmethod
+    def poll(self, job_id: str) -> str:
+        """返回 JOB_PENDING、JOB_COMPLETED 或 JOB_FAILED。"""
+
+    @abstractmethod
+    def results(self, job_id: str) -> Dict[str, Optional[str]]:
+        """已完成作业的结果；没有结果的请求可以缺失或为 None。"""
+
+
+def openai_request_line(handler: BaseApiHandler, request: BulkRequest) -> Dict[str, Any]:
+    """OpenAI Batch API 输入文件的一行：请求体与 Handler 实时调用 chat.completions.create 的参数相同。"""
+    return {
+        "custom_id": request.custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": handler._build_request_kwargs(request.prompt),
+    }
+
+
+def parse_openai_output(lines: Iterable[str]) -> Dict[str, Optional[str]]:
+    """解析 OpenAI Batch API 的输出文件 (每行 {"custom_id", "response": {"status_code", "body"}, "error"})。"""
+    results: Dict[str, Optional[str]] = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        choices = (response.get("body") or {}).get("choices") or []
+        content = choices[0].get("message", {}).get("content") if choices else None
+        ok = response.get("status_code") == 200 and not record.get("error") and content
+        results[record["custom_id"]] = content.strip() if ok else None
+    return results
+
+
+class OpenAIBatchBackend(BulkBackend):
+    """OpenAI Batch API：上传 JSONL (purpose="batch") 后创建 24 小时完成窗口的作业。"""
+
+    name = "openai"
+    ENDPOINT = "/v1/chat/completions"
+
+    def submit(self, requests: List[BulkRequest]) -> str:
+        payload = "\n".join(json.dumps(openai_request_line(self.handler, r), ensure_ascii=False) for r in requests)
+        client = self.handler.client
+        upload = client.files.create(file=("remis_bulk.jsonl", payload.encode("utf-8")), purpose="batch")
+        batch = client.batches.create(input_file_id=upload.id, endpoint=self.ENDPOINT, completion_window="24h")
+        return batch.id
+
+    def poll(self, job_id: str) -> str:
+        batch = self.handler.client.batches.retrieve(job_id)
+        if batch.status == "completed":
+            return JOB_COMPLETED
+        if batch.status == "expired":
+            # 窗口内已完成的请求仍在输出文件中，其余请求回到实时模式
+            return JOB_COMPLETED if batch.output_file_id else JOB_FAILED
+        if batch.status in ("failed", "cancelled"):
+            return JOB_FAILED
+        return JOB_PENDING
+
+    def results(self, job_id: str) -> Dict[str, Optional[str]]:
+        client = self.handler.client
+        batch = client.batches.retrieve(job_id)
+        if not batch.output_file_id:
+            return {}
+        return parse_openai_output(client.files.content(batch.output_file_id).text.splitlines())
+
+
+class GeminiBatchBackend(BulkBackend):
+    """Gemini Batch API：上传 {"key", "request"} 格式的 JSONL 文件，作业完成后下载结果文件。"""
+
+    name = "gemini"
+    SUCCEEDED = ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED")
+    FAILED = ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+    def _model(self) -> str:
+        return self.handler.get_provider_config().get("default_model", "gemini-1.5-flash")
+
+    def submit(self, requests: List[BulkRequest]) -> str:
+        from google.genai import types
+
+        # 与实时请求相同的输出上限 (GeminiHandler._output_token_limit)
+        max_output_tokens = self.handler._output_token_limit(self._model(), self.handler.get_provider_config())
+        generation_config = {"generationConfig": {"maxOutputTokens": max_output_tokens}} if max_output_tokens else {}
+        lines = [
+            json.dumps({"key": r.custom_id, "request": {"contents": [{"role": "user", "parts": [{"text": r.prompt}]}], **generation_config}},
+                       ensure_ascii=False)
+            for r in requests
+        ]
+        client = self.handler.client
+        uploaded = client.files.upload(
+            file=io.BytesIO("\n".join(lines).encode("utf-8")),
+            config=types.UploadFileConfig(display_name="remis-bulk", mime_type="jsonl")
+        )
+        job = client.batches.create(model=self._model(), src=uploaded.name,
+                                    config=types.CreateBatchJobConfig(display_name="remis-bulk"))
+        return job.name
+
+    @staticmethod
+    def _state(job: Any) -> str:
+        state = job.state
+        return getattr(state, "name", None) or str(state)
+
+    def poll(self, job_id: str) -> str:
+        state = self._state(self.handler.client.batches.get(name=job_id))
+        if state in self.SUCCEEDED:
+            return JOB_COMPLETED
+        if state in self.FAILED:
+            return JOB_FAILED
+        return JOB_PENDING
+
+    def results(self, job_id: str) -> Dict[str, Optional[str]]:
+        client = self.handler.client
+        job = client.batches.get(name=job_id)
+        if not (job.dest and job.dest.file_name):
+            return {}
+        content = client.files.download(file=job.dest.file_name).decode("utf-8")
+        results: Dict[str, Optional[str]] = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            candidates = (record.get("response") or {}).get("candidates") or []
+            parts = (candidates[0].get("content") or {}).get("parts") or [] if candidates else []
+            # 与 GeminiHandler._extract_text 相同：只取文本部分，跳过思考内容
+            text = "".join(part.get("text", "") for part in parts if not part.get("thought")).strip()
+            results[record["key"]] = text or None
+        return results
+
+
+class LocalBatchBackend(BulkBackend):
+    """
+    本地文件后端 (测试与压测用)：作业目录 <work_dir>/.remis_bulk/<job_id>/ 保存 OpenAI 格式的 input.jsonl 与 status.json，
+    第 complete_after_polls 次轮询时用 Handler 的实时接口逐条处理并写出 output.jsonl。
+    状态全部在磁盘上，新的实例 (例如服务重启后) 可以继续轮询同一作业。
+    """
+
+    name = "local"
+    DIRECTORY = ".remis_bulk"
+
+    def __init__(self, handler: BaseApiHandler, work_dir: str, complete_after_polls: Optional[int] = None):
+        super().__init__(handler, work_dir)
+        if complete_after_polls is None:
+            complete_after_polls = handler.get_provider_config().get("batch_complete_after_polls", 1)
+        self.complete_after_polls = complete_after_polls
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.work_dir, self.DIRECTORY, job_id)
+
+    def _read_status(self, job_id: str) -> Dict[str, Any]:
+        with open(os.path.join(self._job_dir(job_id), "status.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_status(self, job_id: str, status: Dict[str, Any]):
+        path = os.path.join(self._job_dir(job_id), "status.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(status, f)
+        os.replace(path + ".tmp", path)
+
+    def submit(self, requests: List[BulkRequest]) -> str:
+        job_id = f"local-{uuid.uuid4().hex[:12]}"
+        os.makedirs(self._job_dir(job_id))
+        with open(os.path.join(self._job_dir(job_id), "input.jsonl"), "w", encoding="utf-8") as f:
+            for request in requests:
+                f.write(json.dumps(openai_request_line(self.handler, request), ensure_ascii=False) + "\n")
+        self._write_status(job_id, {"status": JOB_PENDING, "polls": 0, "requests": len(requests)})
+        return job_id
+
+    def poll(self, job_id: str) -> str:
+        try:
+            status = self._read_status(job_id)
+        except FileNotFoundError:
+            return JOB_FAILED
+        if status["status"] == JOB_PENDING:
+            status["polls"] += 1
+            if status["polls"] >= self.complete_after_polls:
+                self._run(job_id)
+                status["status"] = JOB_COMPLETED
+            self._write_status(job_id, status)
+        return status["status"]
+
+    def _run(self, job_id: str):
+        job_dir = self._job_dir(job_id)
+        with open(os.path.join(job_dir, "input.jsonl"), "r", encoding="utf-8") as source, \
+                open(os.path.join(job_dir, "output.jsonl"), "w", encoding="utf-8") as output:
+            for line in source:
+                request = json.loads(line)
+                prompt = request["body"]["messages"][-1]["content"]
+                record = {"custom_id": request["custom_id"], "response": None, "error": None}
+                try:
+                    content = self.handler._call_api(self.handler.client, prompt)
+                    record["response"] = {"status_code": 200, "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}}
+                except Exception as e:
+                    record["error"] = {"message": str(e)}
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def results(self, job_id: str) -> Dict[str, Optional[str]]:
+        path = os.path.join(self._job_dir(job_id), "output.jsonl")
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return parse_openai_output(f)
+
+
+BULK_BACKENDS = {
+    OpenAIBatchBackend.name: OpenAIBatchBackend,
+    GeminiBatchBackend.name: GeminiBatchBackend,
+    LocalBatchBackend.name: LocalBatchBackend,
+}
+
+
+def get_bulk_backend(handler: BaseApiHandler, work_dir: str) -> Optional[BulkBackend]:
+    """Provider 配置的批处理后端；没有批处理接口时返回 None (退回实时请求)。"""
+    name = handler.get_provider_config().get("batch_api")
+    if not name:
+        return None
+    if name not in BULK_BACKENDS:
+        logger.warning(f"Unknown batch_api '{name}' for {handler.provider_name}.")
+        return None
+    return BULK_BACKENDS[name](handler, work_dir)
+
+
+def job_record(backend: BulkBackend, job_id: str, requests: int) -> Dict[str, Any]:
+    """写入断点的作业记录。"""
+    return {"backend": backend.name, "job_id": job_id, "requests": requests, "submitted_at": time.time()}
+
+
+def wait_for_jobs(
+    backend: BulkBackend,
+    job_ids: List[str],
+    poll_interval: float,
+    max_wait: float,
+    on_poll: Optional[Callable[[Dict[str, str]], None]] = None,
+    sleep: Callable[[float], None] = time.sleep
+) -> Dict[str, str]:
+    """
+    轮询直到所有作业结束或超过 max_wait 秒，返回 {job_id: 状态}；超时时仍在运行的作业为 JOB_PENDING。
+    查询失败 (网络错误等) 视为仍在运行，下次轮询重试。
+    """
+    statuses = {job_id: JOB_PENDING for job_id in job_ids}
+    started = time.monotonic()
+    while True:
+        for job_id in [j for j, status in statuses.items() if status == JOB_PENDING]:
+            try:
+                statuses[job_id] = backend.poll(job_id)
+            except Exception as e:
+                logger.warning(f"Polling batch job {job_id} failed: {e}")
+        if on_poll is not None:
+            on_poll(statuses)
+        if JOB_PENDING not in statuses.values() or time.monotonic() - started >= max_wait:
+            return statuses
+        sleep(poll_interval)
@@ -9,7 +9,10 @@ from typing import List, Set, Dict, Any, Optional
 class CheckpointManager:
     """
     Manages translation checkpoints to support resume functionality.
-    Stores progress in a JSON file in the output directory.
+    Stores progress in a JSON snapshot (metadata + completed_files) in the output
+    directory, plus an append-only log next to it with one completed filename per
+    line, so marking a file done costs one small append instead of a full rewrite.
+    save_checkpoint() folds the log back into the snapshot.
     Thread-safe and metadata-aware.
     """
 
@@ -19,6 +22,7 @@ class CheckpointManager:
         self.output_dir = output_dir
         self.CHECKPOINT_FILENAME = checkpoint_filename
         self.checkpoint_path = os.path.join(output_dir, self.CHECKPOINT_FILENAME)
+        self.log_path = os.path.splitext(self.checkpoint_path)[0] + ".log"
         self.completed_files: Set[str] = set()
         self.metadata: Dict[str, Any] = {}
         self.current_config = current_config or {}
@@ -27,27 +31,43 @@ class CheckpointManager:
         self._load_checkpoint()
 
     def _load_checkpoint(self):
-        """Loads existing checkpoint if available."""
-        if os.path.exists(self.checkpoint_path):
-            try:
+        """Loads the existing snapshot (plain JSON, as written by older versions) and replays the append log."""
+        self.completed_files = set()
+        self.metadata = self.current_config
+        if not os.path.exists(self.checkpoint_path) and not os.path.exists(self.log_path):
+            return
+
+        try:
+            if os.path.exists(self.checkpoint_path):
                 with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     self.completed_files = set(data.get("completed_files", []))
                     self.metadata = data.get("metadata", {})
-                
-                self.logger.info(f"Loaded checkpoint. {len(self.completed_files)} files already completed.")
-                
-                # Validate metadata if config is provided
-                if self.current_config:
-                    self._validate_config()
-                    
-            except Exception as e:
-                self.logger.warning(f"Failed to load checkpoint: {e}. Starting fresh.")
-                self.completed_files = set()
-                self.metadata = {}
-        else:
+            self.completed_files.update(self._read_log())
+
+            self.logger.info(f"Loaded checkpoint. {len(self.completed_files)} files already completed.")
+
+            # Validate metadata if config is provided
+            if self.current_config:
+                self._validate_config()
+
+        except Exception as e:
+            self.logger.warning(f"Failed to load checkpoint: {e}. Starting fresh.")
             self.completed_files = set()
-            self.metadata = self.current_config
+            self.metadata = {}
+
+    def _read_log(self) -> List[str]:
+        """Filenames appended since the last snapshot. A torn last line (crash mid-write) is ignored."""
+        if not os.path.exists(self.log_path):
+            return []
+        filenames = []
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    filenames.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return filenames
 
     def _validate_config(self):
         """Validates if the current config matches the checkpoint metadata."""
@@ -74,22 +94,41 @@ class CheckpointManager:
             pass
 
     def save_checkpoint(self):
-        """Saves current progress to checkpoint file atomically."""
+        """Writes a full snapshot atomically and truncates the append log (compaction)."""
         with self._lock:
-            data = {
-                "metadata": self.metadata if self.metadata else self.current_config,
-                "completed_files": list(self.completed_files)
-            }
-            
-            try:
-                # Write to temp file first then rename to ensure atomicity
-                with tempfile.NamedTemporaryFile(mode='w', delete=False, encoding='utf-8', dir=self.output_dir) as tmp:
-                    json.dump(data, tmp, ensure_ascii=False, indent=2)
-                    tmp_path = tmp.name
-                
-                shutil.move(tmp_path, self.checkpoint_path)
-            except Exception as e:
-                self.logger.error(f"Failed to save checkpoint: {e}")
+            self._write_snapshot()
+            self._remove(self.log_path)
+
+    def _write_snapshot(self):
+        # Caller holds self._lock
+        data = {
+            "metadata": self.metadata if self.metadata else self.current_config,
+            "completed_files": sorted(self.completed_files)
+        }
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            # Write to temp file first then rename to ensure atomicity
+            with tempfile.NamedTemporaryFile(mode='w', delete=False, encoding='utf-8', dir=self.output_dir) as tmp:
+                json.dump(data, tmp, ensure_ascii=False, indent=2)
+                tmp_path = tmp.name
+
+            shutil.move(tmp_path, self.checkpoint_path)
+        except Exception as e:
+            self.logger.error(f"Failed to save checkpoint: {e}")
+
+    def get_metadata(self, key: str, default: Any = None) -> Any:
+        """Returns a run-level value stored with set_metadata (or loaded from the snapshot)."""
+        with self._lock:
+            return self.metadata.get(key, default)
+
+    def set_metadata(self, key: str, value: Any):
+        """Stores a run-level value (e.g. a submitted bulk job id) and writes the snapshot right away."""
+        with self._lock:
+            # Copy so the caller's current_config dict is not mutated
+            self.metadata = dict(self.metadata or self.current_config)
+            self.metadata[key] = value
+            self._write_snapshot()
 
     def is_file_completed(self, filename: str) -> bool:
         """Checks if a file has been successfully processed."""
@@ -97,23 +136,21 @@ class CheckpointManager:
             return filename in self.completed_files
 
     def mark_file_completed(self, filename: str):
-        """Marks a file as completed and saves checkpoint."""
+        """Marks a file as completed with a single append to the checkpoint log."""
         with self._lock:
+            if filename in self.completed_files:
+                return
             self.completed_files.add(filename)
-        # Save outside the lock to minimize blocking time? 
-        # No, save_checkpoint uses lock too. 
-        # Actually, we should save inside lock or make save_checkpoint re-entrant safe?
-        # save_checkpoint acquires lock. So we shouldn't hold lock when calling it if it's not re-entrant.
-        # RLock would solve this, or just calling save_checkpoint (which locks) is enough.
-        # But we need to add to set atomically.
-        
-        # Correct pattern:
-        # with self._lock:
-        #    self.completed_files.add(filename)
-        # self.save_checkpoint() 
-        
-        # But if another thread adds between add and save, it's fine.
-        self.save_checkpoint()
+            if not os.path.exists(self.checkpoint_path):
+                # The snapshot carries the run metadata; it is written once, not per file.
+                self._write_snapshot()
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(filename, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                self.logger.error(f"Failed to append checkpoint: {e}")
 
     def filter_pending_files(self, all_files_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Returns a list of files that still need to be processed."""
@@ -132,20 +169,26 @@ class CheckpointManager:
         return pending
 
     def clear_checkpoint(self):
-        """Deletes the checkpoint file upon successful completion."""
+        """Deletes the checkpoint snapshot and log upon successful completion."""
         with self._lock:
-            if os.path.exists(self.checkpoint_path):
-                try:
-                    os.remove(self.checkpoint_path)
-                    self.logger.info("Checkpoint file cleared.")
-                except Exception as e:
-                    self.logger.warning(f"Failed to clear checkpoint file: {e}")
+            existed = os.path.exists(self.checkpoint_path) or os.path.exists(self.log_path)
+            self._remove(self.checkpoint_path)
+            self._remove(self.log_path)
+            if existed:
+                self.logger.info("Checkpoint file cleared.")
+
+    def _remove(self, path: str):
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                self.logger.warning(f"Failed to clear checkpoint file: {e}")
 
     def get_checkpoint_info(self) -> Dict[str, Any]:
         """Returns info about the checkpoint for UI display."""
         with self._lock:
             return {
-                "exists": os.path.exists(self.checkpoint_path),
+                "exists": os.path.exists(self.checkpoint_path) or os.path.exists(self.log_path),
                 "completed_count": len(self.completed_files),
                 "metadata": self.metadata
             }
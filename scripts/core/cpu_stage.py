@@ -0,0 +1,234 @@
+# scripts/core/cpu_stage.py
+"""
+CPU 密集阶段进程池 (CPU Stage Pool)
+词典匹配、词典一致性校验、标点清理与后处理格式校验都是纯 Python 计算，放在翻译线程里会持有 GIL，
+拖慢本该只在等待网络 I/O 的工作线程。这里把它们交给独立的进程池执行：
+调用方构造可 pickle 的纯数据载荷 (Payload)，在进程中运行模块级的 worker 函数，线程只阻塞在 future 上。
+
+词典随进程初始化时发送一次 (worker 上下文)，内存中的词典被替换或模糊匹配模式改变时进程池会重建。
+进程池不可用 (打包版、单核、进程崩溃) 时一律退回当前线程执行，结果与进程内执行完全相同。
+"""
+
+import os
+import sys
+import pickle
+import logging
+import threading
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from scripts.app_settings import CPU_POOL_ENABLED, CPU_POOL_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+# ───────────── Payloads ─────────────
+
+@dataclass
+class TermMatchPayload:
+    """词典匹配：已拼接并转为小写的批次文本"""
+    text: str
+    source_lang: str
+    target_lang: str
+
+
+@dataclass
+class GlossaryCheckPayload:
+    """译后词典一致性校验"""
+    filename: str
+    batch_index: int
+    source_lang: str
+    target_lang: str
+    texts: List[str]
+    translated_texts: List[str]
+
+
+@dataclass
+class PunctuationPayload:
+    """单个文件译文的标点清理"""
+    texts: List[str]
+    source_lang: str
+    target_lang: str
+
+
+@dataclass
+class FileValidationPayload:
+    """单个译文文件的后处理格式校验"""
+    file_path: str
+    game_key: str
+    source_lang: Dict[str, Any]
+    dynamic_valid_tags: Optional[List[str]] = None
+
+
+# ───────────── Worker side ─────────────
+
+# Per-process state, set up by _init_worker
+_worker_glossary_manager = None
+_worker_simple_glossaries: Dict[Tuple[str, str], Dict[str, str]] = {}
+_worker_validator = None
+
+
+def _init_worker(glossary: Optional[Dict[str, Any]], fuzzy_mode: str, ui_language: str):
+    global _worker_glossary_manager
+    from scripts.utils import i18n
+    i18n.load_language(ui_language)
+    if glossary is not None:
+        from scripts.core.glossary_manager import GlossaryManager
+        _worker_glossary_manager = GlossaryManager()
+        _worker_glossary_manager.in_memory_glossary = glossary
+        _worker_glossary_manager.fuzzy_matching_mode = fuzzy_mode
+
+
+def match_glossary_terms(payload: TermMatchPayload) -> List[Dict]:
+    return _worker_glossary_manager._smart_term_matching(payload.text, payload.source_lang, payload.target_lang)
+
+
+def check_glossary_consistency(payload: GlossaryCheckPayload) -> List[Dict[str, Any]]:
+    from scripts.utils.glossary_validator import GlossaryValidator
+    key = (payload.source_lang, payload.target_lang)
+    if key not in _worker_simple_glossaries:
+        _worker_simple_glossaries[key] = GlossaryValidator.simple_glossary(
+            _worker_glossary_manager.in_memory_glossary, payload.source_lang, payload.target_lang
+        )
+    simple_glossary = _worker_simple_glossaries[key]
+    if not simple_glossary:
+        return []
+    return GlossaryValidator().validate_texts(
+        payload.texts, payload.translated_texts, simple_glossary,
+        payload.source_lang, payload.target_lang, payload.filename, payload.batch_index
+    )
+
+
+def clean_punctuation(payload: PunctuationPayload) -> List[str]:
+    from scripts.utils.punctuation_handler import clean_punctuation_core
+    # Clean up double spaces that might result from the mapping (e.g. ", " + " ")
+    return [
+        clean_punctuation_core(text, payload.source_lang, payload.target_lang).replace("  ", " ")
+        for text in payload.texts
+    ]
+
+
+def validate_translated_file(payload: FileValidationPayload):
+    """Returns (results, error message); a file that can't be read is reported instead of raising."""
+    global _worker_validator
+    from scripts.core.post_processing_manager import scan_file_for_issues
+    if _worker_validator is None:
+        from scripts.utils.post_process_validator import PostProcessValidator
+        _worker_validator = PostProcessValidator()
+    try:
+        return scan_file_for_issues(_worker_validator, payload), None
+    except Exception as e:
+        return [], str(e)
+
+
+# ───────────── Pool ─────────────
+
+def _default_workers() -> int:
+    if CPU_POOL_WORKERS is not None:
+        return CPU_POOL_WORKERS
+    return (os.cpu_count() or 1) - 1
+
+
+class CpuStagePool:
+    """懒创建的进程池，整个进程共享；所有方法都可以在多个线程中调用。"""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = _default_workers() if workers is None else workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # (glossary, fuzzy_mode) the current executor's workers were initialised with
+        self._context: Optional[Tuple[Optional[Dict[str, Any]], str]] = None
+        self._broken = False
+        self._lock = threading.Lock()
+        self.stats = {"offloaded": 0, "inline": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return CPU_POOL_ENABLED and self.workers >= 1 and not self._broken and not getattr(sys, "frozen", False)
+
+    def _get_executor(self, context: Optional[Tuple[Optional[Dict[str, Any]], str]]) -> ProcessPoolExecutor:
+        # Caller holds self._lock, and submits before releasing it so a concurrent rebuild can't shut the executor down under it
+        if self._executor is not None and context is not None and not self._same_context(context):
+            # The glossary was reloaded; workers still hold the old one (queued work still completes)
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._executor is None:
+            from scripts.utils import i18n
+            self._context = context or (None, "loose")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._context[0], self._context[1], i18n.get_current_language()),
+            )
+            logger.info(f"Started CPU stage pool with {self.workers} worker processes.")
+        return self._executor
+
+    def _same_context(self, context) -> bool:
+        return self._context is not None and context[0] is self._context[0] and context[1] == self._context[1]
+
+    def run(self, fn: Callable, payload: Any, fallback: Optional[Callable[[], Any]] = None,
+            context: Optional[Tuple[Optional[Dict[str, Any]], str]] = None) -> Any:
+        """
+        Runs fn(payload) in a worker process and blocks the calling thread (not the GIL) until it is done.
+        `fallback()` — fn(payload) by default — runs in-process when the pool is off or breaks.
+        `context` is (glossary, fuzzy_mode) for stages that need the glossary in the workers.
+        """
+        if fallback is None:
+            fallback = lambda: fn(payload)
+        if not self.enabled:
+            return self._inline(fallback)
+        try:
+            with self._lock:
+                future = self._get_executor(context).submit(fn, payload)
+            result = future.result()
+        except (BrokenProcessPool, pickle.PicklingError, OSError) as e:
+            self._disable(e)
+            return self._inline(fallback)
+        with self._lock:
+            self.stats["offloaded"] += 1
+        return result
+
+    def map(self, fn: Callable, payloads: List[Any]) -> List[Any]:
+        """fn over every payload in the pool (in order); falls back to an in-process loop."""
+        if not self.enabled:
+            return [self._inline(lambda p=p: fn(p)) for p in payloads]
+        try:
+            with self._lock:
+                futures = [self._get_executor(None).submit(fn, payload) for payload in payloads]
+            results = [future.result() for future in futures]
+        except (BrokenProcessPool, pickle.PicklingError, OSError) as e:
+            self._disable(e)
+            return [self._inline(lambda p=p: fn(p)) for p in payloads]
+        with self._lock:
+            self.stats["offloaded"] += len(payloads)
+        return results
+
+    def _inline(self, fallback: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.stats["inline"] += 1
+        return fallback()
+
+    def _disable(self, error: Exception):
+        logger.warning(f"CPU stage pool unavailable ({type(error).__name__}: {error}); running CPU stages in-process.")
+        with self._lock:
+            self._broken = True
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, workers=self.workers if self.enabled else 0)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            self._context = None
+
+
+cpu_stage_pool = CpuStagePool()
@@ -0,0 +1,243 @@
+# scripts/core/endpoint_pool.py
+"""
+本地推理服务的多节点负载均衡 (目前用于 Ollama)
+一个 Provider 可以配置多个端点 (多台推理机，或一台多 GPU 主机上的多个实例)，每个端点有自己的并发上限。
+请求路由到 占用/并发上限 最低的健康端点 (least-outstanding-first)；所有名额都被占用时等待。
+连续失败 max_failures 次的端点被移出轮转，cooldown_seconds 后放行一个探测请求 (与故障转移熔断器相同的半开状态)，
+成功即恢复；所有端点都被移出时请求立即失败，交给上层的重试与故障转移。
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from scripts.app_settings import OLLAMA_ENDPOINT_CONCURRENCY, OLLAMA_ENDPOINT_MAX_FAILURES, OLLAMA_ENDPOINT_COOLDOWN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_SLOT_POLL_INTERVAL = 0.05
+
+
+class NoHealthyEndpoint(RuntimeError):
+    """所有端点都已被移出轮转，且没有到期可探测的端点。"""
+
+
+@dataclass
+class Endpoint:
+    """单个推理节点及其实时状态"""
+    url: str
+    max_concurrency: int = 1
+    outstanding: int = 0
+    # 连续失败次数；evicted_until > 0 表示已移出轮转，到期后放行一个探测请求 (probing)
+    failures: int = 0
+    evicted_until: float = 0.0
+    probing: bool = False
+    stats: Dict[str, int] = field(default_factory=lambda: {"requests": 0, "failures": 0, "evictions": 0})
+
+    @property
+    def load(self) -> float:
+        return self.outstanding / self.max_concurrency
+
+
+def endpoint_configs(provider_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Provider 配置中的端点列表 [{"url", "max_concurrency"}]。
+    未配置 "endpoints" 时只有一个端点：base_url_env 环境变量、base_url 或本地默认地址。
+    """
+    configured = provider_config.get("endpoints") or []
+    if not configured:
+        url = os.getenv(provider_config.get("base_url_env", ""), "") or provider_config.get("base_url") or "http://localhost:11434"
+        configured = [{"url": url}]
+    return [
+        {"url": item["url"].rstrip("/"), "max_concurrency": max(1, int(item.get("max_concurrency", OLLAMA_ENDPOINT_CONCURRENCY)))}
+        for item in configured
+    ]
+
+
+def endpoint_capacity(provider_config: Dict[str, Any]) -> int:
+    """所有端点的并发上限之和，即该 Provider 可同时处理的请求数。"""
+    return sum(item["max_concurrency"] for item in endpoint_configs(provider_config))
+
+
+class EndpointPool:
+    """一组端点的路由、并发名额与健康状态，线程模式与 asyncio 模式共用。"""
+
+    def __init__(self, name: str, endpoints: List[Endpoint], max_failures: int = OLLAMA_ENDPOINT_MAX_FAILURES,
+                 cooldown_seconds: float = OLLAMA_ENDPOINT_COOLDOWN_SECONDS):
+        if not endpoints:
+            raise ValueError(f"{name}: at least one endpoint is required")
+        self.name = name
+        self.endpoints = endpoints
+        self.max_failures = max(1, int(max_failures))
+        self.cooldown_seconds = cooldown_seconds
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        return sum(endpoint.max_concurrency for endpoint in self.endpoints)
+
+    # ───────────── 申请 / 释放 ─────────────
+    def _try_acquire(self) -> Tuple[Optional[Endpoint], float]:
+        """Takes a slot on the least loaded usable endpoint, or returns how long to wait. Caller holds _cond."""
+        now = time.monotonic()
+        candidates = []
+        for endpoint in self.endpoints:
+            if endpoint.evicted_until:
+                # 冷却结束的端点只放行一个探测请求
+                if now >= endpoint.evicted_until and not endpoint.probing and endpoint.outstanding == 0:
+                    candidates.append(endpoint)
+            elif endpoint.outstanding < endpoint.max_concurrency:
+                candidates.append(endpoint)
+
+        if not candidates:
+            if all(endpoint.evicted_until for endpoint in self.endpoints):
+                raise NoHealthyEndpoint(f"{self.name}: every endpoint is out of rotation")
+            return None, _SLOT_POLL_INTERVAL
+
+        # 占用率相同时选累计请求最少的节点，空闲时请求也会轮流分配
+        endpoint = min(candidates, key=lambda e: (e.load, e.outstanding, e.stats["requests"]))
+        if endpoint.evicted_until:
+            endpoint.probing = True
+            logger.info(f"{self.name}: probing evicted endpoint {endpoint.url}")
+        endpoint.outstanding += 1
+        endpoint.stats["requests"] += 1
+        return endpoint, 0.0
+
+    def acquire(self) -> Endpoint:
+        """阻塞直到某个端点有空闲名额；没有可用端点时抛出 NoHealthyEndpoint。"""
+        with self._cond:
+            while True:
+                endpoint, wait = self._try_acquire()
+                if endpoint is not None:
+                    return endpoint
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self) -> Endpoint:
+        """acquire 的协程版本，等待期间不占用事件循环。"""
+        while True:
+            with self._cond:
+                endpoint, wait = self._try_acquire()
+            if endpoint is not None:
+                return endpoint
+            await asyncio.sleep(wait)
+
+    def release(self, endpoint: Endpoint, healthy: bool):
+        """归还名额。失败计入该端点的连续失败次数，达到 max_failures (或探测失败) 时移出轮转。"""
+        with self._cond:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            if healthy:
+                if endpoint.evicted_until:
+                    logger.info(f"{self.name}: endpoint {endpoint.url} is healthy again, back in rotation")
+                endpoint.failures = 0
+                endpoint.evicted_until = 0.0
+                endpoint.probing = False
+            else:
+                endpoint.failures += 1
+                endpoint.stats["failures"] += 1
+                if endpoint.probing or endpoint.failures >= self.max_failures:
+                    self._evict(endpoint, f"{endpoint.failures} consecutive failures")
+            self._cond.notify_all()
+
+    def _evict(self, endpoint: Endpoint, reason: str):
+        # Caller holds _cond
+        endpoint.evicted_until = time.monotonic() + self.cooldown_seconds
+        endpoint.probing = False
+        endpoint.stats["evictions"] += 1
+        logger.warning(f"{self.name}: evicting endpoint {endpoint.url} ({reason}), next probe in {self.cooldown_seconds:.0f}s")
+
+    @staticmethod
+    def _is_endpoint_error(error: BaseException) -> bool:
+        """连接错误、超时与 HTTP 错误状态说明节点有问题；模型输出格式错误等不影响节点健康。"""
+        return isinstance(error, (httpx.HTTPError, NoHealthyEndpoint))
+
+    @contextlib.contextmanager
+    def lease(self):
+        """占用一个端点名额执行请求：`with pool.lease() as endpoint: ...`。"""
+        endpoint = self.acquire()
+        healthy = True
+        try:
+            yield endpoint
+        except BaseException as e:
+            healthy = not self._is_endpoint_error(e)
+            raise
+        finally:
+            self.release(endpoint, healthy)
+
+    @contextlib.asynccontextmanager
+    async def lease_async(self):
+        endpoint = await self.acquire_async()
+        healthy = True
+        try:
+            yield endpoint
+        except BaseException as e:
+            healthy = not self._is_endpoint_error(e)
+            raise
+        finally:
+            self.release(endpoint, healthy)
+
+    # ───────────── 健康检查 ─────────────
+    def check_health(self, probe: Callable[[str], Any]) -> List[Endpoint]:
+        """
+        用 probe(url) 逐个探测端点 (抛出异常即不健康)；不健康的端点移出轮转，健康的恢复。
+        返回健康的端点。
+        """
+        healthy = []
+        for endpoint in self.endpoints:
+            try:
+                probe(endpoint.url)
+            except Exception as e:
+                with self._cond:
+                    self._evict(endpoint, f"health check failed: {e}")
+                continue
+            with self._cond:
+                endpoint.failures = 0
+                endpoint.evicted_until = 0.0
+                endpoint.probing = False
+                self._cond.notify_all()
+            healthy.append(endpoint)
+        return healthy
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                endpoint.url: dict(
+                    endpoint.stats, outstanding=endpoint.outstanding, max_concurrency=endpoint.max_concurrency,
+                    healthy=not endpoint.evicted_until or (endpoint.probing and now >= endpoint.evicted_until)
+                )
+                for endpoint in self.endpoints
+            }
+
+
+class EndpointPoolRegistry:
+    """按 Provider 与端点配置共享端点池，使同一 Provider 的所有 Handler 共用并发名额与健康状态。"""
+
+    def __init__(self):
+        self._pools: Dict[Tuple[str, Tuple[Tuple[str, int], ...]], EndpointPool] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider_name: str, provider_config: Dict[str, Any]) -> EndpointPool:
+        configs = endpoint_configs(provider_config)
+        key = (provider_name, tuple((item["url"], item["max_concurrency"]) for item in configs))
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = EndpointPool(
+                    provider_name, [Endpoint(item["url"], item["max_concurrency"]) for item in configs],
+                    max_failures=provider_config.get("endpoint_max_failures", OLLAMA_ENDPOINT_MAX_FAILURES),
+                    cooldown_seconds=provider_config.get("endpoint_cooldown_seconds", OLLAMA_ENDPOINT_COOLDOWN_SECONDS),
+                )
+            return self._pools[key]
+
+    def reset(self):
+        with self._lock:
+            self._pools.clear()
+
+
+endpoint_pool_registry = EndpointPoolRegistry()
@@ -0,0 +1,242 @@
+# scripts/core/failover.py
+"""
+Provider 故障转移 (Failover Chain)
+长任务中主 Provider 持续失败时 (额度耗尽、模型下线、本地 Ollama 崩溃)，
+每个 Provider 都有一个熔断器：连续 FAILOVER_BREAKER_THRESHOLD 个批次整批失败后熔断，
+新的批次改发给链上下一个熔断器闭合的处理器；整批失败的批次也会在下一个处理器上重发一次。
+熔断 FAILOVER_BREAKER_COOLDOWN_SECONDS 秒后进入半开状态，放行一个探测批次，成功即恢复。
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Any
+
+from scripts.app_settings import FAILOVER_BREAKER_THRESHOLD, FAILOVER_BREAKER_COOLDOWN_SECONDS
+from scripts.core import api_handler
+from scripts.core.batch_planner import BatchPlanner
+from scripts.core.parallel_processor import BatchTask
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个 Provider 的熔断器，按批次结果计数连续失败。"""
+
+    def __init__(self, name: str, threshold: int = FAILOVER_BREAKER_THRESHOLD,
+                 cooldown: float = FAILOVER_BREAKER_COOLDOWN_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """Whether a new batch may be sent. After the cooldown a single probe batch is let through."""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and self._clock() - self.opened_at >= self.cooldown:
+                self.state = STATE_HALF_OPEN
+                logger.info(f"Circuit breaker for {self.name} is half-open, sending a probe batch.")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logger.info(f"Circuit breaker for {self.name} closed again.")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == STATE_HALF_OPEN or (self.state == STATE_CLOSED and self.consecutive_failures >= self.threshold):
+                if self.state == STATE_CLOSED:
+                    self.trips += 1
+                    logger.error(f"Circuit breaker for {self.name} opened after {self.consecutive_failures} consecutive failed batches.")
+                self.state = STATE_OPEN
+                self.opened_at = self._clock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, "trips": self.trips}
+
+
+class FailoverRouter:
+    """
+    按顺序把批次交给故障转移链上的处理器 (第一个是任务选定的主处理器)。
+    只有整批失败才计为 Provider 失败；部分条目回退原文说明 Provider 仍在正常响应。
+    """
+
+    def __init__(self, handlers: List[Any], threshold: int = FAILOVER_BREAKER_THRESHOLD,
+                 cooldown: float = FAILOVER_BREAKER_COOLDOWN_SECONDS):
+        self.handlers = handlers
+        self.breakers = {id(h): CircuitBreaker(h.provider_name, threshold, cooldown) for h in handlers}
+        self._lock = threading.Lock()
+        self.stats = {
+            h.provider_name: {"batches": 0, "failed_batches": 0, "failed_over": 0}
+            for h in handlers
+        }
+
+    @property
+    def primary(self):
+        return self.handlers[0]
+
+    def _route(self):
+        """
+        Yields the handlers a batch may go to, in chain order. Breakers are only asked once the
+        previous handler has failed, so a half-open probe is never claimed without being sent.
+        The last handler is kept as a last resort when every breaker is open.
+        """
+        routed = False
+        for handler in self.handlers:
+            if self.breakers[id(handler)].allow():
+                routed = True
+                yield handler
+        if not routed:
+            yield self.handlers[-1]
+
+    @staticmethod
+    def _batch_failed(task: Optional[BatchTask]) -> bool:
+        return task is None or task.translated_texts is None or task.failed
+
+    @staticmethod
+    def _reset(task: BatchTask):
+        """Clears a failed attempt so the next handler starts from the source texts."""
+        task.translated_texts = None
+        task.failed = False
+        task.failed_positions = []
+        task.companion_results = {}
+        task.companion_failed = []
+        task.companion_failed_positions = {}
+        task.entry_providers = []
+
+    def _count(self, handler, key: str):
+        with self._lock:
+            self.stats[handler.provider_name][key] += 1
+
+    def _settle(self, handler, task: Optional[BatchTask]) -> bool:
+        """Updates the breaker and stats for one handler's result. Returns True when the batch is done."""
+        self._count(handler, "batches")
+        breaker = self.breakers[id(handler)]
+        if not self._batch_failed(task):
+            breaker.record_success()
+            task.entry_providers = [handler.provider_name] * len(task.texts)
+            return True
+        breaker.record_failure()
+        self._count(handler, "failed_batches")
+        return False
+
+    def _fail_over(self, previous, handler, task: BatchTask):
+        self._count(previous, "failed_over")
+        logger.warning(f"Batch {task.batch_index + 1} failed on {previous.provider_name}, failing over to {handler.provider_name}.")
+        self._reset(task)
+
+    @staticmethod
+    def _estimate_tokens(handler, task: BatchTask) -> int:
+        return BatchPlanner.for_provider(handler.provider_name).estimate_request_tokens(task.texts)[0]
+
+    def translate_batch(self, task: BatchTask) -> BatchTask:
+        result, previous = task, None
+        for handler in self._route():
+            if previous is not None:
+                self._fail_over(previous, handler, task)
+            result = self._call(handler, task)
+            if self._settle(handler, result):
+                return result
+            previous = handler
+        return result if result is not None else task
+
+    def _call(self, handler, task: BatchTask) -> Optional[BatchTask]:
+        # 主处理器的限流由 ParallelProcessor 负责，其余处理器在这里占用各自的配额
+        if handler is self.primary:
+            return self._guarded(handler, task)
+        handler.rate_limiter.acquire(self._estimate_tokens(handler, task))
+        result = None
+        try:
+            result = self._guarded(handler, task)
+        finally:
+            handler.rate_limiter.release(success=not self._batch_failed(result))
+        return result
+
+    @staticmethod
+    def _guarded(handler, task: BatchTask) -> Optional[BatchTask]:
+        try:
+            return handler.translate_batch(task)
+        except Exception as e:
+            logger.exception(f"Batch {task.batch_index + 1} raised during translation: {e}")
+            return None
+
+    async def translate_batch_async(self, task: BatchTask) -> BatchTask:
+        result, previous = task, None
+        for handler in self._route():
+            if previous is not None:
+                self._fail_over(previous, handler, task)
+            result = await self._call_async(handler, task)
+            if self._settle(handler, result):
+                return result
+            previous = handler
+        return result if result is not None else task
+
+    async def _call_async(self, handler, task: BatchTask) -> Optional[BatchTask]:
+        if handler is self.primary:
+            return await self._guarded_async(handler, task)
+        await handler.rate_limiter.acquire_async(self._estimate_tokens(handler, task))
+        result = None
+        try:
+            result = await self._guarded_async(handler, task)
+        finally:
+            handler.rate_limiter.release(success=not self._batch_failed(result))
+        return result
+
+    @staticmethod
+    async def _guarded_async(handler, task: BatchTask) -> Optional[BatchTask]:
+        try:
+            return await handler.translate_batch_async(task)
+        except Exception as e:
+            logger.exception(f"Batch {task.batch_index + 1} raised during translation: {e}")
+            return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {name: dict(counts) for name, counts in self.stats.items()}
+        for handler in self.handlers:
+            stats[handler.provider_name]["breaker"] = self.breakers[id(handler)].snapshot()
+        return stats
+
+
+def build_failover_router(primary, provider_names: List[str]) -> Optional[FailoverRouter]:
+    """
+    Creates the fallback handlers through api_handler.get_handler.
+    Providers that repeat the primary or have no configured client are skipped; returns None when nothing is left to fail over to.
+    """
+    handlers = [primary]
+    seen = {primary.provider_name}
+    for name in provider_names or []:
+        if name in seen:
+            continue
+        seen.add(name)
+        handler = api_handler.get_handler(name)
+        if not handler or not handler.client:
+            logger.warning(f"Failover provider '{name}' is not configured, skipping it.")
+            continue
+        if handler.provider_name != name:
+            # get_handler falls back to gemini for unknown names
+            logger.warning(f"Unknown failover provider '{name}', skipping it.")
+            continue
+        handlers.append(handler)
+    if len(handlers) == 1:
+        return None
+    logger.info(f"Failover chain: {' -> '.join(h.provider_name for h in handlers)}")
+    return FailoverRouter(handlers)
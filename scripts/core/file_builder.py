@@ -121,7 +121,8 @@ def rebuild_and_write_file(
     This is a wrapper around patch_file_content that handles file writing.
     """
     import os
-    from scripts.utils.punctuation_handler import clean_punctuation_core
+    from scripts.app_settings import CPU_POOL_MIN_TEXTS
+    from scripts.core.cpu_stage import cpu_stage_pool, clean_punctuation, PunctuationPayload
     
     # 1. Determine Target Filename
     # Replace the source language key in the filename with the target language key
@@ -164,13 +165,12 @@ def rebuild_and_write_file(
     source_code = source_lang.get("code", "zh-CN")
     target_code = target_lang.get("code", "en")
     
-    cleaned_translations = []
-    for text in translated_texts:
-        # Use the centralized punctuation handler
-        cleaned = clean_punctuation_core(text, source_code, target_code)
-        # Clean up double spaces that might result from the mapping (e.g. ", " + " ")
-        cleaned = cleaned.replace("  ", " ")
-        cleaned_translations.append(cleaned)
+    # Large files are cleaned in the CPU stage pool so the calling thread doesn't hold the GIL
+    payload = PunctuationPayload(list(translated_texts), source_code, target_code)
+    if cpu_stage_pool.enabled and len(translated_texts) >= CPU_POOL_MIN_TEXTS:
+        cleaned_translations = cpu_stage_pool.run(clean_punctuation, payload)
+    else:
+        cleaned_translations = clean_punctuation(payload)
 
     # 3. Patch the content
     new_lines = patch_file_content(
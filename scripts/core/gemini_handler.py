@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import Any
+from typing import Any, Iterator, AsyncIterator
 from google import genai
 from google.genai import types
 
@@ -19,22 +19,46 @@ class GeminiHandler(BaseApiHandler):
         try:
             # The genai.configure() method is deprecated.
             # The API key is now passed directly to the genai.Client constructor.
-            client = genai.Client(api_key=api_key)
+            client = genai.Client(api_key=api_key, http_options=self._http_options(httpx_client=self.transport.client()))
             self.logger.info("Gemini client initialized successfully.")
             return client
         except Exception as e:
             self.logger.exception(f"Error initializing Gemini client: {e}")
             raise
 
-    def _call_api(self, client: Any, prompt: str) -> str:
-        """【必须由子类实现】执行对Gemini API的调用并返回原始文本响应。"""
-        provider_config = self.get_provider_config()
-        model_name = provider_config.get("default_model", "gemini-1.5-flash")
-        
+    def _http_options(self, **clients) -> types.HttpOptions:
+        """使用共享的长连接池；SDK 按请求传入超时 (毫秒)，未设置时会关闭连接池的超时。"""
+        return types.HttpOptions(timeout=int(self.transport.timeout.read * 1000), **clients)
+
+    def initialize_async_client(self) -> Any:
+        """当前事件循环的异步接口 (client.aio)，使用共享的异步连接池。"""
+        client = genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options=self._http_options(httpx_client=self.transport.client(), httpx_async_client=self.transport.async_client()),
+        )
+        return client.aio
+
+    def _output_token_limit(self, model_name: str, provider_config: dict) -> int | None:
+        """
+        请求的 max_output_tokens，与批次规划的输出预算一致。思考 token 同样计入该上限：固定的 thinking_budget 另外留出，
+        动态思考 (Gemini 3 的 thinking_level 或 thinking_budget=-1) 的用量无法预知，返回 None 沿用模型默认上限。
+        """
+        if not provider_config.get("enable_thinking", False):
+            return self._max_output_tokens()
+        thinking_budget = provider_config.get("thinking_budget", 0)
+        if thinking_budget > 0 and "gemini-3" not in model_name:
+            return self._max_output_tokens() + thinking_budget
+        return None
+
+    def _build_generation_config(self, model_name: str, provider_config: dict, cached_content: str | None = None):
+        """根据 thinking 配置与显式缓存句柄构建 GenerateContentConfig，同步与异步调用共用。"""
         enable_thinking = provider_config.get("enable_thinking", False)
         thinking_budget = provider_config.get("thinking_budget", 0)
 
         generation_config = {}
+        max_output_tokens = self._output_token_limit(model_name, provider_config)
+        if max_output_tokens:
+            generation_config["max_output_tokens"] = max_output_tokens
         if enable_thinking:
             # According to latest google-genai docs:
             # Gemini 3 models support thinking_level ('low', 'high', 'medium', 'minimal')
@@ -59,27 +83,119 @@ class GeminiHandler(BaseApiHandler):
                 if thinking_budget > 0:
                     generation_config["thinking_budget"] = thinking_budget
 
+        if cached_content:
+            generation_config["cached_content"] = cached_content
+
+        return types.GenerateContentConfig(**generation_config) if generation_config else None
+
+    @staticmethod
+    def _extract_text(response: Any) -> str:
+        # SAFE EXTRACTION: Avoid the 'thought_signature' warning by extracting only text parts
+        # Response parts can contain Text, Thought, Call, etc.
+        if response.candidates and response.candidates[0].content.parts:
+            text_parts = [part.text for part in response.candidates[0].content.parts if part.text]
+            if text_parts:
+                return "".join(text_parts).strip()
+        
+        # Fallback to .text if parts extraction fails (will trigger warning but at least returns something)
+        return response.text.strip()
+
+    def _report_gemini_usage(self, response: Any):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self._report_usage(getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None),
+                               getattr(usage, "cached_content_token_count", None))
+
+    def _create_prompt_cache(self, client: Any, prefix: str, ttl_seconds: int) -> str | None:
+        """Gemini 显式上下文缓存 (context caching)：缓存 stable_prefix 布局的静态前缀。"""
+        model_name = self.get_provider_config().get("default_model", "gemini-1.5-flash")
+        cache = client.caches.create(
+            model=model_name,
+            config=types.CreateCachedContentConfig(contents=[prefix], ttl=f"{ttl_seconds}s", display_name="paradox-mod-translator")
+        )
+        self.logger.info(f"Created Gemini context cache {cache.name} ({model_name}, ttl {ttl_seconds}s)")
+        return cache.name
+
+    def _call_api(self, client: Any, prompt: str) -> str:
+        """【必须由子类实现】执行对Gemini API的调用并返回原始文本响应。"""
+        provider_config = self.get_provider_config()
+        model_name = provider_config.get("default_model", "gemini-1.5-flash")
+
         try:
+            cached_content, contents = self._split_cached_prompt(prompt)
             # Pass the generation_config to the API call
             response = client.models.generate_content(
                 model=model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(**generation_config) if generation_config else None
+                contents=contents,
+                config=self._build_generation_config(model_name, provider_config, cached_content)
             )
-            
-            # SAFE EXTRACTION: Avoid the 'thought_signature' warning by extracting only text parts
-            # Response parts can contain Text, Thought, Call, etc.
-            if response.candidates and response.candidates[0].content.parts:
-                text_parts = [part.text for part in response.candidates[0].content.parts if part.text]
-                if text_parts:
-                    return "".join(text_parts).strip()
-            
-            # Fallback to .text if parts extraction fails (will trigger warning but at least returns something)
-            return response.text.strip()
+            self._report_gemini_usage(response)
+            return self._extract_text(response)
         except Exception as e:
             self.logger.exception(f"Gemini API call failed: {e}")
             raise
 
+    async def _call_api_async(self, client: Any, prompt: str) -> str:
+        """使用 google-genai 的异步接口 (client.aio) 执行调用，不占用线程。"""
+        provider_config = self.get_provider_config()
+        model_name = provider_config.get("default_model", "gemini-1.5-flash")
+
+        try:
+            cached_content, contents = await self._split_cached_prompt_async(prompt)
+            response = await self._get_async_client().models.generate_content(
+                model=model_name,
+                contents=contents,
+                config=self._build_generation_config(model_name, provider_config, cached_content)
+            )
+            self._report_gemini_usage(response)
+            return self._extract_text(response)
+        except Exception as e:
+            self.logger.exception(f"Gemini async API call failed: {e}")
+            raise
+
+    def _stream_text(self, chunk: Any) -> str:
+        """流式分块中的文本部分；最后一个分块携带 usage_metadata。"""
+        self._report_gemini_usage(chunk)
+        if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+            return "".join(part.text for part in chunk.candidates[0].content.parts if part.text)
+        return ""
+
+    def _stream_api(self, client: Any, prompt: str) -> Iterator[str]:
+        """流式调用 (STREAMING_RESPONSES)，逐段返回响应文本。"""
+        provider_config = self.get_provider_config()
+        model_name = provider_config.get("default_model", "gemini-1.5-flash")
+        cached_content, contents = self._split_cached_prompt(prompt)
+        stream = client.models.generate_content_stream(
+            model=model_name,
+            contents=contents,
+            config=self._build_generation_config(model_name, provider_config, cached_content)
+        )
+        try:
+            for chunk in stream:
+                text = self._stream_text(chunk)
+                if text:
+                    yield text
+        finally:
+            stream.close()
+
+    async def _stream_api_async(self, client: Any, prompt: str) -> AsyncIterator[str]:
+        """使用 client.aio 的流式接口，用于 asyncio 执行模式。"""
+        provider_config = self.get_provider_config()
+        model_name = provider_config.get("default_model", "gemini-1.5-flash")
+        cached_content, contents = await self._split_cached_prompt_async(prompt)
+        stream = await self._get_async_client().models.generate_content_stream(
+            model=model_name,
+            contents=contents,
+            config=self._build_generation_config(model_name, provider_config, cached_content)
+        )
+        try:
+            async for chunk in stream:
+                text = self._stream_text(chunk)
+                if text:
+                    yield text
+        finally:
+            await stream.aclose()
+
     def generate_with_messages(self, messages: list[dict], temperature: float = 0.7) -> str:
         """
         Supports chat-like interaction for NeologismMiner.
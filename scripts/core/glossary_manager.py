@@ -5,7 +5,8 @@ import logging
 import re
 from typing import Dict, List, Any, Optional
 
-from scripts.app_settings import PROJECT_ROOT
+from scripts.app_settings import PROJECT_ROOT, CPU_POOL_MIN_GLOSSARY_ENTRIES
+from scripts.core.cpu_stage import cpu_stage_pool, match_glossary_terms, TermMatchPayload
 from scripts.utils import i18n
 from scripts.utils.phonetics_engine import PhoneticsEngine
 
@@ -307,7 +308,15 @@ class GlossaryManager:
             return []
         relevant_terms = []
         all_text = " ".join(texts).lower()
-        matches = self._smart_term_matching(all_text, source_lang, target_lang)
+        if cpu_stage_pool.enabled and len(glossary['entries']) >= CPU_POOL_MIN_GLOSSARY_ENTRIES:
+            # 大词典的模糊/音近匹配在进程池中执行，翻译线程只等待结果
+            matches = cpu_stage_pool.run(
+                match_glossary_terms, TermMatchPayload(all_text, source_lang, target_lang),
+                fallback=lambda: self._smart_term_matching(all_text, source_lang, target_lang),
+                context=(glossary, self.fuzzy_matching_mode)
+            )
+        else:
+            matches = self._smart_term_matching(all_text, source_lang, target_lang)
         for match in matches:
             relevant_terms.append({
                 'translations': {
@@ -1,7 +1,8 @@
 # scripts/core/grok_handler.py
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import logging
+from typing import Iterator, AsyncIterator
 
 from scripts.app_settings import API_PROVIDERS
 from scripts.core.base_handler import BaseApiHandler
@@ -22,7 +23,8 @@ class GrokHandler(BaseApiHandler):
             
             client = OpenAI(
                 api_key=api_key,
-                base_url=base_url
+                base_url=base_url,
+                http_client=self.transport.client()
             )
             
             model_name = provider_config.get("default_model", "grok-4-fast-reasoning")
@@ -33,21 +35,52 @@ class GrokHandler(BaseApiHandler):
             self.logger.exception(f"Error initializing Grok client: {e}")
             raise
 
-    def _call_api(self, client: OpenAI, prompt: str) -> str:
-        """【必须由子类实现】执行对Grok API的调用并返回原始文本响应。"""
+    def initialize_async_client(self) -> AsyncOpenAI:
+        """初始化 Grok 的异步客户端 (OpenAI兼容模式)，用于 asyncio 执行模式。"""
+        provider_config = self.get_provider_config()
+        return AsyncOpenAI(api_key=os.getenv("XAI_API_KEY"), base_url=provider_config.get("base_url"), http_client=self.transport.async_client())
+
+    def _build_request_kwargs(self, prompt: str) -> dict:
+        """构建 chat.completions.create 的参数，同步与异步调用共用。"""
         provider_config = self.get_provider_config()
         model_name = provider_config.get("default_model", "grok-4-fast-reasoning")
 
+        return dict(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": "You are a professional translator for game mods."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=self._max_output_tokens()
+        )
+
+    def _call_api(self, client: OpenAI, prompt: str) -> str:
+        """【必须由子类实现】执行对Grok API的调用并返回原始文本响应。"""
         try:
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "You are a professional translator for game mods."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=4000
-            )
+            response = client.chat.completions.create(**self._build_request_kwargs(prompt))
+            self._report_openai_usage(response)
             return response.choices[0].message.content.strip()
         except Exception as e:
             self.logger.exception(f"Grok API call failed: {e}")
             raise
+
+    async def _call_api_async(self, client: OpenAI, prompt: str) -> str:
+        """使用 AsyncOpenAI 执行调用，用于 asyncio 执行模式。"""
+        try:
+            response = await self._get_async_client().chat.completions.create(**self._build_request_kwargs(prompt))
+            self._report_openai_usage(response)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            self.logger.exception(f"Grok async API call failed: {e}")
+            raise
+
+    def _stream_api(self, client: OpenAI, prompt: str) -> Iterator[str]:
+        """流式调用 (STREAMING_RESPONSES)，逐段返回响应文本。"""
+        stream = client.chat.completions.create(**self._build_request_kwargs(prompt), **self._openai_stream_kwargs())
+        return self._iter_openai_stream(stream)
+
+    def _stream_api_async(self, client: OpenAI, prompt: str) -> AsyncIterator[str]:
+        """使用 AsyncOpenAI 的流式调用，用于 asyncio 执行模式。"""
+        return self._aiter_openai_stream(
+            self._get_async_client().chat.completions.create(**self._build_request_kwargs(prompt), **self._openai_stream_kwargs())
+        )
@@ -0,0 +1,164 @@
+# scripts/core/http_transport.py
+"""
+Provider 级 HTTP 连接池
+每个 Provider 共享一个长连接 (keep-alive) 的 httpx 客户端，避免每个批次重新握手 TCP/TLS。
+连接池大小按调度并发确定：同步客户端对应线程模式的 RECOMMENDED_MAX_WORKERS，
+异步客户端对应 asyncio 模式的 ASYNC_MAX_CONCURRENCY，均不超过该 Provider 限流器的 max_concurrency。
+安装了 h2 时启用 HTTP/2。通过 httpcore 的 trace 扩展统计新建连接与 TLS 握手，
+由此得到连接复用率 (见 snapshot)。
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+
+from scripts.app_settings import API_PROVIDERS, DEFAULT_HTTP_POOL, DEFAULT_RATE_LIMIT, RECOMMENDED_MAX_WORKERS, ASYNC_MAX_CONCURRENCY
+
+try:
+    import h2  # noqa: F401  (httpx 的 HTTP/2 支持依赖 h2)
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class HttpTransport:
+    """单个 Provider 的连接池：一个同步客户端，以及每个事件循环一个异步客户端。"""
+
+    def __init__(self, name: str, connect_timeout: float = 10.0, read_timeout: float = 300.0, write_timeout: float = 30.0,
+                 pool_timeout: float = 60.0, keepalive_expiry: float = 60.0, max_connections: Optional[int] = None,
+                 http2: bool = True, trust_env: bool = True, max_concurrency: Optional[int] = None):
+        self.name = name
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, write=write_timeout, pool=pool_timeout)
+        self.keepalive_expiry = keepalive_expiry
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.http2 = http2 and H2_AVAILABLE
+        self.trust_env = trust_env
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        # 异步客户端的连接属于创建它的事件循环，循环结束后随之释放
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self.stats = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "http_versions": {}}
+
+    def pool_size(self, concurrency: int) -> int:
+        if self.max_connections:
+            return self.max_connections
+        if self.max_concurrency:
+            concurrency = min(concurrency, self.max_concurrency)
+        return max(1, concurrency)
+
+    def _limits(self, concurrency: int) -> httpx.Limits:
+        size = self.pool_size(concurrency)
+        return httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=self.keepalive_expiry)
+
+    # --- 统计 -------------------------------------------------------------
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _on_trace(self, event: str, info: Dict[str, Any]):
+        # 只有新建连接时才会出现 connect_tcp / start_tls 事件；复用的连接直接发送请求
+        if event == "connection.connect_tcp.complete":
+            self._count("connections_opened")
+        elif event == "connection.start_tls.complete":
+            self._count("tls_handshakes")
+
+    async def _on_trace_async(self, event: str, info: Dict[str, Any]):
+        self._on_trace(event, info)
+
+    def _on_request(self, request: httpx.Request):
+        request.extensions["trace"] = self._on_trace
+        self._count("requests")
+
+    async def _on_request_async(self, request: httpx.Request):
+        request.extensions["trace"] = self._on_trace_async
+        self._count("requests")
+
+    def _on_response(self, response: httpx.Response):
+        with self._lock:
+            versions = self.stats["http_versions"]
+            versions[response.http_version] = versions.get(response.http_version, 0) + 1
+
+    async def _on_response_async(self, response: httpx.Response):
+        self._on_response(response)
+
+    # --- 客户端 -----------------------------------------------------------
+    def client(self) -> httpx.Client:
+        """线程模式共用的同步客户端。"""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=self.timeout, limits=self._limits(RECOMMENDED_MAX_WORKERS), http2=self.http2,
+                    trust_env=self.trust_env, follow_redirects=True,
+                    event_hooks={"request": [self._on_request], "response": [self._on_response]},
+                )
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """当前事件循环的异步客户端，必须在事件循环中调用。"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    timeout=self.timeout, limits=self._limits(ASYNC_MAX_CONCURRENCY), http2=self.http2,
+                    trust_env=self.trust_env, follow_redirects=True,
+                    event_hooks={"request": [self._on_request_async], "response": [self._on_response_async]},
+                )
+                self._async_clients[loop] = client
+            return client
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats, http_versions=dict(self.stats["http_versions"]))
+        reused = max(0, stats["requests"] - stats["connections_opened"])
+        return dict(
+            stats, reused=reused,
+            reuse_ratio=round(reused / stats["requests"], 3) if stats["requests"] else None,
+            pool_size=self.pool_size(RECOMMENDED_MAX_WORKERS), async_pool_size=self.pool_size(ASYNC_MAX_CONCURRENCY),
+            http2=self.http2,
+        )
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+class TransportRegistry:
+    """按 Provider 共享连接池，使同一 Provider 的所有 Handler (含对冲与故障转移创建的) 复用连接。"""
+
+    def __init__(self):
+        self._transports: Dict[str, HttpTransport] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider_name: str) -> HttpTransport:
+        with self._lock:
+            if provider_name not in self._transports:
+                provider_config = API_PROVIDERS.get(provider_name, {})
+                config = dict(DEFAULT_HTTP_POOL)
+                config.update(provider_config.get("http_pool", {}))
+                max_concurrency = provider_config.get("rate_limit", {}).get("max_concurrency", DEFAULT_RATE_LIMIT["max_concurrency"])
+                self._transports[provider_name] = HttpTransport(provider_name, max_concurrency=max_concurrency, **config)
+            return self._transports[provider_name]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            transports = list(self._transports.values())
+        return {transport.name: transport.snapshot() for transport in transports}
+
+    def reset(self):
+        with self._lock:
+            transports, self._transports = list(self._transports.values()), {}
+        for transport in transports:
+            transport.close()
+
+
+transport_registry = TransportRegistry()
@@ -0,0 +1,99 @@
+# scripts/core/mock_handler.py
+import os
+from typing import Iterator, AsyncIterator
+from openai import OpenAI, AsyncOpenAI
+import logging
+
+from scripts.core.base_handler import BaseApiHandler
+from scripts.core.mock_llm import MockLLM, MockBehaviour
+
+class MockHandler(BaseApiHandler):
+    """模拟 LLM Handler子类，用于不花费 API 费用的压测 (见 scripts/core/mock_llm.py)。"""
+
+    def initialize_client(self):
+        """
+        【必须由子类实现】设置了 MOCK_LLM_BASE_URL (或配置中的 base_url) 时连接本地 OpenAI 兼容模拟服务，
+        否则返回进程内的 MockLLM。
+        """
+        provider_config = self.get_provider_config()
+        self.base_url = os.getenv("MOCK_LLM_BASE_URL") or provider_config.get("base_url")
+        self.model = provider_config.get("default_model", "mock-echo")
+
+        if self.base_url:
+            # SDK 自带的重试关闭，429/500 交给本项目的重试与限流逻辑处理
+            self.logger.info(f"Mock LLM client configured. Base URL: {self.base_url}")
+            return OpenAI(api_key="mock", base_url=self.base_url, max_retries=0, http_client=self.transport.client())
+
+        behaviour = MockBehaviour.from_config(provider_config.get("mock_behaviour"))
+        self.logger.info(f"In-process mock LLM configured: {behaviour}")
+        return MockLLM(behaviour)
+
+    def initialize_async_client(self) -> AsyncOpenAI | None:
+        """HTTP 模式使用 AsyncOpenAI；进程内模式直接调用 MockLLM.respond_async。"""
+        if not self.base_url:
+            return None
+        return AsyncOpenAI(api_key="mock", base_url=self.base_url, max_retries=0, http_client=self.transport.async_client())
+
+    def _build_request_kwargs(self, prompt: str) -> dict:
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a professional translator for game mods."},
+                {"role": "user", "content": prompt}
+            ],
+        )
+
+    def _call_api(self, client: any, prompt: str) -> str:
+        """【必须由子类实现】调用模拟 LLM 并返回原始文本响应。"""
+        try:
+            if isinstance(client, MockLLM):
+                cached_content, contents = self._split_cached_prompt(prompt)
+                content, usage = client.respond(contents, cached_content=cached_content)
+                self._report_mock_usage(usage)
+                return content
+            response = client.chat.completions.create(**self._build_request_kwargs(prompt))
+            self._report_openai_usage(response)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            self.logger.warning(f"Mock LLM call failed: {e}")
+            raise
+
+    async def _call_api_async(self, client: any, prompt: str) -> str:
+        """进程内模式用 asyncio.sleep 模拟延迟，HTTP 模式使用 AsyncOpenAI。"""
+        try:
+            if isinstance(client, MockLLM):
+                cached_content, contents = await self._split_cached_prompt_async(prompt)
+                content, usage = await client.respond_async(contents, cached_content=cached_content)
+                self._report_mock_usage(usage)
+                return content
+            response = await self._get_async_client().chat.completions.create(**self._build_request_kwargs(prompt))
+            self._report_openai_usage(response)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            self.logger.warning(f"Mock async LLM call failed: {e}")
+            raise
+
+    def _report_mock_usage(self, usage: dict):
+        self._report_usage(usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"])
+
+    def _create_prompt_cache(self, client: any, prefix: str, ttl_seconds: int) -> str | None:
+        """进程内模式支持显式缓存句柄；HTTP 模式与 OpenAI 一样只有自动前缀缓存。"""
+        if isinstance(client, MockLLM):
+            return client.create_cache(prefix, ttl_seconds)
+        return None
+
+    def _stream_api(self, client: any, prompt: str) -> Iterator[str]:
+        """流式调用 (STREAMING_RESPONSES)：进程内模式分块产出，HTTP 模式读取 SSE 流。"""
+        if isinstance(client, MockLLM):
+            cached_content, contents = self._split_cached_prompt(prompt)
+            return client.stream(contents, on_usage=self._report_mock_usage, cached_content=cached_content)
+        stream = client.chat.completions.create(**self._build_request_kwargs(prompt), **self._openai_stream_kwargs())
+        return self._iter_openai_stream(stream)
+
+    def _stream_api_async(self, client: any, prompt: str) -> AsyncIterator[str]:
+        if isinstance(client, MockLLM):
+            cached_content, contents = self._split_cached_prompt(prompt)
+            return client.stream_async(contents, on_usage=self._report_mock_usage, cached_content=cached_content)
+        return self._aiter_openai_stream(
+            self._get_async_client().chat.completions.create(**self._build_request_kwargs(prompt), **self._openai_stream_kwargs())
+        )
@@ -0,0 +1,480 @@
+# scripts/core/mock_llm.py
+"""
+模拟 LLM (Mock LLM)，用于可复现的压测
+按翻译提示词中的编号列表返回格式正确的伪译文 ("[mock] 原文")，并可按配置注入：
+延迟分布、500 错误、带 Retry-After 的 429、被截断的 JSON、条目数错误，
+以及 JSON 前的长篇说明文字、复读失控的输出 (用于验证流式响应的提前中断)。
+用量中按 OpenAI 的方式模拟自动前缀缓存 (cached_tokens)，进程内模式还支持 Gemini 式的显式缓存句柄 (create_cache)。
+既可在进程内直接调用 (MockHandler 默认方式)，也可作为 OpenAI 兼容的本地 HTTP 服务运行：
+
+    python -m scripts.core.mock_llm --port 8765 --rate-limit-rate 0.05
+
+故障是否发生由 (seed, 提示词, 该提示词第几次被请求) 决定，与并发调度顺序无关，
+因此同一配置下重复运行得到相同的重试、拆分与抢救路径。
+"""
+
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, fields
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from scripts.core.batch_planner import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_ITEM_PATTERN = re.compile(r'^(\d+)\. "(.*)"$')
+_LANGUAGE_CODES_PATTERN = re.compile(r"Use EXACTLY these language codes as keys: ([^\n]+?)\.\n")
+_SALVAGE_MARKER = "OUTPUT ID OVERRIDE"
+
+FAULT_RATE_LIMIT = "rate_limit"
+FAULT_ERROR = "error"
+FAULT_TRUNCATED = "truncated"
+FAULT_WRONG_COUNT = "wrong_count"
+FAULT_PREAMBLE = "preamble"
+FAULT_RUNAWAY = "runaway"
+
+_PREAMBLE_TEXT = "Sure! Below you will find the translation of every line, keeping all placeholders and formatting intact. " * 6
+
+
+@dataclass
+class MockBehaviour:
+    """模拟 LLM 的延迟与故障配置，对应 API_PROVIDERS["mock"]["mock_behaviour"]。"""
+    latency_distribution: str = "fixed"   # fixed / uniform / lognormal
+    latency_mean_seconds: float = 0.0
+    latency_sigma: float = 0.5            # lognormal 的形状参数
+    latency_min_seconds: float = 0.0
+    latency_max_seconds: float = 60.0
+    seconds_per_item: float = 0.0         # 每个条目额外的生成耗时
+    error_rate: float = 0.0               # 返回 500 的概率
+    rate_limit_rate: float = 0.0          # 返回 429 的概率
+    retry_after_seconds: float = 1.0      # 429 响应的 Retry-After
+    truncate_rate: float = 0.0            # 返回被截断的 JSON 的概率
+    wrong_count_rate: float = 0.0         # 少返回或多返回一条的概率
+    preamble_rate: float = 0.0            # 在 JSON 前输出长篇说明文字的概率
+    runaway_rate: float = 0.0             # 输出若干条后不停复读同一条译文的概率
+    stream_chunk_chars: int = 16          # 流式响应每个分块的字符数
+    prompt_cache_min_chars: int = 4096    # 自动前缀缓存的最小前缀长度 (约 1024 token)，0 表示关闭
+    prompt_cache_block_chars: int = 512   # 前缀缓存的递增粒度 (约 128 token)
+    seed: int = 0
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "MockBehaviour":
+        known = {f.name for f in fields(cls)}
+        unknown = set(config or {}) - known
+        if unknown:
+            logger.warning(f"Ignoring unknown mock_behaviour keys: {sorted(unknown)}")
+        return cls(**{k: v for k, v in (config or {}).items() if k in known})
+
+
+class _MockHttpResponse:
+    """与 SDK 异常上的 response 属性形状一致，供 parse_rate_limit_error 读取状态码与响应头。"""
+
+    def __init__(self, status_code: int, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class MockServerError(Exception):
+    """注入的 500 错误。"""
+    status_code = 500
+
+    def __init__(self, message: str = "Internal server error (mock)"):
+        super().__init__(message)
+        self.response = _MockHttpResponse(500, {})
+
+
+class MockRateLimitError(Exception):
+    """注入的 429 错误，带 Retry-After 响应头。"""
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit reached (mock), retry after {retry_after}s")
+        self.response = _MockHttpResponse(429, {"retry-after": str(retry_after)})
+
+
+def parse_prompt(prompt: str) -> Tuple[List[str], bool, List[str]]:
+    """
+    从翻译提示词中取出 (输入条目, 是否抢救模式, 多目标语言代码)。
+    输入列表取最后一段从 1 开始连续编号的 `N. "text"` 行，词典等前置内容中的编号行不会被误认。
+    """
+    items: List[str] = []
+    for line in prompt.splitlines():
+        match = _ITEM_PATTERN.match(line.strip())
+        if not match:
+            continue
+        number = int(match.group(1))
+        if number == 1:
+            items = [match.group(2)]
+        elif number == len(items) + 1:
+            items.append(match.group(2))
+
+    codes_match = _LANGUAGE_CODES_PATTERN.search(prompt)
+    codes = [code.strip() for code in codes_match.group(1).split(",")] if codes_match else []
+    return items, _SALVAGE_MARKER in prompt, codes
+
+
+class MockLLM:
+    """进程内的模拟 LLM；线程安全，同步与异步调用共用同一份故障序列。"""
+
+    def __init__(self, behaviour: Optional[MockBehaviour] = None):
+        self.behaviour = behaviour or MockBehaviour()
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = {}
+        self._prefixes: set = set()          # 自动前缀缓存中见过的前缀摘要
+        self._caches: Dict[str, str] = {}    # 显式缓存句柄 -> 前缀
+        self.stats = {"requests": 0, FAULT_RATE_LIMIT: 0, FAULT_ERROR: 0, FAULT_TRUNCATED: 0, FAULT_WRONG_COUNT: 0,
+                      FAULT_PREAMBLE: 0, FAULT_RUNAWAY: 0}
+
+    def _rng_for(self, prompt: str) -> random.Random:
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            occurrence = self._seen.get(digest, 0)
+            self._seen[digest] = occurrence + 1
+            self.stats["requests"] += 1
+        return random.Random(f"{self.behaviour.seed}:{digest}:{occurrence}")
+
+    def _count(self, fault: str):
+        with self._lock:
+            self.stats[fault] += 1
+
+    def _latency(self, rng: random.Random, item_count: int) -> float:
+        b = self.behaviour
+        if b.latency_distribution == "uniform":
+            seconds = rng.uniform(b.latency_min_seconds, b.latency_max_seconds)
+        elif b.latency_distribution == "lognormal" and b.latency_mean_seconds > 0:
+            # 取 mu 使分布的均值等于 latency_mean_seconds
+            mu = math.log(b.latency_mean_seconds) - b.latency_sigma ** 2 / 2
+            seconds = rng.lognormvariate(mu, b.latency_sigma)
+        else:
+            seconds = b.latency_mean_seconds
+        seconds += b.seconds_per_item * item_count
+        return min(max(seconds, b.latency_min_seconds), b.latency_max_seconds)
+
+    def _plan(self, prompt: str) -> Tuple[float, Optional[Exception], str]:
+        """决定本次请求的延迟、要抛出的异常 (或 None) 和响应文本。"""
+        b = self.behaviour
+        rng = self._rng_for(prompt)
+        items, salvage, codes = parse_prompt(prompt)
+        latency = self._latency(rng, len(items))
+
+        if rng.random() < b.rate_limit_rate:
+            self._count(FAULT_RATE_LIMIT)
+            return 0.0, MockRateLimitError(b.retry_after_seconds), ""
+        if rng.random() < b.error_rate:
+            self._count(FAULT_ERROR)
+            return latency, MockServerError(), ""
+
+        translations = {code: [f"[{code}] {text}" for text in items] for code in codes} or {"": [f"[mock] {text}" for text in items]}
+        if items and rng.random() < b.wrong_count_rate:
+            self._count(FAULT_WRONG_COUNT)
+            first = next(iter(translations.values()))
+            if len(first) > 1 and rng.random() < 0.5:
+                first.pop(rng.randrange(len(first)))
+            else:
+                first.append(first[-1])
+        # 新增的故障类型只在启用时抽样，不改变已有配置下的故障序列
+        if items and b.runaway_rate and rng.random() < b.runaway_rate:
+            self._count(FAULT_RUNAWAY)
+            first = next(iter(translations.values()))
+            kept = rng.randint(1, len(first))
+            first[kept:] = [first[kept - 1]] * (2 * len(first) + 8)
+
+        if codes:
+            payload: Any = {"translations": translations}
+        elif salvage:
+            payload = [{"id": i + 1, "text": text} for i, text in enumerate(translations[""])]
+        else:
+            payload = translations[""]
+        content = json.dumps(payload, ensure_ascii=False)
+
+        if rng.random() < b.truncate_rate:
+            self._count(FAULT_TRUNCATED)
+            content = content[:max(1, int(len(content) * rng.uniform(0.3, 0.9)))]
+        if b.preamble_rate and rng.random() < b.preamble_rate:
+            self._count(FAULT_PREAMBLE)
+            content = _PREAMBLE_TEXT + "\n" + content
+        return latency, None, content
+
+    def create_cache(self, prefix: str, ttl_seconds: Optional[float] = None) -> str:
+        """显式缓存 (类似 Gemini cachedContents)：保存前缀并返回句柄，请求时通过 cached_content 引用。"""
+        with self._lock:
+            name = f"cachedContents/mock-{len(self._caches) + 1}"
+            self._caches[name] = prefix
+        return name
+
+    def _resolve(self, prompt: str, cached_content: Optional[str]) -> Tuple[str, Optional[str]]:
+        """返回 (模型看到的完整提示词, 显式缓存的前缀)。"""
+        if cached_content is None:
+            return prompt, None
+        with self._lock:
+            prefix = self._caches.get(cached_content)
+        if prefix is None:
+            raise MockServerError(f"Cached content {cached_content} not found (mock)")
+        return prefix + "\n\n" + prompt, prefix
+
+    def _cached_chars(self, prompt: str) -> int:
+        """自动前缀缓存：按 prompt_cache_block_chars 记录见过的前缀，返回命中的最长前缀长度。"""
+        b = self.behaviour
+        if b.prompt_cache_min_chars <= 0:
+            return 0
+        block = max(1, b.prompt_cache_block_chars)
+        digest = hashlib.sha1()
+        prefixes = []
+        for end in range(block, len(prompt) + 1, block):
+            digest.update(prompt[end - block:end].encode("utf-8"))
+            if end >= b.prompt_cache_min_chars:
+                prefixes.append((end, digest.hexdigest()))
+        cached = 0
+        with self._lock:
+            for end, key in prefixes:
+                if key not in self._prefixes:
+                    break
+                cached = end
+            self._prefixes.update(key for _, key in prefixes)
+        return cached
+
+    def _usage(self, prompt: str, content: str, cached_prefix: Optional[str] = None) -> Dict[str, int]:
+        if cached_prefix is None:
+            cached_prefix = prompt[:self._cached_chars(prompt)]
+        return {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content),
+                "cached_tokens": estimate_tokens(cached_prefix) if cached_prefix else 0}
+
+    def respond(self, prompt: str, cached_content: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+        """同步调用：返回 (响应文本, token 用量)，或抛出注入的异常。"""
+        prompt, cached_prefix = self._resolve(prompt, cached_content)
+        latency, error, content = self._plan(prompt)
+        if latency:
+            time.sleep(latency)
+        if error:
+            raise error
+        return content, self._usage(prompt, content, cached_prefix)
+
+    async def respond_async(self, prompt: str, cached_content: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+        prompt, cached_prefix = self._resolve(prompt, cached_content)
+        latency, error, content = self._plan(prompt)
+        if latency:
+            await asyncio.sleep(latency)
+        if error:
+            raise error
+        return content, self._usage(prompt, content, cached_prefix)
+
+    def _chunks(self, content: str) -> List[str]:
+        size = max(1, self.behaviour.stream_chunk_chars)
+        return [content[i:i + size] for i in range(0, len(content), size)]
+
+    def stream(self, prompt: str, on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+               cached_content: Optional[str] = None) -> Iterator[str]:
+        """
+        流式调用：延迟均摊到各分块，逐段产出响应文本；注入的异常在第一个分块前抛出。
+        流结束或被调用方提前关闭时，以已发送的内容调用 on_usage(usage)。
+        """
+        prompt, cached_prefix = self._resolve(prompt, cached_content)
+        latency, error, content = self._plan(prompt)
+        if error:
+            if latency:
+                time.sleep(latency)
+            raise error
+        chunks = self._chunks(content)
+        sent = []
+        try:
+            for chunk in chunks:
+                if latency:
+                    time.sleep(latency / len(chunks))
+                sent.append(chunk)
+                yield chunk
+        finally:
+            if on_usage is not None:
+                on_usage(self._usage(prompt, "".join(sent), cached_prefix))
+
+    async def stream_async(self, prompt: str, on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+                           cached_content: Optional[str] = None) -> AsyncIterator[str]:
+        prompt, cached_prefix = self._resolve(prompt, cached_content)
+        latency, error, content = self._plan(prompt)
+        if error:
+            if latency:
+                await asyncio.sleep(latency)
+            raise error
+        chunks = self._chunks(content)
+        sent = []
+        try:
+            for chunk in chunks:
+                if latency:
+                    await asyncio.sleep(latency / len(chunks))
+                sent.append(chunk)
+                yield chunk
+        finally:
+            if on_usage is not None:
+                on_usage(self._usage(prompt, "".join(sent), cached_prefix))
+
+
+def _openai_usage(usage: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"],
+        "prompt_tokens_details": {"cached_tokens": usage["cached_tokens"]},
+    }
+
+
+class _ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """POST /v1/chat/completions，返回 OpenAI chat.completion 格式的响应；"stream": true 时以 SSE 返回分块。"""
+
+    # HTTP/1.1 才能保持长连接，与真实 Provider 一样复用连接
+    protocol_version = "HTTP/1.1"
+    mock: MockLLM = None
+
+    def log_message(self, format, *args):
+        logger.debug("mock-llm %s - " + format, self.address_string(), *args)
+
+    def _send_json(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []) if m.get("role") == "user")
+
+        try:
+            if request.get("stream"):
+                self._stream(request, prompt)
+                return
+            content, usage = self.mock.respond(prompt)
+        except MockRateLimitError as e:
+            self._send_json(429, {"error": {"message": str(e), "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                            headers={"Retry-After": e.response.headers["retry-after"]})
+            return
+        except MockServerError as e:
+            self._send_json(500, {"error": {"message": str(e), "type": "server_error"}})
+            return
+
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{self.mock.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock-echo"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _openai_usage(usage),
+        })
+
+    def _write_event(self, body: Any):
+        data = b"data: " + (body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")) + b"\n\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, request: dict, prompt: str):
+        """以 chunked 编码发送 chat.completion.chunk 事件；客户端提前断开时停止生成。"""
+        usage: Dict[str, int] = {}
+        stream = self.mock.stream(prompt, on_usage=usage.update)
+        first = next(stream, None)  # 注入的异常在发送响应头之前抛出，返回正常的错误状态码
+        chunk_id = f"chatcmpl-mock-{self.mock.stats['requests']}"
+        model = request.get("model", "mock-echo")
+
+        def event(delta: dict, finish_reason: Optional[str] = None) -> dict:
+            return {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._write_event(event({"role": "assistant", "content": ""}))
+            if first is not None:
+                self._write_event(event({"content": first}))
+                for text in stream:
+                    self._write_event(event({"content": text}))
+            self._write_event(event({}, "stop"))
+            stream.close()
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self._write_event(dict(event({}), choices=[], usage=_openai_usage(usage)))
+            self._write_event(b"[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            stream.close()
+
+
+class MockLLMServer:
+    """在后台线程中运行的 OpenAI 兼容模拟服务；base_url 可直接交给 OpenAI 客户端。"""
+
+    def __init__(self, behaviour: Optional[MockBehaviour] = None, host: str = "127.0.0.1", port: int = 0):
+        self.mock = MockLLM(behaviour)
+        handler = type("MockChatCompletionsHandler", (_ChatCompletionsHandler,), {"mock": self.mock})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        logger.info(f"Mock LLM listening on {self.base_url}")
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self if self._thread else self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def serve_mock_llm(behaviour: Optional[MockBehaviour] = None, host: str = "127.0.0.1", port: int = 0) -> MockLLMServer:
+    """启动模拟服务并返回它；port 为 0 时由系统分配端口。"""
+    return MockLLMServer(behaviour, host, port).start()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM for load testing the translation pipeline.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for field in fields(MockBehaviour):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=type(field.default), default=field.default)
+    args = vars(parser.parse_args(argv))
+    host, port = args.pop("host"), args.pop("port")
+
+    logging.basicConfig(level=logging.INFO)
+    server = MockLLMServer(MockBehaviour(**args), host, port)
+    print(f"Mock LLM listening on {server.base_url} (set MOCK_LLM_BASE_URL to use it)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
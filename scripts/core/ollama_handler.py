@@ -1,57 +1,61 @@
 # scripts/core/ollama_handler.py
-import os
-import requests
+import json
+import httpx
 import logging
-from typing import Any
+from typing import Any, Iterator, AsyncIterator
 
-from scripts.app_settings import API_PROVIDERS
+from scripts.app_settings import API_PROVIDERS, OLLAMA_KEEP_ALIVE, OLLAMA_NUM_CTX
 from scripts.core.base_handler import BaseApiHandler
+from scripts.core.endpoint_pool import endpoint_pool_registry, NoHealthyEndpoint
 
 class OllamaHandler(BaseApiHandler):
-    """Ollama API Handler子类，用于与本地Ollama服务交互。"""
+    """Ollama API Handler子类，用于与本地Ollama服务交互 (支持多节点负载均衡，见 endpoint_pool)。"""
+
+    REQUIRED_VERSION = (0, 1, 14)
+
+    def _check_version(self, base_url: str):
+        """健康检查：节点可连接且版本支持 /api/chat，否则抛出异常。"""
+        response = self.transport.client().get(f"{base_url}/api/version", timeout=10)
+        response.raise_for_status()
+        version_str = response.json().get("version", "0.0.0")
+
+        # 版本号比较
+        current_version = tuple(int(part) for part in version_str.split("-")[0].split(".") if part.isdigit())
+        if current_version < self.REQUIRED_VERSION:
+            raise RuntimeError(
+                f"您的Ollama版本 ({version_str}) 过低，不支持 '/api/chat' 接口。\n"
+                f"请升级到 0.1.14 或更高版本。\n"
+                f"请访问 https://ollama.com/download 下载最新版本。"
+            )
 
     def initialize_client(self) -> Any:
-        """【必须由子类实现】初始化Ollama配置。"""
+        """【必须由子类实现】初始化Ollama配置与节点池。"""
         try:
             provider_config = self.get_provider_config()
-            # 从环境变量 OLLAMA_BASE_URL 读取URL，如果未设置，则从配置读取，最后使用默认值
-            self.base_url = os.getenv("OLLAMA_BASE_URL", provider_config.get("base_url", "http://localhost:11434"))
+            # 节点来自配置的 endpoints；未配置时为 OLLAMA_BASE_URL 环境变量、base_url 或默认地址
+            self.endpoint_pool = endpoint_pool_registry.get(self.provider_name, provider_config)
+            self.model = provider_config.get("default_model", "llama3.2")
+            self.keep_alive = provider_config.get("keep_alive", OLLAMA_KEEP_ALIVE)
+            self.num_ctx = provider_config.get("num_ctx", OLLAMA_NUM_CTX)
 
-            # 检查Ollama版本是否支持/api/chat
-            try:
-                response = requests.get(f"{self.base_url}/api/version", timeout=10)
-                response.raise_for_status()
-                version_str = response.json().get("version", "0.0.0")
-                
-                # 版本号比较
-                current_version = tuple(map(int, version_str.split('.')))
-                required_version = (0, 1, 14)
-
-                if current_version < required_version:
-                    error_msg = (
-                        f"您的Ollama版本 ({version_str}) 过低，不支持 '/api/chat' 接口。\n"
-                        f"请升级到 0.1.14 或更高版本。\n"
-                        f"请访问 https://ollama.com/download 下载最新版本。"
-                    )
-                    raise RuntimeError(error_msg)
-            
-            except requests.exceptions.RequestException as e:
-                self.logger.error(f"无法连接到Ollama或检查其版本。请确保Ollama正在运行于 {self.base_url}。错误: {e}")
-                raise
+            # 检查每个节点是否可用，不可用或版本过低的节点移出轮转
+            healthy = self.endpoint_pool.check_health(self._check_version)
+            if not healthy:
+                urls = ", ".join(endpoint.url for endpoint in self.endpoint_pool.endpoints)
+                self.logger.error(f"无法连接到Ollama或检查其版本。请确保Ollama正在运行于 {urls}。")
+                raise NoHealthyEndpoint(f"No usable Ollama endpoint among: {urls}")
 
-            self.model = provider_config.get("default_model", "llama3.2")
-            
-            self.logger.info(f"Ollama client configured. Base URL: {self.base_url}, Model: {self.model}, Version: {version_str}")
+            self.logger.info(
+                f"Ollama client configured. Endpoints: {len(healthy)}/{len(self.endpoint_pool.endpoints)} healthy, "
+                f"capacity: {self.endpoint_pool.capacity}, Model: {self.model}, keep_alive: {self.keep_alive}, num_ctx: {self.num_ctx}"
+            )
             # 返回自身实例作为客户端，因为它持有配置信息
             return self
         except Exception as e:
             self.logger.exception(f"Error initializing Ollama client: {e}")
             raise
 
-    def _call_api(self, client: Any, prompt: str) -> str:
-        """【必须由子类实现】使用requests调用本地Ollama API。"""
-        handler_instance = client
-
+    def _build_payload(self, prompt: str) -> dict:
         # Split the prompt into system instructions and user data
         # to use the API more effectively.
         try:
@@ -62,31 +66,84 @@ class OllamaHandler(BaseApiHandler):
             system_prompt = "You are a professional translator. Your response MUST be a valid JSON array of strings."
             user_prompt = prompt
 
-        payload = {
-            "model": handler_instance.model,
-            "system": system_prompt,
-            "prompt": user_prompt,
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
             "stream": False,
+            # 模型在批次之间保持加载；num_ctx 过小时 Ollama 会静默截断提示词
+            "keep_alive": self.keep_alive,
+            "options": {"num_ctx": self.num_ctx},
             #"format": "json" 有很多模型不支持这个参数 暂时先注释掉
         }
 
+    def _read_response(self, result: dict) -> str:
+        self._report_usage(result.get("prompt_eval_count"), result.get("eval_count"))
+        return (result.get("message") or {}).get("content", "").strip()
+
+    def _call_api(self, client: Any, prompt: str) -> str:
+        """【必须由子类实现】通过共享的长连接池调用本地Ollama API (不走系统代理，见 http_pool)。"""
+        handler_instance = client
+        payload = handler_instance._build_payload(prompt)
+
         try:
-            proxies = {
-                "http": None,
-                "https": None,
-            }
-            response = requests.post(
-                f"{handler_instance.base_url}/api/generate",
-                json=payload,
-                timeout=300,
-                proxies=proxies
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            return result.get("response", "").strip()
-            
-        except requests.exceptions.RequestException as e:
+            with handler_instance.endpoint_pool.lease() as endpoint:
+                response = self.transport.client().post(f"{endpoint.url}/api/chat", json=payload)
+                response.raise_for_status()
+                return self._read_response(response.json())
+
+        except httpx.HTTPError as e:
             self.logger.exception(f"Ollama API call failed: {e}")
             raise
+
+    def initialize_async_client(self) -> Any:
+        """当前事件循环的共享异步连接池。"""
+        return self.transport.async_client()
+
+    async def _call_api_async(self, client: Any, prompt: str) -> str:
+        """使用 httpx.AsyncClient 调用本地Ollama API。"""
+        handler_instance = client
+        payload = handler_instance._build_payload(prompt)
+
+        try:
+            async with handler_instance.endpoint_pool.lease_async() as endpoint:
+                response = await self._get_async_client().post(f"{endpoint.url}/api/chat", json=payload)
+                response.raise_for_status()
+                return self._read_response(response.json())
+        except httpx.HTTPError as e:
+            self.logger.exception(f"Ollama async API call failed: {e}")
+            raise
+
+
+    def _stream_line(self, line: str) -> str:
+        """解析 NDJSON 流中的一行；最后一行 (done) 带有 token 计数。"""
+        if not line.strip():
+            return ""
+        data = json.loads(line)
+        if data.get("done"):
+            self._report_usage(data.get("prompt_eval_count"), data.get("eval_count"))
+        return (data.get("message") or {}).get("content", "")
+
+    def _stream_api(self, client: Any, prompt: str) -> Iterator[str]:
+        """流式调用 (STREAMING_RESPONSES)，/api/chat 以 NDJSON 逐行返回增量文本。"""
+        payload = dict(client._build_payload(prompt), stream=True)
+        with client.endpoint_pool.lease() as endpoint:
+            with self.transport.client().stream("POST", f"{endpoint.url}/api/chat", json=payload) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    text = self._stream_line(line)
+                    if text:
+                        yield text
+
+    async def _stream_api_async(self, client: Any, prompt: str) -> AsyncIterator[str]:
+        """_stream_api 的异步版本。"""
+        payload = dict(client._build_payload(prompt), stream=True)
+        async with client.endpoint_pool.lease_async() as endpoint:
+            async with self._get_async_client().stream("POST", f"{endpoint.url}/api/chat", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = self._stream_line(line)
+                    if text:
+                        yield text
@@ -1,7 +1,8 @@
 # scripts/core/openai_handler.py
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import logging
+from typing import Iterator, AsyncIterator
 
 from scripts.app_settings import API_PROVIDERS
 from scripts.core.base_handler import BaseApiHandler
@@ -16,7 +17,7 @@ class OpenAIHandler(BaseApiHandler):
             self.logger.error("API Key 'OPENAI_API_KEY' not found in environment variables.")
             raise ValueError("OPENAI_API_KEY not set")
         try:
-            client = OpenAI(api_key=api_key)
+            client = OpenAI(api_key=api_key, http_client=self.transport.client())
             model_name = API_PROVIDERS["openai"]["default_model"]
             self.logger.info(f"OpenAI client initialized successfully, using model: {model_name}")
             return client
@@ -24,8 +25,12 @@ class OpenAIHandler(BaseApiHandler):
             self.logger.exception(f"Error initializing OpenAI client: {e}")
             raise
 
-    def _call_api(self, client: OpenAI, prompt: str) -> str:
-        """【必须由子类实现】执行对OpenAI API的调用并返回原始文本响应。"""
+    def initialize_async_client(self) -> AsyncOpenAI:
+        """初始化 OpenAI 的异步客户端，用于 asyncio 执行模式。"""
+        return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=self.transport.async_client())
+
+    def _build_request_kwargs(self, prompt: str) -> dict:
+        """构建 chat.completions.create 的参数，同步与异步调用共用。"""
         provider_config = self.get_provider_config()
         model_name = provider_config.get("default_model", "gpt-5-mini")
         
@@ -36,22 +41,48 @@ class OpenAIHandler(BaseApiHandler):
         if not enable_thinking and reasoning_effort_value:
             extra_params["reasoning_effort"] = reasoning_effort_value
 
+        return dict(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": "You are a professional translator for game mods."},
+                {"role": "user", "content": prompt}
+            ],
+            max_completion_tokens=self._max_output_tokens(),
+            **extra_params
+        )
+
+    def _call_api(self, client: OpenAI, prompt: str) -> str:
+        """【必须由子类实现】执行对OpenAI API的调用并返回原始文本响应。"""
         try:
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "You are a professional translator for game mods."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_completion_tokens=4000,  # 保持较大的token以适应大批次
-                **extra_params
-            )
+            response = client.chat.completions.create(**self._build_request_kwargs(prompt))
+            self._report_openai_usage(response)
             return response.choices[0].message.content.strip()
         except Exception as e:
             self.logger.exception(f"OpenAI API call failed: {e}")
             # 重新引发异常，让基类的重试逻辑捕获
             raise
 
+    async def _call_api_async(self, client: OpenAI, prompt: str) -> str:
+        """使用 AsyncOpenAI 执行调用，不占用线程。"""
+        try:
+            response = await self._get_async_client().chat.completions.create(**self._build_request_kwargs(prompt))
+            self._report_openai_usage(response)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            self.logger.exception(f"OpenAI async API call failed: {e}")
+            raise
+
+    def _stream_api(self, client: OpenAI, prompt: str) -> Iterator[str]:
+        """流式调用 (STREAMING_RESPONSES)，逐段返回响应文本。"""
+        stream = client.chat.completions.create(**self._build_request_kwargs(prompt), **self._openai_stream_kwargs())
+        return self._iter_openai_stream(stream)
+
+    def _stream_api_async(self, client: OpenAI, prompt: str) -> AsyncIterator[str]:
+        """使用 AsyncOpenAI 的流式调用，用于 asyncio 执行模式。"""
+        return self._aiter_openai_stream(
+            self._get_async_client().chat.completions.create(**self._build_request_kwargs(prompt), **self._openai_stream_kwargs())
+        )
+
     def generate_with_messages(self, messages: list[dict], temperature: float = 0.7) -> str:
         """
         Supports chat-like interaction for NeologismMiner.
@@ -6,14 +6,25 @@
 """
 
 import os
+import time
+import heapq
+import itertools
+import asyncio
+import inspect
+import queue
 import logging
+import contextlib
+import contextvars
 import concurrent.futures
-from typing import List, Dict, Any, Callable, Optional, Tuple
-from dataclasses import dataclass, field
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set, Tuple
+from dataclasses import dataclass, field, replace
 
+from scripts.app_settings import CPU_POOL_MIN_GLOSSARY_ENTRIES
 from scripts.core.glossary_manager import glossary_manager
+from scripts.core.cpu_stage import cpu_stage_pool, check_glossary_consistency, GlossaryCheckPayload
+from scripts.core.batch_planner import BatchPlanner
+from scripts.core.rate_limiter import ProviderLimiter, SlotLease, batch_slot
 from scripts.utils import i18n
-from scripts.app_settings import CHUNK_SIZE, GEMINI_CLI_CHUNK_SIZE
 
 
 @dataclass
@@ -36,6 +47,12 @@ class FileTask:
     client: Any  # API客户端
     mod_name: str  # 添加mod_name字段
     loc_root: str = "" # Localization root path (e.g. mod/main_menu/localization)
+    # 多目标语言模式：与 target_lang 在同一请求中一起翻译的其他目标语言
+    companion_langs: List[Dict[str, Any]] = field(default_factory=list)
+    # 流式结果中每个条目的来源 Provider ("" 表示回退为原文)，由 process_files_stream 填写
+    entry_providers: List[str] = field(default_factory=list)
+    # stable_prefix 提示词布局下按目标语言缓存的静态前缀 (见 base_handler.build_batch_prompt)
+    prompt_prefixes: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
 
 
 @dataclass
@@ -46,16 +63,125 @@ class BatchTask:
     start_index: int
     end_index: int
     texts: List[str]
+    # (file_idx, entry_index) of every text in `texts`. Batches packed across
+    # several small files carry one origin per entry so results can be routed back.
+    origins: List[Tuple[int, int]] = field(default_factory=list)
     translated_texts: Optional[List[str]] = field(default=None, init=False)
     failed: bool = field(default=False, init=False)
+    # Positions in `texts` that fell back to the source text while the rest of
+    # the batch succeeded (see BaseApiHandler bisecting retry).
+    failed_positions: List[int] = field(default_factory=list, init=False)
+    # Results for file_task.companion_langs, keyed by language code.
+    companion_results: Dict[str, List[str]] = field(default_factory=dict, init=False)
+    # Positions already handed over through publish_early_results.
+    published: Set[int] = field(default_factory=set, init=False, repr=False, compare=False)
+    # FileTask of every file packed into this batch, keyed by file_idx (packed batches only).
+    packed_files: Dict[int, FileTask] = field(default_factory=dict, repr=False, compare=False)
+    companion_failed: List[str] = field(default_factory=list, init=False)
+    companion_failed_positions: Dict[str, List[int]] = field(default_factory=dict, init=False)
+    # Provider that produced each position of `texts`; empty means file_task.provider_name
+    # produced the whole batch (a failover router or translation memory fills it in otherwise).
+    entry_providers: List[str] = field(default_factory=list, init=False)
+
+
+# Provenance labels for entries that did not come from an API call in this run
+PROVIDER_TRANSLATION_MEMORY = "translation_memory"
+PROVIDER_JOURNAL = "journal"
+
+# How often the stream loop checks for entries handed over before their batch has finished.
+_EARLY_RESULT_POLL_SECONDS = 0.1
+
+# 当前批次的提前交付通道 (由 ParallelProcessor 在调用翻译函数期间设置)
+early_results: contextvars.ContextVar = contextvars.ContextVar("early_results", default=None)
+
+
+def publish_early_results(batch_task: "BatchTask", items: Dict[int, str]):
+    """
+    Handler 调用：批次结束之前，把 batch_task 中已确定的条目 {position: text} 交给所属文件
+    (流式响应中已完成的条目、拆分后成功的一半)。文件的所有条目到齐后立即输出，不必等整个批次。
+    """
+    sink = early_results.get()
+    if sink is None or not batch_task.origins:
+        return
+    # 流中已交付的条目在请求成功后不再重复交付
+    items = {position: text for position, text in items.items() if position not in batch_task.published}
+    if items:
+        batch_task.published.update(items)
+        sink(batch_task, items)
 
 
 class ParallelProcessor:
     """批次级全局并行处理器 - 实现真正的批次级并行调度"""
 
-    def __init__(self, max_workers: int = 24):
+    def __init__(
+        self,
+        max_workers: int = 24,
+        batch_planner: Optional[BatchPlanner] = None,
+        pack_small_files: bool = False,
+        execution_mode: str = "thread",
+        max_concurrency: Optional[int] = None,
+        rate_limiter: Optional[ProviderLimiter] = None,
+        translation_memory: Any = None,
+        on_batch_complete: Optional[Callable[[BatchTask], None]] = None,
+        deduplicate: bool = False,
+        journal: Any = None,
+        scheduling: str = "lpt",
+        schedule_window: Optional[int] = None
+    ):
         self.max_workers = max_workers
+        # "thread": one OS thread per in-flight request (ThreadPoolExecutor).
+        # "async": requests are coroutines on a private event loop, so the number
+        # of in-flight requests (max_concurrency) is no longer tied to thread count.
+        if execution_mode not in ("thread", "async"):
+            raise ValueError(f"Unknown execution mode: {execution_mode}")
+        self.execution_mode = execution_mode
+        self.max_concurrency = max_concurrency or max_workers
+        # Consulted before every batch is sent; the handler reports 429s to the same limiter.
+        self.rate_limiter = rate_limiter
+        # TranslationMemorySession: hits are served locally, only misses reach translation_function.
+        self.translation_memory = translation_memory
+        # Called once per finished batch, including batches served entirely from memory.
+        self.on_batch_complete = on_batch_complete
+        # Identical texts (per provider/target language) are translated once per run
+        # and fanned out to every occurrence.
+        self.deduplicate = deduplicate
+        # BatchJournal: finished entries are appended as batches return and replayed
+        # on resume, so only the missing part of an interrupted file is dispatched.
+        self.journal = journal
+        # "lpt": ready batches are dispatched longest-estimated-first (tokens x the
+        # provider's latency model) so a big file found late doesn't set the makespan.
+        # "fifo": discovery order. Under "lpt", schedule_window bounds how many planned
+        # batches (ready + in flight) are held for ordering; default is 4x the in-flight
+        # limit. "fifo" gains nothing from looking ahead and plans only up to that limit.
+        if scheduling not in ("lpt", "fifo"):
+            raise ValueError(f"Unknown scheduling policy: {scheduling}")
+        self.scheduling = scheduling
+        self.schedule_window = schedule_window
+        self.schedule_stats: Dict[str, Any] = {}
+        self.dedup_stats = {"unique": 0, "duplicates": 0, "saved_tokens": 0}
+        # When enabled, entries of several files may share one request.
+        self.pack_small_files = pack_small_files
         self.logger = logging.getLogger(__name__)
+        # A shared planner keeps the batch boundaries identical to the totals
+        # the caller pre-computed for progress reporting.
+        self.batch_planner = batch_planner
+        self._planners: Dict[str, BatchPlanner] = {}
+        self.planned_batch_count = 0
+        # Entries handed over early by the handler, drained by process_files_stream
+        self._early_queue: Optional[queue.SimpleQueue] = None
+
+    def _get_planner(self, provider_name: str) -> BatchPlanner:
+        if self.batch_planner is not None:
+            return self.batch_planner
+        if provider_name not in self._planners:
+            self._planners[provider_name] = BatchPlanner.for_provider(provider_name)
+        return self._planners[provider_name]
+
+    def plan_file_batches(self, file_task: FileTask, texts: Optional[List[str]] = None) -> List[Tuple[int, int]]:
+        """Returns the token-budgeted (start, end) ranges for a file's texts (or a subset of them)."""
+        ranges = self._get_planner(file_task.provider_name).plan(file_task.texts_to_translate if texts is None else texts)
+        self.planned_batch_count += len(ranges)
+        return ranges
 
     def process_files_parallel(
         self,
@@ -78,28 +204,85 @@ class ParallelProcessor:
     def _create_batch_tasks(self, file_tasks: List[FileTask]) -> List[BatchTask]:
         batch_tasks = []
         global_batch_index = 0
-        
-        for file_task in file_tasks:
+
+        if self.pack_small_files:
+            # 跨文件打包：同一语言/Provider 的所有条目合并后统一规划
+            pack_buffers: Dict[Any, List[Tuple[FileTask, int, int]]] = {}
+            for file_idx, file_task in enumerate(file_tasks):
+                buffer = pack_buffers.setdefault(self._pack_key(file_task), [])
+                buffer.extend((file_task, file_idx, i) for i in range(len(file_task.texts_to_translate)))
+            for buffer in pack_buffers.values():
+                for batch_task in self._plan_packed_batches(buffer, flush=True):
+                    batch_task.batch_index = global_batch_index
+                    batch_tasks.append(batch_task)
+                    global_batch_index += 1
+            return batch_tasks
+
+        for file_idx, file_task in enumerate(file_tasks):
             if not file_task.texts_to_translate:
                 continue
 
-            chunk_size = GEMINI_CLI_CHUNK_SIZE if file_task.provider_name == "gemini_cli" else CHUNK_SIZE
-            
             texts = file_task.texts_to_translate
-            for i in range(0, len(texts), chunk_size):
-                batch_texts = texts[i:i + chunk_size]
+            for start, end in self.plan_file_batches(file_task):
                 batch_task = BatchTask(
                     file_task=file_task,
                     batch_index=global_batch_index,
-                    start_index=i,
-                    end_index=i + len(batch_texts),
-                    texts=batch_texts
+                    start_index=start,
+                    end_index=end,
+                    texts=texts[start:end],
+                    origins=[(file_idx, i) for i in range(start, end)]
                 )
                 batch_tasks.append(batch_task)
                 global_batch_index += 1
         
         return batch_tasks
 
+    @staticmethod
+    def _pack_key(file_task: FileTask) -> Tuple[Any, ...]:
+        """Entries can only share a request when provider and target language(s) match."""
+        return (
+            file_task.provider_name,
+            file_task.target_lang.get("code"),
+            tuple(lang.get("code") for lang in file_task.companion_langs)
+        )
+
+    def _plan_packed_batches(
+        self,
+        buffer: List[Tuple[FileTask, int, int]],
+        flush: bool
+    ) -> List[BatchTask]:
+        """
+        Cuts full batches off the front of a cross-file pack buffer.
+        The trailing, not-yet-full batch stays in `buffer` unless `flush` is set.
+        """
+        if not buffer:
+            return []
+
+        texts = [ft.texts_to_translate[idx] for ft, _, idx in buffer]
+        ranges = self._get_planner(buffer[0][0].provider_name).plan(texts)
+        if not flush:
+            ranges = ranges[:-1]
+
+        batch_tasks = []
+        for start, end in ranges:
+            entries = buffer[start:end]
+            batch_tasks.append(BatchTask(
+                file_task=entries[0][0],
+                batch_index=0,
+                # start/end are positions inside this packed batch; the real
+                # location of every text is carried by `origins`.
+                start_index=0,
+                end_index=end - start,
+                texts=texts[start:end],
+                origins=[(file_idx, idx) for _, file_idx, idx in entries],
+                packed_files={file_idx: ft for ft, file_idx, _ in entries}
+            ))
+
+        consumed = ranges[-1][1] if ranges else 0
+        del buffer[:consumed]
+        self.planned_batch_count += len(batch_tasks)
+        return batch_tasks
+
     def _process_batches_parallel(
         self,
         batch_tasks: List[BatchTask],
@@ -137,187 +320,638 @@ class ParallelProcessor:
         batch_task: BatchTask,
         translation_function: Callable
     ) -> Tuple[BatchTask, List[Dict[str, Any]]]:
-        warnings = []
-        processed_task = translation_function(batch_task)
+        hits, pending = {}, batch_task
+        if self.translation_memory is not None:
+            hits, pending = self.translation_memory.serve(batch_task)
+
+        translated = None
+        if pending is not None:
+            lease = None
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(self._estimate_batch_tokens(pending))
+                lease = SlotLease(self.rate_limiter)
+            token = batch_slot.set(lease)
+            sink_token = early_results.set(self._early_sink())
+            try:
+                translated = translation_function(pending)
+            finally:
+                early_results.reset(sink_token)
+                batch_slot.reset(token)
+                if lease is not None:
+                    lease.release(success=self._batch_succeeded(translated))
+
+        processed_task = translated
+        if self.translation_memory is not None:
+            processed_task = self.translation_memory.complete(batch_task, hits, translated)
+        if self.on_batch_complete is not None:
+            self.on_batch_complete(processed_task)
+        return processed_task, self._validate_batch(processed_task)
+
+    async def _process_single_batch_async(
+        self,
+        batch_task: BatchTask,
+        translation_function: Callable,
+        semaphore: asyncio.Semaphore
+    ) -> Tuple[BatchTask, List[Dict[str, Any]]]:
+        """Async counterpart of _process_single_batch; accepts coroutine or plain translation functions."""
+        hits, pending = {}, batch_task
+        if self.translation_memory is not None:
+            hits, pending = await asyncio.to_thread(self.translation_memory.serve, batch_task)
 
+        translated = None
+        if pending is not None:
+            async with semaphore:
+                lease = None
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire_async(self._estimate_batch_tokens(pending))
+                    lease = SlotLease(self.rate_limiter)
+                token = batch_slot.set(lease)
+                sink_token = early_results.set(self._early_sink())
+                try:
+                    if inspect.iscoroutinefunction(translation_function):
+                        translated = await translation_function(pending)
+                    else:
+                        translated = await asyncio.to_thread(translation_function, pending)
+                finally:
+                    early_results.reset(sink_token)
+                    batch_slot.reset(token)
+                    if lease is not None:
+                        lease.release(success=self._batch_succeeded(translated))
+
+        processed_task = translated
+        if self.translation_memory is not None:
+            processed_task = await asyncio.to_thread(self.translation_memory.complete, batch_task, hits, translated)
+        if self.on_batch_complete is not None:
+            self.on_batch_complete(processed_task)
+        return processed_task, await asyncio.to_thread(self._validate_batch, processed_task)
+
+    def _early_sink(self) -> Optional[Callable[[BatchTask, Dict[int, str]], None]]:
+        """Callback behind publish_early_results while a stream is running, else None."""
+        early_queue = self._early_queue
+        if early_queue is None:
+            return None
+
+        def sink(batch_task: BatchTask, items: Dict[int, str]):
+            provider = batch_task.file_task.provider_name
+            early_queue.put([
+                (batch_task.origins[position], batch_task.texts[position], text, provider, batch_task.batch_index)
+                for position, text in items.items() if position < len(batch_task.origins)
+            ])
+        return sink
+
+    @staticmethod
+    def _batch_succeeded(processed_task: Optional[BatchTask]) -> bool:
+        return processed_task is not None and processed_task.translated_texts is not None and not processed_task.failed
+
+    def _estimate_batch_seconds(self, batch_task: BatchTask) -> float:
+        """Estimated request wall time, the scheduling cost of a batch."""
+        return self._get_planner(batch_task.file_task.provider_name).estimate_request_seconds(batch_task.texts)
+
+    def _log_schedule_stats(self):
+        completions = sorted(seconds for _, _, seconds in self.schedule_stats["file_completion_seconds"])
+        if not completions:
+            return
+        mean = sum(completions) / len(completions)
+        p95 = completions[min(len(completions) - 1, int(len(completions) * 0.95))]
+        self.logger.info(
+            f"Schedule ({self.scheduling}): makespan {self.schedule_stats['makespan_seconds']:.1f}s, "
+            f"{len(completions)} file results, completion mean {mean:.1f}s / p95 {p95:.1f}s"
+        )
+
+    def _estimate_batch_tokens(self, batch_task: BatchTask) -> int:
+        """Estimated prompt + output tokens of a batch, charged against the TPM budget."""
+        input_tokens, output_tokens = self._get_planner(batch_task.file_task.provider_name).estimate_request_tokens(batch_task.texts)
+        return input_tokens + output_tokens
+
+    def _validate_batch(self, processed_task: BatchTask) -> List[Dict[str, Any]]:
+        """
+        Post-translation glossary validation. Marks the task failed if it has no result.
+        Each origin file of a packed batch is checked on its own entries, and its
+        warnings carry that file's name and `file_idx` so they can be routed back.
+        """
+        warnings = []
         if processed_task.translated_texts is None:
             processed_task.failed = True
-            return processed_task, warnings
+            return warnings
 
         # Post-translation validation
         glossary = glossary_manager.get_glossary_for_translation()
         if glossary:
-            simple_glossary = {}
-            source_lang_code = processed_task.file_task.source_lang.get("code")
-            target_lang_code = processed_task.file_task.target_lang.get("code")
-            if source_lang_code and target_lang_code and 'entries' in glossary:
-                for entry in glossary.get('entries', []):
-                    translations = entry.get('translations', {})
-                    source_term = translations.get(source_lang_code)
-                    target_term = translations.get(target_lang_code)
-                    if source_term and target_term and isinstance(source_term, str) and isinstance(target_term, str):
-                        simple_glossary[source_term] = target_term
-            if simple_glossary:
-                from scripts.utils.glossary_validator import GlossaryValidator
-                validator = GlossaryValidator()
-                validation_warnings = validator.validate_batch(processed_task, simple_glossary)
-                if validation_warnings:
-                    warnings.extend(validation_warnings)
-
-        return processed_task, warnings
+            # positions of every origin file, in batch order
+            segments: Dict[Optional[int], List[int]] = {}
+            for position in range(len(processed_task.texts)):
+                origin = processed_task.origins[position] if position < len(processed_task.origins) else None
+                segments.setdefault(origin[0] if origin else None, []).append(position)
+
+            simple_glossaries: Dict[Tuple[Any, Any], Any] = {}
+            for file_idx, positions in segments.items():
+                file_task = processed_task.packed_files.get(file_idx, processed_task.file_task)
+                validation_warnings = self._check_glossary(
+                    glossary, file_task, processed_task.batch_index,
+                    [processed_task.texts[p] for p in positions],
+                    [processed_task.translated_texts[p] for p in positions],
+                    simple_glossaries
+                )
+                for warning in validation_warnings:
+                    warning["file_idx"] = file_idx
+                warnings.extend(validation_warnings)
+
+        return warnings
+
+    def _check_glossary(
+        self,
+        glossary: Dict[str, Any],
+        file_task: FileTask,
+        batch_index: int,
+        texts: List[str],
+        translated_texts: List[str],
+        simple_glossaries: Optional[Dict[Tuple[Any, Any], Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Glossary consistency warnings for one file's entries of a batch."""
+        from scripts.utils.glossary_validator import GlossaryValidator
+        source_lang_code = file_task.source_lang.get("code")
+        target_lang_code = file_task.target_lang.get("code")
+        simple_glossaries = {} if simple_glossaries is None else simple_glossaries
+
+        def validate_in_thread():
+            key = (source_lang_code, target_lang_code)
+            if key not in simple_glossaries:
+                simple_glossaries[key] = GlossaryValidator.simple_glossary(glossary, source_lang_code, target_lang_code)
+            if not simple_glossaries[key]:
+                return []
+            return GlossaryValidator().validate_texts(
+                texts, translated_texts, simple_glossaries[key], source_lang_code or "", target_lang_code or "",
+                file_task.filename, batch_index
+            )
+
+        if cpu_stage_pool.enabled and len(glossary['entries']) >= CPU_POOL_MIN_GLOSSARY_ENTRIES and source_lang_code and target_lang_code:
+            payload = GlossaryCheckPayload(
+                filename=file_task.filename, batch_index=batch_index,
+                source_lang=source_lang_code, target_lang=target_lang_code,
+                texts=texts, translated_texts=translated_texts
+            )
+            return cpu_stage_pool.run(
+                check_glossary_consistency, payload, fallback=validate_in_thread,
+                context=(glossary, glossary_manager.fuzzy_matching_mode)
+            )
+        return validate_in_thread()
+
+    @contextlib.contextmanager
+    def _open_dispatcher(self, translation_function: Callable):
+        """
+        Yields (start, wait_first, pending_limit) for the configured execution mode.
+        `start(batch_task)` returns a future-like object with `.result()`;
+        `wait_first(futures, timeout)` blocks until at least one of them is done (or the timeout passes)
+        and returns the done set.
+        """
+        if self.execution_mode == "thread":
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                def start(batch_task: BatchTask):
+                    return executor.submit(self._process_single_batch, batch_task, translation_function)
+
+                def wait_first(futures, timeout=None):
+                    done, _ = concurrent.futures.wait(futures, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+                    return done
+
+                yield start, wait_first, self.max_workers * 4
+            return
+
+        # The stream is consumed synchronously by the caller, so the event loop is
+        # private to this call and only runs while we wait for the next result.
+        loop = asyncio.new_event_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        def start(batch_task: BatchTask):
+            return loop.create_task(self._process_single_batch_async(batch_task, translation_function, semaphore))
+
+        def wait_first(futures, timeout=None):
+            done, _ = loop.run_until_complete(asyncio.wait(futures, timeout=timeout, return_when=asyncio.FIRST_COMPLETED))
+            return done
+
+        try:
+            yield start, wait_first, self.max_concurrency * 2
+        finally:
+            pending = [task for task in asyncio.all_tasks(loop) if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
 
     def process_files_stream(
         self,
         file_tasks_generator: Any, # Iterator[FileTask]
         translation_function: Callable
-    ) -> Any: # Iterator[Tuple[str, List[str], List[Dict[str, Any]]]]
+    ) -> Any: # Iterator[Tuple[FileTask, List[str], List[Dict[str, Any]], bool]]
         """
         Stream processing of files.
-        Yields (filename, translated_texts, warnings) as soon as a file is completed.
+        Yields (file_task, translated_texts, warnings, failed) as soon as every entry
+        of a file has come back, even when its entries were packed together with
+        entries of other files. Entries the handler hands over before its batch has
+        finished (publish_early_results) count as come back.
         """
-        # Buffer to hold incomplete file batches: {filename: {batch_index: BatchTask}}
-        file_buffers: Dict[str, Dict[int, BatchTask]] = {}
-        # Track total batches expected per file: {filename: total_batches}
-        file_batch_counts: Dict[str, int] = {}
-        
-        # We need a way to map futures back to their file and batch index
-        # But since we are consuming a generator, we can't submit everything at once if we want to be lazy?
-        # Actually, for "streaming" input, we should submit as we consume.
-        # But we also need to yield results as they complete.
-        
-        # Use a bounded executor or semaphore to prevent submitting too many tasks at once if the generator is infinite?
-        # For now, assuming the generator yields all files, but we want to process them in parallel and yield results ASAP.
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # We need to manage submission and completion simultaneously.
-            # Since we can't easily "select" on both generator and futures, 
-            # we can submit all tasks (if memory allows) or use a separate thread for submission.
-            # Given the requirement is to reduce memory usage, we shouldn't generate ALL BatchTasks at once if there are millions.
-            # But typically we have thousands. 
-            
-            # However, the main memory bottleneck is loading ALL file contents into memory.
-            # The `file_tasks_generator` should yield FileTasks one by one (reading file content on demand).
-            
-            future_to_info = {}
-            
-            # Helper to submit batches for a file
-            def submit_file(file_task: FileTask):
-                if not file_task.texts_to_translate:
-                    # Handle empty file immediately
-                    return True, (file_task.filename, [], [])
-                
-                chunk_size = GEMINI_CLI_CHUNK_SIZE if file_task.provider_name == "gemini_cli" else CHUNK_SIZE
+        # Per-file result slots, keyed by the order in which files were consumed.
+        file_states: Dict[int, _FileState] = {}
+        # Cross-file pack buffers: {pack_key: [(file_task, file_idx, entry_idx), ...]}
+        pack_buffers: Dict[Any, List[Tuple[FileTask, int, int]]] = {}
+        # Run-wide dedup index: {(pack_key, text): _DedupEntry}
+        dedup_index = _DedupIndex()
+        self.dedup_stats = {"unique": 0, "duplicates": 0, "saved_tokens": 0}
+
+        started_at = time.monotonic()
+        self.schedule_stats = {"policy": self.scheduling, "makespan_seconds": 0.0, "file_completion_seconds": []}
+
+        early_queue = self._early_queue = queue.SimpleQueue()
+        # Files yielded before every batch they were handed over from came back:
+        # {file_idx: (filename, {entry_idx: text written})}
+        finished_early: Dict[int, Tuple[str, Dict[int, str]]] = {}
+
+        def drain_early_results() -> List[int]:
+            completed = []
+            while True:
+                try:
+                    entries = early_queue.get_nowait()
+                except queue.Empty:
+                    return list(dict.fromkeys(completed))
+                completed.extend(self._apply_early_results(entries, file_states, dedup_index))
+
+        def finish(file_idx: int, state: "_FileState"):
+            if state.unsettled:
+                # Their batch is still out, so validate what is about to be written here
+                state.warnings.extend(self._validate_early_entries(file_idx, state))
+                finished_early[file_idx] = (state.file_task.filename, {i: state.results[i] for i in state.unsettled})
+            self.schedule_stats["file_completion_seconds"].append(
+                (state.file_task.filename, state.file_task.target_lang.get("code"), time.monotonic() - started_at)
+            )
+            return state.stream_results()
+
+        with self._open_dispatcher(translation_function) as (start, wait_first, pending_limit):
+            future_to_batch: Dict[Any, BatchTask] = {}
+            # Planned but not yet dispatched: (-estimated_seconds, sequence, batch_task)
+            ready: List[Tuple[float, int, BatchTask]] = []
+            sequence = itertools.count()
+
+            def submit(batch_task: BatchTask):
+                cost = self._estimate_batch_seconds(batch_task) if self.scheduling == "lpt" else 0.0
+                heapq.heappush(ready, (-cost, next(sequence), batch_task))
+
+            def submit_file(file_idx: int, file_task: FileTask) -> List[int]:
+                """Plans and submits a file's batches. Returns files already complete (journaled or all duplicates)."""
                 texts = file_task.texts_to_translate
-                total_batches = (len(texts) + chunk_size - 1) // chunk_size
-                file_batch_counts[file_task.filename] = total_batches
-                file_buffers[file_task.filename] = {}
-                
-                for i in range(0, len(texts), chunk_size):
-                    batch_texts = texts[i:i + chunk_size]
-                    batch_index = i // chunk_size
-                    
-                    batch_task = BatchTask(
+                file_states[file_idx] = _FileState.for_file(file_task)
+
+                indices = list(range(len(texts)))
+                if self.journal is not None:
+                    indices = self._replay_journal(file_idx, file_task, file_states, dedup_index if self.deduplicate else None)
+                if self.deduplicate:
+                    indices = self._deduplicate_file(file_idx, file_task, file_states, dedup_index, indices)
+                completed = [file_idx] if file_states[file_idx].remaining == 0 else []
+
+                if self.pack_small_files:
+                    buffer = pack_buffers.setdefault(self._pack_key(file_task), [])
+                    buffer.extend((file_task, file_idx, i) for i in indices)
+                    for batch_task in self._plan_packed_batches(buffer, flush=False):
+                        submit(batch_task)
+                    return completed
+
+                subset = [texts[i] for i in indices]
+                for batch_index, (start, end) in enumerate(self.plan_file_batches(file_task, subset)):
+                    submit(BatchTask(
                         file_task=file_task,
                         batch_index=batch_index,
-                        start_index=i,
-                        end_index=i + len(batch_texts),
-                        texts=batch_texts
-                    )
-                    
-                    future = executor.submit(self._process_single_batch, batch_task, translation_function)
-                    future_to_info[future] = (file_task.filename, batch_index, batch_task)
-                return False, None
-
-            # We iterate through the generator and submit tasks. 
-            # To avoid loading EVERYTHING, we can't just loop to end.
-            # But `as_completed` requires a set of futures.
-            
-            # Strategy: 
-            # 1. Submit a chunk of files.
-            # 2. Loop while there are pending futures.
-            # 3. In the loop, check for completed futures.
-            # 4. Also try to submit more files if we have capacity (optional, for now let's just submit all or use a smart loop).
-            
-            # Simpler approach for V1: 
-            # The generator yields FileTasks. We iterate it.
-            # If we just iterate and submit, we still hold all Futures in memory. 
-            # But Futures are small. The FileTask content is what's big.
-            # Wait, `BatchTask` holds reference to `FileTask`. 
-            # So if we submit all, we hold all FileTasks in memory. That defeats the purpose.
-            
-            # So we MUST limit the number of active files/batches.
-            MAX_PENDING_BATCHES = self.max_workers * 4
-            pending_batches_count = 0
-            
+                        start_index=indices[start],
+                        end_index=indices[end - 1] + 1,
+                        texts=subset[start:end],
+                        origins=[(file_idx, i) for i in indices[start:end]]
+                    ))
+                return completed
+
+            def flush_pack_buffers():
+                for buffer in pack_buffers.values():
+                    for batch_task in self._plan_packed_batches(buffer, flush=True):
+                        submit(batch_task)
+
+            # Bound the amount of in-flight work so that only a window of
+            # FileTasks (and their contents) is held in memory at once.
+            MAX_PENDING_BATCHES = pending_limit
+            if self.scheduling == "lpt":
+                window = self.schedule_window or pending_limit * 4
+            else:
+                window = MAX_PENDING_BATCHES
+
             iterator = iter(file_tasks_generator)
             done_consuming = False
-            
-            while not done_consuming or future_to_info:
-                # 1. Submit new tasks if we have capacity
-                while not done_consuming and pending_batches_count < MAX_PENDING_BATCHES:
+            next_file_idx = 0
+
+            while not done_consuming or future_to_batch or ready:
+                # 1. Plan new files while the scheduling window has room
+                while not done_consuming and len(ready) + len(future_to_batch) < max(window, MAX_PENDING_BATCHES):
                     try:
                         file_task = next(iterator)
-                        is_empty, empty_result = submit_file(file_task)
-                        if is_empty:
-                            yield empty_result
-                        else:
-                            # Update pending count
-                            pending_batches_count += file_batch_counts[file_task.filename]
                     except StopIteration:
                         done_consuming = True
-                
-                # 2. Wait for at least one future to complete
-                if future_to_info:
-                    # wait for first completed
-                    done, _ = concurrent.futures.wait(
-                        future_to_info.keys(), 
-                        return_when=concurrent.futures.FIRST_COMPLETED
-                    )
-                    
-                    for future in done:
-                        filename, batch_index, batch_task = future_to_info.pop(future)
-                        pending_batches_count -= 1
-                        
-                        try:
-                            processed_task, warnings = future.result()
-                        except Exception as e:
-                            self.logger.error(f"Critical error in batch processing thread for {filename} batch {batch_index}: {e}")
-                            # Create a failed task result so the file logic can progress
-                            batch_task.failed = True
-                            batch_task.translated_texts = batch_task.texts
-                            processed_task = batch_task
-
-                        if filename not in file_buffers:
-                            continue
-                            
-                        file_buffers[filename][batch_index] = processed_task
-                        
-                        # Check if file is complete (all batches accounted for, even if failed)
-                        if len(file_buffers[filename]) == file_batch_counts[filename]:
-                            # Assemble file
-                            sorted_batches = [file_buffers[filename][i] for i in range(file_batch_counts[filename])]
-                            
-                            # Get the FileTask from the first batch (all batches share the same FileTask reference)
-                            # We need this to return the full context (original lines, etc.)
-                            file_task_ref = sorted_batches[0].file_task
-                            
-                            full_translated_texts = []
-                            file_failed = False
-                            
-                            for task in sorted_batches:
-                                if task.failed:
-                                    file_failed = True
-                                full_translated_texts.extend(task.translated_texts or [])
-                            
-                            if file_failed:
-                                self.logger.error(f"File {filename} incomplete or failed.")
-                                yield (file_task_ref, full_translated_texts, [], True) # Fourth item is 'failed' flag
-                            else:
-                                yield (file_task_ref, full_translated_texts, [], False)
-                            
-                            # Cleanup
-                            del file_buffers[filename]
-                            del file_batch_counts[filename]
+                        flush_pack_buffers()
+                        break
+
+                    if not file_task.texts_to_translate:
+                        # Handle empty file immediately
+                        yield from _FileState.for_file(file_task).stream_results()
+                        continue
+
+                    completed = submit_file(next_file_idx, file_task)
+                    next_file_idx += 1
+                    for file_idx in completed:
+                        yield from finish(file_idx, file_states.pop(file_idx))
+
+                # 2. Dispatch the most expensive ready batches up to the in-flight limit
+                while ready and len(future_to_batch) < MAX_PENDING_BATCHES:
+                    _, _, batch_task = heapq.heappop(ready)
+                    future_to_batch[start(batch_task)] = batch_task
+
+                if not future_to_batch:
+                    continue
+
+                # 3. Wait for at least one future to complete, taking over entries handed over early meanwhile
+                done = wait_first(list(future_to_batch.keys()), timeout=_EARLY_RESULT_POLL_SECONDS)
+                for file_idx in drain_early_results():
+                    yield from finish(file_idx, file_states.pop(file_idx))
+
+                for future in done:
+                    batch_task = future_to_batch.pop(future)
+
+                    try:
+                        processed_task, warnings = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Critical error in batch processing thread for {batch_task.file_task.filename} batch {batch_task.batch_index}: {e}")
+                        # Create a failed task result so the file logic can progress
+                        batch_task.failed = True
+                        batch_task.translated_texts = batch_task.texts
+                        processed_task, warnings = batch_task, []
+
+                    completed = self._scatter_batch(processed_task, file_states, warnings, dedup_index, finished_early)
+                    if self.journal is not None:
+                        self._journal_batch(processed_task, file_states)
+                    for file_idx in completed:
+                        state = file_states.pop(file_idx)
+                        if state.failed:
+                            self.logger.error(f"File {state.file_task.filename} incomplete or failed.")
+                        # One (file_task, results, warnings, failed) tuple per target language
+                        yield from finish(file_idx, state)
+
+        self._early_queue = None
+        self.schedule_stats["makespan_seconds"] = time.monotonic() - started_at
+        self._log_schedule_stats()
+
+    def _replay_journal(
+        self,
+        file_idx: int,
+        file_task: FileTask,
+        file_states: Dict[int, "_FileState"],
+        dedup_index: Optional["_DedupIndex"]
+    ) -> List[int]:
+        """
+        Fills the entries a previous, interrupted run already translated for every
+        target language of the file. Returns the indices that still need translating.
+        """
+        texts = file_task.texts_to_translate
+        languages = [file_task.target_lang] + list(file_task.companion_langs)
+        replayed = [self.journal.replay(file_task.filename, lang.get("code"), texts) for lang in languages]
+        if not all(replayed):
+            return list(range(len(texts)))
+
+        state = file_states[file_idx]
+        pack_key = self._pack_key(file_task)
+        indices = []
+        for i, text in enumerate(texts):
+            if not all(i in found for found in replayed):
+                indices.append(i)
+                continue
+            outcome = _EntryOutcome(
+                source=text,
+                text=replayed[0][i],
+                failed=False,
+                companions={lang.get("code"): found[i] for lang, found in zip(languages[1:], replayed[1:])},
+                provider=PROVIDER_JOURNAL
+            )
+            state.apply(i, outcome)
+            if dedup_index is not None and (pack_key, text) not in dedup_index.entries:
+                dedup_index.entries[(pack_key, text)] = _DedupEntry(leader=(file_idx, i), outcome=outcome)
+
+        if len(indices) < len(texts):
+            self.logger.info(f"Resumed {len(texts) - len(indices)}/{len(texts)} entries of {file_task.filename} from the batch journal.")
+        return indices
+
+    def _journal_batch(self, batch_task: BatchTask, file_states: Dict[int, "_FileState"]):
+        """Appends the successfully translated entries of a finished batch, one record per file and language."""
+        by_file: Dict[int, List[Tuple[int, "_EntryOutcome"]]] = {}
+        for (file_idx, entry_idx), outcome in zip(batch_task.origins, self._batch_outcomes(batch_task)):
+            if outcome.failed or outcome.failed_companions:
+                continue
+            by_file.setdefault(file_idx, []).append((entry_idx, outcome))
+
+        for file_idx, entries in by_file.items():
+            state = file_states.get(file_idx)
+            if state is None:
+                continue
+            file_task = state.file_task
+            languages = [file_task.target_lang] + list(file_task.companion_langs)
+            if any(lang.get("code") not in entries[0][1].companions for lang in languages[1:]):
+                # A companion language fell back to the source text; nothing to resume from.
+                continue
+            indices = [entry_idx for entry_idx, _ in entries]
+            sources = [outcome.source for _, outcome in entries]
+            self.journal.record(file_task.filename, file_task.target_lang.get("code"), batch_task.batch_index,
+                                indices, sources, [outcome.text for _, outcome in entries])
+            for lang in languages[1:]:
+                code = lang.get("code")
+                self.journal.record(file_task.filename, code, batch_task.batch_index,
+                                    indices, sources, [outcome.companions[code] for _, outcome in entries])
+
+    def _deduplicate_file(
+        self,
+        file_idx: int,
+        file_task: FileTask,
+        file_states: Dict[int, "_FileState"],
+        dedup_index: "_DedupIndex",
+        indices: List[int]
+    ) -> List[int]:
+        """
+        Registers a file's pending entries in the dedup index.
+        Returns the indices that still need translating; duplicates of known results are filled in directly.
+        """
+        pack_key = self._pack_key(file_task)
+        planner = self._get_planner(file_task.provider_name)
+        state = file_states[file_idx]
+        texts = file_task.texts_to_translate
+        pending = []
+        for i in indices:
+            text = texts[i]
+            entry = dedup_index.entries.get((pack_key, text))
+            if entry is None:
+                dedup_index.entries[(pack_key, text)] = _DedupEntry(leader=(file_idx, i))
+                dedup_index.leaders[(file_idx, i)] = (pack_key, text)
+                pending.append(i)
+                self.dedup_stats["unique"] += 1
+                continue
+
+            self.dedup_stats["duplicates"] += 1
+            self.dedup_stats["saved_tokens"] += sum(planner.entry_cost(text))
+            if entry.outcome is not None:
+                state.apply(i, entry.outcome)
+            else:
+                entry.followers.append((file_idx, i))
+
+        return pending
+
+    @staticmethod
+    def _batch_outcomes(batch_task: BatchTask) -> List["_EntryOutcome"]:
+        """Per-entry results of a finished batch, with source-text fallback for anything missing."""
+        translated = batch_task.translated_texts or batch_task.texts
+        if len(translated) != len(batch_task.texts):
+            batch_task.failed = True
+            translated = batch_task.texts
+
+        usable_companions = {
+            code: texts for code, texts in batch_task.companion_results.items()
+            if texts is not None and len(texts) == len(batch_task.texts) and code not in batch_task.companion_failed
+        }
+        failed_positions = set(batch_task.failed_positions)
+        companion_failed_positions = {code: set(positions) for code, positions in batch_task.companion_failed_positions.items()}
+        providers = batch_task.entry_providers
+        if len(providers) != len(batch_task.texts):
+            providers = [batch_task.file_task.provider_name] * len(batch_task.texts)
+        return [
+            _EntryOutcome(
+                source=source,
+                text=text,
+                failed=batch_task.failed or position in failed_positions,
+                companions={code: texts[position] for code, texts in usable_companions.items()},
+                failed_companions=[code for code, positions in companion_failed_positions.items() if position in positions],
+                provider=providers[position]
+            )
+            for position, (source, text) in enumerate(zip(batch_task.texts, translated))
+        ]
+
+    @staticmethod
+    def _apply_early_results(
+        entries: List[Tuple[Tuple[int, int], str, str, str, int]],
+        file_states: Dict[int, "_FileState"],
+        dedup_index: Optional["_DedupIndex"]
+    ) -> List[int]:
+        """
+        Fills entry slots from (origin, source, text, provider, batch_index) handed over before their batch finished.
+        Files with companion languages wait for the whole batch, which carries every language.
+        Returns the indices of files whose entries are now all accounted for.
+        """
+        touched = []
+        for origin, source, text, provider, batch_index in entries:
+            state = file_states.get(origin[0])
+            if state is None or state.companion_results:
+                continue
+            outcome = _EntryOutcome(source=source, text=text, failed=False, companions={}, provider=provider)
+            targets = [origin]
+            if dedup_index is not None and origin in dedup_index.leaders:
+                entry = dedup_index.entries[dedup_index.leaders.pop(origin)]
+                entry.outcome = outcome
+                targets.extend(entry.followers)
+                entry.followers = []
+            for file_idx, entry_idx in targets:
+                target_state = file_states.get(file_idx)
+                if target_state is not None:
+                    # Only the entry that was actually sent waits for its batch; dedup followers are copies
+                    if target_state.apply(entry_idx, outcome, early=True) and (file_idx, entry_idx) == origin:
+                        target_state.unsettled[entry_idx] = batch_index
+                    touched.append(file_idx)
+        return [file_idx for file_idx in dict.fromkeys(touched) if file_states[file_idx].remaining == 0]
+
+    def _validate_early_entries(self, file_idx: int, state: "_FileState") -> List[Dict[str, Any]]:
+        """Glossary warnings for a file's early entries whose batch has not been validated yet."""
+        glossary = glossary_manager.get_glossary_for_translation()
+        if not glossary:
+            return []
+        by_batch: Dict[int, List[int]] = {}
+        for entry_idx, batch_index in state.unsettled.items():
+            by_batch.setdefault(batch_index, []).append(entry_idx)
+
+        warnings = []
+        simple_glossaries: Dict[Tuple[Any, Any], Any] = {}
+        for batch_index, entry_indices in by_batch.items():
+            entry_indices.sort()
+            batch_warnings = self._check_glossary(
+                glossary, state.file_task, batch_index,
+                [state.file_task.texts_to_translate[i] for i in entry_indices],
+                [state.results[i] for i in entry_indices],
+                simple_glossaries
+            )
+            for warning in batch_warnings:
+                warning["file_idx"] = file_idx
+            warnings.extend(batch_warnings)
+        return warnings
+
+    def _settle_finished_entry(
+        self,
+        origin: Tuple[int, int],
+        outcome: "_EntryOutcome",
+        finished_early: Dict[int, Tuple[str, Dict[int, str]]]
+    ):
+        """Reports a final batch text that differs from the one already written for a file finished early."""
+        file_idx, entry_idx = origin
+        filename, written = finished_early[file_idx]
+        if entry_idx in written:
+            text = written.pop(entry_idx)
+            if not outcome.failed and outcome.text != text:
+                self.logger.warning(
+                    f"File {filename} entry {entry_idx}: final batch text differs from the streamed text "
+                    f"already written; keeping the streamed text."
+                )
+        if not written:
+            del finished_early[file_idx]
+
+    def _scatter_batch(
+        self,
+        batch_task: BatchTask,
+        file_states: Dict[int, "_FileState"],
+        warnings: List[Dict[str, Any]],
+        dedup_index: Optional["_DedupIndex"] = None,
+        finished_early: Optional[Dict[int, Tuple[str, Dict[int, str]]]] = None
+    ) -> List[int]:
+        """
+        Demultiplexes a finished batch back into per-file result slots, fanning
+        deduplicated entries out to every occurrence.
+        Entries of files already yielded from early hand-offs are only checked against
+        what was written; their warnings were raised when the file finished.
+        Returns the indices of files whose entries are now all accounted for.
+        """
+        touched = []
+        for origin, outcome in zip(batch_task.origins, self._batch_outcomes(batch_task)):
+            if finished_early and origin[0] in finished_early:
+                self._settle_finished_entry(origin, outcome, finished_early)
+            targets = [origin]
+            if dedup_index is not None and origin in dedup_index.leaders:
+                entry = dedup_index.entries[dedup_index.leaders.pop(origin)]
+                entry.outcome = outcome
+                targets.extend(entry.followers)
+                entry.followers = []
+
+            for file_idx, entry_idx in targets:
+                state = file_states.get(file_idx)
+                if state is None:
+                    continue
+                state.apply(entry_idx, outcome)
+                if not touched or touched[-1] != file_idx:
+                    touched.append(file_idx)
+
+        for warning in warnings:
+            # _validate_batch tags each warning with the file whose entries it was found in
+            file_idx = warning.get("file_idx")
+            if file_idx is None and touched:
+                file_idx = touched[0]
+            state = file_states.get(file_idx)
+            if state is not None:
+                state.warnings.append(warning)
+
+        return [file_idx for file_idx in dict.fromkeys(touched) if file_states[file_idx].remaining == 0]
 
     def _collect_file_results(
         self,
@@ -325,41 +959,131 @@ class ParallelProcessor:
         batch_results: Dict[Tuple[str, int], BatchTask]
     ) -> Dict[str, List[str]]:
         file_results = {}
-        
-        grouped_batch_results: Dict[str, Dict[int, BatchTask]] = {}
-        for (filename, batch_idx), task in batch_results.items():
-            if filename not in grouped_batch_results:
-                grouped_batch_results[filename] = {}
-            grouped_batch_results[filename][batch_idx] = task
-        
-        for file_task in file_tasks:
+
+        file_states = {
+            file_idx: _FileState.for_file(file_task)
+            for file_idx, file_task in enumerate(file_tasks)
+        }
+        for task in batch_results.values():
+            self._scatter_batch(task, file_states, [])
+
+        for state in file_states.values():
+            file_task = state.file_task
             if not file_task.texts_to_translate:
                 file_results[file_task.filename] = []
                 continue
 
-            file_translated_texts = []
-            file_failed = False
-            
-            file_batches = grouped_batch_results.get(file_task.filename, {})
-            # Check if we have all batches
-            # In the original code, we didn't strictly check if we have ALL batches, 
-            # but we iterated sorted keys. 
-            # If a batch was missing (e.g. exception), it would be skipped, length mismatch -> fallback.
-            
-            sorted_batch_indices = sorted(file_batches.keys())
-
-            for batch_idx in sorted_batch_indices:
-                task = file_batches[batch_idx]
-                if task.failed:
-                    file_failed = True
-                    break
-                file_translated_texts.extend(task.translated_texts)
-
-            if file_failed or len(file_translated_texts) != len(file_task.texts_to_translate):
+            # A missing batch (e.g. exception) leaves empty slots -> fallback.
+            if state.failed or state.remaining != 0:
                 self.logger.error(f"File translation failed for {file_task.filename}, using fallback.")
                 file_results[file_task.filename] = file_task.texts_to_translate
             else:
-                file_results[file_task.filename] = file_translated_texts
+                file_results[file_task.filename] = state.results
                 self.logger.info(i18n.t("file_translation_completed", filename=file_task.filename))
 
         return file_results
+
+
+@dataclass
+class _FileState:
+    """流式处理中单个文件的结果槽位"""
+    file_task: FileTask
+    results: List[Optional[str]]
+    remaining: int
+    failed: bool = False
+    warnings: List[Dict[str, Any]] = field(default_factory=list)
+    companion_results: Dict[str, List[Optional[str]]] = field(default_factory=dict)
+    companion_failed: set = field(default_factory=set)
+    # Provider of every entry slot, per language ("" where the source text was kept)
+    providers: List[str] = field(default_factory=list)
+    companion_providers: Dict[str, List[str]] = field(default_factory=dict)
+    # Entries filled before their batch finished (publish_early_results)
+    early: set = field(default_factory=set)
+    # Early entries whose own batch has not come back yet: {entry_idx: batch_index}
+    unsettled: Dict[int, int] = field(default_factory=dict)
+
+    @classmethod
+    def for_file(cls, file_task: FileTask) -> "_FileState":
+        count = len(file_task.texts_to_translate)
+        return cls(
+            file_task=file_task,
+            results=[None] * count,
+            remaining=count,
+            companion_results={lang.get("code"): [None] * count for lang in file_task.companion_langs},
+            providers=[""] * count,
+            companion_providers={lang.get("code"): [""] * count for lang in file_task.companion_langs}
+        )
+
+    def apply(self, entry_idx: int, outcome: "_EntryOutcome", early: bool = False) -> bool:
+        """
+        Fills one entry slot (and its companion-language slots) from a batch outcome.
+        Returns True if an early hand-off filled the slot.
+        """
+        if early and self.results[entry_idx] is not None:
+            # A late hand-off (e.g. from a losing hedged stream) never replaces an entry that is already filled
+            return False
+        if entry_idx in self.early:
+            # Already counted when it was handed over early; the batch's final text wins unless it fell back to the source.
+            if not outcome.failed:
+                self.results[entry_idx] = outcome.text
+                self.providers[entry_idx] = outcome.provider
+            self.unsettled.pop(entry_idx, None)
+            return False
+        if early:
+            self.early.add(entry_idx)
+        self.results[entry_idx] = outcome.text
+        self.providers[entry_idx] = "" if outcome.failed else outcome.provider
+        self.remaining -= 1
+        if outcome.failed:
+            self.failed = True
+        for code, slots in self.companion_results.items():
+            if code in outcome.companions:
+                slots[entry_idx] = outcome.companions[code]
+                if code in outcome.failed_companions:
+                    self.companion_failed.add(code)
+                else:
+                    self.companion_providers[code][entry_idx] = outcome.provider
+            else:
+                # Languages the handler could not deliver fall back to the source text.
+                slots[entry_idx] = outcome.source
+                self.companion_failed.add(code)
+        return early
+
+    def stream_results(self) -> Iterator[Tuple[FileTask, List[Optional[str]], List[Dict[str, Any]], bool]]:
+        """Yields the primary language result, then one result per companion language."""
+        self.file_task.entry_providers = self.providers
+        yield (self.file_task, self.results, self.warnings, self.failed)
+        for lang in self.file_task.companion_langs:
+            code = lang.get("code")
+            companion_task = replace(self.file_task, target_lang=lang, companion_langs=[],
+                                     entry_providers=self.companion_providers[code])
+            yield (companion_task, self.companion_results[code], [], code in self.companion_failed)
+
+
+@dataclass
+class _EntryOutcome:
+    """单个条目的翻译结果 (主语言 + 多目标语言)"""
+    source: str
+    text: str
+    failed: bool
+    companions: Dict[str, str]
+    # Companion languages whose text for this entry is the source fallback
+    failed_companions: List[str] = field(default_factory=list)
+    # Provider (or PROVIDER_* label) that produced the entry
+    provider: str = ""
+
+
+@dataclass
+class _DedupEntry:
+    """同一运行中相同原文的首个出现位置，以及等待其结果的其他位置"""
+    leader: Tuple[int, int]
+    followers: List[Tuple[int, int]] = field(default_factory=list)
+    outcome: Optional[_EntryOutcome] = None
+
+
+@dataclass
+class _DedupIndex:
+    """运行内去重索引"""
+    entries: Dict[Tuple[Any, str], _DedupEntry] = field(default_factory=dict)
+    # leader origin -> entries key, until the leader's batch has come back
+    leaders: Dict[Tuple[int, int], Tuple[Any, str]] = field(default_factory=dict)
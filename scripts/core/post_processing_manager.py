@@ -15,6 +15,36 @@ from scripts.utils.post_process_validator import PostProcessValidator, Validatio
 from scripts.app_settings import GAME_PROFILES
 from scripts.utils import i18n
 from scripts.utils.quote_extractor import QuoteExtractor
+from scripts.core.cpu_stage import cpu_stage_pool, validate_translated_file, FileValidationPayload
+
+
+def scan_file_for_issues(validator: PostProcessValidator, payload: FileValidationPayload) -> List[ValidationResult]:
+    """逐行校验一个译文文件中引号内的文本 (可在进程池中运行)"""
+    with open(payload.file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+
+    file_results = []
+    for line_num, line in enumerate(content.split('\n'), 1):
+        stripped = line.strip()
+
+        # 跳过空行和注释行
+        if not stripped or stripped.startswith("#"):
+            continue
+
+        # 使用统一的引号提取工具
+        translatable_content = QuoteExtractor.extract_from_line(line)
+        if translatable_content:
+            # 只检查引号内的内容，并传入动态标签列表
+            results = validator.validate_game_text(
+                payload.game_key,
+                translatable_content,
+                line_num,
+                payload.source_lang,
+                dynamic_valid_tags=payload.dynamic_valid_tags
+            )
+            if results:
+                file_results.extend(results)
+    return file_results
 
 
 class PostProcessingManager:
@@ -80,9 +110,20 @@ class PostProcessingManager:
             
             self.logger.info(i18n.t("post_processing_scanning", file_count=self.total_files))
             
-            # 验证每个文件
-            for file_path in translated_files:
-                self._validate_single_file(file_path, target_lang, source_lang, dynamic_valid_tags=dynamic_valid_tags)
+            # 验证每个文件 (多个文件时在进程池中并行)
+            if cpu_stage_pool.enabled and len(translated_files) > 1:
+                payloads = [
+                    FileValidationPayload(file_path, self.normalized_game_key, source_lang, dynamic_valid_tags)
+                    for file_path in translated_files
+                ]
+                for file_path, (file_results, error) in zip(translated_files, cpu_stage_pool.map(validate_translated_file, payloads)):
+                    if error is not None:
+                        self.logger.warning(f"验证文件失败 {file_path}: {error}")
+                    else:
+                        self._record_file_results(file_path, file_results)
+            else:
+                for file_path in translated_files:
+                    self._validate_single_file(file_path, target_lang, source_lang, dynamic_valid_tags=dynamic_valid_tags)
             
             # 输出验证摘要
             self._log_validation_summary()
@@ -185,55 +226,28 @@ class PostProcessingManager:
             dynamic_valid_tags: 动态生成的有效标签列表
         """
         try:
-            # 读取文件内容
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            # 按行分割内容
-            lines = content.split('\n')
-            
-            # 验证每一行
-            file_results = []
-            for line_num, line in enumerate(lines, 1):
-                stripped = line.strip()
-                
-                # 跳过空行和注释行
-                if not stripped or stripped.startswith("#"):
-                    continue
-                
-                # 使用统一的引号提取工具
-                translatable_content = QuoteExtractor.extract_from_line(line)
-                if translatable_content:
-                    # 只检查引号内的内容，并传入动态标签列表
-                    results = self.validator.validate_game_text(
-                        self.normalized_game_key,
-                        translatable_content,
-                        line_num,
-                        source_lang,
-                        dynamic_valid_tags=dynamic_valid_tags
-                    )
-                    if results:
-                        file_results.extend(results)
-            
-            # 记录文件验证结果
-            if file_results:
-                self.validation_results[file_path] = file_results
-                self.files_with_issues += 1
-                
-                # 统计问题数量
-                for result in file_results:
-                    if result.level == ValidationLevel.ERROR:
-                        self.total_errors += 1
-                    elif result.level == ValidationLevel.WARNING:
-                        self.total_warnings += 1
-                    elif result.level == ValidationLevel.INFO:
-                        self.total_info += 1
-            else:
-                self.valid_files += 1
-                
+            payload = FileValidationPayload(file_path, self.normalized_game_key, source_lang, dynamic_valid_tags)
+            self._record_file_results(file_path, scan_file_for_issues(self.validator, payload))
         except Exception as e:
             self.logger.warning(f"验证文件失败 {file_path}: {e}")
 
+    def _record_file_results(self, file_path: str, file_results: List[ValidationResult]):
+        """记录单个文件的验证结果并更新统计"""
+        if file_results:
+            self.validation_results[file_path] = file_results
+            self.files_with_issues += 1
+
+            # 统计问题数量
+            for result in file_results:
+                if result.level == ValidationLevel.ERROR:
+                    self.total_errors += 1
+                elif result.level == ValidationLevel.WARNING:
+                    self.total_warnings += 1
+                elif result.level == ValidationLevel.INFO:
+                    self.total_info += 1
+        else:
+            self.valid_files += 1
+
     def attach_results_to_proofreading_tracker(self, proofreading_tracker) -> None:
         """将验证结果合并写入校对进度追踪器的每个文件记录"""
         if not self.validation_results:
@@ -0,0 +1,270 @@
+# scripts/core/rate_limiter.py
+"""
+Provider 级自适应限流器
+每个 (provider, model) 共享一个限流器，组合了两种机制：
+1. 令牌桶：限制每分钟请求数 (RPM) 与每分钟 token 数 (TPM)。
+2. AIMD 并发窗口：请求成功时加性增长，遇到 429 / 配额错误时减半，并遵守 Retry-After。
+ParallelProcessor 在派发每个批次前向限流器申请名额，Handler 在遇到限流错误时回报。
+批次内的额外请求 (拆分、补请求、单语言回退) 先归还批次的名额 (release_batch_slot)，再各自申请名额。
+"""
+
+import re
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from scripts.app_settings import API_PROVIDERS, DEFAULT_RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# How often a caller re-checks for a free concurrency slot when nothing else tells it when to wake up.
+_SLOT_POLL_INTERVAL = 0.05
+
+_RATE_LIMIT_MARKERS = ("resource_exhausted", "rate limit", "rate_limit", "too many requests", "quota")
+_RETRY_DELAY_PATTERN = re.compile(r"retry[_ ]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE)
+
+
+def parse_rate_limit_error(exc: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    Inspects an SDK/HTTP exception.
+    Returns (is_rate_limit, retry_after_seconds); retry_after is None when the server did not say.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None) or getattr(response, "status_code", None)
+    text = str(exc).lower()
+    is_rate_limit = status == 429 or any(marker in text for marker in _RATE_LIMIT_MARKERS)
+    if not is_rate_limit:
+        return False, None
+
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers:
+        if headers.get("retry-after-ms"):
+            try:
+                retry_after = float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        if retry_after is None and headers.get("retry-after"):
+            value = headers["retry-after"]
+            try:
+                retry_after = float(value)
+            except ValueError:
+                try:
+                    retry_after = max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    if retry_after is None:
+        # Gemini reports the delay inside the error details, e.g. 'retryDelay': '23s'
+        match = _RETRY_DELAY_PATTERN.search(str(exc))
+        if match:
+            retry_after = float(match.group(1))
+
+    return True, retry_after
+
+
+class _TokenBucket:
+    """每分钟补充 `per_minute` 个令牌的令牌桶。"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A single request larger than the whole bucket may go once the bucket is full.
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    """
+    单个 (provider, model) 的限流器，线程模式与 asyncio 模式共用。
+    The concurrency window starts in slow-start (+1 slot per success) and switches
+    to congestion avoidance (+1 slot per full window of successes) after the first
+    rate-limit error, which halves it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        default_retry_after: float = 5.0
+    ):
+        self.name = name
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.default_retry_after = default_retry_after
+        self.in_flight = 0
+
+        self._request_bucket = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        self._slow_start = True
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+        self.stats = {"requests": 0, "successes": 0, "failures": 0, "rate_limited": 0, "peak_concurrency": int(self.limit)}
+
+    # ───────────── 申请 / 释放 ─────────────
+    def _try_acquire(self, tokens: int) -> float:
+        """Takes a slot and consumes bucket capacity, or returns how long to wait. Caller holds _cond."""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self.in_flight >= int(self.limit):
+            return _SLOT_POLL_INTERVAL
+
+        wait = 0.0
+        if self._request_bucket:
+            wait = max(wait, self._request_bucket.wait_time(1, now))
+        if self._token_bucket and tokens:
+            wait = max(wait, self._token_bucket.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+
+        if self._request_bucket:
+            self._request_bucket.consume(1)
+        if self._token_bucket and tokens:
+            self._token_bucket.consume(tokens)
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        return 0.0
+
+    def acquire(self, tokens: int = 0):
+        """阻塞直到获得一个并发名额，且 RPM/TPM 预算足够。"""
+        with self._cond:
+            while True:
+                wait = self._try_acquire(tokens)
+                if wait <= 0:
+                    return
+                self._cond.wait(timeout=wait)
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """不等待地申请一个名额；预算不足时立即返回 False (用于对冲等可放弃的额外请求)。"""
+        with self._cond:
+            return self._try_acquire(tokens) <= 0
+
+    async def acquire_async(self, tokens: int = 0):
+        """acquire 的协程版本，等待期间不占用事件循环。"""
+        while True:
+            with self._cond:
+                wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self, success: bool):
+        """归还名额。成功的请求让并发窗口加性增长。"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if success:
+                self.stats["successes"] += 1
+                step = 1.0 if self._slow_start else 1.0 / max(self.limit, 1.0)
+                self.limit = min(float(self.max_concurrency), self.limit + step)
+                self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], int(self.limit))
+            else:
+                self.stats["failures"] += 1
+            self._cond.notify_all()
+
+    # ───────────── 限流反馈 ─────────────
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        Handler 遇到 429 / 配额错误时调用：并发窗口减半，并在 Retry-After 内暂停派发。
+        A burst of 429s from requests that were already in flight only halves the window once.
+        """
+        delay = retry_after if retry_after is not None else self.default_retry_after
+        with self._cond:
+            now = time.monotonic()
+            self.stats["rate_limited"] += 1
+            self._blocked_until = max(self._blocked_until, now + delay)
+            if now - self._last_decrease >= max(delay, 1.0):
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._slow_start = False
+                self._last_decrease = now
+                logger.warning(f"Rate limited by {self.name}: concurrency reduced to {int(self.limit)}, pausing {delay:.1f}s.")
+
+    def retry_delay(self) -> float:
+        """距离允许再次请求还需等待的秒数 (Retry-After)。"""
+        with self._cond:
+            return max(0.0, self._blocked_until - time.monotonic())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self.stats, concurrency=int(self.limit), in_flight=self.in_flight)
+
+
+class SlotLease:
+    """ParallelProcessor 为一个批次占用的名额；release 只生效一次，Handler 可以提前归还。"""
+
+    def __init__(self, limiter: ProviderLimiter):
+        self.limiter = limiter
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self, success: bool):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.limiter.release(success)
+
+
+# 当前批次的名额 (由 ParallelProcessor 在调用翻译函数期间设置)
+batch_slot: contextvars.ContextVar = contextvars.ContextVar("batch_slot", default=None)
+
+
+def release_batch_slot(success: bool):
+    """
+    提前归还当前批次的名额。批次的首个请求已经结束，之后的子请求各自申请名额，
+    这样子请求计入 RPM/TPM，且不会在持有名额时等待名额 (并发窗口减到 1 时不会死锁)。
+    """
+    lease = batch_slot.get()
+    if lease is not None:
+        lease.release(success)
+
+
+class RateLimiterRegistry:
+    """按 (provider, model) 共享限流器，使同一 Provider 的所有任务共用一个预算。"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider_name: str, model_name: Optional[str] = None) -> ProviderLimiter:
+        provider_config = API_PROVIDERS.get(provider_name, {})
+        model_name = model_name or provider_config.get("default_model") or ""
+        key = (provider_name, model_name)
+        with self._lock:
+            if key not in self._limiters:
+                config = dict(DEFAULT_RATE_LIMIT)
+                config.update(provider_config.get("rate_limit", {}))
+                self._limiters[key] = ProviderLimiter(f"{provider_name}/{model_name}", **config)
+            return self._limiters[key]
+
+    def reset(self):
+        with self._lock:
+            self._limiters.clear()
+
+
+rate_limit_registry = RateLimiterRegistry()
@@ -0,0 +1,336 @@
+# scripts/core/run_estimator.py
+"""
+试运行估算 (Dry Run)
+在启动耗时数小时的任务之前，按真实运行的同一套规则 (运行内去重、翻译记忆、跨文件打包、token 预算批次、
+掩码与词典注入) 规划出全部请求，但不调用任何 API。报告请求数、按各 Provider 分词器计数的输入/输出 token、
+按本地价格表 (PRICE_TABLE) 估算的费用，以及在配置的并发与限流下的预计耗时。
+
+为了让超大 Mod 也能在数秒内完成：每个条目只计数一次，完整提示词 (含词典匹配) 只为
+至多 DRY_RUN_PROMPT_SAMPLE 个随机抽样的请求构建，其余请求的固定提示词开销按抽样均值外推。
+"""
+
+import math
+import time
+import heapq
+import random
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from scripts.app_settings import (
+    API_PROVIDERS, PRICE_TABLE, DRY_RUN_PROMPT_SAMPLE, DEFAULT_RATE_LIMIT, RECOMMENDED_MAX_WORKERS,
+    ASYNC_MAX_CONCURRENCY, EXECUTION_MODE, CROSS_FILE_PACKING, INTRA_RUN_DEDUP,
+)
+from scripts.core.batch_planner import BatchPlanner, BatchBudget, estimate_tokens
+from scripts.core.base_handler import build_batch_prompt
+from scripts.core.endpoint_pool import endpoint_capacity
+from scripts.core.parallel_processor import BatchTask, FileTask
+from scripts.core.translation_memory import prompt_fingerprint
+from scripts.utils.text_clean import mask_special_tokens
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Label of the tokenizer-free estimate used by the batch planner
+ESTIMATE_TOKENIZER = "estimate"
+
+
+def get_token_counter(provider_name: str) -> Tuple[str, Callable[[str], int]]:
+    """
+    Returns (tokenizer label, count function) for a provider: the tiktoken encoding named by its
+    `tokenizer` setting when tiktoken is installed, otherwise the planner's character-based estimate.
+    """
+    encoding_name = API_PROVIDERS.get(provider_name, {}).get("tokenizer")
+    if encoding_name and TIKTOKEN_AVAILABLE:
+        try:
+            encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            # 编码表首次使用时需要下载，离线环境下退回估算
+            logger.warning(f"tiktoken encoding '{encoding_name}' unavailable ({e}); using the character estimate for {provider_name}.")
+        else:
+            return encoding_name, lambda text: len(encoding.encode(text, disallowed_special=())) if text else 0
+    return ESTIMATE_TOKENIZER, estimate_tokens
+
+
+def lookup_price(provider_name: str, model: str) -> Optional[Tuple[float, float]]:
+    """(input, output) USD per million tokens from PRICE_TABLE, or None when the model isn't listed."""
+    prices = PRICE_TABLE.get(provider_name, {})
+    return prices.get(model, prices.get("*"))
+
+
+def request_concurrency(provider_name: str, execution_mode: Optional[str] = None) -> int:
+    """In-flight request limit of a run, as initial_translate configures the ParallelProcessor and rate limiter."""
+    mode = "thread" if provider_name == "gemini_cli" else (execution_mode or EXECUTION_MODE)
+    if provider_name == "ollama":
+        workers = endpoint_capacity(API_PROVIDERS.get(provider_name, {}))
+    else:
+        workers = ASYNC_MAX_CONCURRENCY if mode == "async" else RECOMMENDED_MAX_WORKERS
+    return max(1, min(workers, int(_rate_limit(provider_name)["max_concurrency"])))
+
+
+def _rate_limit(provider_name: str) -> Dict[str, Any]:
+    config = dict(DEFAULT_RATE_LIMIT)
+    config.update(API_PROVIDERS.get(provider_name, {}).get("rate_limit", {}))
+    return config
+
+
+def lpt_makespan(durations: List[float], slots: int) -> float:
+    """Finish time of `durations` on `slots` parallel workers, longest first (the processor's LPT policy)."""
+    finish = [0.0] * max(1, min(slots, len(durations)))
+    for duration in sorted(durations, reverse=True):
+        heapq.heapreplace(finish, finish[0] + duration)
+    return max(finish)
+
+
+class _Lane:
+    """一组共用请求的目标语言 (单语言，或多目标语言模式下的全部语言) 的去重集合与打包缓冲区。"""
+
+    def __init__(self, template: FileTask):
+        # 提示词只依赖语言、游戏与 Mod 上下文，整条通道共用一个文件任务
+        self.template = template
+        self.seen = set()
+        self.buffer: List[str] = []
+
+
+class ProviderEstimate:
+    """
+    单个 Provider 的试运行：与 ParallelProcessor 相同的去重、打包与批次切分，
+    翻译记忆命中的条目从请求中移除，全部命中的请求不计入。
+    """
+
+    def __init__(
+        self,
+        provider_name: str,
+        model: str,
+        source_lang: Dict[str, Any],
+        lane_languages: List[List[Dict[str, Any]]],
+        game_profile: Dict[str, Any],
+        mod_context: str,
+        planner_overrides: Optional[Dict[str, Any]] = None,
+        pack: bool = CROSS_FILE_PACKING,
+        deduplicate: bool = INTRA_RUN_DEDUP,
+        translation_memory: Any = None,
+        execution_mode: Optional[str] = None,
+        sample_size: int = DRY_RUN_PROMPT_SAMPLE
+    ):
+        self.provider_name = provider_name
+        self.model = model
+        self.source_lang = source_lang
+        self.planner = BatchPlanner.for_provider(provider_name, planner_overrides)
+        self.tokenizer, self.count_tokens = get_token_counter(provider_name)
+        self.pack = pack
+        self.deduplicate = deduplicate
+        self.translation_memory = translation_memory
+        self.tm_model = f"{provider_name}:{model}"
+        self.prompt_hashes = {
+            lang["code"]: prompt_fingerprint(game_profile, mod_context, source_lang.get("code", ""), lang["code"])
+            for langs in lane_languages for lang in langs
+        } if translation_memory is not None else {}
+        self.concurrency = request_concurrency(provider_name, execution_mode)
+        self.lanes = [
+            _Lane(FileTask(
+                filename="", root="", original_lines=[], texts_to_translate=[], key_map={}, is_custom_loc=False,
+                target_lang=langs[0], source_lang=source_lang, game_profile=game_profile, mod_context=mod_context,
+                provider_name=provider_name, output_folder_name="", source_dir="", dest_dir="", client=None,
+                mod_name="", companion_langs=list(langs[1:])
+            ))
+            for langs in lane_languages
+        ]
+        self.stats = {"entries": 0, "duplicates": 0, "memory_hits": 0}
+        # 每个请求的 (条目 token, 条目数, 预期输出 token)；提示词开销在 report() 中补上
+        self._requests: List[Tuple[int, int, int]] = []
+        # 水塘抽样：(请求序号, 通道, 文本)，结束时为这些请求构建完整提示词
+        self.sample_size = sample_size
+        self._samples: List[Tuple[int, _Lane, List[str]]] = []
+        self._rng = random.Random(0)
+
+    def add_file(self, texts: List[str]):
+        for lane in self.lanes:
+            subset = texts
+            if self.deduplicate:
+                subset = []
+                for text in texts:
+                    key = hash(text)
+                    if key in lane.seen:
+                        self.stats["duplicates"] += 1
+                        continue
+                    lane.seen.add(key)
+                    subset.append(text)
+            if not subset:
+                continue
+            if not self.pack:
+                for start, end in self.planner.plan(subset):
+                    self._dispatch(lane, subset[start:end])
+                continue
+            # 与 _plan_packed_batches 相同：只切下已装满的批次，末尾未满的批次留给后续文件
+            lane.buffer.extend(subset)
+            ranges = self.planner.plan(lane.buffer)[:-1]
+            for start, end in ranges:
+                self._dispatch(lane, lane.buffer[start:end])
+            if ranges:
+                del lane.buffer[:ranges[-1][1]]
+
+    def _flush(self):
+        for lane in self.lanes:
+            for start, end in self.planner.plan(lane.buffer):
+                self._dispatch(lane, lane.buffer[start:end])
+            lane.buffer = []
+
+    def _memory_misses(self, lane: _Lane, texts: List[str]) -> List[str]:
+        """Drops the texts every language of the lane already has in translation memory."""
+        if self.translation_memory is None:
+            return texts
+        file_task = lane.template
+        source_code = self.source_lang.get("code", "")
+        per_language = [
+            self.translation_memory.lookup(texts, source_code, lang["code"], self.tm_model, self.prompt_hashes[lang["code"]])
+            for lang in [file_task.target_lang] + list(file_task.companion_langs)
+        ]
+        misses = [text for i, text in enumerate(texts) if not all(i in found for found in per_language)]
+        self.stats["memory_hits"] += len(texts) - len(misses)
+        return misses
+
+    def _dispatch(self, lane: _Lane, texts: List[str]):
+        texts = self._memory_misses(lane, texts)
+        if not texts:
+            return
+        budget = self.planner.budget
+        entry_tokens = 0
+        output_tokens = 0
+        for text in texts:
+            entry_tokens += self.count_tokens(mask_special_tokens(text))
+            output_tokens += math.ceil(self.count_tokens(text) * budget.output_ratio) + budget.per_item_overhead_tokens
+        index = len(self._requests)
+        self._requests.append((entry_tokens, len(texts), output_tokens))
+        self.stats["entries"] += len(texts)
+
+        if len(self._samples) < self.sample_size:
+            self._samples.append((index, lane, texts))
+        else:
+            slot = self._rng.randrange(index + 1)
+            if slot < self.sample_size:
+                self._samples[slot] = (index, lane, texts)
+
+    def _measure_prompts(self) -> Tuple[Dict[int, int], int]:
+        """
+        Builds the real prompt (masking, glossary injection, format rules) of every sampled request.
+        Returns ({request index: prompt tokens}, mean fixed prompt overhead per request).
+        """
+        per_item = self.planner.budget.per_item_overhead_tokens
+        measured: Dict[int, int] = {}
+        overheads = []
+        for index, lane, texts in self._samples:
+            task = BatchTask(file_task=lane.template, batch_index=index, start_index=0, end_index=len(texts), texts=texts)
+            tokens = self.count_tokens(build_batch_prompt(task, logger))
+            measured[index] = tokens
+            entry_tokens, count, _ = self._requests[index]
+            overheads.append(max(0, tokens - entry_tokens - per_item * count))
+        return measured, round(sum(overheads) / len(overheads)) if overheads else self.planner.budget.prompt_overhead_tokens
+
+    def report(self) -> Dict[str, Any]:
+        self._flush()
+        measured, fixed_overhead = self._measure_prompts()
+        per_item = self.planner.budget.per_item_overhead_tokens
+
+        input_total = output_total = 0
+        durations = []
+        for index, (entry_tokens, count, output_tokens) in enumerate(self._requests):
+            input_tokens = measured.get(index, entry_tokens + per_item * count + fixed_overhead)
+            input_total += input_tokens
+            output_total += output_tokens
+            durations.append(self.planner.latency.estimate_seconds(input_tokens, output_tokens))
+
+        # 耗时取并发调度与限流 (每分钟请求数 / token 数) 三者中最慢的一项
+        bounds = {"concurrency": lpt_makespan(durations, self.concurrency) if durations else 0.0}
+        rate_limit = _rate_limit(self.provider_name)
+        if rate_limit.get("requests_per_minute"):
+            bounds["requests_per_minute"] = len(durations) / rate_limit["requests_per_minute"] * 60
+        if rate_limit.get("tokens_per_minute"):
+            bounds["tokens_per_minute"] = input_total / rate_limit["tokens_per_minute"] * 60
+        bound = max(bounds, key=bounds.get)
+
+        price = lookup_price(self.provider_name, self.model)
+        cost = None
+        if price is not None:
+            cost = round((input_total * price[0] + output_total * price[1]) / 1_000_000, 4)
+
+        return {
+            "provider": self.provider_name,
+            "model": self.model,
+            "tokenizer": self.tokenizer,
+            "requests": len(self._requests),
+            "entries": self.stats["entries"],
+            "duplicates": self.stats["duplicates"],
+            "memory_hits": self.stats["memory_hits"],
+            "input_tokens": input_total,
+            "output_tokens": output_total,
+            "price_per_million": {"input": price[0], "output": price[1]} if price is not None else None,
+            "cost_usd": cost,
+            "concurrency": self.concurrency,
+            "wall_seconds": round(bounds[bound], 1),
+            "bound": bound,
+            "prompt_samples": len(self._samples),
+        }
+
+
+class RunEstimator:
+    """
+    整个任务的试运行：源文件逐个加入 (不保留文本)，每个 Provider 独立规划。
+    第一个 Provider 是任务选定的 Provider，其余用于比较。
+    """
+
+    def __init__(
+        self,
+        source_lang: Dict[str, Any],
+        target_languages: List[Dict[str, Any]],
+        game_profile: Dict[str, Any],
+        mod_context: str,
+        providers: List[Tuple[str, str]],
+        multi_target: bool = False,
+        execution_mode: Optional[str] = None,
+        translation_memory: Any = None,
+        pack: bool = CROSS_FILE_PACKING,
+        deduplicate: bool = INTRA_RUN_DEDUP,
+        sample_size: int = DRY_RUN_PROMPT_SAMPLE
+    ):
+        self.target_languages = target_languages
+        self.files = 0
+        self.source_entries = 0
+        self._started = time.monotonic()
+        self.multi_target = multi_target and len(target_languages) > 1
+        self.providers = []
+        for provider_name, model in providers:
+            # Gemini CLI 自行管理请求，不支持多目标语言模式 (与 initial_translate 一致)
+            use_multi_target = self.multi_target and provider_name != "gemini_cli"
+            overrides = None
+            lane_languages = [[lang] for lang in target_languages]
+            if use_multi_target:
+                overrides = {"output_ratio": BatchBudget.for_provider(provider_name).output_ratio * len(target_languages)}
+                lane_languages = [list(target_languages)]
+            self.providers.append(ProviderEstimate(
+                provider_name, model, source_lang, lane_languages, game_profile, mod_context,
+                planner_overrides=overrides, pack=pack, deduplicate=deduplicate,
+                translation_memory=translation_memory, execution_mode=execution_mode, sample_size=sample_size
+            ))
+
+    def add_file(self, texts: List[str]):
+        self.files += 1
+        self.source_entries += len(texts)
+        if texts:
+            for provider in self.providers:
+                provider.add_file(texts)
+
+    def report(self) -> Dict[str, Any]:
+        providers = [provider.report() for provider in self.providers]
+        return {
+            "files": self.files,
+            "source_entries": self.source_entries,
+            "target_languages": [lang.get("code") for lang in self.target_languages],
+            "multi_target": self.multi_target,
+            "providers": providers,
+            "elapsed_seconds": round(time.monotonic() - self._started, 2),
+        }
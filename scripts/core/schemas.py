@@ -1,5 +1,20 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List
 
 class TranslationResponse(BaseModel):
     translations: List[str] = Field(description="A list of translated strings. The list must have the same number of elements as the input list.")
+
+
+class IdentifiedTranslation(BaseModel):
+    """部分结果抢救模式：携带输入编号 (从 1 开始) 的单条译文。"""
+    id: int
+    text: str
+
+
+class MultiTargetTranslationResponse(BaseModel):
+    """多目标语言模式：一次请求返回同一批文本的多种语言译文。"""
+    translations: Dict[str, List[str]] = Field(description="Translated strings keyed by target language code. Every list must have the same number of elements as the input list.")
+
+    def complete_languages(self, expected_count: int) -> Dict[str, List[str]]:
+        """Returns only the languages whose list has exactly `expected_count` items."""
+        return {code: texts for code, texts in self.translations.items() if len(texts) == expected_count}
@@ -0,0 +1,170 @@
+# scripts/core/telemetry_ledger.py
+"""
+批次遥测账本 (Telemetry Ledger)
+每一次 API 请求尝试都写入一行结构化记录：Provider、模型、批次大小、输入/输出 token、
+耗时、第几次尝试、异常类型与解析结果。Provider 未返回用量时按批次规划器估算 (tokens_estimated=1)。
+数据存放在 mods_cache.sqlite 的 batch_telemetry 表中，按 run_id (任务 ID) 汇总。
+"""
+
+import os
+import math
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Any
+
+from scripts.app_settings import MODS_CACHE_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# 解析结果
+OUTCOME_OK = "ok"                 # 整批译文可用
+OUTCOME_PARTIAL = "partial"       # 部分条目被抢救，其余补充请求
+OUTCOME_PARSE_ERROR = "parse_error"  # 收到响应但没有可用条目
+OUTCOME_ERROR = "error"           # 请求本身失败 (网络、限流、服务端错误)
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class TelemetryLedger:
+    """遥测账本，独立连接 mods_cache.sqlite，所有读写都由一把锁串行化。"""
+
+    def __init__(self, db_path: str = MODS_CACHE_DB_PATH):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        """Lazy load database connection."""
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._create_tables(self._conn)
+            except Exception as e:
+                logger.error(f"Failed to open telemetry ledger at {self.db_path}: {e}")
+                self._conn = None
+        return self._conn
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS batch_telemetry (
+                telemetry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                batch_index INTEGER NOT NULL,
+                batch_size INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                tokens_estimated INTEGER NOT NULL DEFAULT 0,
+                latency_ms INTEGER NOT NULL,
+                attempt INTEGER NOT NULL,
+                outcome TEXT NOT NULL,
+                error_class TEXT,
+                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_batch_telemetry_run_id ON batch_telemetry (run_id)")
+        conn.commit()
+
+    def record(self, run_id: str, provider: str, model: str, batch_index: int, batch_size: int,
+               prompt_tokens: int, completion_tokens: int, tokens_estimated: bool, latency_ms: int,
+               attempt: int, outcome: str, error_class: Optional[str] = None):
+        """Appends one request attempt."""
+        if not self.connection:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("""
+                    INSERT INTO batch_telemetry (run_id, provider, model, batch_index, batch_size, prompt_tokens,
+                        completion_tokens, tokens_estimated, latency_ms, attempt, outcome, error_class)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (run_id, provider, model, batch_index, batch_size, prompt_tokens, completion_tokens,
+                      int(tokens_estimated), latency_ms, attempt, outcome, error_class))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Telemetry write failed: {e}")
+                self._conn.rollback()
+
+    def records(self, run_id: str) -> List[Dict[str, Any]]:
+        if not self.connection:
+            return []
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("SELECT * FROM batch_telemetry WHERE run_id = ? ORDER BY telemetry_id", (run_id,))
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def summary(self, run_id: str) -> Dict[str, Any]:
+        """Aggregates a run: totals, latency/token percentiles, retries, outcomes and error classes per provider/model."""
+        rows = self.records(run_id)
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault((row["provider"], row["model"]), []).append(row)
+        summary = _aggregate(rows)
+        summary["run_id"] = run_id
+        summary["providers"] = [
+            dict(_aggregate(group), provider=provider, model=model)
+            for (provider, model), group in groups.items()
+        ]
+        return summary
+
+    def session(self, run_id: str, provider: str, model: str) -> "TelemetrySession":
+        return TelemetrySession(self, run_id, provider, model)
+
+
+def _aggregate(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = sorted(row["latency_ms"] for row in rows)
+    prompt_tokens = sorted(row["prompt_tokens"] for row in rows)
+    completion_tokens = sorted(row["completion_tokens"] for row in rows)
+    outcomes: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    for row in rows:
+        outcomes[row["outcome"]] = outcomes.get(row["outcome"], 0) + 1
+        if row["error_class"]:
+            errors[row["error_class"]] = errors.get(row["error_class"], 0) + 1
+    return {
+        "requests": len(rows),
+        "retries": sum(1 for row in rows if row["attempt"] > 0),
+        "items": sum(row["batch_size"] for row in rows),
+        "prompt_tokens": sum(prompt_tokens),
+        "completion_tokens": sum(completion_tokens),
+        "estimated_requests": sum(1 for row in rows if row["tokens_estimated"]),
+        "latency_ms": {f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+        "prompt_tokens_per_request": {f"p{p}": percentile(prompt_tokens, p) for p in PERCENTILES},
+        "completion_tokens_per_request": {f"p{p}": percentile(completion_tokens, p) for p in PERCENTILES},
+        "outcomes": outcomes,
+        "errors": errors,
+    }
+
+
+class TelemetrySession:
+    """一次翻译任务使用的账本视图：绑定 run_id、Provider 与模型。"""
+
+    def __init__(self, ledger: TelemetryLedger, run_id: str, provider: str, model: str):
+        self.ledger = ledger
+        self.run_id = run_id
+        self.provider = provider
+        self.model = model
+
+    def record(self, batch_index: int, batch_size: int, prompt_tokens: int, completion_tokens: int,
+               tokens_estimated: bool, latency_ms: int, attempt: int, outcome: str, error_class: Optional[str] = None):
+        self.ledger.record(self.run_id, self.provider, self.model, batch_index, batch_size, prompt_tokens,
+                           completion_tokens, tokens_estimated, latency_ms, attempt, outcome, error_class)
+
+    def summary(self) -> Dict[str, Any]:
+        return self.ledger.summary(self.run_id)
+
+
+telemetry_ledger = TelemetryLedger()
@@ -0,0 +1,322 @@
+# scripts/core/translation_memory.py
+"""
+精确匹配翻译记忆 (Translation Memory)
+在每个批次发往 LLM 之前，按 (规范化原文, 源语言, 目标语言, 模型, 有效提示词哈希) 查找已有译文。
+命中的条目直接使用，只有未命中的条目才会发送给 API；成功的译文会写回记忆库。
+数据存放在 mods_cache.sqlite 的 translation_memory 表中，source_hash 列带索引。
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple, Any
+
+from scripts.app_settings import MODS_CACHE_DB_PATH, FALLBACK_FORMAT_PROMPT, PROMPT_LAYOUT, PARTIAL_SALVAGE, SALVAGE_FORMAT_PROMPT
+from scripts.core.prompt_manager import prompt_manager
+from scripts.core.glossary_manager import glossary_manager
+from scripts.utils.punctuation_handler import generate_punctuation_prompt
+from scripts.core.parallel_processor import BatchTask, PROVIDER_TRANSLATION_MEMORY
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_source(text: str) -> str:
+    """Unicode NFC + unified line endings. Exact-match otherwise: case and spacing are preserved."""
+    return unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(normalize_source(text).encode("utf-8")).hexdigest()
+
+
+def glossary_fingerprint(glossary: Optional[Dict[str, Any]]) -> str:
+    """Hash of the loaded glossary entries; editing or switching glossaries changes it."""
+    if not glossary or not glossary.get("entries"):
+        return ""
+    entries = sorted(json.dumps(entry, sort_keys=True, ensure_ascii=False, default=str) for entry in glossary["entries"])
+    return hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+def prompt_fingerprint(game_profile: Dict[str, Any], mod_context: str, source_lang: str = "", target_lang: str = "") -> str:
+    """
+    Hash of everything in the prompt that is shared by all batches of a run for one language pair:
+    templates, prompt layout, response format, punctuation rules and the loaded glossary.
+    """
+    game_id = game_profile.get("id", "")
+    hasher = hashlib.sha256()
+    for part in (
+        prompt_manager.get_effective_prompt(game_id) or game_profile.get("prompt_template", ""),
+        prompt_manager.get_effective_format_prompt(game_id) or FALLBACK_FORMAT_PROMPT,
+        # 提示词布局与抢救格式 (带编号的输出) 都会改变模型看到的提示与返回的格式
+        PROMPT_LAYOUT,
+        SALVAGE_FORMAT_PROMPT if PARTIAL_SALVAGE else "",
+        # 标点转换规则随语言对与 LANGUAGE_PUNCTUATION_CONFIG 变化；写出文件时的标点清理对命中的译文同样执行，不影响记忆内容
+        generate_punctuation_prompt(source_lang, target_lang) if source_lang and target_lang else "",
+        mod_context or "",
+        # 每个批次注入的词典条目取自当前加载的词典，词典变化后旧译文不再命中
+        glossary_fingerprint(glossary_manager.get_glossary_for_translation()),
+    ):
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class TranslationMemory:
+    """翻译记忆库，独立连接 mods_cache.sqlite，所有读写都由一把锁串行化。"""
+
+    def __init__(self, db_path: str = MODS_CACHE_DB_PATH):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        """Lazy load database connection."""
+        if self._conn is None:
+            with self._lock:
+                # 建表完成后才发布连接，其他工作线程不会在表存在之前读写
+                if self._conn is None:
+                    try:
+                        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                        self._create_tables(conn)
+                        self._conn = conn
+                    except Exception as e:
+                        logger.error(f"Failed to open translation memory at {self.db_path}: {e}")
+        return self._conn
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                tm_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_hash TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                source_text TEXT NOT NULL,
+                translated_text TEXT NOT NULL,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(source_hash, source_lang, target_lang, model, prompt_hash)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_translation_memory_source_hash ON translation_memory (source_hash)")
+        conn.commit()
+
+    def lookup(self, texts: List[str], source_lang: str, target_lang: str, model: str, prompt_hash: str) -> Dict[int, str]:
+        """Returns {index_in_texts: translation} for every text found in memory."""
+        if not texts or not self.connection:
+            return {}
+        hashes = [source_hash(text) for text in texts]
+        found: Dict[str, str] = {}
+        with self._lock:
+            try:
+                cursor = self._conn.cursor()
+                unique_hashes = list(dict.fromkeys(hashes))
+                # Stay well below SQLite's host parameter limit
+                for start in range(0, len(unique_hashes), 500):
+                    chunk = unique_hashes[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor.execute(
+                        f"SELECT source_hash, translated_text FROM translation_memory "
+                        f"WHERE source_hash IN ({placeholders}) AND source_lang = ? AND target_lang = ? AND model = ? AND prompt_hash = ?",
+                        (*chunk, source_lang, target_lang, model, prompt_hash)
+                    )
+                    found.update(cursor.fetchall())
+            except sqlite3.Error as e:
+                logger.error(f"Translation memory lookup failed: {e}")
+                return {}
+        return {i: found[h] for i, h in enumerate(hashes) if h in found}
+
+    def store(self, pairs: List[Tuple[str, str]], source_lang: str, target_lang: str, model: str, prompt_hash: str):
+        """Upserts (source_text, translated_text) pairs."""
+        if not pairs or not self.connection:
+            return
+        rows = [
+            (source_hash(src), source_lang, target_lang, model, prompt_hash, src, dst)
+            for src, dst in pairs
+        ]
+        with self._lock:
+            try:
+                self._conn.executemany("""
+                    INSERT INTO translation_memory (source_hash, source_lang, target_lang, model, prompt_hash, source_text, translated_text)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(source_hash, source_lang, target_lang, model, prompt_hash) DO UPDATE SET
+                    translated_text = excluded.translated_text,
+                    last_used_at = CURRENT_TIMESTAMP
+                """, rows)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Translation memory write failed: {e}")
+                self._conn.rollback()
+
+    def session(self, model: str, bypass: bool = False, read_only: bool = False,
+                fallback_models: Optional[Dict[str, str]] = None) -> "TranslationMemorySession":
+        return TranslationMemorySession(self, model, bypass, read_only, fallback_models)
+
+
+class TranslationMemorySession:
+    """
+    一次翻译任务使用的记忆库视图：绑定模型，统计命中/未命中。
+    bypass=True 时跳过查找 (强制重新翻译)，但新的译文仍会写回记忆库。
+    read_only=True 时不写回 (离线批量模式的规划阶段只需要与正式运行相同的命中结果)。
+    fallback_models 为故障转移链上其他 Provider 的模型键 ({provider_name: "provider:model"})：
+    由它们翻译的条目记在各自的模型下，不在其中的 Provider 产出的条目不写回。
+    """
+
+    def __init__(self, memory: TranslationMemory, model: str, bypass: bool = False, read_only: bool = False,
+                 fallback_models: Optional[Dict[str, str]] = None):
+        self.memory = memory
+        self.model = model
+        self.fallback_models = dict(fallback_models or {})
+        self.bypass = bypass
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._prompt_hashes: Dict[Tuple[str, str, str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def _prompt_hash(self, batch_task: BatchTask, target_code: Optional[str] = None) -> str:
+        file_task = batch_task.file_task
+        source_code = file_task.source_lang.get("code", "")
+        target_code = target_code or file_task.target_lang.get("code", "")
+        key = (file_task.game_profile.get("id", ""), file_task.mod_context, source_code, target_code)
+        if key not in self._prompt_hashes:
+            self._prompt_hashes[key] = prompt_fingerprint(file_task.game_profile, file_task.mod_context, source_code, target_code)
+        return self._prompt_hashes[key]
+
+    @staticmethod
+    def _languages(batch_task: BatchTask) -> List[Dict[str, Any]]:
+        return [batch_task.file_task.target_lang] + list(batch_task.file_task.companion_langs)
+
+    def serve(self, batch_task: BatchTask) -> Tuple[Dict[int, Dict[str, str]], Optional[BatchTask]]:
+        """
+        Looks up every text of the batch.
+        Returns (hits, pending): hits maps a position to its translation per language code;
+        pending is a batch with only the misses, or None when everything was served from memory.
+        An entry counts as a hit only when all of the batch's target languages are in memory.
+        """
+        texts = batch_task.texts
+        hits: Dict[int, Dict[str, str]] = {}
+        if not self.bypass:
+            source_code = batch_task.file_task.source_lang.get("code", "")
+            per_language = {
+                lang["code"]: self.memory.lookup(texts, source_code, lang["code"], self.model, self._prompt_hash(batch_task, lang["code"]))
+                for lang in self._languages(batch_task)
+            }
+            for i in range(len(texts)):
+                if all(i in found for found in per_language.values()):
+                    hits[i] = {code: found[i] for code, found in per_language.items()}
+
+        with self._lock:
+            self.hits += len(hits)
+            self.misses += len(texts) - len(hits)
+
+        if not hits:
+            return hits, batch_task
+
+        miss_positions = [i for i in range(len(texts)) if i not in hits]
+        if not miss_positions:
+            return hits, None
+        pending = BatchTask(
+            file_task=batch_task.file_task,
+            batch_index=batch_task.batch_index,
+            start_index=0,
+            end_index=len(miss_positions),
+            texts=[texts[i] for i in miss_positions],
+            origins=[batch_task.origins[i] for i in miss_positions] if batch_task.origins else []
+        )
+        return hits, pending
+
+    def complete(self, batch_task: BatchTask, hits: Dict[int, Dict[str, str]], translated: Optional[BatchTask]) -> BatchTask:
+        """
+        Merges memory hits with the translated misses back into `batch_task`,
+        then stores the newly translated texts.
+        """
+        if translated is not None and translated is not batch_task:
+            primary_code = batch_task.file_task.target_lang["code"]
+            results = iter(translated.translated_texts or translated.texts)
+            companions = {code: iter(texts) for code, texts in translated.companion_results.items()}
+            merged = []
+            merged_companions: Dict[str, List[str]] = {code: [] for code in companions}
+            for i in range(len(batch_task.texts)):
+                if i in hits:
+                    merged.append(hits[i][primary_code])
+                    for code in merged_companions:
+                        merged_companions[code].append(hits[i][code])
+                else:
+                    merged.append(next(results, batch_task.texts[i]))
+                    for code, it in companions.items():
+                        merged_companions[code].append(next(it, batch_task.texts[i]))
+            miss_positions = [i for i in range(len(batch_task.texts)) if i not in hits]
+            batch_task.translated_texts = merged
+            batch_task.failed = translated.failed
+            batch_task.failed_positions = [miss_positions[j] for j in translated.failed_positions]
+            batch_task.companion_results = merged_companions
+            batch_task.companion_failed = list(translated.companion_failed)
+            batch_task.companion_failed_positions = {
+                code: [miss_positions[j] for j in positions]
+                for code, positions in translated.companion_failed_positions.items()
+            }
+            miss_providers = translated.entry_providers
+            if len(miss_providers) != len(miss_positions):
+                miss_providers = [translated.file_task.provider_name] * len(miss_positions)
+            providers = iter(miss_providers)
+            batch_task.entry_providers = [
+                PROVIDER_TRANSLATION_MEMORY if i in hits else next(providers)
+                for i in range(len(batch_task.texts))
+            ]
+        elif translated is None:
+            # Every entry was served from memory
+            primary_code = batch_task.file_task.target_lang["code"]
+            batch_task.translated_texts = [hits[i][primary_code] for i in range(len(batch_task.texts))]
+            batch_task.companion_results = {
+                lang["code"]: [hits[i][lang["code"]] for i in range(len(batch_task.texts))]
+                for lang in batch_task.file_task.companion_langs
+            }
+            batch_task.entry_providers = [PROVIDER_TRANSLATION_MEMORY] * len(batch_task.texts)
+            return batch_task
+
+        self._store_new(batch_task, translated, hits)
+        return batch_task
+
+    def _store_new(self, batch_task: BatchTask, translated: BatchTask, hits: Dict[int, Dict[str, str]]):
+        if self.read_only or translated.translated_texts is None:
+            return
+        source_code = batch_task.file_task.source_lang.get("code", "")
+        miss_sources = [text for i, text in enumerate(batch_task.texts) if i not in hits]
+        # Each entry is remembered under the provider/model that actually produced it
+        primary = batch_task.file_task.provider_name
+        providers = translated.entry_providers
+        if len(providers) != len(miss_sources):
+            providers = [primary] * len(miss_sources)
+        models = [self.model if provider == primary else self.fallback_models.get(provider) for provider in providers]
+
+        outputs = {}
+        if not translated.failed:
+            outputs[batch_task.file_task.target_lang["code"]] = (translated.translated_texts, translated.failed_positions)
+        for code, texts in translated.companion_results.items():
+            if code not in translated.companion_failed:
+                outputs[code] = (texts, translated.companion_failed_positions.get(code, []))
+        for code, (texts, failed_positions) in outputs.items():
+            if len(texts) == len(miss_sources):
+                # Entries that fell back to the source text are not remembered
+                failed = set(failed_positions)
+                by_model: Dict[str, List[Tuple[str, str]]] = {}
+                for j, pair in enumerate(zip(miss_sources, texts)):
+                    if j not in failed and models[j] is not None:
+                        by_model.setdefault(models[j], []).append(pair)
+                for model, pairs in by_model.items():
+                    self.memory.store(pairs, source_code, code, model, self._prompt_hash(batch_task, code))
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"tm_hits": self.hits, "tm_misses": self.misses}
+
+
+translation_memory = TranslationMemory()
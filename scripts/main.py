@@ -93,6 +93,21 @@ def main_menu_workflow():
 
         final_remote_id = workshop_id_info['id']
 
+        # --- 2.5 试运行估算 (可选，不调用 API) ---
+        if menu_handler.ask_dry_run_choice():
+            glossary_manager.set_fuzzy_matching_mode(fuzzy_mode)
+            report = initial_translate.run(
+                mod_name=mod_name,
+                source_lang=source_lang,
+                target_languages=target_languages,
+                game_profile=game_profile,
+                mod_context=mod_context,
+                selected_provider=api_provider,
+                selected_glossary_ids=selected_glossary_ids,
+                dry_run=True
+            )
+            menu_handler.show_dry_run_report(report)
+
         # --- 3. 工程总览与确认 ---
         user_confirmed = menu_handler.show_project_overview(
             mod_name, api_provider, game_profile, source_lang, target_languages,
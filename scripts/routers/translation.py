@@ -10,11 +10,13 @@ from fastapi.responses import FileResponse
 
 from scripts.shared.state import tasks
 from scripts.shared.services import project_manager, glossary_manager, archive_manager
-from scripts.schemas.translation import InitialTranslationRequest, TranslationRequestV2, CustomLangConfig, CheckpointStatusRequest
+from scripts.schemas.translation import InitialTranslationRequest, DryRunRequest, TranslationRequestV2, CustomLangConfig, CheckpointStatusRequest
 from scripts.app_settings import GAME_PROFILES, LANGUAGES, API_PROVIDERS, SOURCE_DIR, DEST_DIR
 from scripts.workflows import initial_translate
 from scripts.utils import i18n
 from scripts.core.checkpoint_manager import CheckpointManager
+from scripts.core.telemetry_ledger import telemetry_ledger
+from scripts.core.http_transport import transport_registry
 
 import threading
 router = APIRouter()
@@ -57,6 +59,7 @@ def run_translation_workflow(task_id: str, mod_name: str, game_profile_id: str,
             target_languages=target_languages,
             selected_provider=api_provider,
             mod_context=mod_context,
+            task_id=task_id,
         )
 
         # 3. Once done, update status and prepare result
@@ -111,12 +114,58 @@ def run_translation_workflow(task_id: str, mod_name: str, game_profile_id: str,
             except Exception as e:
                 logging.error(f"Failed to log failure activity: {e}")
 
+def _resolve_workflow_inputs(
+    game_profile_id: str, source_lang_code: str, target_lang_codes: List[str],
+    custom_lang_config: Optional[CustomLangConfig], selected_glossary_ids: List[int], use_main_glossary: bool
+):
+    """Resolves the game profile, languages and glossary IDs of a workflow request (shared by translation and dry runs)."""
+    # Handle legacy/alias 'vic3' -> 'victoria3'
+    normalized_game_id = game_profile_id
+    if game_profile_id == 'vic3':
+        normalized_game_id = 'victoria3'
+        logging.info(f"Normalized game_id 'vic3' to '{normalized_game_id}'")
+
+    game_profile = GAME_PROFILES.get(normalized_game_id)
+    # Fallback: Try finding by 'id' field in values if key lookup fails
+    if not game_profile:
+        game_profile = next((p for p in GAME_PROFILES.values() if p['id'] == normalized_game_id), None)
+
+    source_lang = next((lang for lang in LANGUAGES.values() if lang["code"] == source_lang_code), None)
+    target_languages = [lang for lang in LANGUAGES.values() if lang["code"] in target_lang_codes]
+    
+    logging.info(f"Resolved: GameProfile={game_profile is not None}, SourceLang={source_lang is not None}, TargetLangs={len(target_languages)}")
+
+    # If custom language is provided, use it instead (or in addition? For now, let's assume it replaces if target_lang_codes contains 'custom')
+    if custom_lang_config:
+        # Convert Pydantic model to dict
+        custom_lang = custom_lang_config.dict()
+        # Ensure it has necessary fields
+        if not custom_lang.get('name_en'): custom_lang['name_en'] = custom_lang['name']
+        target_languages = [custom_lang]
+        logging.info(f"Using Custom Language Config: {custom_lang}")
+
+    if not all([game_profile, source_lang]) or (not target_languages and not custom_lang_config):
+        logging.error(f"Validation Failed: GameProfile={game_profile}, SourceLang={source_lang}, TargetLangs={target_languages}")
+        raise ValueError("无效的游戏配置、源语言或目标语言。")
+    
+    final_glossary_ids = list(selected_glossary_ids) if selected_glossary_ids else []
+    if use_main_glossary:
+        available = glossary_manager.get_available_glossaries(game_profile["id"])
+        main_glossary = next((g for g in available if g.get('is_main')), None)
+        if main_glossary and main_glossary['glossary_id'] not in final_glossary_ids:
+            final_glossary_ids.append(main_glossary['glossary_id'])
+    
+    return game_profile, source_lang, target_languages, final_glossary_ids
+
 def run_translation_workflow_v2(
     task_id: str, mod_name: str, game_profile_id: str, source_lang_code: str,
     target_lang_codes: List[str], api_provider: str, mod_context: str,
     selected_glossary_ids: List[int], model_name: Optional[str], use_main_glossary: bool,
     custom_lang_config: Optional[CustomLangConfig] = None,
-    project_id: Optional[str] = None
+    project_id: Optional[str] = None,
+    bypass_translation_memory: bool = False,
+    failover_providers: Optional[List[str]] = None,
+    bulk_mode: Optional[bool] = None
 ):
     i18n.load_language('en_US')
     tasks[task_id]["status"] = "processing"
@@ -143,13 +192,18 @@ def run_translation_workflow_v2(
         "current_batch": 0,
         "error_count": 0,
         "glossary_issues": 0,
-        "format_issues": 0
+        "format_issues": 0,
+        "tm_hits": 0,
+        "tm_misses": 0,
+        "dedup_duplicates": 0,
+        "dedup_saved_tokens": 0
     }
 
     def progress_callback(current, total, current_file, stage="Translating", 
                           current_batch=0, total_batches=0, 
                           error_count=0, glossary_issues=0, format_issues=0,
-                          log_message: str = None):
+                          log_message: str = None, tm_hits=0, tm_misses=0,
+                          dedup_duplicates=0, dedup_saved_tokens=0):
         with task_lock:
             if task_id not in tasks: return
             
@@ -162,6 +216,10 @@ def run_translation_workflow_v2(
             tasks[task_id]["progress"]["error_count"] = error_count
             tasks[task_id]["progress"]["glossary_issues"] = glossary_issues
             tasks[task_id]["progress"]["format_issues"] = format_issues
+            tasks[task_id]["progress"]["tm_hits"] = tm_hits
+            tasks[task_id]["progress"]["tm_misses"] = tm_misses
+            tasks[task_id]["progress"]["dedup_duplicates"] = dedup_duplicates
+            tasks[task_id]["progress"]["dedup_saved_tokens"] = dedup_saved_tokens
             
             if log_message:
                 tasks[task_id]["log"].append(log_message)
@@ -174,48 +232,18 @@ def run_translation_workflow_v2(
         logging.info(f"Starting V2 Workflow for Task {task_id}")
         logging.info(f"Params: game_profile_id={game_profile_id}, source={source_lang_code}, targets={target_lang_codes}")
         
-        # Handle legacy/alias 'vic3' -> 'victoria3'
-        normalized_game_id = game_profile_id
-        if game_profile_id == 'vic3':
-            normalized_game_id = 'victoria3'
-            logging.info(f"Normalized game_id 'vic3' to '{normalized_game_id}'")
-
-        game_profile = GAME_PROFILES.get(normalized_game_id)
-        # Fallback: Try finding by 'id' field in values if key lookup fails
-        if not game_profile:
-             game_profile = next((p for p in GAME_PROFILES.values() if p['id'] == normalized_game_id), None)
+        game_profile, source_lang, target_languages, final_glossary_ids = _resolve_workflow_inputs(
+            game_profile_id, source_lang_code, target_lang_codes, custom_lang_config, selected_glossary_ids, use_main_glossary
+        )
 
-        source_lang = next((lang for lang in LANGUAGES.values() if lang["code"] == source_lang_code), None)
-        target_languages = [lang for lang in LANGUAGES.values() if lang["code"] in target_lang_codes]
-        
-        logging.info(f"Resolved: GameProfile={game_profile is not None}, SourceLang={source_lang is not None}, TargetLangs={len(target_languages)}")
-
-        # If custom language is provided, use it instead (or in addition? For now, let's assume it replaces if target_lang_codes contains 'custom')
-        if custom_lang_config:
-            # Convert Pydantic model to dict
-            custom_lang = custom_lang_config.dict()
-            # Ensure it has necessary fields
-            if not custom_lang.get('name_en'): custom_lang['name_en'] = custom_lang['name']
-            target_languages = [custom_lang]
-            logging.info(f"Using Custom Language Config: {custom_lang}")
-
-        if not all([game_profile, source_lang]) or (not target_languages and not custom_lang_config):
-            logging.error(f"Validation Failed: GameProfile={game_profile}, SourceLang={source_lang}, TargetLangs={target_languages}")
-            raise ValueError("无效的游戏配置、源语言或目标语言。")
-        
-        final_glossary_ids = list(selected_glossary_ids) if selected_glossary_ids else []
-        if use_main_glossary:
-            available = glossary_manager.get_available_glossaries(game_profile["id"])
-            main_glossary = next((g for g in available if g.get('is_main')), None)
-            if main_glossary and main_glossary['glossary_id'] not in final_glossary_ids:
-                final_glossary_ids.append(main_glossary['glossary_id'])
-        
         logging.info("Calling initial_translate.run...")
         initial_translate.run(
             mod_name=mod_name, game_profile=game_profile, source_lang=source_lang,
             target_languages=target_languages, selected_provider=api_provider,
             mod_context=mod_context, selected_glossary_ids=final_glossary_ids,
-            model_name=model_name, use_glossary=True, progress_callback=progress_callback
+            model_name=model_name, use_glossary=True, progress_callback=progress_callback,
+            bypass_translation_memory=bypass_translation_memory, task_id=task_id,
+            failover_providers=failover_providers, bulk_mode=bulk_mode
         )
         logging.info("Returned from initial_translate.run")
         tasks[task_id]["status"] = "completed"
@@ -288,7 +316,10 @@ def start_translation_project(request: InitialTranslationRequest, background_tas
         request.model,
         request.use_main_glossary,
         request.custom_lang_config,
-        project_id=request.project_id
+        project_id=request.project_id,
+        bypass_translation_memory=request.bypass_translation_memory,
+        failover_providers=request.failover_providers,
+        bulk_mode=request.bulk_mode
     )
 
     # Auto-register translation path (Optimistic registration)
@@ -314,6 +345,38 @@ def start_translation_project(request: InitialTranslationRequest, background_tas
 
     return {"task_id": task_id, "status": "started", "message": f"Translation started for project {project['name']}"}
 
+@router.post("/api/translate/dry_run")
+def dry_run_translation(request: DryRunRequest):
+    """
+    Plans the translation of a project without calling any API and returns the estimate:
+    requests, input/output tokens per provider tokenizer, projected cost and wall-clock time.
+    """
+    project = project_manager.get_project(request.project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not os.path.exists(project['source_path']):
+        raise HTTPException(status_code=400, detail=f"Project source path not found: {project['source_path']}")
+
+    try:
+        game_profile, source_lang, target_languages, final_glossary_ids = _resolve_workflow_inputs(
+            project['game_id'], request.source_lang_code, request.target_lang_codes,
+            request.custom_lang_config, request.selected_glossary_ids, request.use_main_glossary
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    report = initial_translate.run(
+        mod_name=os.path.basename(project['source_path']), game_profile=game_profile, source_lang=source_lang,
+        target_languages=target_languages, selected_provider=request.api_provider,
+        mod_context=request.mod_context, selected_glossary_ids=final_glossary_ids,
+        model_name=request.model, use_glossary=True,
+        bypass_translation_memory=request.bypass_translation_memory,
+        compare_providers=request.compare_providers, dry_run=True
+    )
+    if report is None:
+        raise HTTPException(status_code=404, detail="No localisable files found for the source language")
+    return report
+
 @router.post("/api/translate")
 async def start_translation(
     background_tasks: BackgroundTasks,
@@ -410,7 +473,10 @@ async def start_translation_v2(
         payload.model_name,
         payload.use_main_glossary,
         payload.custom_lang_config,
-        project_id=None # Path-based upload might not have project ID
+        project_id=None, # Path-based upload might not have project ID
+        bypass_translation_memory=payload.bypass_translation_memory,
+        failover_providers=payload.failover_providers,
+        bulk_mode=payload.bulk_mode
     )
 
     return {"task_id": task_id, "message": "翻译任务已开始"}
@@ -444,6 +510,21 @@ def get_status(task_id: str):
         raise HTTPException(status_code=404, detail="任务未找到")
     return task
 
+@router.get("/api/telemetry/{task_id}")
+def get_telemetry(task_id: str, include_records: bool = False):
+    """Per-batch request telemetry of a task: token/latency percentiles, retries, outcomes and error classes."""
+    summary = telemetry_ledger.summary(task_id)
+    if not summary["requests"] and task_id not in tasks:
+        raise HTTPException(status_code=404, detail="任务未找到")
+    if include_records:
+        summary["records"] = telemetry_ledger.records(task_id)
+    return summary
+
+@router.get("/api/transport")
+def get_transport_stats():
+    """Per-provider HTTP connection pool statistics: requests, new connections, TLS handshakes and reuse ratio."""
+    return transport_registry.snapshot()
+
 @router.get("/api/result/{task_id}")
 def get_result(task_id: str):
     task = tasks.get(task_id)
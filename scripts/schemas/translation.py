@@ -30,6 +30,9 @@ class InitialTranslationRequest(BaseModel):
     use_main_glossary: bool = True
     clean_source: bool = False
     custom_lang_config: Optional[CustomLangConfig] = None
+    bypass_translation_memory: bool = False  # 强制重新翻译，不使用翻译记忆
+    failover_providers: Optional[List[str]] = None  # 故障转移链 (主 Provider 之后)，None 使用 FAILOVER_CHAIN
+    bulk_mode: Optional[bool] = None  # 离线批量模式 (Provider 批处理接口)，None 使用 BULK_MODE
 
     @field_validator('source_lang_code', mode='before')
     @classmethod
@@ -45,6 +48,9 @@ class InitialTranslationRequest(BaseModel):
             return [LanguageCode.from_str(code) if isinstance(code, str) else code for code in v]
         return v
 
+class DryRunRequest(InitialTranslationRequest):
+    compare_providers: Optional[List[str]] = None  # 额外估算的 Provider (使用各自的默认模型)
+
 class TranslationRequestV2(BaseModel):
     project_path: str
     game_profile_id: str
@@ -58,6 +64,9 @@ class TranslationRequestV2(BaseModel):
     clean_source: bool = False
     is_existing_source: bool = False
     custom_lang_config: Optional[CustomLangConfig] = None
+    bypass_translation_memory: bool = False  # 强制重新翻译，不使用翻译记忆
+    failover_providers: Optional[List[str]] = None  # 故障转移链 (主 Provider 之后)，None 使用 FAILOVER_CHAIN
+    bulk_mode: Optional[bool] = None  # 离线批量模式 (Provider 批处理接口)，None 使用 BULK_MODE
 
     @field_validator('source_lang_code', mode='before')
     @classmethod
@@ -36,19 +36,61 @@ class TestCheckpointManager(unittest.TestCase):
         self.assertTrue(os.path.exists(self.manager.checkpoint_path))
         self.manager.clear_checkpoint()
         self.assertFalse(os.path.exists(self.manager.checkpoint_path))
+        self.assertFalse(os.path.exists(self.manager.log_path))
+
+    def test_marking_appends_without_rewriting_snapshot(self):
+        self.manager.mark_file_completed("file1.txt")
+        snapshot_mtime = os.stat(self.manager.checkpoint_path).st_mtime_ns
+        with open(self.manager.checkpoint_path, encoding='utf-8') as f:
+            snapshot = f.read()
+
+        for i in range(2, 50):
+            self.manager.mark_file_completed(f"file{i}.txt")
+
+        with open(self.manager.checkpoint_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), snapshot)
+        self.assertEqual(os.stat(self.manager.checkpoint_path).st_mtime_ns, snapshot_mtime)
+        with open(self.manager.log_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 49)
+
+        new_manager = CheckpointManager(self.test_dir)
+        self.assertEqual(len(new_manager.completed_files), 49)
+
+    def test_loads_legacy_json_and_compacts(self):
+        import json
+        with open(self.manager.checkpoint_path, 'w', encoding='utf-8') as f:
+            json.dump({"metadata": {"model_name": "m"}, "completed_files": ["old.txt"]}, f)
+        manager = CheckpointManager(self.test_dir)
+        self.assertTrue(manager.is_file_completed("old.txt"))
+        self.assertEqual(manager.metadata, {"model_name": "m"})
+
+        manager.mark_file_completed("new.txt")
+        with open(manager.log_path, 'a', encoding='utf-8') as f:
+            f.write('"torn')  # crash mid-append
+        manager = CheckpointManager(self.test_dir)
+        self.assertEqual(manager.completed_files, {"old.txt", "new.txt"})
+
+        manager.save_checkpoint()
+        self.assertFalse(os.path.exists(manager.log_path))
+        with open(manager.checkpoint_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["completed_files"], ["new.txt", "old.txt"])
 
 class TestParallelProcessorStreaming(unittest.TestCase):
     def setUp(self):
         self.processor = ParallelProcessor(max_workers=2)
 
     def test_process_files_stream(self):
-        # Mock FileTasks
+        # Real FileTasks: packing, dedup, TM and file completion read most of their fields
         tasks = []
         for i in range(3):
-            task = MagicMock(spec=FileTask)
-            task.filename = f"file_{i}.txt"
-            task.texts_to_translate = [f"text_{i}_{j}" for j in range(10)]
-            task.provider_name = "mock"
+            task = FileTask(
+                filename=f"file_{i}.txt", root="", original_lines=[],
+                texts_to_translate=[f"text_{i}_{j}" for j in range(10)], key_map={},
+                is_custom_loc=False, target_lang={"code": "zh-CN", "name": "Simplified Chinese"},
+                source_lang={"code": "en", "name": "English"}, game_profile={}, mod_context="",
+                provider_name="mock", output_folder_name="", source_dir="", dest_dir="",
+                client=None, mod_name=""
+            )
             tasks.append(task)
 
         # Mock translation function
@@ -65,7 +107,7 @@ class TestParallelProcessorStreaming(unittest.TestCase):
         results = []
         stream = self.processor.process_files_stream(task_generator(), mock_translate)
         
-        for file_task, translated_texts, warnings in stream:
+        for file_task, translated_texts, warnings, failed in stream:
             results.append((file_task.filename, translated_texts))
 
         self.assertEqual(len(results), 3)
@@ -3,7 +3,7 @@
 测试目标：验证流式翻译工作流在启动前强制执行完整备份的逻辑
 """
 import pytest
-from unittest.mock import MagicMock, patch, call
+from unittest.mock import MagicMock, patch, call, DEFAULT
 import sys
 import os
 
@@ -26,6 +26,7 @@ class TestMandatoryBackupStrategy:
         with patch('scripts.workflows.initial_translate.discover_files') as mock_discover, \
              patch('scripts.workflows.initial_translate.file_parser') as mock_parser, \
              patch('scripts.workflows.initial_translate.archive_manager') as mock_archive, \
+             patch('scripts.workflows.initial_translate.telemetry_ledger'), \
              patch('scripts.workflows.initial_translate.CheckpointManager') as mock_checkpoint_cls, \
              patch('scripts.workflows.initial_translate.ParallelProcessor') as mock_processor_cls, \
              patch('scripts.workflows.initial_translate.api_handler') as mock_api, \
@@ -55,6 +56,14 @@ class TestMandatoryBackupStrategy:
                 {"key1": 0, "key2": 1}  # key_map
             )
 
+            # 源文件以迭代器形式流式交给快照，mock 需要逐个读取
+            def consume_sources(mod_id, all_files_data):
+                for _ in all_files_data:
+                    pass
+                return DEFAULT
+
+            mock_archive.create_source_version.side_effect = consume_sources
+
             # API handler mock
             mock_handler = MagicMock()
             mock_handler.provider_name = "test_provider"
@@ -76,10 +85,11 @@ class TestMandatoryBackupStrategy:
             mock_file_task.original_lines = ["line1", "line2"]
             mock_file_task.root = "/fake/root"
             mock_file_task.is_custom_loc = False
+            mock_file_task.target_lang = {"code": "zh", "name": "Chinese", "key": "l_simp_chinese"}
             
             # process_files_stream 返回一个迭代器
             mock_processor.process_files_stream.return_value = iter([
-                (mock_file_task, ["translated1", "translated2"], [])
+                (mock_file_task, ["translated1", "translated2"], [], False)
             ])
 
             # file_builder mock
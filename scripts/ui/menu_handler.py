@@ -491,6 +491,44 @@ def show_project_overview(mod_name, api_provider, game_profile, source_lang, tar
         else:
             logging.warning(i18n.t("invalid_confirm_choice"))
 
+def ask_dry_run_choice():
+    """
+    询问用户是否在开始前进行试运行估算 (不调用 API)
+    """
+    while True:
+        choice = input(i18n.t("dry_run_prompt")).strip().upper()
+        if choice == 'Y':
+            return True
+        elif choice == 'N':
+            return False
+        else:
+            logging.warning(i18n.t("invalid_confirm_choice"))
+
+def _format_duration(seconds):
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {secs:02d}s"
+
+def show_dry_run_report(report: Optional[Dict]):
+    """
+    显示试运行估算报告 (initial_translate.estimate_run 的返回值)
+    """
+    if not report:
+        logging.warning(i18n.t("dry_run_report_empty"))
+        return
+    logging.info(i18n.t("dry_run_report_title"))
+    logging.info(i18n.t("dry_run_report_summary", files=report["files"], entries=report["source_entries"],
+                        languages=", ".join(report["target_languages"]), seconds=report["elapsed_seconds"]))
+    for estimate in report["providers"]:
+        cost = f"${estimate['cost_usd']:.2f}" if estimate["cost_usd"] is not None else i18n.t("dry_run_cost_unknown")
+        logging.info(i18n.t(
+            "dry_run_report_provider", provider=estimate["provider"], model=estimate["model"],
+            requests=estimate["requests"], input_tokens=f"{estimate['input_tokens']:,}",
+            output_tokens=f"{estimate['output_tokens']:,}", tokenizer=estimate["tokenizer"], cost=cost,
+            duration=_format_duration(estimate["wall_seconds"]), concurrency=estimate["concurrency"]
+        ))
+        logging.info(i18n.t("dry_run_report_savings", duplicates=estimate["duplicates"], memory_hits=estimate["memory_hits"]))
+
 def handle_custom_language_selection():
     """
     处理自定义语言选择
@@ -21,6 +21,20 @@ class GlossaryValidator:
         else:
             return r'\b' + re.escape(term) + r'\b'
 
+    @staticmethod
+    def simple_glossary(glossary: Dict[str, Any], source_lang_code: str, target_lang_code: str) -> Dict[str, str]:
+        """Flattens the in-memory glossary into {source_term: target_term} for one language pair."""
+        simple = {}
+        if not source_lang_code or not target_lang_code:
+            return simple
+        for entry in glossary.get('entries', []):
+            translations = entry.get('translations', {})
+            source_term = translations.get(source_lang_code)
+            target_term = translations.get(target_lang_code)
+            if source_term and target_term and isinstance(source_term, str) and isinstance(target_term, str):
+                simple[source_term] = target_term
+        return simple
+
     def validate_batch(self, task: BatchTask, glossary: Dict[str, str]) -> List[Dict[str, Any]]:
         """
         Validates a batch of translations against the glossary.
@@ -32,18 +46,26 @@ class GlossaryValidator:
         Returns:
             List[Dict[str, Any]]: A list of warnings for inconsistencies.
         """
-        warnings = []
         if not hasattr(task, 'translated_texts') or not task.translated_texts:
+            return []
+        return self.validate_texts(
+            task.texts, task.translated_texts, glossary,
+            task.file_task.source_lang.get("code", ""), task.file_task.target_lang.get("code", ""),
+            task.file_task.filename, task.batch_index
+        )
+
+    def validate_texts(self, texts: List[str], translated_texts: List[str], glossary: Dict[str, str],
+                       source_lang_code: str, target_lang_code: str, file_path: str, batch_id: int) -> List[Dict[str, Any]]:
+        """Same check as validate_batch on plain lists, so it can run in a worker process."""
+        warnings = []
+        if not translated_texts:
             return warnings
 
-        original_chunk = "\n".join(task.texts)
-        translated_chunk = "\n".join(task.translated_texts)
-
-        file_path = task.file_task.filename
-        batch_id = task.batch_index
+        original_chunk = "\n".join(texts)
+        translated_chunk = "\n".join(translated_texts)
 
-        target_lang_code = task.file_task.target_lang.get("code", "").lower()
-        source_lang_code = task.file_task.source_lang.get("code", "").lower()
+        target_lang_code = target_lang_code.lower()
+        source_lang_code = source_lang_code.lower()
 
         for source_term, target_term in glossary.items():
             try:
@@ -3,9 +3,9 @@ import json
 import logging
 from json_repair import repair_json
 from pydantic import ValidationError, BaseModel
-from typing import Type, TypeVar
+from typing import Dict, List, Tuple, Type, TypeVar
 
-from scripts.core.schemas import TranslationResponse
+from scripts.core.schemas import TranslationResponse, MultiTargetTranslationResponse, IdentifiedTranslation
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +58,10 @@ def parse_response(response_text: str, pydantic_model: Type[T] = TranslationResp
         if payload_to_validate.strip().startswith('[') and pydantic_model is TranslationResponse:
              final_input_for_pydantic = f'{{"translations": {payload_to_validate}}}'
              model_instance = pydantic_model.model_validate_json(final_input_for_pydantic)
+        elif pydantic_model is MultiTargetTranslationResponse and '"translations"' not in payload_to_validate:
+            # Models often drop the wrapper and answer {"fr": [...], "de": [...]} directly.
+            final_input_for_pydantic = f'{{"translations": {payload_to_validate}}}'
+            model_instance = pydantic_model.model_validate_json(final_input_for_pydantic)
         else:
             # Otherwise, assume the payload is a complete object string for the target model.
             # This handles the 'SimpleModel' test case and direct '{"translations": ...}' cases.
@@ -68,6 +72,12 @@ def parse_response(response_text: str, pydantic_model: Type[T] = TranslationResp
             model_instance.translations = [
                 restore_special_tokens(t, target_lang) for t in model_instance.translations
             ]
+        elif pydantic_model is MultiTargetTranslationResponse:
+            # Each language list is restored with its own punctuation rules.
+            model_instance.translations = {
+                code: [restore_special_tokens(t, code) for t in texts]
+                for code, texts in model_instance.translations.items()
+            }
 
         return model_instance
 
@@ -79,3 +89,259 @@ def parse_response(response_text: str, pydantic_model: Type[T] = TranslationResp
         logger.critical(f"An unexpected critical error occurred during parsing. Error: {e}", exc_info=True)
         logger.debug(f"Failed to parse input (first 100 chars): {response_text[:100]}...")
         return None
+
+
+def parse_identified_response(response_text: str, expected_count: int, target_lang: str = "en") -> Dict[int, str]:
+    """
+    Lenient parser for the salvage format ([{"id": 1, "text": "..."}, ...]).
+    Keeps every well-formed item whose id is within 1..expected_count; malformed
+    elements, duplicate ids and out-of-range ids are dropped. A plain string array
+    is accepted only when it has exactly `expected_count` items, since it cannot
+    be aligned otherwise.
+
+    Returns {position (0-based): translation}. An empty dict means nothing was usable.
+    """
+    try:
+        stripped = _strip_code_fence(response_text.strip())
+        data = json.loads(repair_json(stripped))
+        if isinstance(data, dict) and isinstance(data.get("response"), str):
+            # gemini-cli style wrapper
+            stripped = _strip_code_fence(data["response"].strip())
+            data = json.loads(repair_json(stripped))
+        if isinstance(data, dict):
+            data = data.get("translations")
+    except Exception as e:
+        logger.error(f"Salvage parsing failed. Error: {e}")
+        return {}
+
+    if not isinstance(data, list):
+        return {}
+
+    if data and all(isinstance(item, str) for item in data):
+        if len(data) != expected_count:
+            return {}
+        return {position: restore_special_tokens(text, target_lang) for position, text in enumerate(data)}
+
+    # A response cut off mid-item is closed by repair_json, so its last element
+    # may look well-formed while being truncated. Only trust it if the raw text was valid JSON.
+    try:
+        json.loads(stripped)
+    except (json.JSONDecodeError, TypeError):
+        data = data[:-1]
+
+    salvaged: Dict[int, str] = {}
+    for item in data:
+        try:
+            parsed = IdentifiedTranslation.model_validate(item)
+        except ValidationError:
+            continue
+        position = parsed.id - 1
+        if 0 <= position < expected_count and position not in salvaged:
+            salvaged[position] = restore_special_tokens(parsed.text, target_lang)
+    return salvaged
+
+
+def _strip_code_fence(text: str) -> str:
+    if text.startswith("```json"):
+        return text[7:].rstrip("`").strip()
+    if text.startswith("```"):
+        return text[3:].rstrip("`").strip()
+    return text
+
+
+# 流式响应中断原因
+ABORT_PREAMBLE = "preamble"      # JSON 开始前的说明文字过长
+ABORT_MALFORMED = "malformed"    # 条目不是合法的 JSON
+ABORT_SCHEMA = "schema"          # 条目类型与要求的格式不符
+ABORT_OVERFLOW = "overflow"      # 条目数超过输入条目数
+ABORT_RUNAWAY = "runaway"        # 单条译文长度失控
+ABORT_REPETITION = "repetition"  # 连续复读同一条译文
+
+
+class IncrementalResponseParser:
+    """
+    流式响应的增量 JSON 解析器。
+    逐段喂入模型输出，在条目数组中每完成一个元素就校验一次：
+    合格的条目立即返回 (供下游提前使用)，输出已无法挽救时设置 abort_reason，调用方应立即中断流。
+    接受顶层数组或 {"translations": [...]} 包装；identified=True 时接受抢救格式 ([{"id": 1, "text": ...}])，
+    与 parse_identified_response 一致，也接受恰好 expected_count 条的纯字符串数组。
+    """
+
+    def __init__(self, expected_count: int, identified: bool = False, source_texts: List[str] | None = None,
+                 target_lang: str = "en", preamble_limit: int = 200, repetition_limit: int = 4, item_length_ratio: int = 10):
+        self.expected_count = expected_count
+        self.identified = identified
+        self.source_texts = list(source_texts or [])
+        self.target_lang = target_lang
+        self.preamble_limit = preamble_limit
+        self.repetition_limit = repetition_limit
+        longest = max((len(text) for text in self.source_texts), default=0)
+        self.max_item_chars = 200 + item_length_ratio * longest
+
+        self.buffer = ""
+        self.abort_reason: str | None = None
+        self.done = False
+        self.completed: Dict[int, str] = {}  # position -> 已交给下游的译文 (已还原特殊标记)
+        self._raw: Dict[int, str] = {}       # position -> 模型原文 (未还原)，用于中断后重建响应
+        self._pos = 0
+        self._json_start: int | None = None
+        self._depth = 0
+        self._item_depth: int | None = None
+        self._in_string = False
+        self._escape = False
+        self._element_start: int | None = None
+        self._elements = 0
+        self._form: str | None = None        # "string" 或 "object"
+        self._held: List[Tuple[int, str]] = []  # 可能是复读的条目，确认前不交给下游
+        self._last_text: str | None = None
+        self._last_position: int | None = None
+
+    def feed(self, chunk: str) -> Dict[int, str]:
+        """喂入一段输出，返回本段新完成并通过校验的条目 {position: text}。"""
+        released: Dict[int, str] = {}
+        if self.abort_reason or self.done or not chunk:
+            return released
+        self.buffer += chunk
+        buffer = self.buffer
+        while self._pos < len(buffer) and not (self.abort_reason or self.done):
+            char = buffer[self._pos]
+            i = self._pos
+            self._pos += 1
+
+            if self._json_start is None:
+                if char in "[{":
+                    self._json_start = i
+                    self._open(char, i)
+                elif i >= self.preamble_limit:
+                    self.abort_reason = ABORT_PREAMBLE
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+                self._start_element(i)
+            elif char in "[{":
+                self._start_element(i)
+                self._open(char, i)
+            elif char in "]}":
+                if self._item_depth is not None and self._depth == self._item_depth and char == "]":
+                    self._end_element(i, released)
+                    self.done = True
+                self._depth -= 1
+            elif char == "," and self._item_depth is not None and self._depth == self._item_depth:
+                self._end_element(i, released)
+            elif not char.isspace():
+                self._start_element(i)
+
+            if self._element_start is not None and i - self._element_start > self.max_item_chars:
+                self.abort_reason = ABORT_RUNAWAY
+        return released
+
+    def finish(self) -> Dict[int, str]:
+        """流结束：正常结束的响应中，暂扣的 (未达到复读上限的) 条目交给下游。"""
+        released: Dict[int, str] = {}
+        if not self.abort_reason:
+            self._release_held(released)
+        return released
+
+    @property
+    def positions_final(self) -> bool:
+        """
+        已完成条目的位置是否已确定：抢救格式 (带 id) 每条完成即确定；
+        纯字符串数组要等数组闭合、条数与输入一致后才能确认没有漏条错位。
+        """
+        return self._form == "object" or (self.done and not self.abort_reason and self._elements == self.expected_count)
+
+    @property
+    def identified_items(self) -> bool:
+        """条目是否为抢救格式 (带 id 的对象)。"""
+        return self._form == "object"
+
+    def result_text(self) -> str:
+        """
+        用于常规解析的响应文本。正常结束时为完整输出；
+        中断时为已交给下游的条目重建的合法 JSON，使中断前完成的条目可被抢救。
+        """
+        if not self.abort_reason:
+            return self.buffer
+        positions = sorted(self._raw)
+        if self._form == "object":
+            return json.dumps([{"id": p + 1, "text": self._raw[p]} for p in positions], ensure_ascii=False)
+        return json.dumps([self._raw[p] for p in positions], ensure_ascii=False)
+
+    # --- 内部状态机 --------------------------------------------------------
+    def _open(self, char: str, index: int):
+        self._depth += 1
+        if self._item_depth is None and char == "[" and self._depth <= 2:
+            # 顶层数组，或顶层对象 (如 {"translations": [...]}) 中的第一个数组
+            self._item_depth = self._depth
+            self._element_start = None
+
+    def _start_element(self, index: int):
+        if self._item_depth is not None and self._depth == self._item_depth and self._element_start is None:
+            self._element_start = index
+
+    def _end_element(self, index: int, released: Dict[int, str]):
+        start, self._element_start = self._element_start, None
+        if start is None:
+            return
+        try:
+            value = json.loads(self.buffer[start:index])
+        except json.JSONDecodeError:
+            self.abort_reason = ABORT_MALFORMED
+            return
+
+        form = "string" if isinstance(value, str) else "object" if isinstance(value, dict) else None
+        if form is None or (self._form and form != self._form) or (form == "object" and not self.identified):
+            self.abort_reason = ABORT_SCHEMA
+            return
+        self._form = form
+        self._elements += 1
+        if self._elements > self.expected_count:
+            self.abort_reason = ABORT_OVERFLOW
+            return
+
+        if form == "string":
+            position, text = self._elements - 1, value
+        else:
+            try:
+                item = IdentifiedTranslation.model_validate(value)
+            except ValidationError:
+                return  # 与 parse_identified_response 一样跳过格式错误的条目
+            position, text = item.id - 1, item.text
+            if not 0 <= position < self.expected_count or position in self._raw:
+                return
+        self._accept(position, text, released)
+
+    def _accept(self, position: int, text: str, released: Dict[int, str]):
+        if self._last_text is not None and text == self._last_text and not self._same_source(position):
+            self._held.append((position, text))
+            # 第一条在确认复读前已交给下游，暂扣的后续条目一并丢弃
+            if len(self._held) + 1 >= self.repetition_limit:
+                self._held = []
+                self.abort_reason = ABORT_REPETITION
+            return
+        self._release_held(released)
+        self._last_text, self._last_position = text, position
+        self._emit(position, text, released)
+
+    def _same_source(self, position: int) -> bool:
+        previous = self._held[-1][0] if self._held else self._last_position
+        if previous is None or not (0 <= position < len(self.source_texts) and 0 <= previous < len(self.source_texts)):
+            return False
+        return self.source_texts[position] == self.source_texts[previous]
+
+    def _release_held(self, released: Dict[int, str]):
+        for position, text in self._held:
+            self._emit(position, text, released)
+        self._held = []
+
+    def _emit(self, position: int, text: str, released: Dict[int, str]):
+        self._raw[position] = text
+        self.completed[position] = released[position] = restore_special_tokens(text, self.target_lang)
@@ -1,6 +1,9 @@
 # scripts/workflows/initial_translate.py
 import os
+import sys
+import uuid
 import logging
+from dataclasses import dataclass
 from typing import Any, Optional, List, Iterator
 
 from scripts.core import file_parser, api_handler, file_builder, asset_handler, directory_handler
@@ -11,8 +14,17 @@ from scripts.core.loc_parser import parse_loc_file
 from scripts.core.project_manager import ProjectManager
 from scripts.core.archive_manager import archive_manager
 from scripts.core.checkpoint_manager import CheckpointManager
-from scripts.app_settings import SOURCE_DIR, DEST_DIR, LANGUAGES, RECOMMENDED_MAX_WORKERS, ARCHIVE_RESULTS_AFTER_TRANSLATION, CHUNK_SIZE, GEMINI_CLI_CHUNK_SIZE, OLLAMA_CHUNK_SIZE
+from scripts.core.batch_journal import BatchJournal
+from scripts.core.batch_planner import BatchPlanner, BatchBudget, BatchCounter
+from scripts.core.translation_memory import translation_memory
+from scripts.core.telemetry_ledger import telemetry_ledger
+from scripts.core.failover import build_failover_router
+from scripts.core.cpu_stage import cpu_stage_pool
+from scripts.core.run_estimator import RunEstimator
+from scripts.core import bulk_jobs
+from scripts.app_settings import SOURCE_DIR, DEST_DIR, LANGUAGES, API_PROVIDERS, RECOMMENDED_MAX_WORKERS, ARCHIVE_RESULTS_AFTER_TRANSLATION, CROSS_FILE_PACKING, EXECUTION_MODE, ASYNC_MAX_CONCURRENCY, MULTI_TARGET_MODE, TRANSLATION_MEMORY_ENABLED, INTRA_RUN_DEDUP, PARTIAL_SALVAGE, BATCH_JOURNAL_ENABLED, BATCH_SCHEDULING, SCHEDULING_LOOKAHEAD_BATCHES, SOURCE_MEMORY_CEILING_MB, TELEMETRY_ENABLED, HEDGED_REQUESTS, FAILOVER_CHAIN, STREAMING_RESPONSES, PROMPT_LAYOUT, BULK_MODE, BULK_POLL_INTERVAL_SECONDS, BULK_MAX_WAIT_SECONDS
 from scripts.utils import i18n
+from scripts.utils.memory_usage import peak_rss_mb
 
 
 def run(mod_name: str,
@@ -27,9 +39,29 @@ def run(mod_name: str,
         use_glossary: bool = True,
         project_id: Optional[str] = None,
         custom_lang_config: Optional[dict] = None,
-        progress_callback: Optional[Any] = None):
-    """【最终版】初次翻译工作流（多语言 & 多游戏兼容）- 流式处理 & 断点续传版"""
+        progress_callback: Optional[Any] = None,
+        execution_mode: Optional[str] = None,
+        multi_target: Optional[bool] = None,
+        bypass_translation_memory: bool = False,
+        task_id: Optional[str] = None,
+        failover_providers: Optional[List[str]] = None,
+        dry_run: bool = False,
+        compare_providers: Optional[List[str]] = None,
+        bulk_mode: Optional[bool] = None):
+    """
+    【最终版】初次翻译工作流（多语言 & 多游戏兼容）- 流式处理 & 断点续传版
+    dry_run=True 时只规划请求并返回估算报告 (见 estimate_run)，不调用 API、不写任何输出。
+    bulk_mode=True 时通过 Provider 的批处理接口离线翻译 (见 scripts/core/bulk_jobs.py)，None 使用 BULK_MODE。
+    """
     logging.info("Entered initial_translate.run")
+    if dry_run:
+        return estimate_run(
+            mod_name, source_lang, target_languages, game_profile, mod_context,
+            selected_provider=selected_provider, selected_glossary_ids=selected_glossary_ids,
+            model_name=model_name, use_glossary=use_glossary, progress_callback=progress_callback,
+            execution_mode=execution_mode, multi_target=multi_target,
+            bypass_translation_memory=bypass_translation_memory, compare_providers=compare_providers
+        )
 
     # ───────────── 1. 路径与模式 ─────────────
     is_batch_mode = len(target_languages) > 1
@@ -59,12 +91,7 @@ def run(mod_name: str,
         return
 
     # ───────────── 2.5. 加载词典 ─────────────
-    game_id = game_profile.get("id", "")
-    if game_id and use_glossary:
-        if selected_glossary_ids:
-            glossary_manager.load_selected_glossaries(selected_glossary_ids)
-        else:
-            glossary_manager.load_game_glossary(game_id)
+    _load_glossary(game_profile, use_glossary, selected_glossary_ids)
 
     # ───────────── 3. 创建输出目录 & 初始化断点管理器 ─────────────
     directory_handler.create_output_structure(mod_name, output_folder_name, game_profile)
@@ -87,55 +114,98 @@ def run(mod_name: str,
         logging.warning(i18n.t("no_localisable_files_found", lang_name=source_lang['name']))
         return
 
+    # 按文件名稳定排序：源版本快照的哈希按文件名顺序计算，解析只需顺序遍历一次
+    all_file_paths = sorted(all_file_paths, key=lambda fi: fi["filename"])
+
     # Update progress total
     total_files = len(all_file_paths)
     if progress_callback:
         progress_callback(0, total_files, "", "Analyzing Files")
 
-    # ───────────── 4.5. 强制全量备份 (Brute Force Backup) ─────────────
-    # 策略变更：数据安全第一。在开始任何翻译前，强制将所有源文件读入内存并创建快照。
-    # 即使是大 Mod，文本数据通常也不超过 50MB，内存不是瓶颈。
-    
-    logging.info("Reading all source files for backup...")
-    all_files_content = []
-    
-    for idx, file_info in enumerate(all_file_paths):
-        fp = file_info["path"]
-        if progress_callback:
-             progress_callback(idx, total_files, file_info["filename"], "Reading Source")
-        try:
-            orig, texts, km = file_parser.extract_translatable_content(fp)
-            # 仅存储包含可翻译文本的文件
-            if texts: 
-                file_info["original_lines"] = orig
-                file_info["texts_to_translate"] = texts
-                file_info["key_map"] = km
-                all_files_content.append(file_info)
-            else:
-                # 空文件也保留
-                file_info["original_lines"] = orig
-                file_info["texts_to_translate"] = []
-                file_info["key_map"] = []
-                all_files_content.append(file_info)
-                
-        except Exception as e:
-            logging.error(f"Failed to parse file {fp} for backup: {e}")
-            logging.error("Aborting workflow due to file read error.")
-            return
+    # 离线批量模式：Provider 没有批处理接口时退回实时请求
+    bulk_backend = None
+    if BULK_MODE if bulk_mode is None else bulk_mode:
+        bulk_backend = bulk_jobs.get_bulk_backend(handler, output_dir_path)
+        if bulk_backend is None:
+            logging.warning(f"{selected_provider} has no batch API configured (batch_api); translating in realtime.")
 
     # Calculate Total Batches (Pre-calculation)
-    total_batches = 0
-    # Determine chunk size based on provider
-    if selected_provider == "gemini_cli":
-        chunk_size = GEMINI_CLI_CHUNK_SIZE
-    elif selected_provider == "ollama":
-        chunk_size = OLLAMA_CHUNK_SIZE
-    else:
-        chunk_size = CHUNK_SIZE
+    # The same token-budget planner is handed to the ParallelProcessor below,
+    # so the pre-computed total matches the batches that are actually dispatched.
+    # 多目标语言模式：一次请求返回所有目标语言 (Gemini CLI 自行管理请求，不支持该模式)
+    # 离线批量模式按单语言请求回放结果，不使用多目标语言模式
+    use_multi_target = (MULTI_TARGET_MODE if multi_target is None else multi_target) \
+        and len(target_languages) > 1 and selected_provider != "gemini_cli" and bulk_backend is None
+    planner_overrides = None
+    if use_multi_target:
+        # The expected output grows with the number of languages returned per request.
+        base_ratio = BatchBudget.for_provider(selected_provider).output_ratio
+        planner_overrides = {"output_ratio": base_ratio * len(target_languages)}
+        logging.info(f"Multi-target mode: {len(target_languages)} languages per request.")
+        if STREAMING_RESPONSES:
+            # 增量解析器只校验单个条目数组；合并请求完整返回后再解析，单语言回退请求仍然流式
+            logging.warning("Streaming responses are not used for multi-target requests; only single-language fallback requests stream.")
+    batch_planner = BatchPlanner.for_provider(selected_provider, planner_overrides)
+
+    # 每个目标语言独立的断点、校对看板与输出；翻译批次共享同一个工作池
+    lang_runs: List[_LanguageRun] = []
+    for target_lang in target_languages:
+        logging.info(i18n.t("translating_to_language", lang_name=target_lang["name"]))
+        current_config = {
+            "model_name": gemini_cli_model or selected_provider,
+            "source_lang": source_lang.get("code"),
+            "target_lang_code": target_lang.get("code")
+        }
+        # Use a unique checkpoint file for each language to prevent conflicts in batch mode
+        checkpoint_filename = f".remis_checkpoint_{target_lang.get('code', 'unknown')}.json"
+        lang_runs.append(_LanguageRun(
+            target_lang=target_lang,
+            checkpoint_manager=CheckpointManager(output_dir_path, current_config=current_config, checkpoint_filename=checkpoint_filename),
+            proofreading_tracker=create_proofreading_tracker(mod_name, output_folder_name, target_lang.get("code", "zh-CN"))
+        ))
+    runs_by_code = {run.target_lang.get("code"): run for run in lang_runs}
+
+    def pending_runs(file_info) -> List[_LanguageRun]:
+        return [run for run in lang_runs if not run.checkpoint_manager.is_file_completed(file_info["filename"])]
+
+    # Re-plan for the files each language still has to translate, so files
+    # skipped by the checkpoint don't keep the progress bar below 100%.
+    # 多目标语言模式下一个请求覆盖文件仍需的所有语言，因此只有一个计数器。
+    total_counter = BatchCounter(batch_planner, pack=CROSS_FILE_PACKING)
+    pending_counters = [
+        BatchCounter(batch_planner, pack=CROSS_FILE_PACKING, deduplicate=INTRA_RUN_DEDUP)
+        for _ in (lang_runs[:1] if use_multi_target else lang_runs)
+    ]
+
+    # ───────────── 4.5. 强制全量备份 (Streaming Backup) ─────────────
+    # 策略：数据安全第一。在开始任何翻译前，仍为所有源文件创建快照；
+    # 但解析结果逐文件分块写入归档，不再整体驻留内存。SOURCE_MEMORY_CEILING_MB 以内的解析结果
+    # 被缓存供翻译阶段复用，超出部分在轮到该文件时才重新解析。
+    source_cache = _SourceCache(SOURCE_MEMORY_CEILING_MB * 1024 * 1024)
+
+    def ingest_sources() -> Iterator[dict]:
+        for idx, file_info in enumerate(all_file_paths):
+            fp = file_info["path"]
+            if progress_callback:
+                progress_callback(idx, total_files, file_info["filename"], "Reading Source")
+            try:
+                orig, texts, km = file_parser.extract_translatable_content(fp)
+            except Exception as e:
+                logging.error(f"Failed to parse file {fp} for backup: {e}")
+                logging.error("Aborting workflow due to file read error.")
+                raise
+            if not texts:
+                # 空文件也保留
+                texts, km = [], []
+
+            total_counter.add(texts)
+            runs = pending_runs(file_info)
+            for counter, run in zip(pending_counters, lang_runs):
+                if (runs if use_multi_target else run in runs):
+                    counter.add(texts)
 
-    for file_data in all_files_content:
-        if not file_data["texts_to_translate"]: continue
-        total_batches += (len(file_data["texts_to_translate"]) + chunk_size - 1) // chunk_size
+            source_cache.offer(fp, (orig, texts, km))
+            yield dict(file_info, original_lines=orig, texts_to_translate=texts, key_map=km)
 
     # 创建源版本快照
     mod_id = archive_manager.get_or_create_mod_entry(mod_name, f"local_{mod_name}")
@@ -143,19 +213,19 @@ def run(mod_name: str,
         logging.error("Failed to get/create mod entry in database. Aborting.")
         return
 
-    logging.info("Creating source version snapshot...")
-    if progress_callback:
-        progress_callback(0, total_files, "", "Creating Backup", total_batches=total_batches)
-        
-    version_id = archive_manager.create_source_version(mod_id, all_files_content)
-    
+    logging.info("Reading source files and creating source version snapshot...")
+    version_id = archive_manager.create_source_version(mod_id, ingest_sources())
+
     if not version_id:
         logging.error("Failed to create source version snapshot. Aborting workflow to prevent data loss.")
         return
-        
+
     logging.info(f"Source snapshot created successfully (Version ID: {version_id}). Proceeding to translation.")
+    logging.info(f"Planned {total_counter.total} token-budgeted batches for {total_files} files.")
+    logging.info(f"Source cache: {len(source_cache)} of {total_files} parsed files kept in memory "
+                 f"({source_cache.used_bytes / (1024 * 1024):.1f} MB, ceiling {SOURCE_MEMORY_CEILING_MB} MB).")
 
-    # ───────────── 5. 多语言并行翻译 (Streaming from Memory) ─────────────
+    # ───────────── 5. 多语言并行翻译 (Streaming) ─────────────
     
     # 准备归档 (如果需要)
     should_archive = ARCHIVE_RESULTS_AFTER_TRANSLATION or (project_id is not None)
@@ -165,76 +235,105 @@ def run(mod_name: str,
 
     import threading
 
-    for target_lang in target_languages:
-        logging.info(i18n.t("translating_to_language", lang_name=target_lang["name"]))
-        
-        proofreading_tracker = create_proofreading_tracker(
-            mod_name, output_folder_name, target_lang.get("code", "zh-CN")
-        )
-
-        # Initialize Checkpoint Manager for this language
-        current_config = {
-            "model_name": gemini_cli_model or selected_provider,
-            "source_lang": source_lang.get("code"),
-            "target_lang_code": target_lang.get("code")
-        }
-        # Use a unique checkpoint file for each language to prevent conflicts in batch mode
-        checkpoint_filename = f".remis_checkpoint_{target_lang.get('code', 'unknown')}.json"
-        checkpoint_manager = CheckpointManager(output_dir_path, current_config=current_config, checkpoint_filename=checkpoint_filename)
-
-
-
-        # Progress Tracking State
-        completed_batches = 0
-        processed_files_count = 0
-        error_count = 0
-        glossary_issues = 0
-        format_issues = 0
-        progress_lock = threading.Lock()
-
-        def update_progress(current_file_name="", stage="Translating", log_message=None, format_issues_override=None):
-            nonlocal format_issues
-            if format_issues_override is not None:
-                format_issues = format_issues_override
-
-            if progress_callback:
-                # PROGRESS FIX: Use batch counts for 'current' and 'total' so the progress bar is smooth.
-                # 'processed_files_count' and 'total_files' are still tracked but not used for the percentage calculation.
-                progress_callback(
-                    current=completed_batches,
-                    total=total_batches,
-                    current_file=current_file_name,
-                    stage=stage,
-                    current_batch=completed_batches,
-                    total_batches=total_batches,
-                    error_count=error_count,
-                    glossary_issues=glossary_issues,
-                    format_issues=format_issues,
-                    log_message=log_message
-                )
+    # 批次级断点日志 (所有语言共用一个文件，记录按 文件+语言 区分)
+    batch_journal = BatchJournal(output_dir_path) if BATCH_JOURNAL_ENABLED else None
+
+    # Progress Tracking State (combined over every target language)
+    completed_batches = 0
+    combined_total_batches = sum(counter.total for counter in pending_counters)
+    processed_files_count = 0
+    reparsed_files = 0
+    error_count = 0
+    glossary_issues = 0
+    format_issues = 0
+    progress_lock = threading.Lock()
+
+    model_label = handler.model_id or handler.get_provider_config().get('default_model', '')
+    # 批次遥测：按任务 ID 记录每次请求尝试 (CLI 运行没有任务 ID 时生成一个)
+    run_id = task_id or uuid.uuid4().hex
+    handler.telemetry = telemetry_ledger.session(run_id, selected_provider, model_label) if TELEMETRY_ENABLED else None
+    # 故障转移链：主 Provider 持续失败时把批次转给后续 Provider (None 表示使用 FAILOVER_CHAIN)
+    failover = build_failover_router(handler, FAILOVER_CHAIN if failover_providers is None else failover_providers)
+    fallback_models = {}
+    for fallback in (failover.handlers[1:] if failover else []):
+        fallback_model = fallback.model_id or fallback.get_provider_config().get('default_model', '')
+        fallback_models[fallback.provider_name] = f"{fallback.provider_name}:{fallback_model}"
+        if TELEMETRY_ENABLED:
+            fallback.telemetry = telemetry_ledger.session(run_id, fallback.provider_name, fallback_model)
+    # 翻译记忆：按 Provider/模型 隔离 (故障转移产出的条目记在实际翻译它们的模型下)；bypass 时跳过查找，但新译文仍写回
+    tm_model = f"{selected_provider}:{model_label}"
+    tm_session = translation_memory.session(
+        tm_model, bypass=bypass_translation_memory, fallback_models=fallback_models
+    ) if TRANSLATION_MEMORY_ENABLED else None
+
+    processor = None  # 由下方创建；去重统计随进度一起上报
+
+    def update_progress(current_file_name="", stage="Translating", log_message=None, format_issues_override=None):
+        nonlocal format_issues
+        if format_issues_override is not None:
+            format_issues = format_issues_override
 
-        # 定义文件任务生成器 (Producer) - 现在从内存读取
-        def file_task_generator() -> Iterator[FileTask]:
-            for file_data in all_files_content:
-                # 检查断点
-                if checkpoint_manager.is_file_completed(file_data["filename"]):
-                    logging.info(f"Skipping completed file: {file_data['filename']}")
+        if progress_callback:
+            tm_stats = tm_session.snapshot() if tm_session else {}
+            dedup_stats = processor.dedup_stats if processor else {}
+            # PROGRESS FIX: Use batch counts for 'current' and 'total' so the progress bar is smooth.
+            # 'processed_files_count' and 'total_files' are still tracked but not used for the percentage calculation.
+            progress_callback(
+                current=completed_batches,
+                total=combined_total_batches,
+                current_file=current_file_name,
+                stage=stage,
+                current_batch=completed_batches,
+                total_batches=combined_total_batches,
+                error_count=error_count,
+                glossary_issues=glossary_issues,
+                format_issues=format_issues,
+                log_message=log_message,
+                dedup_duplicates=dedup_stats.get("duplicates", 0),
+                dedup_saved_tokens=dedup_stats.get("saved_tokens", 0),
+                **tm_stats
+            )
+
+    # 定义文件任务生成器 (Producer) - 按需取出解析结果
+    # 缓存内的源文件只解析一次；每个文件依次为所有目标语言生成任务，使各语言的批次在工作池中交错执行。
+    # release_cache=False 时缓存保留 (离线批量模式的规划阶段之后还要再遍历一次)
+    def file_task_generator(release_cache: bool = True) -> Iterator[FileTask]:
+        nonlocal processed_files_count, reparsed_files
+        for file_data in all_file_paths:
+            runs = pending_runs(file_data)
+            for run in lang_runs:
+                if run not in runs:
+                    logging.info(f"Skipping completed file: {file_data['filename']} ({run.target_lang.get('code')})")
+
+            parsed = source_cache.take(file_data["path"]) if release_cache else source_cache.peek(file_data["path"])
+            if not runs:
+                continue
+            if parsed is None:
+                # 超出内存上限的文件在轮到它时才重新解析
+                try:
+                    orig, texts, km = file_parser.extract_translatable_content(file_data["path"])
+                except Exception as e:
+                    logging.error(f"Failed to re-read {file_data['filename']}: {e}. It stays unfinished for the next run.")
                     continue
-
-                texts = file_data["texts_to_translate"]
-                orig = file_data["original_lines"]
-                km = file_data["key_map"]
-
-                # 如果是空文件，直接处理并跳过生成器
+                reparsed_files += 1
                 if not texts:
-                    _handle_empty_file(file_data, orig, texts, km, source_lang, target_lang, game_profile, output_folder_name, mod_name, proofreading_tracker)
-                    checkpoint_manager.mark_file_completed(file_data["filename"])
+                    texts, km = [], []
+            else:
+                orig, texts, km = parsed
+
+            # 如果是空文件，直接处理并跳过生成器
+            if not texts:
+                for run in runs:
+                    _handle_empty_file(file_data, orig, texts, km, source_lang, run.target_lang, game_profile, output_folder_name, mod_name, run.proofreading_tracker)
+                    run.checkpoint_manager.mark_file_completed(file_data["filename"])
                     # Update progress for empty files
-                    nonlocal processed_files_count
                     processed_files_count += 1
                     update_progress(file_data["filename"], log_message=f"Skipped empty file: {file_data['filename']}")
-                    continue
+                continue
 
+            # 多目标语言模式下第一个语言作为主语言，其余语言随同一请求返回
+            groups = [runs] if use_multi_target and runs else [[run] for run in runs]
+            for group in groups:
                 yield FileTask(
                     filename=file_data["filename"],
                     root=file_data["root"],
@@ -242,7 +341,7 @@ def run(mod_name: str,
                     texts_to_translate=texts,
                     key_map=km,
                     is_custom_loc=file_data["is_custom_loc"],
-                    target_lang=target_lang,
+                    target_lang=group[0].target_lang,
                     source_lang=source_lang,
                     game_profile=game_profile,
                     mod_context=mod_context,
@@ -252,126 +351,390 @@ def run(mod_name: str,
                     dest_dir=DEST_DIR,
                     client=handler.client,
                     mod_name=mod_name,
-                    loc_root=file_data.get("loc_root", "")
+                    loc_root=file_data.get("loc_root", ""),
+                    companion_langs=[run.target_lang for run in group[1:]]
                 )
 
-        # 初始化并行处理器
-        max_workers = RECOMMENDED_MAX_WORKERS
-        if selected_provider == "ollama":
-            max_workers = 1 # Ollama usually can't handle parallel requests well locally
-        
-        processor = ParallelProcessor(max_workers=max_workers)
+    def on_batch_done(batch_task):
+        with progress_lock:
+            nonlocal completed_batches
+            completed_batches += 1
+            update_progress(batch_task.file_task.filename)
+
+    # 初始化并行处理器 (所有语言共用一个受限流器约束的工作池)
+    max_workers = RECOMMENDED_MAX_WORKERS
+    endpoint_pool = handler.endpoint_pool if selected_provider == "ollama" else None
+    if endpoint_pool is not None:
+        # 本地推理节点 (Ollama)：并发等于各节点并发上限之和，由节点池分配到具体节点
+        max_workers = endpoint_pool.capacity
+
+    # Gemini CLI 通过子进程调用，没有异步客户端，始终使用线程模式
+    mode = execution_mode or EXECUTION_MODE
+    if selected_provider == "gemini_cli":
+        mode = "thread"
+
+    def make_processor(**overrides) -> ParallelProcessor:
+        settings = dict(
+            max_workers=max_workers,
+            batch_planner=batch_planner,
+            pack_small_files=CROSS_FILE_PACKING,
+            execution_mode=mode,
+            max_concurrency=max_workers if endpoint_pool is not None else ASYNC_MAX_CONCURRENCY,
+            rate_limiter=handler.rate_limiter,
+            translation_memory=tm_session,
+            on_batch_complete=on_batch_done,
+            deduplicate=INTRA_RUN_DEDUP,
+            journal=batch_journal,
+            scheduling=BATCH_SCHEDULING,
+            schedule_window=SCHEDULING_LOOKAHEAD_BATCHES
+        )
+        settings.update(overrides)
+        return ParallelProcessor(**settings)
 
-        # 定义翻译函数 (Consumer)
+    processor = make_processor()
+
+    # 定义翻译函数 (Consumer) - 只有翻译记忆未命中的条目会到达这里
+    translator = failover or handler
+    if mode == "async":
+        async def translation_wrapper(batch_task):
+            return await translator.translate_batch_async(batch_task)
+    else:
         def translation_wrapper(batch_task):
-            result = handler.translate_batch(batch_task)
-            with progress_lock:
-                nonlocal completed_batches
-                completed_batches += 1
-                update_progress(batch_task.file_task.filename)
-            return result
-
-        # ───────────── Log Capture Handler ─────────────
-        class CallbackHandler(logging.Handler):
-            def emit(self, record):
-                try:
-                    msg = self.format(record)
-                    if "GET /api/status" in msg: return 
-                    update_progress(log_message=msg)
-                except Exception:
-                    self.handleError(record)
-
-        log_handler = CallbackHandler()
-        log_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        log_handler.setFormatter(formatter)
-        logging.getLogger().addHandler(log_handler)
+            return translator.translate_batch(batch_task)
+
+    # ───────────── Log Capture Handler ─────────────
+    class CallbackHandler(logging.Handler):
+        def emit(self, record):
+            try:
+                msg = self.format(record)
+                if "GET /api/status" in msg: return 
+                update_progress(log_message=msg)
+            except Exception:
+                self.handleError(record)
+
+    log_handler = CallbackHandler()
+    log_handler.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    log_handler.setFormatter(formatter)
+    logging.getLogger().addHandler(log_handler)
 
-        try:
-            # 开始流式处理
-            for file_task, translated_texts, warnings, is_failed in processor.process_files_stream(file_task_generator(), translation_wrapper):
-                processed_files_count += 1
-                
-                # Aggregate warnings and send logs
-                if is_failed:
-                    error_count += 1
-                    logging.error(f"File {file_task.filename} failed to translate (partially or fully). Using fallback.")
-                    update_progress(file_task.filename, "Failed", log_message=f"ERROR: File {file_task.filename} failed to translate. Rolled back to original text.")
-                
-                if warnings:
-                    # (Already handled by log handler but good for internal state)
+    try:
+        if bulk_backend is not None:
+            # 规划阶段与正式运行切分出相同的批次，但不限流、不写批次日志，翻译记忆只读
+            def plan_requests(collector):
+                planning_tm = translation_memory.session(tm_model, bypass=bypass_translation_memory, read_only=True,
+                                                         fallback_models=fallback_models) if tm_session else None
+                planner_run = make_processor(execution_mode="thread", rate_limiter=None, translation_memory=planning_tm,
+                                             on_batch_complete=None, journal=None)
+                for _ in planner_run.process_files_stream(file_task_generator(release_cache=False), collector):
                     pass
 
-                # 这里的 update_progress 主要是为了更新文件计数，日志已经在 logging.info 中捕获
-                update_progress(file_task.filename, log_message=f"SUCCESS: {file_task.filename} translated.")
-
-                # 构建目标目录
-                dest_dir = _build_dest_dir(file_task, target_lang, output_folder_name, game_profile)
-                os.makedirs(dest_dir, exist_ok=True)
-
-                # 重建并写入文件
-                dest_file_path = file_builder.rebuild_and_write_file(
-                    file_task.original_lines,
-                    file_task.texts_to_translate,
-                    translated_texts,
-                    file_task.key_map,
-                    dest_dir,
-                    file_task.filename,
-                    file_task.source_lang,
-                    file_task.target_lang,
-                    file_task.game_profile,
-                )
+            _run_bulk_jobs(handler, bulk_backend, lang_runs, plan_requests, update_progress)
 
-                # 更新校对进度
-                if dest_file_path:
-                    source_file_path = os.path.join(file_task.root, file_task.filename)
-                    proofreading_tracker.add_file_info({
-                        'source_path': source_file_path,
-                        'dest_path': dest_file_path,
-                        'translated_lines': len(file_task.texts_to_translate),
-                        'filename': file_task.filename,
-                        'is_custom_loc': file_task.is_custom_loc
-                    })
-                    logging.info(i18n.t("file_build_completed", filename=os.path.basename(dest_file_path)))
-
-                # 标记断点
-                checkpoint_manager.mark_file_completed(file_task.filename)
-
-                # 实时归档翻译结果 (Incremental Archiving)
-                if version_id:
-                    try:
-                        archive_manager.archive_translated_results(
-                            version_id,
-                            {file_task.filename: translated_texts},
-                            all_files_content,
-                            target_lang.get("code")
-                        )
-                    except Exception as e:
-                        logging.error(f"Failed to archive results for {file_task.filename}: {e}")
-
-        finally:
-            logging.getLogger().removeHandler(log_handler)
-
-        # ───────────── 6. 后处理 & 归档 ─────────────
-        # (Post-processing logic remains similar, but runs after all files are done)
-        _run_post_processing(mod_name, game_profile, target_lang, source_lang, output_folder_name, proofreading_tracker, update_progress)
+        # 开始流式处理
+        for file_task, translated_texts, warnings, is_failed in processor.process_files_stream(file_task_generator(), translation_wrapper):
+            processed_files_count += 1
+            run = runs_by_code[file_task.target_lang.get("code")]
+            target_lang = run.target_lang
+
+            # Aggregate warnings and send logs
+            if is_failed:
+                error_count += 1
+                logging.error(f"File {file_task.filename} failed to translate (partially or fully). Using fallback.")
+                update_progress(file_task.filename, "Failed", log_message=f"ERROR: File {file_task.filename} ({target_lang.get('code')}) failed to translate. Rolled back to original text.")
+            
+            if warnings:
+                # (Already handled by log handler but good for internal state)
+                pass
+
+            # 这里的 update_progress 主要是为了更新文件计数，日志已经在 logging.info 中捕获
+            update_progress(file_task.filename, log_message=f"SUCCESS: {file_task.filename} ({target_lang.get('code')}) translated.")
+
+            # 构建目标目录
+            dest_dir = _build_dest_dir(file_task, target_lang, output_folder_name, game_profile)
+            os.makedirs(dest_dir, exist_ok=True)
+
+            # 重建并写入文件
+            dest_file_path = file_builder.rebuild_and_write_file(
+                file_task.original_lines,
+                file_task.texts_to_translate,
+                translated_texts,
+                file_task.key_map,
+                dest_dir,
+                file_task.filename,
+                file_task.source_lang,
+                file_task.target_lang,
+                file_task.game_profile,
+            )
+
+            # 更新校对进度
+            if dest_file_path:
+                source_file_path = os.path.join(file_task.root, file_task.filename)
+                run.proofreading_tracker.add_file_info({
+                    'source_path': source_file_path,
+                    'dest_path': dest_file_path,
+                    'translated_lines': len(file_task.texts_to_translate),
+                    'filename': file_task.filename,
+                    'is_custom_loc': file_task.is_custom_loc
+                })
+                logging.info(i18n.t("file_build_completed", filename=os.path.basename(dest_file_path)))
+
+            # 标记断点
+            run.checkpoint_manager.mark_file_completed(file_task.filename)
+            if batch_journal:
+                batch_journal.discard(file_task.filename, target_lang.get("code"))
+
+            # 实时归档翻译结果 (Incremental Archiving)
+            if version_id:
+                try:
+                    archive_manager.archive_translated_results(
+                        version_id,
+                        {file_task.filename: translated_texts},
+                        [{"filename": file_task.filename, "key_map": file_task.key_map}],
+                        target_lang.get("code"),
+                        providers={file_task.filename: file_task.entry_providers}
+                    )
+                except Exception as e:
+                    logging.error(f"Failed to archive results for {file_task.filename}: {e}")
+
+    finally:
+        logging.getLogger().removeHandler(log_handler)
+        logging.info(f"Rate limiter {handler.rate_limiter.name}: {handler.rate_limiter.snapshot()}")
+        if tm_session:
+            logging.info(f"Translation memory: {tm_session.snapshot()}")
+        if INTRA_RUN_DEDUP:
+            logging.info(f"Intra-run dedup: {processor.dedup_stats}")
+        if PARTIAL_SALVAGE:
+            logging.info(f"Partial response salvage: {handler.salvage_stats}")
+        if HEDGED_REQUESTS:
+            logging.info(f"Hedged requests: {handler.hedge_stats}")
+        if failover:
+            logging.info(f"Provider failover: {failover.snapshot()}")
+        logging.info(f"CPU stage pool: {cpu_stage_pool.snapshot()}")
+        logging.info(f"HTTP transport {handler.provider_name}: {handler.transport.snapshot()}")
+        if endpoint_pool is not None:
+            logging.info(f"Endpoint pool {endpoint_pool.name}: {endpoint_pool.snapshot()}")
+        if STREAMING_RESPONSES:
+            logging.info(f"Streaming responses: {handler.stream_stats}")
+        if bulk_backend is not None:
+            logging.info(f"Bulk mode ({bulk_backend.name}): {handler.bulk_stats}")
+        if handler.prompt_cache_stats["requests"]:
+            cache_stats = handler.prompt_cache_stats
+            logging.info(
+                f"Prompt cache ({PROMPT_LAYOUT} layout): {cache_stats['hits']}/{cache_stats['requests']} requests hit, "
+                f"{cache_stats['cached_tokens']}/{cache_stats['prompt_tokens']} prompt tokens cached, "
+                f"{cache_stats['explicit_caches']} explicit caches created."
+            )
+        if handler.telemetry:
+            telemetry = handler.telemetry.summary()
+            logging.info(
+                f"Telemetry (run {run_id}): {telemetry['requests']} requests, {telemetry['retries']} retries, "
+                f"{telemetry['prompt_tokens']} prompt / {telemetry['completion_tokens']} completion tokens, "
+                f"latency p50/p95 {telemetry['latency_ms']['p50']}/{telemetry['latency_ms']['p95']} ms, outcomes {telemetry['outcomes']}"
+            )
+        peak_rss = peak_rss_mb()
+        logging.info(f"Source ingestion: {reparsed_files} files re-read past the {SOURCE_MEMORY_CEILING_MB} MB ceiling; "
+                     f"peak RSS: {f'{peak_rss:.1f} MB' if peak_rss is not None else 'unavailable'}")
+
+    # ───────────── 6. 后处理 & 归档 ─────────────
+    # (Post-processing logic remains similar, but runs after all files are done)
+    for run in lang_runs:
+        _run_post_processing(mod_name, game_profile, run.target_lang, source_lang, output_folder_name, run.proofreading_tracker, update_progress)
 
         # 保存校对看板
-        proofreading_tracker.save_proofreading_progress()
+        run.proofreading_tracker.save_proofreading_progress()
 
     # ───────────── 7. 元数据处理 ─────────────
     if is_batch_mode:
         process_metadata_for_language(mod_name, handler, source_lang, primary_target_lang, output_folder_name, mod_context, game_profile)
     else:
-        process_metadata_for_language(mod_name, handler, source_lang, target_lang, output_folder_name, mod_context, game_profile)
+        process_metadata_for_language(mod_name, handler, source_lang, target_languages[0], output_folder_name, mod_context, game_profile)
 
     # ───────────── 8. 清理断点 ─────────────
-    checkpoint_manager.clear_checkpoint()
+    for run in lang_runs:
+        run.checkpoint_manager.clear_checkpoint()
+    if batch_journal:
+        batch_journal.clear()
     
     logging.info(i18n.t("translation_workflow_completed"))
     logging.info(i18n.t("output_folder_created", folder=output_folder_name))
 
 
+def estimate_run(mod_name: str,
+                 source_lang: dict,
+                 target_languages: list[dict],
+                 game_profile: dict,
+                 mod_context: str,
+                 selected_provider: str = "gemini",
+                 selected_glossary_ids: Optional[List[int]] = None,
+                 model_name: Optional[str] = None,
+                 use_glossary: bool = True,
+                 progress_callback: Optional[Any] = None,
+                 execution_mode: Optional[str] = None,
+                 multi_target: Optional[bool] = None,
+                 bypass_translation_memory: bool = False,
+                 compare_providers: Optional[List[str]] = None) -> Optional[dict]:
+    """
+    试运行：按真实运行的同一套解析、去重、翻译记忆、打包与词典注入规则规划全部请求，
+    返回请求数、token、费用与耗时估算 (每个 Provider 一项，第一项为选定的 Provider)。
+    不需要 API Key，不调用 API，也不创建输出目录、断点或源版本快照。
+    """
+    logging.info(f"Dry run for {mod_name} ({selected_provider})")
+    _load_glossary(game_profile, use_glossary, selected_glossary_ids)
+
+    all_file_paths = sorted(discover_files(mod_name, game_profile, source_lang), key=lambda fi: fi["filename"])
+    if not all_file_paths:
+        logging.warning(i18n.t("no_localisable_files_found", lang_name=source_lang['name']))
+        return None
+
+    providers = [(selected_provider, model_name or API_PROVIDERS.get(selected_provider, {}).get("default_model", ""))]
+    for name in compare_providers or []:
+        if name not in API_PROVIDERS:
+            logging.warning(f"Unknown provider '{name}' in dry-run comparison, skipping it.")
+        elif name not in (p for p, _ in providers):
+            providers.append((name, API_PROVIDERS[name].get("default_model", "")))
+
+    estimator = RunEstimator(
+        source_lang, target_languages, game_profile, mod_context, providers,
+        multi_target=MULTI_TARGET_MODE if multi_target is None else multi_target,
+        execution_mode=execution_mode,
+        translation_memory=translation_memory if TRANSLATION_MEMORY_ENABLED and not bypass_translation_memory else None,
+        pack=CROSS_FILE_PACKING,
+        deduplicate=INTRA_RUN_DEDUP
+    )
+    unreadable = 0
+    for idx, file_info in enumerate(all_file_paths):
+        if progress_callback:
+            progress_callback(idx, len(all_file_paths), file_info["filename"], "Estimating")
+        try:
+            _, texts, _ = file_parser.extract_translatable_content(file_info["path"])
+        except Exception as e:
+            # 试运行不中止：真实运行会在备份阶段因该文件报错
+            logging.error(f"Failed to parse file {file_info['path']}: {e}")
+            unreadable += 1
+            continue
+        estimator.add_file(texts or [])
+
+    report = dict(estimator.report(), mod_name=mod_name, unreadable_files=unreadable)
+    for estimate in report["providers"]:
+        logging.info(
+            f"Dry run {estimate['provider']}/{estimate['model']}: {estimate['requests']} requests, "
+            f"{estimate['input_tokens']} input / {estimate['output_tokens']} output tokens ({estimate['tokenizer']}), "
+            f"cost {estimate['cost_usd']} USD, ~{estimate['wall_seconds']} s at concurrency {estimate['concurrency']}"
+        )
+    return report
+
+
+def _load_glossary(game_profile: dict, use_glossary: bool, selected_glossary_ids: Optional[List[int]]):
+    game_id = game_profile.get("id", "")
+    if game_id and use_glossary:
+        if selected_glossary_ids:
+            glossary_manager.load_selected_glossaries(selected_glossary_ids)
+        else:
+            glossary_manager.load_game_glossary(game_id)
+
+
+class _SourceCache:
+    """解析结果缓存：总大小不超过 ceiling_bytes，放不下的文件不缓存 (翻译阶段重新解析)。"""
+
+    def __init__(self, ceiling_bytes: int):
+        self.ceiling_bytes = ceiling_bytes
+        self.used_bytes = 0
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _size(parsed) -> int:
+        return sum(sys.getsizeof(part) + sum(sys.getsizeof(item) for item in part) for part in parsed)
+
+    def offer(self, path: str, parsed) -> bool:
+        size = self._size(parsed)
+        if self.used_bytes + size > self.ceiling_bytes:
+            return False
+        self._entries[path] = (parsed, size)
+        self.used_bytes += size
+        return True
+
+    def peek(self, path: str):
+        """Returns the cached parse of `path` without removing it, or None if it wasn't kept."""
+        entry = self._entries.get(path)
+        return entry[0] if entry is not None else None
+
+    def take(self, path: str):
+        """Removes and returns the cached parse of `path`, or None if it wasn't kept."""
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return None
+        self.used_bytes -= entry[1]
+        return entry[0]
+
+
+def _run_bulk_jobs(handler, backend, lang_runs, plan_requests, update_progress):
+    """
+    离线批量模式：断点中没有作业时先规划并提交 (每个目标语言一个作业，作业 ID 写入该语言的断点)，
+    然后轮询到全部结束，把结果加载到 handler，供随后的正式运行按提示词回放。
+    超过 BULK_MAX_WAIT_SECONDS 仍未完成时抛出 TimeoutError，作业留在断点中，再次运行同一任务会继续轮询。
+    """
+    jobs = {}
+    for run in lang_runs:
+        record = run.checkpoint_manager.get_metadata(bulk_jobs.CHECKPOINT_KEY)
+        if record and record.get("backend") == backend.name:
+            jobs[run.target_lang.get("code")] = record
+        elif record:
+            logging.warning(f"Ignoring {record.get('backend')} batch job {record.get('job_id')} in the checkpoint; "
+                            f"{handler.provider_name} uses {backend.name}.")
+
+    if jobs:
+        logging.info(f"Resuming batch jobs from the checkpoint: {[record['job_id'] for record in jobs.values()]}")
+    else:
+        update_progress(stage="Preparing Batch Job", log_message="Bulk mode: planning every request...")
+        collector = bulk_jobs.BulkCollector(handler)
+        plan_requests(collector)
+        for run in lang_runs:
+            code = run.target_lang.get("code")
+            requests = collector.requests.get(code)
+            if not requests:
+                continue
+            try:
+                job_id = backend.submit(requests)
+            except Exception as e:
+                logging.error(f"Failed to submit the {code} batch job ({len(requests)} requests): {e}. Translating in realtime.")
+                continue
+            jobs[code] = bulk_jobs.job_record(backend, job_id, len(requests))
+            run.checkpoint_manager.set_metadata(bulk_jobs.CHECKPOINT_KEY, jobs[code])
+            logging.info(f"Submitted {backend.name} batch job {job_id} for {code}: {len(requests)} requests.")
+
+    def on_poll(statuses):
+        waiting = [job_id for job_id, status in statuses.items() if status == bulk_jobs.JOB_PENDING]
+        if waiting:
+            update_progress(stage="Waiting for Batch Job", log_message=f"Bulk mode: {len(waiting)}/{len(statuses)} batch job(s) still running.")
+
+    handler.load_bulk_responses({})
+    statuses = bulk_jobs.wait_for_jobs(backend, [record["job_id"] for record in jobs.values()],
+                                       BULK_POLL_INTERVAL_SECONDS, BULK_MAX_WAIT_SECONDS, on_poll)
+    if bulk_jobs.JOB_PENDING in statuses.values():
+        raise TimeoutError(f"Batch jobs still running after {BULK_MAX_WAIT_SECONDS}s; run the task again to resume polling.")
+
+    for code, record in jobs.items():
+        if statuses[record["job_id"]] != bulk_jobs.JOB_COMPLETED:
+            logging.warning(f"Batch job {record['job_id']} ({code}) failed; its batches are translated in realtime.")
+            continue
+        responses = bulk_jobs.responses_by_prompt(backend.results(record["job_id"]))
+        handler.load_bulk_responses(responses)
+        logging.info(f"Batch job {record['job_id']} ({code}) completed: "
+                     f"{sum(len(texts) for texts in responses.values())}/{record['requests']} results.")
+
+
+@dataclass
+class _LanguageRun:
+    """单个目标语言在一次多语言运行中的独立状态"""
+    target_lang: dict
+    checkpoint_manager: CheckpointManager
+    proofreading_tracker: Any
+
+
 def _handle_empty_file(file_info, orig, texts, km, source_lang, target_lang, game_profile, output_folder_name, mod_name, proofreading_tracker):
     """处理空文件的辅助函数"""
     # 创建临时的 FileTask (用于复用 _build_dest_dir)
@@ -582,21 +945,4 @@ def discover_files(mod_name: str, game_profile: dict, source_lang: dict) -> List
             logging.warning("Please check if you selected the correct Source Language.")
 
     return all_file_paths
-    
-    # 注意：流式处理模式下，我们无法在开始前创建完整的 Source Version Snapshot，
-    # 除非我们再次遍历所有文件读取内容。
-    # 为了性能，我们可以在流式处理过程中收集数据，或者接受 Snapshot 创建需要额外一次IO的成本。
-    # 鉴于 Snapshot 很重要，我们先快速读取一遍用于归档（如果启用了归档）。
-    # 或者，我们可以推迟归档到处理过程中？不，Source Version 应该是原始状态。
-    # 现在的逻辑是：如果启用了归档，我们还是得读一遍。
-    # 但为了避免内存爆炸，我们可以分批读并写入归档？ArchiveManager目前不支持流式写入。
-    # 暂时保留：如果启用归档，可能会消耗较多内存。但通常归档是在本地数据库，压力稍小。
-    # 为了真正解决内存问题，ArchiveManager 也应该优化，但那是另一个任务。
-    # 这里我们先假设归档步骤仍然是一次性的，或者我们跳过它以专注于翻译流。
-    # *决定*: 暂时跳过 Source Version 的自动创建，或者仅记录元数据。
-    # 为了保持兼容性，如果文件非常多，这步确实是瓶颈。
-    # 暂时保留原逻辑的简化版：只有在文件数可控时才归档？
-    # 实际上，我们可以让 ArchiveManager 逐个文件添加？
-    # 现有的 archive_manager.create_source_version 需要 all_files_data。
-    # 我们先略过这步的优化，专注于翻译过程的流式化。
 
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from scripts.core.archive_manager import ArchiveManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "mods_cache.sqlite"))
+    conn.row_factory = sqlite3.Row
+    manager = ArchiveManager()
+    manager._create_tables(conn)
+    manager._conn = conn
+    yield manager
+    conn.close()
+
+
+def _files():
+    return [
+        {"filename": "a.yml", "key_map": ["a1", "a2", "a3"], "texts_to_translate": ["A1", "A2", "A3"]},
+        {"filename": "b.yml", "key_map": ["b1"], "texts_to_translate": ["B1"]},
+        {"filename": "c.yml", "key_map": [], "texts_to_translate": []},
+    ]
+
+
+def test_streamed_snapshot_is_written_in_chunks(manager):
+    mod_id = manager.get_or_create_mod_entry("Mod", "local_Mod")
+
+    version_id = manager.create_source_version(mod_id, iter(_files()), chunk_size=2)
+
+    rows = manager.connection.execute(
+        "SELECT entry_key, source_text, file_path FROM source_entries WHERE version_id = ? ORDER BY source_entry_id",
+        (version_id,)
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [("a1", "A1", "a.yml"), ("a2", "A2", "a.yml"), ("a3", "A3", "a.yml"), ("b1", "B1", "b.yml")]
+    assert manager.connection.execute("SELECT COUNT(*) FROM staged_source_entries").fetchone()[0] == 0
+
+
+def test_streamed_snapshot_hashes_like_the_sorted_list(manager):
+    mod_id = manager.get_or_create_mod_entry("Mod", "local_Mod")
+    version_id = manager.create_source_version(mod_id, iter(_files()))
+
+    # Same sources given as an unsorted list resolve to the existing version
+    assert manager.create_source_version(mod_id, list(reversed(_files()))) == version_id
+    assert manager.connection.execute("SELECT COUNT(*) FROM source_versions").fetchone()[0] == 1
+    assert manager.connection.execute("SELECT COUNT(*) FROM source_entries").fetchone()[0] == 4
+
+
+def test_translated_entries_record_their_provider(manager):
+    mod_id = manager.get_or_create_mod_entry("Mod", "local_Mod")
+    version_id = manager.create_source_version(mod_id, _files())
+
+    manager.archive_translated_results(
+        version_id, {"a.yml": ["甲1", "A2", "甲3"]}, [{"filename": "a.yml", "key_map": ["a1", "a2", "a3"]}], "zh-CN",
+        providers={"a.yml": ["gemini", "", "translation_memory"]}
+    )
+
+    rows = manager.connection.execute(
+        "SELECT translated_text, provider FROM translated_entries ORDER BY source_entry_id"
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [("甲1", "gemini"), ("A2", ""), ("甲3", "translation_memory")]
+
+
+def test_provider_column_is_added_to_existing_databases(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "old.sqlite"))
+    conn.execute("CREATE TABLE translated_entries (translated_entry_id INTEGER PRIMARY KEY AUTOINCREMENT, source_entry_id INTEGER NOT NULL, language_code TEXT NOT NULL, translated_text TEXT NOT NULL, last_translated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, UNIQUE(source_entry_id, language_code))")
+
+    ArchiveManager()._create_tables(conn)
+
+    assert "provider" in [col[1] for col in conn.execute("PRAGMA table_info(translated_entries)")]
+    conn.close()
@@ -0,0 +1,219 @@
+import json
+import threading
+
+import pytest
+
+from scripts.core.base_handler import BaseApiHandler
+from scripts.core.parallel_processor import ParallelProcessor, FileTask, BatchTask
+from scripts.core.rate_limiter import ProviderLimiter
+
+ZH = {"code": "zh-CN", "name": "Simplified Chinese", "key": "l_simp_chinese"}
+
+
+class _PoisonHandler(BaseApiHandler):
+    """Translates every batch unless it contains a poisoned text, in which case the item count comes back wrong."""
+
+    def __init__(self, poison=("BAD",)):
+        self.poison = set(poison)
+        self.requests = []
+        super().__init__("mock")
+
+    def initialize_client(self):
+        return object()
+
+    def _build_prompt(self, task):
+        return json.dumps(task.texts)
+
+    def _call_api(self, client, prompt):
+        texts = json.loads(prompt)
+        self.requests.append(texts)
+        if self.poison & set(texts):
+            return json.dumps(["?"] * (len(texts) + 1))
+        return json.dumps([f"T({t})" for t in texts])
+
+    def _retry_delay(self, attempt, rate_limited):
+        return 0
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    monkeypatch.setattr("scripts.core.base_handler.BATCH_BISECT_AFTER_ATTEMPTS", 1)
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: None)
+
+
+def _file_task(texts):
+    return FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang={"code": "en", "name": "English"},
+        game_profile={}, mod_context="", provider_name="mock", output_folder_name="", source_dir="", dest_dir="",
+        client=None, mod_name="",
+    )
+
+
+def _batch(texts):
+    return BatchTask(file_task=_file_task(texts), batch_index=0, start_index=0, end_index=len(texts),
+                     texts=texts, origins=[(0, i) for i in range(len(texts))])
+
+
+def test_bisect_isolates_the_failing_entry():
+    texts = [f"e{i}" for i in range(8)]
+    texts[5] = "BAD"
+    handler = _PoisonHandler()
+
+    task = handler.translate_batch(_batch(texts))
+
+    assert not task.failed
+    assert task.failed_positions == [5]
+    assert task.translated_texts == [f"T({t})" if t != "BAD" else "BAD" for t in texts]
+    # Healthy halves are never re-sent
+    assert sum(1 for r in handler.requests if r == texts[:4]) == 1
+
+
+def test_batch_without_failures_is_sent_once():
+    handler = _PoisonHandler()
+
+    task = handler.translate_batch(_batch(["a", "b", "c"]))
+
+    assert handler.requests == [["a", "b", "c"]]
+    assert task.translated_texts == ["T(a)", "T(b)", "T(c)"]
+    assert task.failed_positions == []
+
+
+def test_bisect_disabled_retries_whole_batch(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.BATCH_BISECT_AFTER_ATTEMPTS", 0)
+    handler = _PoisonHandler()
+
+    task = handler.translate_batch(_batch(["a", "BAD"]))
+
+    assert all(r == ["a", "BAD"] for r in handler.requests)
+    assert task.failed
+    assert task.translated_texts == ["a", "BAD"]
+
+
+def test_async_bisect_matches_sync():
+    import asyncio
+
+    handler = _PoisonHandler()
+
+    task = asyncio.run(handler.translate_batch_async(_batch(["a", "BAD", "c", "d"])))
+
+    assert task.failed_positions == [1]
+    assert task.translated_texts == ["T(a)", "BAD", "T(c)", "T(d)"]
+
+
+def test_stream_marks_only_the_file_holding_the_failing_entry():
+    files = [
+        FileTask(**{**_file_task(["ok1", "ok2"]).__dict__, "filename": "good.yml"}),
+        FileTask(**{**_file_task(["ok3", "BAD"]).__dict__, "filename": "bad.yml"}),
+    ]
+    handler = _PoisonHandler()
+    processor = ParallelProcessor(max_workers=1, pack_small_files=True)
+
+    results = {ft.filename: (texts, failed) for ft, texts, _, failed in processor.process_files_stream(iter(files), handler.translate_batch)}
+
+    assert results["good.yml"] == (["T(ok1)", "T(ok2)"], False)
+    assert results["bad.yml"] == (["T(ok3)", "BAD"], True)
+
+
+class _ShortAnswerHandler(_PoisonHandler):
+    """Silently drops the last item of any batch larger than one."""
+
+    with_ids = True
+
+    def _call_api(self, client, prompt):
+        texts = json.loads(prompt)
+        self.requests.append(texts)
+        kept = texts[:-1] if len(texts) > 1 else texts
+        if not self.with_ids:
+            return json.dumps([f"T({t})" for t in kept])
+        return json.dumps([{"id": i + 1, "text": f"T({t})"} for i, t in enumerate(kept)])
+
+
+@pytest.fixture
+def salvage(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.PARTIAL_SALVAGE", True)
+
+
+def test_partial_response_is_salvaged_and_only_missing_ids_rerequested(salvage):
+    handler = _ShortAnswerHandler()
+
+    task = handler.translate_batch(_batch(["a", "b", "c", "d"]))
+
+    assert handler.requests == [["a", "b", "c", "d"], ["d"]]
+    assert task.translated_texts == ["T(a)", "T(b)", "T(c)", "T(d)"]
+    assert not task.failed and task.failed_positions == []
+    assert handler.salvage_stats["salvaged_items"] == 3
+    assert handler.salvage_stats["rerequested_items"] == 1
+    assert handler.salvage_stats["saved_tokens"] > 0
+
+
+def test_salvage_disabled_falls_back_to_bisecting(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.PARTIAL_SALVAGE", False)
+    handler = _ShortAnswerHandler()
+    handler.with_ids = False
+
+    task = handler.translate_batch(_batch(["a", "b"]))
+
+    assert handler.requests[0] == ["a", "b"]
+    assert ["a"] in handler.requests and ["b"] in handler.requests
+    assert task.translated_texts == ["T(a)", "T(b)"]
+    assert handler.salvage_stats["salvaged_items"] == 0
+
+
+def test_each_half_takes_its_own_limiter_slot():
+    handler = _PoisonHandler()
+    handler._rate_limiter = ProviderLimiter("test", requests_per_minute=600, initial_concurrency=1, max_concurrency=1)
+    processor = ParallelProcessor(max_workers=1, rate_limiter=handler.rate_limiter)
+
+    [(_, texts, _, _)] = list(processor.process_files_stream(iter([_file_task(["a", "BAD", "c", "d"])]), handler.translate_batch))
+
+    assert texts == ["T(a)", "BAD", "T(c)", "T(d)"]
+    # the batch and each of its four halves were charged against the limiter; retries reuse their slot
+    assert len(handler.requests) == 6 and handler.requests.count(["BAD"]) == 2
+    assert handler.rate_limiter.stats["requests"] == 5
+    assert handler.rate_limiter.in_flight == 0
+
+
+class _SlowPoisonHandler(_PoisonHandler):
+    """Holds the request for the lone poisoned entry until the consumer has seen an earlier file."""
+
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+        self.held = None
+
+    def _call_api(self, client, prompt):
+        if json.loads(prompt) == ["BAD"]:
+            self.held = self.released.wait(timeout=5)
+        return super()._call_api(client, prompt)
+
+
+def test_healthy_half_reaches_its_file_before_the_batch_finishes():
+    files = [
+        FileTask(**{**_file_task(["ok1", "ok2"]).__dict__, "filename": "good.yml"}),
+        FileTask(**{**_file_task(["BAD", "ok3"]).__dict__, "filename": "bad.yml"}),
+    ]
+    handler = _SlowPoisonHandler()
+    processor = ParallelProcessor(max_workers=1, pack_small_files=True)
+
+    order = []
+    for ft, texts, _, failed in processor.process_files_stream(iter(files), handler.translate_batch):
+        order.append((ft.filename, texts, failed))
+        handler.released.set()
+
+    assert order == [("good.yml", ["T(ok1)", "T(ok2)"], False), ("bad.yml", ["BAD", "T(ok3)"], True)]
+    # good.yml was yielded while the poisoned entry's request was still in flight
+    assert handler.held is True
+
+
+def test_salvage_follow_up_takes_its_own_limiter_slot(salvage):
+    handler = _ShortAnswerHandler()
+    handler._rate_limiter = ProviderLimiter("test", requests_per_minute=600, initial_concurrency=1, max_concurrency=1)
+    processor = ParallelProcessor(max_workers=1, rate_limiter=handler.rate_limiter)
+
+    [(_, texts, _, _)] = list(processor.process_files_stream(iter([_file_task(["a", "b", "c"])]), handler.translate_batch))
+
+    assert texts == ["T(a)", "T(b)", "T(c)"]
+    assert handler.requests == [["a", "b", "c"], ["c"]]
+    assert handler.rate_limiter.stats["requests"] == 2 and handler.rate_limiter.in_flight == 0
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from scripts.core.batch_journal import BatchJournal
+from scripts.core.batch_planner import BatchPlanner, BatchBudget
+from scripts.core.parallel_processor import ParallelProcessor, FileTask
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: None)
+
+
+def _planner(max_items):
+    return BatchPlanner(BatchBudget(
+        max_batch_tokens=100000, max_output_tokens=100000, max_batch_items=max_items,
+        prompt_overhead_tokens=0, output_ratio=1.0, per_item_overhead_tokens=0,
+    ))
+
+
+def _file_task(name, texts, companions=()):
+    return FileTask(
+        filename=name, root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang={"code": "zh-CN"}, source_lang={"code": "en"},
+        game_profile={}, mod_context="", provider_name="mock", output_folder_name="",
+        source_dir="", dest_dir="", client=None, mod_name="", companion_langs=list(companions),
+    )
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _Translator:
+    """Translates batches in order; raises once `fail_after` batches have been translated."""
+
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.fail_after = fail_after
+
+    def __call__(self, batch_task):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise _Interrupted()
+        self.sent.append(list(batch_task.texts))
+        batch_task.translated_texts = [f"zh:{t}" for t in batch_task.texts]
+        for lang in batch_task.file_task.companion_langs:
+            batch_task.companion_results[lang["code"]] = [f"{lang['code']}:{t}" for t in batch_task.texts]
+        return batch_task
+
+
+def _run(journal, files, translator):
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(2), journal=journal)
+    return {(ft.filename, ft.target_lang["code"]): (texts, failed)
+            for ft, texts, _, failed in processor.process_files_stream(iter(files), translator)}
+
+
+def test_resume_dispatches_only_missing_batches(tmp_path):
+    texts = [f"e{i}" for i in range(6)]
+    first = _Translator(fail_after=2)
+    _run(BatchJournal(str(tmp_path)), [_file_task("big.yml", texts)], first)  # third batch "fails"
+    assert first.sent == [["e0", "e1"], ["e2", "e3"]]
+
+    second = _Translator()
+    results = _run(BatchJournal(str(tmp_path)), [_file_task("big.yml", texts)], second)
+
+    assert second.sent == [["e4", "e5"]]
+    assert results[("big.yml", "zh-CN")] == ([f"zh:{t}" for t in texts], False)
+
+
+def test_changed_source_slice_is_not_replayed(tmp_path):
+    journal = BatchJournal(str(tmp_path))
+    journal.record("a.yml", "zh-CN", 0, [0, 1], ["a", "b"], ["zh:a", "zh:b"])
+
+    assert BatchJournal(str(tmp_path)).replay("a.yml", "zh-CN", ["a", "b"]) == {0: "zh:a", 1: "zh:b"}
+    assert BatchJournal(str(tmp_path)).replay("a.yml", "zh-CN", ["a", "changed"]) == {}
+
+
+def test_torn_last_line_is_skipped_and_discard_compacts(tmp_path):
+    journal = BatchJournal(str(tmp_path))
+    journal.record("a.yml", "zh-CN", 0, [0], ["a"], ["zh:a"])
+    journal.record("b.yml", "zh-CN", 0, [0], ["b"], ["zh:b"])
+    journal.discard("a.yml", "zh-CN")
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"file": "b.yml", "lang": "zh-CN", "idx": [1')
+
+    reloaded = BatchJournal(str(tmp_path))
+
+    assert reloaded.replay("a.yml", "zh-CN", ["a"]) == {}
+    assert reloaded.replay("b.yml", "zh-CN", ["b"]) == {0: "zh:b"}
+    with open(reloaded.journal_path, encoding="utf-8") as f:
+        assert [json.loads(line)["file"] for line in f] == ["b.yml"]
+
+    reloaded.discard("b.yml", "zh-CN")
+    assert not (tmp_path / BatchJournal.JOURNAL_FILENAME).exists()
+
+
+def test_multi_target_replay_requires_every_language(tmp_path):
+    fr = {"code": "fr"}
+    texts = ["a", "b", "c", "d"]
+    _run(BatchJournal(str(tmp_path)), [_file_task("m.yml", texts, [fr])], _Translator(fail_after=1))
+
+    journal = BatchJournal(str(tmp_path))
+    assert journal.replay("m.yml", "fr", texts) == {0: "fr:a", 1: "fr:b"}
+
+    second = _Translator()
+    results = _run(journal, [_file_task("m.yml", texts, [fr])], second)
+
+    assert second.sent == [["c", "d"]]
+    assert results[("m.yml", "fr")] == ([f"fr:{t}" for t in texts], False)
@@ -0,0 +1,136 @@
+import pytest
+
+from scripts.app_settings import API_PROVIDERS
+from scripts.core.batch_planner import BatchPlanner, BatchBudget, estimate_tokens
+from scripts.core.parallel_processor import ParallelProcessor, FileTask
+
+
+def _budget(**overrides):
+    values = dict(
+        max_batch_tokens=1000,
+        max_output_tokens=600,
+        max_batch_items=200,
+        prompt_overhead_tokens=100,
+        output_ratio=1.5,
+        per_item_overhead_tokens=2,
+    )
+    values.update(overrides)
+    return BatchBudget(**values)
+
+
+def test_estimate_tokens_latin_and_cjk():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    # Every CJK character counts as a token
+    assert estimate_tokens("船队") == 2
+
+
+def test_short_texts_fill_a_single_batch():
+    planner = BatchPlanner(_budget())
+    texts = ["Yes"] * 50
+    assert planner.plan(texts) == [(0, 50)]
+
+
+def test_item_cap_is_respected():
+    planner = BatchPlanner(_budget(max_batch_items=20))
+    ranges = planner.plan(["Yes"] * 50)
+    assert ranges == [(0, 20), (20, 40), (40, 50)]
+
+
+def test_long_texts_are_split_by_output_budget():
+    planner = BatchPlanner(_budget())
+    long_text = "x" * 800  # 200 tokens in, 300 tokens expected out
+    ranges = planner.plan([long_text] * 4)
+    assert len(ranges) == 4
+    assert ranges[0] == (0, 1)
+
+
+def test_oversized_entry_gets_its_own_batch():
+    planner = BatchPlanner(_budget())
+    huge = "y" * 10000
+    ranges = planner.plan(["a", huge, "b"])
+    assert ranges == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_ranges_cover_every_entry_in_order():
+    planner = BatchPlanner(_budget())
+    texts = [("word " * (i % 37)) for i in range(300)]
+    ranges = planner.plan(texts)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(texts)
+    for (_, prev_end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert prev_end == next_start
+
+
+def test_provider_budget_overrides_defaults():
+    ollama = BatchBudget.for_provider("ollama")
+    gemini = BatchBudget.for_provider("gemini")
+    assert ollama.max_batch_tokens < gemini.max_batch_tokens
+    assert BatchBudget.for_provider("gemini", {"max_batch_items": 7}).max_batch_items == 7
+
+
+def test_processor_uses_shared_planner():
+    planner = BatchPlanner(_budget(max_batch_items=3))
+    processor = ParallelProcessor(max_workers=1, batch_planner=planner)
+    file_task = FileTask(
+        filename="a_l_english.yml", root="", original_lines=[], texts_to_translate=["t"] * 7,
+        key_map={}, is_custom_loc=False, target_lang={}, source_lang={}, game_profile={},
+        mod_context="", provider_name="gemini", output_folder_name="", source_dir="",
+        dest_dir="", client=None, mod_name="",
+    )
+    batches = processor._create_batch_tasks([file_task])
+    assert [(b.start_index, b.end_index) for b in batches] == [(0, 3), (3, 6), (6, 7)]
+    assert processor.planned_batch_count == planner.count_batches(file_task.texts_to_translate)
+
+
+def test_count_batches_for_files_with_dedup_counts_unique_texts_only():
+    planner = BatchPlanner(BatchBudget(
+        max_batch_tokens=100000, max_output_tokens=100000, max_batch_items=2,
+        prompt_overhead_tokens=0, output_ratio=1.0, per_item_overhead_tokens=0,
+    ))
+    files = [["a", "b", "a"], ["b", "c"]]
+    assert planner.count_batches_for_files(files, pack=True) == 3
+    assert planner.count_batches_for_files(files, pack=True, deduplicate=True) == 2
+
+
+def test_batch_counter_matches_whole_plan_when_fed_file_by_file():
+    from scripts.core.batch_planner import BatchCounter
+    planner = BatchPlanner(_budget(max_batch_items=3))
+    files = [["x" * n for n in range(1, 6)], [], ["a", "b"], ["x" * 3000, "c"]]
+
+    for pack in (False, True):
+        counter = BatchCounter(planner, pack=pack)
+        for texts in files:
+            counter.add(texts)
+        expected = (planner.count_batches([t for texts in files for t in texts]) if pack
+                    else sum(planner.count_batches(texts) for texts in files))
+        assert counter.total == expected
+
+
+def test_latency_model_scales_with_output_tokens():
+    from scripts.core.batch_planner import LatencyModel
+    planner = BatchPlanner(_budget(), LatencyModel(base_seconds=1.0, input_tokens_per_second=1000.0, output_tokens_per_second=10.0))
+
+    short = planner.estimate_request_seconds(["a" * 40])
+    long = planner.estimate_request_seconds(["a" * 400])
+
+    assert short > 1.0
+    assert long > short
+    input_tokens, output_tokens = planner.estimate_request_tokens(["a" * 400])
+    assert long == pytest.approx(1.0 + input_tokens / 1000.0 + output_tokens / 10.0)
+
+
+def test_openai_compatible_handlers_request_the_planned_output_budget(monkeypatch):
+    from scripts.core.deepseek_handler import DeepSeekHandler
+
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "fake_key")
+    handler = DeepSeekHandler("deepseek")
+    budget = BatchBudget.for_provider("deepseek").max_output_tokens
+
+    max_tokens = handler._build_request_kwargs("prompt")["max_tokens"]
+
+    assert budget < max_tokens <= budget * 1.5
+    # an explicit provider setting wins over the budget
+    monkeypatch.setitem(API_PROVIDERS["deepseek"], "max_output_tokens", 8000)
+    assert handler._build_request_kwargs("prompt")["max_tokens"] == 8000
@@ -0,0 +1,172 @@
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from scripts.app_settings import API_PROVIDERS
+from scripts.core import api_handler, bulk_jobs
+from scripts.core.checkpoint_manager import CheckpointManager
+from scripts.core.http_transport import transport_registry
+from scripts.core.parallel_processor import FileTask, BatchTask
+from scripts.core.telemetry_ledger import TelemetryLedger
+from scripts.core.translation_memory import TranslationMemory
+from scripts.workflows import initial_translate
+
+EN = {"code": "en", "name": "English", "key": "l_english"}
+ZH = {"code": "zh-CN", "name": "Simplified Chinese", "key": "l_simp_chinese"}
+FR = {"code": "fr", "name": "French", "key": "l_french"}
+GAME = {"id": "unknown_game", "prompt_template": "Translate {source_lang_name} into {target_lang_name}.\n",
+        "source_localization_folder": "localization"}
+INSTANT = {"latency_distribution": "fixed", "latency_mean_seconds": 0.0}
+FILES = {"a_l_english.yml": ["Fleet ready", "Empire rises", "Fleet ready"], "b_l_english.yml": ["Planet lost"]}
+
+
+@pytest.fixture(autouse=True)
+def mock_provider(monkeypatch):
+    monkeypatch.setitem(API_PROVIDERS["mock"], "mock_behaviour", INSTANT)
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    monkeypatch.delenv("MOCK_LLM_BASE_URL", raising=False)
+    transport_registry.reset()
+    yield
+    transport_registry.reset()
+
+
+def _batch(texts, target=ZH):
+    file_task = FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=target, source_lang=EN, game_profile=GAME, mod_context="",
+        provider_name="mock", output_folder_name="", source_dir="", dest_dir="", client=None, mod_name="",
+    )
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts), texts=texts,
+                     origins=[(0, i) for i in range(len(texts))])
+
+
+def test_requests_are_serialized_as_openai_batch_lines(tmp_path):
+    handler = api_handler.get_handler("mock")
+    collector = bulk_jobs.BulkCollector(handler)
+    batch = collector(_batch(["Fleet ready", "Planet lost"]))
+    collector(_batch(["Fleet ready", "Planet lost"]))
+
+    backend = bulk_jobs.LocalBatchBackend(handler, str(tmp_path))
+    job_id = backend.submit(collector.requests["zh-CN"])
+
+    with open(tmp_path / ".remis_bulk" / job_id / "input.jsonl", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    # identical prompts share the digest but keep one request each
+    assert [bulk_jobs.request_key(line["custom_id"]) for line in lines] == [lines[0]["custom_id"][:-2]] * 2
+    assert lines[0]["custom_id"] != lines[1]["custom_id"]
+    assert lines[0]["method"] == "POST" and lines[0]["url"] == "/v1/chat/completions"
+    assert lines[0]["body"]["model"] == "mock-echo"
+    assert lines[0]["body"]["messages"][-1]["content"] == handler._build_prompt(batch)
+    # planning returns placeholders without calling the provider
+    assert batch.translated_texts == batch.texts and handler.client.stats["requests"] == 0
+
+
+def test_local_job_survives_a_new_backend_instance(tmp_path):
+    handler = api_handler.get_handler("mock")
+    collector = bulk_jobs.BulkCollector(handler)
+    collector(_batch(["Fleet ready"]))
+    job_id = bulk_jobs.LocalBatchBackend(handler, str(tmp_path), complete_after_polls=2).submit(collector.requests["zh-CN"])
+
+    assert bulk_jobs.LocalBatchBackend(handler, str(tmp_path), complete_after_polls=2).poll(job_id) == bulk_jobs.JOB_PENDING
+    restarted = bulk_jobs.LocalBatchBackend(api_handler.get_handler("mock"), str(tmp_path), complete_after_polls=2)
+    assert restarted.poll(job_id) == bulk_jobs.JOB_COMPLETED
+
+    results = restarted.results(job_id)
+    assert len(results) == 1 and '"[mock] Fleet ready"' in next(iter(results.values()))
+
+
+def test_handler_replays_results_and_falls_back_to_realtime():
+    handler = api_handler.get_handler("mock")
+    replayed, missing = _batch(["Fleet ready", "Empire rises"]), _batch(["Planet lost"])
+    prompt = handler._build_prompt(replayed)
+    response = '{"translations": ["舰队就绪", "帝国崛起"]}'
+    handler.load_bulk_responses(bulk_jobs.responses_by_prompt({f"{bulk_jobs.bulk_request_key(prompt)}-0": response}))
+
+    assert handler.translate_batch(replayed).translated_texts == ["舰队就绪", "帝国崛起"]
+    assert handler.translate_batch(missing).translated_texts == ["[mock] Planet lost"]
+    assert handler.bulk_stats == {"replayed": 1, "realtime": 1}
+    assert handler.client.stats["requests"] == 1
+
+
+def test_openai_output_lines_are_parsed():
+    lines = [
+        json.dumps({"custom_id": "k-0", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": " ok "}}]}}}),
+        json.dumps({"custom_id": "k-1", "response": {"status_code": 500, "body": {}}, "error": None}),
+        json.dumps({"custom_id": "j-2", "response": None, "error": {"message": "expired"}}),
+        "",
+    ]
+
+    assert bulk_jobs.parse_openai_output(lines) == {"k-0": "ok", "k-1": None, "j-2": None}
+    assert bulk_jobs.responses_by_prompt({"k-1": "b", "k-0": "a", "j-2": None}) == {"k": ["a", "b"]}
+
+
+@pytest.fixture
+def workflow(tmp_path, monkeypatch):
+    monkeypatch.setattr("scripts.workflows.initial_translate.DEST_DIR", str(tmp_path))
+    monkeypatch.setattr("scripts.workflows.initial_translate.BULK_POLL_INTERVAL_SECONDS", 0)
+    # both files share one request per language
+    monkeypatch.setattr("scripts.workflows.initial_translate.CROSS_FILE_PACKING", True)
+    monkeypatch.setitem(API_PROVIDERS["mock"], "batch_complete_after_polls", 2)
+    paths = [{"path": f"/fake/{name}", "filename": name, "root": "/fake", "is_custom_loc": False, "loc_root": ""} for name in FILES]
+    with patch('scripts.workflows.initial_translate.translation_memory', TranslationMemory(str(tmp_path / "tm.sqlite"))), \
+         patch('scripts.workflows.initial_translate.telemetry_ledger', TelemetryLedger(str(tmp_path / "telemetry.sqlite"))), \
+         patch('scripts.workflows.initial_translate.discover_files', return_value=paths), \
+         patch('scripts.workflows.initial_translate.file_parser') as parser, \
+         patch('scripts.workflows.initial_translate.archive_manager') as archive, \
+         patch('scripts.workflows.initial_translate.directory_handler'), \
+         patch('scripts.workflows.initial_translate.asset_handler'), \
+         patch('scripts.workflows.initial_translate.glossary_manager'), \
+         patch('scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation', return_value=None), \
+         patch('scripts.workflows.initial_translate.create_proofreading_tracker', side_effect=lambda *args: MagicMock()), \
+         patch('scripts.workflows.initial_translate.file_builder') as builder, \
+         patch('scripts.workflows.initial_translate.process_metadata_for_language'), \
+         patch('scripts.workflows.initial_translate._run_post_processing'):
+        parser.extract_translatable_content.side_effect = lambda path: ([], FILES[os.path.basename(path)], {})
+        archive.get_or_create_mod_entry.return_value = 1
+        archive.create_source_version.side_effect = lambda mod_id, files: (list(files), 7)[1]
+        builder.rebuild_and_write_file.return_value = None
+        yield {"builder": builder, "output": tmp_path / "Multilanguage-TestMod"}
+
+
+def _run_bulk():
+    handlers = []
+    original = api_handler.get_handler
+
+    def get_handler(*args, **kwargs):
+        handlers.append(original(*args, **kwargs))
+        return handlers[-1]
+
+    with patch('scripts.workflows.initial_translate.api_handler.get_handler', side_effect=get_handler):
+        initial_translate.run(
+            mod_name="TestMod", source_lang=EN, target_languages=[ZH, FR], game_profile=GAME, mod_context="",
+            selected_provider="mock", execution_mode="thread", bulk_mode=True,
+        )
+    return handlers[0]
+
+
+def test_job_id_is_checkpointed_and_a_restarted_run_resumes_it(workflow, monkeypatch):
+    monkeypatch.setattr("scripts.workflows.initial_translate.BULK_MAX_WAIT_SECONDS", 0)
+    with pytest.raises(TimeoutError):
+        _run_bulk()
+
+    output = str(workflow["output"])
+    jobs = {code: CheckpointManager(output, checkpoint_filename=f".remis_checkpoint_{code}.json").get_metadata(bulk_jobs.CHECKPOINT_KEY)
+            for code in ("zh-CN", "fr")}
+    assert all(record["backend"] == "local" and record["requests"] == 1 for record in jobs.values())
+    workflow["builder"].rebuild_and_write_file.assert_not_called()
+
+    # the next run polls the same jobs instead of submitting new ones
+    monkeypatch.setattr("scripts.workflows.initial_translate.BULK_MAX_WAIT_SECONDS", 60)
+    handler = _run_bulk()
+
+    assert sorted(os.listdir(os.path.join(output, ".remis_bulk"))) == sorted(record["job_id"] for record in jobs.values())
+    # only the stand-in batch service called the model; every batch of the run was replayed
+    assert handler.bulk_stats == {"replayed": 2, "realtime": 0}
+    assert handler.client.stats["requests"] == 2
+    written = {(c.args[5], c.args[7]["code"]): c.args[2] for c in workflow["builder"].rebuild_and_write_file.call_args_list}
+    assert written[("a_l_english.yml", "fr")] == ["[mock] Fleet ready", "[mock] Empire rises", "[mock] Fleet ready"]
+    assert written[("b_l_english.yml", "zh-CN")] == ["[mock] Planet lost"]
+    # a finished run clears the checkpoints, job records included
+    assert not os.path.exists(os.path.join(output, ".remis_checkpoint_fr.json"))
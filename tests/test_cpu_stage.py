@@ -0,0 +1,92 @@
+import pytest
+
+from scripts.core.cpu_stage import (
+    CpuStagePool, TermMatchPayload, GlossaryCheckPayload, PunctuationPayload, FileValidationPayload,
+    match_glossary_terms, check_glossary_consistency, clean_punctuation, validate_translated_file,
+)
+from scripts.core.glossary_manager import GlossaryManager
+from scripts.utils.glossary_validator import GlossaryValidator
+
+
+def _glossary(*pairs):
+    return {"entries": [
+        {"entry_id": f"e{i}", "translations": {"en": source, "zh-CN": target}, "variants": {}, "abbreviations": {}, "raw_metadata": {}}
+        for i, (source, target) in enumerate(pairs)
+    ]}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr("scripts.core.cpu_stage.CPU_POOL_ENABLED", True)
+    pool = CpuStagePool(workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_punctuation_cleaning_matches_in_process_result(pool):
+    payload = PunctuationPayload(["你好，世界。", "Test,  value"], "zh-CN", "en")
+
+    assert pool.run(clean_punctuation, payload) == clean_punctuation(payload)
+    assert pool.snapshot()["offloaded"] == 1
+
+
+def test_term_matching_runs_against_the_glossary_shipped_to_workers(pool):
+    glossary = _glossary(("convoy", "护航队"), ("battleship", "战列舰"))
+    manager = GlossaryManager()
+    manager.in_memory_glossary = glossary
+    text = "the convoy met a battleshp"
+
+    matches = pool.run(match_glossary_terms, TermMatchPayload(text, "en", "zh-CN"), context=(glossary, "loose"))
+
+    assert matches == manager._smart_term_matching(text, "en", "zh-CN")
+    assert [m["source_term"] for m in matches if m["match_type"] == "exact"] == ["convoy"]
+
+
+def test_reloaded_glossary_rebuilds_the_workers(pool):
+    payload = GlossaryCheckPayload("a.yml", 0, "en", "zh-CN", ["A convoy."], ["一支舰队。"])
+
+    first = pool.run(check_glossary_consistency, payload, context=(_glossary(("convoy", "护航队")), "loose"))
+    second = pool.run(check_glossary_consistency, payload, context=(_glossary(("fleet", "舰队")), "loose"))
+
+    assert [w["source_term"] for w in first] == ["convoy"]
+    assert second == []
+
+
+def test_glossary_check_matches_validate_batch_warnings(pool):
+    glossary = _glossary(("convoy", "护航队"))
+    payload = GlossaryCheckPayload("a.yml", 3, "en", "zh-CN", ["A convoy and a convoy."], ["一支护航队。"])
+
+    offloaded = pool.run(check_glossary_consistency, payload, context=(glossary, "loose"))
+
+    expected = GlossaryValidator().validate_texts(
+        payload.texts, payload.translated_texts, GlossaryValidator.simple_glossary(glossary, "en", "zh-CN"),
+        "en", "zh-CN", "a.yml", 3
+    )
+    # Messages are localised with each process's UI language; everything else must agree
+    strip = lambda warnings: [{k: v for k, v in w.items() if k != "message"} for w in warnings]
+    assert strip(offloaded) == strip(expected)
+    assert expected[0]["source_count"] == 2
+
+
+def test_disabled_pool_runs_the_fallback_in_process():
+    pool = CpuStagePool(workers=0)
+    calls = []
+
+    result = pool.run(clean_punctuation, PunctuationPayload(["x"], "en", "zh-CN"), fallback=lambda: calls.append(1) or ["fallback"])
+
+    assert result == ["fallback"] and calls == [1]
+    assert pool.snapshot() == {"offloaded": 0, "inline": 1, "workers": 0}
+
+
+def test_file_validation_map_keeps_order_and_reports_unreadable_files(pool, tmp_path):
+    good = tmp_path / "a_l_english.yml"
+    good.write_text('l_english:\n key:0 "Hello"\n', encoding="utf-8")
+    payloads = [
+        FileValidationPayload(str(good), "1", {"code": "en"}),
+        FileValidationPayload(str(tmp_path / "missing.yml"), "1", {"code": "en"}),
+    ]
+
+    (results, error), (_, missing_error) = pool.map(validate_translated_file, payloads)
+
+    assert error is None and isinstance(results, list)
+    assert missing_error
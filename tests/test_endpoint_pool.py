@@ -0,0 +1,176 @@
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from scripts.app_settings import API_PROVIDERS
+from scripts.core import api_handler, run_estimator
+from scripts.core.endpoint_pool import Endpoint, EndpointPool, NoHealthyEndpoint, endpoint_pool_registry
+from scripts.core.http_transport import transport_registry
+from scripts.core.parallel_processor import FileTask, BatchTask
+
+EN = {"code": "en", "name": "English"}
+ZH = {"code": "zh-CN", "name": "Simplified Chinese"}
+GAME = {"id": "unknown_game", "prompt_template": "Translate {source_lang_name} into {target_lang_name}.\n"}
+
+
+def _pool(*concurrency, max_failures=2, cooldown=60.0):
+    return EndpointPool("test", [Endpoint(f"http://node{i}", c) for i, c in enumerate(concurrency)],
+                        max_failures=max_failures, cooldown_seconds=cooldown)
+
+
+def test_requests_go_to_the_least_loaded_endpoint():
+    pool = _pool(1, 2)
+
+    picked = [pool.acquire() for _ in range(3)]
+
+    # node1 has twice the slots, so it takes two of the three requests
+    assert sorted(e.url for e in picked) == ["http://node0", "http://node1", "http://node1"]
+    assert pool.capacity == 3
+    assert all(e.outstanding == e.max_concurrency for e in pool.endpoints)
+
+
+def test_acquire_waits_for_a_free_slot():
+    pool = _pool(1)
+    first = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.1)
+    assert not got
+
+    pool.release(first, healthy=True)
+    waiter.join(timeout=2)
+    assert got == [first] and first.outstanding == 1
+
+
+def test_failing_endpoint_is_evicted_and_a_probe_restores_it():
+    pool = _pool(1, 1, cooldown=0.1)
+    bad, good = pool.endpoints
+
+    for expected in (bad, good, bad):
+        with pytest.raises(httpx.ConnectError) if expected is bad else contextlib.nullcontext():
+            with pool.lease() as endpoint:
+                assert endpoint is expected
+                if endpoint is bad:
+                    raise httpx.ConnectError("refused")
+    assert bad.evicted_until and bad.stats == {"requests": 2, "failures": 2, "evictions": 1}
+
+    # while evicted, requests go to the healthy node only
+    for _ in range(2):
+        with pool.lease() as endpoint:
+            assert endpoint is good
+
+    time.sleep(0.15)
+    # after the cooldown a single probe is let through; success puts the node back
+    with pool.lease() as endpoint:
+        assert endpoint is bad and bad.probing
+    assert not bad.evicted_until and bad.failures == 0
+
+
+def test_application_errors_do_not_count_against_the_endpoint():
+    pool = _pool(1, max_failures=1)
+
+    with pytest.raises(ValueError):
+        with pool.lease():
+            raise ValueError("model returned invalid JSON")
+
+    assert pool.endpoints[0].failures == 0 and not pool.endpoints[0].evicted_until
+
+
+def test_no_healthy_endpoint_fails_fast():
+    pool = _pool(1, max_failures=1)
+    pool.release(pool.acquire(), healthy=False)
+
+    with pytest.raises(NoHealthyEndpoint):
+        pool.acquire()
+
+
+class _FakeOllama(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._json({"version": self.server.version})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.payloads.append((self.path, payload))
+        texts = [line.split(". ", 1)[1].strip('"') for line in payload["messages"][-1]["content"].splitlines()
+                 if line[:1].isdigit() and ". " in line]
+        self._json({"message": {"role": "assistant", "content": json.dumps([f"[{self.server.name}] {t}" for t in texts])},
+                    "done": True, "prompt_eval_count": 10, "eval_count": 5})
+
+
+@pytest.fixture
+def ollama_nodes(monkeypatch):
+    servers = []
+    for name, version in (("a", "0.5.7"), ("b", "0.6.0"), ("old", "0.1.9")):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllama)
+        server.name, server.version, server.payloads = name, version, []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    urls = [f"http://127.0.0.1:{s.server_address[1]}" for s in servers]
+    monkeypatch.setitem(API_PROVIDERS["ollama"], "endpoints",
+                        [{"url": url, "max_concurrency": 2} for url in urls] + [{"url": "http://127.0.0.1:9", "max_concurrency": 2}])
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    transport_registry.reset()
+    endpoint_pool_registry.reset()
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    transport_registry.reset()
+    endpoint_pool_registry.reset()
+
+
+def _batch(texts):
+    file_task = FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang=EN, game_profile=GAME, mod_context="",
+        provider_name="ollama", output_folder_name="", source_dir="", dest_dir="", client=None, mod_name="",
+    )
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts), texts=texts,
+                     origins=[(0, i) for i in range(len(texts))])
+
+
+def test_handler_balances_chat_requests_over_healthy_nodes(ollama_nodes):
+    a, b, old = ollama_nodes
+    handler = api_handler.get_handler("ollama")
+
+    # the unreachable node and the one too old for /api/chat are out of rotation
+    assert [bool(e.evicted_until) for e in handler.endpoint_pool.endpoints] == [False, False, True, True]
+
+    results = [None] * 4
+    def translate(i):
+        results[i] = handler.translate_batch(_batch([f"Fleet {i}"])).translated_texts
+    threads = [threading.Thread(target=translate, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert all(r and r[0].endswith(f"Fleet {i}") for i, r in enumerate(results))
+    assert a.payloads and b.payloads and not old.payloads
+    path, payload = a.payloads[0]
+    assert path == "/api/chat"
+    assert [m["role"] for m in payload["messages"]] == ["system", "user"]
+    assert payload["keep_alive"] == "30m" and payload["options"] == {"num_ctx": 8192}
+
+
+def test_estimator_concurrency_is_the_sum_of_endpoint_slots(monkeypatch):
+    monkeypatch.setitem(API_PROVIDERS["ollama"], "endpoints", [{"url": "http://a", "max_concurrency": 2}, {"url": "http://b"}])
+
+    assert run_estimator.request_concurrency("ollama") == 3
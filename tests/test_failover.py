@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from scripts.core.batch_planner import BatchPlanner, BatchBudget
+from scripts.core.failover import FailoverRouter, CircuitBreaker, STATE_OPEN, STATE_CLOSED
+from scripts.core.parallel_processor import ParallelProcessor, BatchTask, FileTask
+
+
+class _Limiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, tokens=0):
+        self.acquired += 1
+
+    async def acquire_async(self, tokens=0):
+        self.acquired += 1
+
+    def release(self, success):
+        pass
+
+
+class _Handler:
+    """Translates with a provider-specific prefix, or fails every batch while `down` is set."""
+
+    def __init__(self, name, down=False):
+        self.provider_name = name
+        self.down = down
+        self.calls = 0
+        self.rate_limiter = _Limiter()
+
+    def translate_batch(self, task):
+        self.calls += 1
+        if self.down:
+            task.failed = True
+            task.translated_texts = task.texts
+            task.failed_positions = list(range(len(task.texts)))
+        else:
+            task.translated_texts = [f"{self.provider_name}({t})" for t in task.texts]
+        return task
+
+    async def translate_batch_async(self, task):
+        return self.translate_batch(task)
+
+
+def _file_task(name, texts):
+    return FileTask(
+        filename=name, root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang={"code": "zh-CN"}, source_lang={"code": "en"},
+        game_profile={}, mod_context="", provider_name="gemini", output_folder_name="",
+        source_dir="", dest_dir="", client=None, mod_name="",
+    )
+
+
+def _batch(texts, index=0):
+    return BatchTask(file_task=_file_task("a.yml", texts), batch_index=index, start_index=0,
+                     end_index=len(texts), texts=texts, origins=[(0, i) for i in range(len(texts))])
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr(
+        "scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: None
+    )
+
+
+def test_failed_batch_is_resent_on_the_next_provider():
+    primary, fallback = _Handler("gemini", down=True), _Handler("openai")
+    router = FailoverRouter([primary, fallback], threshold=3)
+
+    task = router.translate_batch(_batch(["a", "b"]))
+
+    assert task.translated_texts == ["openai(a)", "openai(b)"]
+    assert not task.failed and task.failed_positions == []
+    assert task.entry_providers == ["openai", "openai"]
+    # Only the fallback takes its own rate limit slot; the processor holds the primary's
+    assert (primary.rate_limiter.acquired, fallback.rate_limiter.acquired) == (0, 1)
+
+
+def test_breaker_opens_after_consecutive_failures_and_routes_new_batches():
+    primary, fallback = _Handler("gemini", down=True), _Handler("ollama")
+    router = FailoverRouter([primary, fallback], threshold=2, cooldown=60)
+
+    for i in range(5):
+        router.translate_batch(_batch(["x"], index=i))
+
+    assert primary.calls == 2
+    assert fallback.calls == 5
+    stats = router.snapshot()
+    assert stats["gemini"]["breaker"]["state"] == STATE_OPEN
+    assert stats["gemini"]["failed_over"] == 2
+    assert stats["ollama"]["batches"] == 5
+
+
+def test_half_open_probe_closes_breaker_on_success():
+    now = [0.0]
+    breaker = CircuitBreaker("gemini", threshold=1, cooldown=30, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 31
+    assert breaker.allow()
+    # Only one probe is let through while it is in flight
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    now = [0.0]
+    breaker = CircuitBreaker("gemini", threshold=1, cooldown=30, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 31
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN and not breaker.allow()
+    assert breaker.trips == 1
+
+
+def test_last_handler_is_kept_when_every_breaker_is_open():
+    primary, fallback = _Handler("gemini", down=True), _Handler("ollama", down=True)
+    router = FailoverRouter([primary, fallback], threshold=1, cooldown=60)
+    router.translate_batch(_batch(["x"]))
+
+    task = router.translate_batch(_batch(["y"]))
+
+    assert task.failed and task.translated_texts == ["y"]
+    assert (primary.calls, fallback.calls) == (1, 2)
+
+
+def test_async_failover():
+    primary, fallback = _Handler("gemini", down=True), _Handler("openai")
+    router = FailoverRouter([primary, fallback], threshold=1)
+
+    task = asyncio.run(router.translate_batch_async(_batch(["a"])))
+
+    assert task.translated_texts == ["openai(a)"]
+    assert task.entry_providers == ["openai"]
+
+
+def test_streamed_files_record_the_provider_of_every_entry():
+    primary, fallback = _Handler("gemini"), _Handler("openai")
+    router = FailoverRouter([primary, fallback], threshold=1)
+    planner = BatchPlanner(BatchBudget(
+        max_batch_tokens=100000, max_output_tokens=100000, max_batch_items=2,
+        prompt_overhead_tokens=0, output_ratio=1.0, per_item_overhead_tokens=0,
+    ))
+    processor = ParallelProcessor(max_workers=1, batch_planner=planner)
+
+    def translate(batch_task):
+        # The primary goes down after the first batch
+        primary.down = primary.calls >= 1
+        return router.translate_batch(batch_task)
+
+    [(file_task, texts, _, failed)] = list(processor.process_files_stream(iter([_file_task("a.yml", ["a", "b", "c"])]), translate))
+
+    assert not failed
+    assert texts == ["gemini(a)", "gemini(b)", "openai(c)"]
+    assert file_task.entry_providers == ["gemini", "gemini", "openai"]
+
+
+def test_processor_labels_entries_without_a_router_and_blanks_fallbacks():
+    planner = BatchPlanner(BatchBudget(
+        max_batch_tokens=100000, max_output_tokens=100000, max_batch_items=10,
+        prompt_overhead_tokens=0, output_ratio=1.0, per_item_overhead_tokens=0,
+    ))
+    processor = ParallelProcessor(max_workers=1, batch_planner=planner)
+
+    def partial(batch_task):
+        batch_task.translated_texts = ["T(a)", "b"]
+        batch_task.failed_positions = [1]
+        return batch_task
+
+    [(file_task, _, _, _)] = list(processor.process_files_stream(iter([_file_task("a.yml", ["a", "b"])]), partial))
+
+    assert file_task.entry_providers == ["gemini", ""]
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import MagicMock, patch
 import os
+from scripts.core.batch_planner import BatchBudget
 from scripts.core.gemini_handler import GeminiHandler
 
 class TestGeminiHandler:
@@ -19,7 +20,10 @@ class TestGeminiHandler:
         with patch.dict(os.environ, {"GEMINI_API_KEY": "fake_key"}):
             handler = GeminiHandler("gemini")
             assert handler.client is not None
-            mock_genai_client.assert_called_once_with(api_key="fake_key")
+            mock_genai_client.assert_called_once()
+            kwargs = mock_genai_client.call_args.kwargs
+            assert kwargs["api_key"] == "fake_key"
+            assert kwargs["http_options"].httpx_client is handler.transport.client()
 
     def test_initialization_no_key(self):
         with patch.dict(os.environ, {}, clear=True):
@@ -74,3 +78,19 @@ class TestGeminiHandler:
         
         assert "System Prompt" in content_arg
         assert "User Message" in content_arg
+
+    def test_generation_config_caps_output_at_the_batch_budget(self, handler):
+        budget = BatchBudget.for_provider("gemini").max_output_tokens
+
+        config = handler._build_generation_config("gemini-3-flash-preview", {"enable_thinking": False})
+
+        # the planner fills batches up to the budget, the request allows some headroom above it
+        assert budget < config.max_output_tokens <= budget * 1.5
+
+    def test_fixed_thinking_budget_is_added_to_the_output_cap(self, handler):
+        plain = handler._output_token_limit("gemini-2.5-flash", {"enable_thinking": False})
+
+        assert handler._output_token_limit("gemini-2.5-flash", {"enable_thinking": True, "thinking_budget": 1024}) == plain + 1024
+        # dynamic thinking has no predictable size, the model default applies
+        assert handler._output_token_limit("gemini-2.5-flash", {"enable_thinking": True, "thinking_budget": -1}) is None
+        assert handler._output_token_limit("gemini-3-flash-preview", {"enable_thinking": True}) is None
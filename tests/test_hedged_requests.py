@@ -0,0 +1,133 @@
+import json
+import time
+import asyncio
+
+import pytest
+
+from scripts.core.base_handler import BaseApiHandler
+from scripts.core.parallel_processor import BatchTask, FileTask
+
+ZH = {"code": "zh-CN", "name": "Simplified Chinese", "key": "l_simp_chinese"}
+
+
+class _StragglerHandler(BaseApiHandler):
+    """Answers instantly, except that the calls listed in `slow_calls` hang for `hang` seconds."""
+
+    def __init__(self, slow_calls=(), hang=2.0):
+        self.slow_calls = set(slow_calls)
+        self.hang = hang
+        self.calls = 0
+        super().__init__("mock")
+
+    def initialize_client(self):
+        return object()
+
+    def _build_prompt(self, task):
+        return json.dumps(task.texts)
+
+    def _next_delay(self):
+        self.calls += 1
+        return self.hang if self.calls in self.slow_calls else 0.0
+
+    def _call_api(self, client, prompt):
+        time.sleep(self._next_delay())
+        return json.dumps([f"T({t})" for t in json.loads(prompt)])
+
+    async def _call_api_async(self, client, prompt):
+        await asyncio.sleep(self._next_delay())
+        return json.dumps([f"T({t})" for t in json.loads(prompt)])
+
+
+@pytest.fixture(autouse=True)
+def hedging(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    monkeypatch.setattr("scripts.core.base_handler.HEDGED_REQUESTS", True)
+    monkeypatch.setattr("scripts.core.base_handler.HEDGE_MIN_SAMPLES", 3)
+    monkeypatch.setattr("scripts.core.base_handler.HEDGE_BUDGET_PERCENT", 50)
+
+
+def _batch(texts):
+    file_task = FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang={"code": "en", "name": "English"},
+        game_profile={}, mod_context="", provider_name="mock", output_folder_name="", source_dir="", dest_dir="",
+        client=None, mod_name="",
+    )
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts),
+                     texts=texts, origins=[(0, i) for i in range(len(texts))])
+
+
+def test_straggler_is_overtaken_by_hedged_request():
+    handler = _StragglerHandler(slow_calls={4})
+    for _ in range(3):
+        handler.translate_batch(_batch(["warm"]))
+
+    started = time.monotonic()
+    task = handler.translate_batch(_batch(["a", "b"]))
+
+    assert time.monotonic() - started < handler.hang
+    assert task.translated_texts == ["T(a)", "T(b)"]
+    assert handler.hedge_stats["hedged"] == 1
+    assert handler.hedge_stats["hedge_wins"] == 1
+
+
+class _MultiTargetStraggler(_StragglerHandler):
+    def _call_api(self, client, prompt):
+        time.sleep(self._next_delay())
+        texts = json.loads(prompt)
+        return json.dumps({"translations": {code: [f"{code}({t})" for t in texts] for code in ("zh-CN", "fr")}})
+
+
+def test_combined_multi_target_request_is_hedged():
+    handler = _MultiTargetStraggler(slow_calls={4})
+    batches = [_batch(["warm"]) for _ in range(3)] + [_batch(["a", "b"])]
+    for task in batches:
+        task.file_task.companion_langs = [{"code": "fr", "name": "French", "key": "l_french"}]
+
+    for task in batches[:3]:
+        handler.translate_batch(task)
+    started = time.monotonic()
+    task = handler.translate_batch(batches[3])
+
+    assert time.monotonic() - started < handler.hang
+    assert task.translated_texts == ["zh-CN(a)", "zh-CN(b)"]
+    assert task.companion_results == {"fr": ["fr(a)", "fr(b)"]}
+    assert handler.hedge_stats["hedged"] == 1 and handler.hedge_stats["hedge_wins"] == 1
+
+
+def test_no_hedging_before_enough_latency_samples():
+    handler = _StragglerHandler(slow_calls={1}, hang=0.2)
+
+    task = handler.translate_batch(_batch(["a"]))
+
+    assert task.translated_texts == ["T(a)"]
+    assert handler.hedge_stats["hedged"] == 0
+    assert handler.calls == 1
+
+
+def test_hedge_budget_caps_extra_requests(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.HEDGE_BUDGET_PERCENT", 0)
+    handler = _StragglerHandler(slow_calls={4}, hang=0.3)
+    for _ in range(3):
+        handler.translate_batch(_batch(["warm"]))
+
+    handler.translate_batch(_batch(["a"]))
+
+    assert handler.hedge_stats["hedged"] == 0
+    assert handler.hedge_stats["budget_exhausted"] == 1
+    assert handler.calls == 4
+
+
+def test_async_straggler_is_cancelled_when_hedge_wins():
+    handler = _StragglerHandler(slow_calls={4}, hang=30.0)
+
+    async def run():
+        for _ in range(3):
+            await handler.translate_batch_async(_batch(["warm"]))
+        return await asyncio.wait_for(handler.translate_batch_async(_batch(["a"])), timeout=5)
+
+    task = asyncio.run(run())
+
+    assert task.translated_texts == ["T(a)"]
+    assert handler.hedge_stats["hedge_wins"] == 1
+    assert handler.rate_limiter.snapshot()["in_flight"] == 0
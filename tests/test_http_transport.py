@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from scripts.app_settings import API_PROVIDERS
+from scripts.core import api_handler
+from scripts.core.http_transport import HttpTransport, transport_registry
+from scripts.core.mock_llm import serve_mock_llm
+from scripts.core.parallel_processor import FileTask, BatchTask
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    transport_registry.reset()
+    yield
+    transport_registry.reset()
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    with serve_mock_llm() as server:
+        monkeypatch.setenv("MOCK_LLM_BASE_URL", server.base_url)
+        yield server
+
+
+def _batch(texts):
+    file_task = FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang={"code": "zh-CN", "name": "Simplified Chinese"},
+        source_lang={"code": "en", "name": "English"}, game_profile={"id": "unknown_game", "prompt_template": ""},
+        mod_context="", provider_name="mock", output_folder_name="", source_dir="", dest_dir="", client=None, mod_name="",
+    )
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts), texts=texts,
+                     origins=[(0, i) for i in range(len(texts))])
+
+
+def test_sequential_requests_reuse_one_connection(mock_server):
+    handler = api_handler.get_handler("mock")
+
+    for i in range(5):
+        assert handler.translate_batch(_batch([f"line {i}"])).translated_texts == [f"[mock] line {i}"]
+
+    stats = handler.transport.snapshot()
+    assert stats["requests"] == 5
+    assert stats["connections_opened"] == 1 and stats["reused"] == 4
+    assert stats["tls_handshakes"] == 0 and stats["http_versions"] == {"HTTP/1.1": 5}
+
+
+def test_handlers_of_the_same_provider_share_the_pool(mock_server):
+    first, second = api_handler.get_handler("mock"), api_handler.get_handler("mock")
+
+    first.translate_batch(_batch(["a"]))
+    second.translate_batch(_batch(["b"]))
+
+    assert first.transport is second.transport
+    assert transport_registry.snapshot()["mock"]["connections_opened"] == 1
+
+
+def test_async_client_is_per_event_loop_and_pooled(mock_server):
+    handler = api_handler.get_handler("mock")
+
+    async def run():
+        await asyncio.gather(*(handler.translate_batch_async(_batch([f"x{i}"])) for i in range(3)))
+        for i in range(3):
+            await handler.translate_batch_async(_batch([f"y{i}"]))
+        return handler.transport.async_client()
+
+    first_loop_client = asyncio.run(run())
+    second_loop_client = asyncio.run(run())
+
+    stats = handler.transport.snapshot()
+    assert first_loop_client is not second_loop_client
+    assert stats["requests"] == 12
+    # at most one connection per concurrent request in each loop; the sequential ones reuse them
+    assert stats["connections_opened"] <= 6 and stats["reused"] >= 6
+
+
+def test_pool_size_follows_the_dispatch_concurrency():
+    assert HttpTransport("p").pool_size(16) == 16
+    assert HttpTransport("p", max_concurrency=8).pool_size(64) == 8
+    assert HttpTransport("p", max_connections=4, max_concurrency=8).pool_size(64) == 4
+
+    transport = HttpTransport("p", connect_timeout=3, read_timeout=120)
+    client = transport.client()
+    assert (client.timeout.connect, client.timeout.read) == (3, 120)
+    assert client is transport.client()
+    transport.close()
+
+
+def test_provider_overrides_are_applied(monkeypatch):
+    monkeypatch.setitem(API_PROVIDERS["ollama"], "http_pool", {"trust_env": False, "read_timeout": 42.0})
+
+    transport = transport_registry.get("ollama")
+
+    assert transport.trust_env is False
+    assert transport.timeout.read == 42.0
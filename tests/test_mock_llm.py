@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+from scripts.app_settings import API_PROVIDERS
+from scripts.core import api_handler
+from scripts.core.base_handler import build_batch_prompt
+from scripts.core.batch_planner import BatchPlanner, BatchBudget
+from scripts.core.mock_handler import MockHandler
+from scripts.core.mock_llm import MockLLM, MockBehaviour, MockRateLimitError, MockServerError, parse_prompt, serve_mock_llm
+from scripts.core.parallel_processor import ParallelProcessor, FileTask, BatchTask
+from scripts.core.rate_limiter import parse_rate_limit_error
+
+EN = {"code": "en", "name": "English"}
+ZH = {"code": "zh-CN", "name": "Simplified Chinese"}
+FR = {"code": "fr", "name": "French"}
+GAME = {"id": "unknown_game", "prompt_template": "Translate {source_lang_name} into {target_lang_name}.\n"}
+INSTANT = {"latency_distribution": "fixed", "latency_mean_seconds": 0.0}
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: None)
+    monkeypatch.delenv("MOCK_LLM_BASE_URL", raising=False)
+
+
+def _behaviour(monkeypatch, **overrides):
+    monkeypatch.setitem(API_PROVIDERS["mock"], "mock_behaviour", dict(INSTANT, **overrides))
+
+
+def _file_task(texts, companions=()):
+    return FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang=EN, game_profile=GAME, mod_context="",
+        provider_name="mock", output_folder_name="", source_dir="", dest_dir="", client=None, mod_name="",
+        companion_langs=list(companions),
+    )
+
+
+def _batch(texts, companions=()):
+    return BatchTask(file_task=_file_task(texts, companions), batch_index=0, start_index=0, end_index=len(texts),
+                     texts=texts, origins=[(0, i) for i in range(len(texts))])
+
+
+def _quiet(handler):
+    handler._retry_delay = lambda attempt, rate_limited: 0
+    return handler
+
+
+def test_registered_and_answers_single_target_batches(monkeypatch):
+    _behaviour(monkeypatch)
+    handler = api_handler.get_handler("mock")
+
+    task = handler.translate_batch(_batch(["Hello", "Fleet [Root.GetName] $VALUE$"]))
+
+    assert isinstance(handler, MockHandler) and not task.failed
+    assert task.translated_texts == ["[mock] Hello", "[mock] Fleet [Root.GetName] $VALUE$"]
+
+
+def test_answers_multi_target_batches_per_language(monkeypatch):
+    _behaviour(monkeypatch)
+    task = api_handler.get_handler("mock").translate_batch(_batch(["Hello", "World"], companions=[FR]))
+
+    assert task.translated_texts == ["[zh-CN] Hello", "[zh-CN] World"]
+    assert task.companion_results["fr"] == ["[fr] Hello", "[fr] World"]
+
+
+def test_prompt_parsing_ignores_numbered_lines_outside_the_input_list(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.PARTIAL_SALVAGE", True)
+    prompt = build_batch_prompt(_batch(["a", "b", "c"]))
+
+    items, salvage, codes = parse_prompt('1. "glossary line"\n' + prompt)
+
+    assert items == ["a", "b", "c"] and codes == []
+    assert salvage is True
+
+
+def test_faults_are_deterministic_for_the_same_seed():
+    prompts = [build_batch_prompt(_batch([f"text {i}", "other"])) for i in range(40)]
+    behaviour = MockBehaviour(error_rate=0.2, rate_limit_rate=0.2, truncate_rate=0.2, wrong_count_rate=0.2, seed=7)
+
+    def outcomes(mock):
+        results = []
+        for prompt in prompts + prompts:
+            try:
+                results.append(mock.respond(prompt)[0])
+            except (MockRateLimitError, MockServerError) as e:
+                results.append(type(e).__name__)
+        return results
+
+    first, second = MockLLM(behaviour), MockLLM(behaviour)
+    assert outcomes(first) == outcomes(second)
+    assert first.stats == second.stats
+    assert all(first.stats[fault] > 0 for fault in ("rate_limit", "error", "truncated", "wrong_count"))
+    assert outcomes(MockLLM(MockBehaviour(error_rate=0.2, seed=8))) != outcomes(MockLLM(MockBehaviour(error_rate=0.2, seed=7)))
+
+
+def test_injected_faults_have_the_shape_of_real_failures():
+    prompt = build_batch_prompt(_batch(["a", "b", "c"]))
+
+    with pytest.raises(MockRateLimitError) as rate_limited:
+        MockLLM(MockBehaviour(rate_limit_rate=1.0, retry_after_seconds=2.5)).respond(prompt)
+    assert parse_rate_limit_error(rate_limited.value) == (True, 2.5)
+
+    truncated, _ = MockLLM(MockBehaviour(truncate_rate=1.0)).respond(prompt)
+    with pytest.raises(ValueError):
+        json.loads(truncated)
+
+    wrong, _ = MockLLM(MockBehaviour(wrong_count_rate=1.0)).respond(prompt)
+    assert len(json.loads(wrong)) in (2, 4)
+
+
+def test_lognormal_latency_is_clamped():
+    mock = MockLLM(MockBehaviour(latency_distribution="lognormal", latency_mean_seconds=1.0, latency_sigma=2.0,
+                                 latency_min_seconds=0.1, latency_max_seconds=3.0))
+    samples = [mock._latency(mock._rng_for(str(i)), 1) for i in range(200)]
+
+    assert min(samples) >= 0.1 and max(samples) <= 3.0
+    assert len(set(samples)) > 100
+
+
+def test_http_server_speaks_the_openai_protocol(monkeypatch):
+    with serve_mock_llm(MockBehaviour(rate_limit_rate=1.0, retry_after_seconds=3)) as limited, serve_mock_llm() as server:
+        monkeypatch.setenv("MOCK_LLM_BASE_URL", server.base_url)
+        task = api_handler.get_handler("mock").translate_batch(_batch(["Hello", "World"]))
+
+        monkeypatch.setenv("MOCK_LLM_BASE_URL", limited.base_url)
+        handler = MockHandler("mock")
+        with pytest.raises(Exception) as error:
+            handler._call_api(handler.client, build_batch_prompt(_batch(["Hello"])))
+
+    assert task.translated_texts == ["[mock] Hello", "[mock] World"]
+    assert server.mock.stats["requests"] == 1
+    assert parse_rate_limit_error(error.value) == (True, 3.0)
+
+
+@pytest.mark.parametrize("mode", ["thread", "async"])
+def test_processor_recovers_from_injected_faults(monkeypatch, mode):
+    monkeypatch.setattr("scripts.core.base_handler.PARTIAL_SALVAGE", True)
+    _behaviour(monkeypatch, error_rate=0.15, rate_limit_rate=0.1, retry_after_seconds=0.0,
+               truncate_rate=0.15, wrong_count_rate=0.15, seed=3)
+    handler = _quiet(api_handler.get_handler("mock"))
+    planner = BatchPlanner(BatchBudget(
+        max_batch_tokens=100000, max_output_tokens=100000, max_batch_items=8,
+        prompt_overhead_tokens=0, output_ratio=1.0, per_item_overhead_tokens=0,
+    ))
+    processor = ParallelProcessor(max_workers=4, batch_planner=planner, execution_mode=mode)
+    files = [_file_task([f"file {f} entry {i}" for i in range(30)]) for f in range(4)]
+    translate = handler.translate_batch_async if mode == "async" else handler.translate_batch
+
+    results = list(processor.process_files_stream(iter(files), translate))
+
+    stats = handler.client.stats
+    assert stats["requests"] > 16 and stats["error"] and stats["truncated"] and stats["wrong_count"]
+    for file_task, texts, _, failed in results:
+        assert not failed
+        assert texts == [f"[mock] {t}" for t in file_task.texts_to_translate]
@@ -0,0 +1,164 @@
+import json
+
+import pytest
+
+from scripts.core.base_handler import BaseApiHandler, bulk_request_key
+from scripts.core.parallel_processor import ParallelProcessor, FileTask, BatchTask
+from scripts.core.rate_limiter import ProviderLimiter
+from scripts.core.schemas import MultiTargetTranslationResponse
+from scripts.utils.structured_parser import parse_response
+
+ZH = {"code": "zh-CN", "name": "Simplified Chinese", "key": "l_simp_chinese"}
+FR = {"code": "fr", "name": "French", "key": "l_french"}
+DE = {"code": "de", "name": "German", "key": "l_german"}
+
+
+class _ScriptedHandler(BaseApiHandler):
+    """Returns canned responses in order and records every prompt it was sent."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+        super().__init__("mock")
+
+    def initialize_client(self):
+        return object()
+
+    def _call_api(self, client, prompt):
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: None)
+
+
+def _file_task(texts, companions=(FR, DE)):
+    return FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang={"code": "en", "name": "English"},
+        game_profile={"id": "unknown_game", "prompt_template": "Translate {source_lang_name} into {target_lang_name}.\n"},
+        mod_context="", provider_name="mock", output_folder_name="", source_dir="", dest_dir="",
+        client=None, mod_name="", companion_langs=list(companions),
+    )
+
+
+def _batch(file_task):
+    texts = file_task.texts_to_translate
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts),
+                     texts=texts, origins=[(0, i) for i in range(len(texts))])
+
+
+def test_parser_accepts_multi_target_object_with_and_without_wrapper():
+    wrapped = parse_response('{"translations": {"fr": ["a", "b"], "de": ["c", "d"]}}', MultiTargetTranslationResponse)
+    bare = parse_response('{"fr": ["a", "b"], "de": ["c"]}', MultiTargetTranslationResponse)
+
+    assert wrapped.translations == {"fr": ["a", "b"], "de": ["c", "d"]}
+    assert bare.complete_languages(2) == {"fr": ["a", "b"]}
+
+
+def test_one_request_returns_every_language():
+    response = json.dumps({"translations": {"zh-CN": ["你好", "世界"], "fr": ["Bonjour", "Monde"], "de": ["Hallo", "Welt"]}})
+    handler = _ScriptedHandler([response])
+
+    task = handler.translate_batch(_batch(_file_task(["Hello", "World"])))
+
+    assert len(handler.prompts) == 1
+    assert handler.prompts[0].count('"Hello"') == 1  # source sent once
+    assert "zh-CN, fr, de" in handler.prompts[0]
+    assert task.translated_texts == ["你好", "世界"]
+    assert task.companion_results == {"fr": ["Bonjour", "Monde"], "de": ["Hallo", "Welt"]}
+    assert not task.failed and not task.companion_failed
+
+
+def test_missing_and_short_languages_fall_back_to_single_language_requests():
+    response = json.dumps({"translations": {"zh-CN": ["你好", "世界"], "fr": ["Bonjour"]}})
+    handler = _ScriptedHandler([response, '["Bonjour", "Monde"]', '["Hallo", "Welt"]'])
+
+    task = handler.translate_batch(_batch(_file_task(["Hello", "World"])))
+
+    assert len(handler.prompts) == 3
+    assert "MULTI-LANGUAGE" not in handler.prompts[1]
+    assert task.companion_results == {"fr": ["Bonjour", "Monde"], "de": ["Hallo", "Welt"]}
+    assert not task.companion_failed
+
+
+def test_stream_yields_one_result_per_language():
+    response = json.dumps({"translations": {"zh-CN": ["你好"], "fr": ["Bonjour"], "de": ["Hallo"]}})
+    handler = _ScriptedHandler([response])
+    processor = ParallelProcessor(max_workers=1)
+
+    results = {ft.target_lang["code"]: (texts, failed)
+               for ft, texts, _, failed in processor.process_files_stream(iter([_file_task(["Hello"])]), handler.translate_batch)}
+
+    assert results == {"zh-CN": (["你好"], False), "fr": (["Bonjour"], False), "de": (["Hallo"], False)}
+
+
+class _FlakyHandler(_ScriptedHandler):
+    """Raises for responses that are exceptions, without waiting between retries."""
+
+    def _call_api(self, client, prompt):
+        response = super()._call_api(client, prompt)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def _retry_delay(self, attempt, rate_limited):
+        return 0
+
+
+def test_combined_request_is_retried_before_falling_back():
+    response = json.dumps({"translations": {"zh-CN": ["你好"], "fr": ["Bonjour"], "de": ["Hallo"]}})
+    handler = _FlakyHandler([TimeoutError("read timeout"), response])
+
+    task = handler.translate_batch(_batch(_file_task(["Hello"])))
+
+    assert len(handler.prompts) == 2
+    assert all("MULTI-LANGUAGE" in prompt for prompt in handler.prompts)
+    assert task.companion_results == {"fr": ["Bonjour"], "de": ["Hallo"]}
+
+
+def test_fallback_requests_take_their_own_limiter_slots():
+    response = json.dumps({"translations": {"zh-CN": ["你好"]}})
+    handler = _FlakyHandler([response, '["Bonjour"]', '["Hallo"]'])
+    limiter = ProviderLimiter("test", requests_per_minute=600, initial_concurrency=1, max_concurrency=1)
+    handler._rate_limiter = limiter  # initial_translate hands the handler's limiter to the processor
+    processor = ParallelProcessor(max_workers=1, rate_limiter=limiter)
+
+    results = {ft.target_lang["code"]: texts
+               for ft, texts, _, _ in processor.process_files_stream(iter([_file_task(["Hello"])]), handler.translate_batch)}
+
+    assert results == {"zh-CN": ["你好"], "fr": ["Bonjour"], "de": ["Hallo"]}
+    # the batch plus one slot per fallback language, and every slot was returned
+    assert limiter.stats["requests"] == 3 and limiter.in_flight == 0
+
+
+def test_combined_request_replays_a_bulk_result():
+    response = json.dumps({"translations": {"zh-CN": ["你好"], "fr": ["Bonjour"], "de": ["Hallo"]}})
+    handler = _ScriptedHandler([])
+    task = _batch(_file_task(["Hello"]))
+    handler.load_bulk_responses({bulk_request_key(handler._build_prompt(task)): [response]})
+
+    task = handler.translate_batch(task)
+
+    assert handler.prompts == []
+    assert task.translated_texts == ["你好"] and task.companion_results == {"fr": ["Bonjour"], "de": ["Hallo"]}
+    assert handler.bulk_stats["replayed"] == 1
+
+
+def test_combined_request_is_not_streamed(monkeypatch):
+    # the incremental parser only understands a single item array
+    class _StreamingHandler(_ScriptedHandler):
+        def _stream_api(self, client, prompt):
+            raise AssertionError("combined requests are sent whole")
+
+    monkeypatch.setattr("scripts.core.base_handler.STREAMING_RESPONSES", True)
+    response = json.dumps({"translations": {"zh-CN": ["你好"], "fr": ["Bonjour"], "de": ["Hallo"]}})
+    handler = _StreamingHandler([response])
+
+    task = handler.translate_batch(_batch(_file_task(["Hello"])))
+
+    assert len(handler.prompts) == 1
+    assert task.companion_results == {"fr": ["Bonjour"], "de": ["Hallo"]}
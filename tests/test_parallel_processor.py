@@ -0,0 +1,280 @@
+import threading
+
+import pytest
+
+from scripts.core.batch_planner import BatchPlanner, BatchBudget
+from scripts.core.parallel_processor import ParallelProcessor, FileTask
+
+
+def _planner(max_items):
+    return BatchPlanner(BatchBudget(
+        max_batch_tokens=100000, max_output_tokens=100000, max_batch_items=max_items,
+        prompt_overhead_tokens=0, output_ratio=1.0, per_item_overhead_tokens=0,
+    ))
+
+
+def _file_task(name, texts, target_code="zh-CN"):
+    return FileTask(
+        filename=name, root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang={"code": target_code}, source_lang={"code": "en"},
+        game_profile={}, mod_context="", provider_name="mock", output_folder_name="",
+        source_dir="", dest_dir="", client=None, mod_name="",
+    )
+
+
+class _RecordingTranslator:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, batch_task):
+        with self._lock:
+            self.calls.append(list(batch_task.texts))
+        batch_task.translated_texts = [f"T({t})" for t in batch_task.texts]
+        return batch_task
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr(
+        "scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: None
+    )
+
+
+def test_packing_merges_small_files_into_one_request():
+    files = [_file_task(f"f{i}.yml", [f"f{i}_e{j}" for j in range(3)]) for i in range(10)]
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=4, batch_planner=_planner(10), pack_small_files=True)
+
+    results = {ft.filename: (texts, failed) for ft, texts, _, failed in processor.process_files_stream(iter(files), translator)}
+
+    assert len(translator.calls) == 3  # 30 entries / 10 per batch
+    assert len(results) == 10
+    for i in range(10):
+        texts, failed = results[f"f{i}.yml"]
+        assert not failed
+        assert texts == [f"T(f{i}_e{j})" for j in range(3)]
+
+
+def test_without_packing_each_file_costs_a_request():
+    files = [_file_task(f"f{i}.yml", ["a", "b"]) for i in range(5)]
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=2, batch_planner=_planner(10))
+
+    results = list(processor.process_files_stream(iter(files), translator))
+
+    assert len(translator.calls) == 5
+    assert all(texts == ["T(a)", "T(b)"] for _, texts, _, _ in results)
+
+
+def test_packing_never_mixes_target_languages():
+    files = [_file_task("a.yml", ["x"], "de"), _file_task("b.yml", ["y"], "fr")]
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=2, batch_planner=_planner(10), pack_small_files=True)
+
+    list(processor.process_files_stream(iter(files), translator))
+
+    assert sorted(translator.calls) == [["x"], ["y"]]
+
+
+def test_failed_packed_batch_marks_every_member_file_failed():
+    files = [_file_task("a.yml", ["x"]), _file_task("b.yml", ["y"])]
+
+    def failing(batch_task):
+        raise RuntimeError("boom")
+
+    processor = ParallelProcessor(max_workers=2, batch_planner=_planner(10), pack_small_files=True)
+    results = {ft.filename: (texts, failed) for ft, texts, _, failed in processor.process_files_stream(iter(files), failing)}
+
+    assert results == {"a.yml": (["x"], True), "b.yml": (["y"], True)}
+
+
+def test_collect_file_results_demultiplexes_packed_batches():
+    files = [_file_task("a.yml", ["1", "2", "3"]), _file_task("b.yml", ["4"]), _file_task("c.yml", ["5", "6"])]
+    processor = ParallelProcessor(max_workers=2, batch_planner=_planner(4), pack_small_files=True)
+
+    file_results, _ = processor.process_files_parallel(files, _RecordingTranslator())
+
+    assert file_results == {
+        "a.yml": ["T(1)", "T(2)", "T(3)"],
+        "b.yml": ["T(4)"],
+        "c.yml": ["T(5)", "T(6)"],
+    }
+
+
+def test_glossary_warnings_of_a_packed_batch_go_to_their_own_file(monkeypatch):
+    glossary = {"entries": [{"translations": {"en": "Fleet", "zh-CN": "舰队"}}]}
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: glossary)
+    files = [_file_task("a.yml", ["Hello"]), _file_task("b.yml", ["Fleet"]), _file_task("c.yml", ["Fleet"])]
+
+    def translator(batch_task):
+        # b.yml keeps the glossary term, c.yml drops it
+        batch_task.translated_texts = ["你好", "舰队", "船"]
+        return batch_task
+
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(10), pack_small_files=True)
+    warnings = {ft.filename: w for ft, _, w, _ in processor.process_files_stream(iter(files), translator)}
+
+    assert not warnings["a.yml"] and not warnings["b.yml"]
+    assert [w["file_path"] for w in warnings["c.yml"]] == ["c.yml"]
+
+
+def test_async_mode_caps_in_flight_requests_by_max_concurrency():
+    import asyncio
+
+    in_flight = 0
+    peak = 0
+
+    async def translator(batch_task):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        batch_task.translated_texts = [f"T({t})" for t in batch_task.texts]
+        return batch_task
+
+    files = [_file_task(f"f{i}.yml", [f"f{i}_e{j}" for j in range(4)]) for i in range(20)]
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(2), execution_mode="async", max_concurrency=8)
+
+    results = {ft.filename: (texts, failed) for ft, texts, _, failed in processor.process_files_stream(iter(files), translator)}
+
+    assert len(results) == 20
+    assert all(not failed for _, failed in results.values())
+    assert results["f3.yml"][0] == [f"T(f3_e{j})" for j in range(4)]
+    # Concurrency is bounded by max_concurrency, not by the single worker thread.
+    assert 1 < peak <= 8
+
+
+def test_async_mode_accepts_sync_translation_function():
+    files = [_file_task("a.yml", ["x", "y", "z"])]
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=2, batch_planner=_planner(2), execution_mode="async")
+
+    [(_, texts, _, failed)] = list(processor.process_files_stream(iter(files), translator))
+
+    assert not failed
+    assert texts == ["T(x)", "T(y)", "T(z)"]
+    assert len(translator.calls) == 2
+
+
+def test_dedup_translates_repeated_texts_once_across_files():
+    files = [
+        _file_task("a.yml", ["Yes", "Cancel", "a_only"]),
+        _file_task("b.yml", ["Cancel", "Yes"]),
+        _file_task("c.yml", ["Yes", "Yes"]),
+    ]
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=2, batch_planner=_planner(10), pack_small_files=True, deduplicate=True)
+
+    results = {ft.filename: texts for ft, texts, _, _ in processor.process_files_stream(iter(files), translator)}
+
+    sent = [text for call in translator.calls for text in call]
+    assert sorted(sent) == ["Cancel", "Yes", "a_only"]
+    assert results["a.yml"] == ["T(Yes)", "T(Cancel)", "T(a_only)"]
+    assert results["b.yml"] == ["T(Cancel)", "T(Yes)"]
+    assert results["c.yml"] == ["T(Yes)", "T(Yes)"]
+    assert processor.dedup_stats["unique"] == 3
+    assert processor.dedup_stats["duplicates"] == 4
+    assert processor.dedup_stats["saved_tokens"] > 0
+
+
+def test_dedup_without_packing_and_per_target_language():
+    files = [
+        _file_task("a.yml", ["x", "y", "x"], target_code="zh-CN"),
+        _file_task("a.yml", ["x", "y"], target_code="fr"),
+    ]
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(10), pack_small_files=False, deduplicate=True)
+
+    results = {(ft.target_lang["code"]): texts for ft, texts, _, _ in processor.process_files_stream(iter(files), translator)}
+
+    assert translator.calls == [["x", "y"], ["x", "y"]]
+    assert results["zh-CN"] == ["T(x)", "T(y)", "T(x)"]
+    assert results["fr"] == ["T(x)", "T(y)"]
+
+
+def test_dedup_followers_inherit_failure_of_leader_batch():
+    def failing(batch_task):
+        raise RuntimeError("boom")
+
+    files = [_file_task("a.yml", ["same"]), _file_task("b.yml", ["same"])]
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(10), pack_small_files=False, deduplicate=True)
+
+    results = {ft.filename: (texts, failed) for ft, texts, _, failed in processor.process_files_stream(iter(files), failing)}
+
+    assert results["a.yml"] == (["same"], True)
+    assert results["b.yml"] == (["same"], True)
+
+
+def test_lpt_dispatches_the_largest_batch_first():
+    files = [_file_task(f"small{i}.yml", [f"s{i}"]) for i in range(3)]
+    files.append(_file_task("big.yml", ["x" * 4000]))
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(10), pack_small_files=False, scheduling="lpt")
+
+    list(processor.process_files_stream(iter(files), translator))
+
+    assert translator.calls[0] == ["x" * 4000]
+    assert processor.schedule_stats["policy"] == "lpt"
+    assert len(processor.schedule_stats["file_completion_seconds"]) == 4
+    assert processor.schedule_stats["makespan_seconds"] >= max(s for _, _, s in processor.schedule_stats["file_completion_seconds"])
+
+
+def test_fifo_keeps_discovery_order():
+    files = [_file_task(f"small{i}.yml", [f"s{i}"]) for i in range(3)]
+    files.append(_file_task("big.yml", ["x" * 4000]))
+    translator = _RecordingTranslator()
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(10), pack_small_files=False, scheduling="fifo")
+
+    list(processor.process_files_stream(iter(files), translator))
+
+    assert translator.calls == [["s0"], ["s1"], ["s2"], ["x" * 4000]]
+
+
+def test_schedule_window_bounds_lookahead():
+    consumed = []
+
+    def generator():
+        for i in range(20):
+            consumed.append(i)
+            yield _file_task(f"f{i}.yml", [f"e{i}"])
+
+    first_call_consumed = []
+
+    def translator(batch_task):
+        if not first_call_consumed:
+            first_call_consumed.append(len(consumed))
+        batch_task.translated_texts = batch_task.texts
+        return batch_task
+
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(10), pack_small_files=False, schedule_window=6)
+    results = list(processor.process_files_stream(generator(), translator))
+
+    assert len(results) == 20
+    assert first_call_consumed[0] <= 6
+
+
+def test_fifo_plans_no_further_than_the_in_flight_limit():
+    consumed = []
+
+    def generator():
+        for i in range(20):
+            consumed.append(i)
+            yield _file_task(f"f{i}.yml", [f"e{i}"])
+
+    first_call_consumed = []
+
+    def translator(batch_task):
+        if not first_call_consumed:
+            first_call_consumed.append(len(consumed))
+        batch_task.translated_texts = batch_task.texts
+        return batch_task
+
+    # a large lookahead window only matters for lpt ordering
+    processor = ParallelProcessor(max_workers=1, batch_planner=_planner(10), pack_small_files=False,
+                                  scheduling="fifo", schedule_window=100)
+    results = list(processor.process_files_stream(generator(), translator))
+
+    assert len(results) == 20
+    assert first_call_consumed[0] <= 4  # max_workers * 4 batches pending
@@ -0,0 +1,133 @@
+import pytest
+
+from scripts.app_settings import API_PROVIDERS
+from scripts.core import api_handler
+from scripts.core.base_handler import build_batch_prompt, split_prompt_prefix
+from scripts.core.http_transport import transport_registry
+from scripts.core.mock_llm import serve_mock_llm, MockBehaviour
+from scripts.core.parallel_processor import FileTask, BatchTask
+
+EN = {"code": "en", "name": "English"}
+ZH = {"code": "zh-CN", "name": "Simplified Chinese"}
+GAME = {"id": "unknown_game", "prompt_template": "Translate {source_lang_name} into {target_lang_name}.\n"}
+CACHE = {"latency_distribution": "fixed", "latency_mean_seconds": 0.0, "prompt_cache_min_chars": 1024, "prompt_cache_block_chars": 64}
+GLOSSARY = {"fleet": "舰队", "empire": "帝国", "planet": "行星", "starbase": "恒星基地"}
+FILE_TEXTS = ["The fleet arrives", "A new empire rises", "Colonize the planet", "Upgrade the fleet", "Empire at war", "Planet captured"]
+
+
+def _terms(texts, source, target):
+    text = " ".join(texts).lower()
+    return [{"id": word, "translations": {source: word, target: GLOSSARY[word]}, "metadata": {}, "variants": {},
+             "match_type": "exact", "confidence": 1.0} for word in GLOSSARY if word in text]
+
+
+@pytest.fixture(autouse=True)
+def glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: {"entries": GLOSSARY})
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.extract_relevant_terms", _terms)
+    monkeypatch.setitem(API_PROVIDERS["mock"], "mock_behaviour", CACHE)
+    monkeypatch.delenv("MOCK_LLM_BASE_URL", raising=False)
+    transport_registry.reset()
+    yield
+    transport_registry.reset()
+
+
+@pytest.fixture
+def stable(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.PROMPT_LAYOUT", "stable_prefix")
+
+
+def _file_task(texts=FILE_TEXTS):
+    return FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=list(texts), key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang=EN, game_profile=GAME, mod_context="Space",
+        provider_name="mock", output_folder_name="", source_dir="", dest_dir="", client=None, mod_name="",
+    )
+
+
+def _batches(file_task, size=2):
+    texts = file_task.texts_to_translate
+    return [BatchTask(file_task=file_task, batch_index=i // size, start_index=i, end_index=i + size,
+                      texts=texts[i:i + size], origins=[(0, j) for j in range(i, i + size)])
+            for i in range(0, len(texts), size)]
+
+
+def test_stable_layout_shares_a_byte_identical_prefix(stable):
+    prompts = [build_batch_prompt(batch) for batch in _batches(_file_task())]
+
+    prefixes = {split_prompt_prefix(prompt)[0] for prompt in prompts}
+    assert len(prefixes) == 1
+    prefix = prefixes.pop()
+    # the whole file's glossary and the static rules are in the prefix, the numbered items are not
+    assert all(GLOSSARY[word] in prefix for word in ("fleet", "empire", "planet"))
+    assert "The fleet arrives" not in prefix and "{chunk_size}" not in prefix
+    _, payload = split_prompt_prefix(prompts[1])
+    assert payload.startswith("--- BATCH INPUT ---\nN = 2\n")
+    assert '1. "Colonize the planet"\n2. "Upgrade the fleet"' in payload
+
+
+def test_terms_missing_from_the_file_prefix_go_to_the_batch(stable):
+    file_task = _file_task()
+    packed = BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=2,
+                       texts=["The fleet arrives", "Build a starbase"], origins=[(0, 0), (1, 0)])
+
+    prefix, payload = split_prompt_prefix(build_batch_prompt(packed))
+
+    assert "恒星基地" in payload and "恒星基地" not in prefix
+    assert "舰队" in prefix and "舰队" not in payload
+
+
+def test_classic_layout_is_unchanged_and_has_no_split():
+    prompt = build_batch_prompt(_batches(_file_task())[0])
+
+    assert split_prompt_prefix(prompt) == (None, prompt)
+    assert prompt.index("舰队") < prompt.index('1. "The fleet arrives"')
+
+
+@pytest.mark.parametrize("layout", ["classic", "stable_prefix"])
+def test_cache_hits_are_counted_from_usage(monkeypatch, layout):
+    monkeypatch.setattr("scripts.core.base_handler.PROMPT_LAYOUT", layout)
+    handler = api_handler.get_handler("mock")
+
+    for batch in _batches(_file_task()):
+        assert not handler.translate_batch(batch).failed
+
+    stats = handler.prompt_cache_stats
+    assert stats["requests"] == 3
+    if layout == "classic":
+        # each batch's own glossary sits before the shared format rules
+        assert stats["hits"] == 0
+    else:
+        assert stats["hits"] == 2 and stats["cached_tokens"] > stats["prompt_tokens"] / 3
+
+
+def test_cache_hits_over_http(monkeypatch, stable):
+    with serve_mock_llm(MockBehaviour(**CACHE)) as server:
+        monkeypatch.setenv("MOCK_LLM_BASE_URL", server.base_url)
+        handler = api_handler.get_handler("mock")
+        tasks = [handler.translate_batch(batch) for batch in _batches(_file_task())]
+
+    assert [task.translated_texts for task in tasks] == [[f"[mock] {t}" for t in task.texts] for task in tasks]
+    assert handler.prompt_cache_stats["hits"] == 2
+
+
+def test_explicit_cache_handle_is_created_once_and_reused(monkeypatch, stable):
+    monkeypatch.setattr("scripts.core.base_handler.PROMPT_CACHE_EXPLICIT", True)
+    monkeypatch.setattr("scripts.core.base_handler.PROMPT_CACHE_MIN_TOKENS", 100)
+    handler = api_handler.get_handler("mock")
+
+    tasks = [handler.translate_batch(batch) for batch in _batches(_file_task())]
+
+    assert [task.translated_texts for task in tasks] == [[f"[mock] {t}" for t in task.texts] for task in tasks]
+    assert handler.prompt_cache_stats["explicit_caches"] == 1 and len(handler.client._caches) == 1
+    assert handler.prompt_cache_stats["hits"] == 3
+
+
+def test_short_prefixes_are_not_cached_explicitly(monkeypatch, stable):
+    monkeypatch.setattr("scripts.core.base_handler.PROMPT_CACHE_EXPLICIT", True)
+    monkeypatch.setitem(API_PROVIDERS["mock"], "prompt_cache_min_tokens", 10 ** 6)
+    handler = api_handler.get_handler("mock")
+
+    handler.translate_batch(_batches(_file_task())[0])
+
+    assert handler.prompt_cache_stats["explicit_caches"] == 0 and not handler.client._caches
@@ -0,0 +1,78 @@
+import time
+import asyncio
+
+from scripts.core.rate_limiter import ProviderLimiter, parse_rate_limit_error
+
+
+class _FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _HttpError(Exception):
+    def __init__(self, status_code, headers=None, message="error"):
+        super().__init__(message)
+        self.response = _FakeResponse(status_code, headers)
+
+
+def test_parse_rate_limit_error_reads_retry_after_header():
+    assert parse_rate_limit_error(_HttpError(429, {"retry-after": "7"})) == (True, 7.0)
+    assert parse_rate_limit_error(_HttpError(429, {"retry-after-ms": "1500"})) == (True, 1.5)
+    assert parse_rate_limit_error(_HttpError(500)) == (False, None)
+
+
+def test_parse_rate_limit_error_reads_gemini_retry_delay():
+    error = Exception("429 RESOURCE_EXHAUSTED. {'retryDelay': '23s'}")
+    assert parse_rate_limit_error(error) == (True, 23.0)
+
+
+def test_success_grows_and_rate_limit_halves_concurrency():
+    limiter = ProviderLimiter("test", initial_concurrency=4, max_concurrency=16)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(success=True)
+    assert int(limiter.limit) == 8
+
+    limiter.on_rate_limited(retry_after=0)
+    assert int(limiter.limit) == 4
+    # A second 429 from the same burst does not halve again
+    limiter.on_rate_limited(retry_after=0)
+    assert int(limiter.limit) == 4
+
+    # After the first decrease growth is additive: one slot per window of successes
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(success=True)
+    assert 4 < limiter.limit < 5
+
+
+def test_retry_after_blocks_new_requests():
+    limiter = ProviderLimiter("test", initial_concurrency=2)
+    limiter.on_rate_limited(retry_after=0.2)
+    assert limiter.retry_delay() > 0.1
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_concurrency_window_caps_in_flight_requests():
+    limiter = ProviderLimiter("test", initial_concurrency=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter._try_acquire(0) > 0
+    limiter.release(success=False)
+    assert limiter._try_acquire(0) == 0
+
+
+def test_request_bucket_paces_async_callers():
+    limiter = ProviderLimiter("test", requests_per_minute=600, initial_concurrency=64)
+    limiter._request_bucket.tokens = 0
+
+    async def run():
+        start = time.monotonic()
+        await limiter.acquire_async()
+        return time.monotonic() - start
+
+    # 600 RPM refills one request every 0.1s
+    assert asyncio.run(run()) >= 0.05
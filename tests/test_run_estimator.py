@@ -0,0 +1,136 @@
+import pytest
+
+from scripts.core import run_estimator
+from scripts.core.base_handler import build_batch_prompt
+from scripts.core.batch_planner import BatchPlanner, BatchCounter, estimate_tokens
+from scripts.core.parallel_processor import BatchTask
+from scripts.core.run_estimator import RunEstimator, ProviderEstimate, lpt_makespan, lookup_price
+
+EN = {"code": "en", "name": "English"}
+ZH = {"code": "zh-CN", "name": "Simplified Chinese"}
+FR = {"code": "fr", "name": "French"}
+GAME = {"id": "unknown_game", "prompt_template": "Translate {source_lang_name} into {target_lang_name}.\n"}
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+
+
+def _files():
+    return [[f"Entry number {i} of file {f}" for i in range(70)] + ["Shared line"] * 5 for f in range(4)]
+
+
+class _Memory:
+    """Knows the translation of every text in `known`, for every language."""
+
+    def __init__(self, known):
+        self.known = set(known)
+        self.lookups = 0
+
+    def lookup(self, texts, source_lang, target_lang, model, prompt_hash):
+        self.lookups += 1
+        return {i: f"T({t})" for i, t in enumerate(texts) if t in self.known}
+
+
+def test_requests_match_the_planned_batch_count():
+    estimator = RunEstimator(EN, [ZH, FR], GAME, "", [("gemini", "gemini-3-flash-preview")], pack=True, deduplicate=True)
+    counter = BatchCounter(BatchPlanner.for_provider("gemini"), pack=True, deduplicate=True)
+    for texts in _files():
+        estimator.add_file(texts)
+        counter.add(texts)
+
+    report = estimator.report()
+    [gemini] = report["providers"]
+
+    # One lane per target language, each deduplicated and packed like the processor
+    assert gemini["requests"] == 2 * counter.total
+    assert gemini["duplicates"] == 2 * 19
+    assert gemini["entries"] == 2 * (4 * 70 + 1)
+    assert report["files"] == 4 and report["source_entries"] == 4 * 75
+
+
+def test_fully_sampled_run_counts_the_real_prompts():
+    estimate = ProviderEstimate("gemini", "gemini-3-flash-preview", EN, [[ZH]], GAME, "Space mod", pack=False)
+    for texts in _files():
+        estimate.add_file(texts)
+
+    report = estimate.report()
+
+    expected = 0
+    for _, lane, texts in estimate._samples:
+        task = BatchTask(file_task=lane.template, batch_index=0, start_index=0, end_index=len(texts), texts=texts)
+        expected += estimate_tokens(build_batch_prompt(task))
+    assert report["prompt_samples"] == report["requests"] == 4
+    assert report["input_tokens"] == expected
+    assert report["tokenizer"] == "estimate"
+
+
+def test_unsampled_requests_reuse_the_measured_prompt_overhead():
+    full = ProviderEstimate("gemini", "gemini-3-flash-preview", EN, [[ZH]], GAME, "", pack=False)
+    sampled = ProviderEstimate("gemini", "gemini-3-flash-preview", EN, [[ZH]], GAME, "", pack=False, sample_size=1)
+    for texts in _files():
+        full.add_file(texts)
+        sampled.add_file(texts)
+
+    full_report, sampled_report = full.report(), sampled.report()
+
+    assert sampled_report["prompt_samples"] == 1
+    assert sampled_report["output_tokens"] == full_report["output_tokens"]
+    assert abs(sampled_report["input_tokens"] - full_report["input_tokens"]) <= 0.02 * full_report["input_tokens"]
+
+
+def test_translation_memory_hits_are_not_sent():
+    memory = _Memory(["Shared line"] + [f"Entry number {i} of file 0" for i in range(70)])
+    estimate = ProviderEstimate("gemini", "gemini-3-flash-preview", EN, [[ZH, FR]], GAME, "",
+                                pack=False, deduplicate=False, translation_memory=memory)
+    estimate.add_file(_files()[0])
+    estimate.add_file(_files()[1])
+
+    report = estimate.report()
+
+    assert report["memory_hits"] == 75 + 5
+    assert report["entries"] == 70
+    assert report["requests"] == 1  # the first file's only batch is served entirely from memory
+
+
+def test_multi_target_uses_one_lane_with_a_larger_output_ratio():
+    single = RunEstimator(EN, [ZH, FR], GAME, "", [("gemini", "gemini-3-flash-preview")])
+    multi = RunEstimator(EN, [ZH, FR], GAME, "", [("gemini", "gemini-3-flash-preview")], multi_target=True)
+    for texts in _files():
+        single.add_file(texts)
+        multi.add_file(texts)
+
+    single_report, multi_report = single.report()["providers"][0], multi.report()["providers"][0]
+
+    assert multi_report["entries"] * 2 == single_report["entries"]
+    assert multi_report["requests"] < single_report["requests"]
+    assert multi_report["input_tokens"] < single_report["input_tokens"]
+
+
+def test_cost_comes_from_the_price_table(monkeypatch):
+    monkeypatch.setattr(run_estimator, "PRICE_TABLE", {"gemini": {"gemini-3-flash-preview": (1.0, 10.0)}, "ollama": {"*": (0.0, 0.0)}})
+    estimator = RunEstimator(EN, [ZH], GAME, "", [("gemini", "gemini-3-flash-preview"), ("ollama", "qwen3:4b"), ("qwen", "qwen-plus")])
+    estimator.add_file(_files()[0])
+
+    gemini, ollama, qwen = estimator.report()["providers"]
+
+    assert gemini["cost_usd"] == round((gemini["input_tokens"] * 1.0 + gemini["output_tokens"] * 10.0) / 1_000_000, 4)
+    assert ollama["cost_usd"] == 0.0 and ollama["concurrency"] == 1
+    assert qwen["cost_usd"] is None and qwen["price_per_million"] is None
+    assert lookup_price("ollama", "anything") == (0.0, 0.0)
+
+
+def test_wall_time_spreads_requests_over_the_concurrency_and_respects_rate_limits(monkeypatch):
+    assert lpt_makespan([5, 4, 3, 3], 2) == 8
+    assert lpt_makespan([5, 4, 3], 8) == 5
+
+    monkeypatch.setitem(run_estimator.DEFAULT_RATE_LIMIT, "requests_per_minute", 1)
+    estimate = ProviderEstimate("gemini", "gemini-3-flash-preview", EN, [[ZH]], GAME, "", pack=False)
+    for texts in _files():
+        estimate.add_file(texts)
+
+    report = estimate.report()
+
+    assert report["bound"] == "requests_per_minute"
+    assert report["wall_seconds"] == report["requests"] * 60
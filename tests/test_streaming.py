@@ -0,0 +1,214 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from scripts.app_settings import API_PROVIDERS
+from scripts.core import api_handler
+from scripts.core.base_handler import BaseApiHandler
+from scripts.core.http_transport import transport_registry
+from scripts.core.mock_llm import MockBehaviour, serve_mock_llm
+from scripts.core.parallel_processor import ParallelProcessor, FileTask, BatchTask, early_results
+
+EN = {"code": "en", "name": "English"}
+ZH = {"code": "zh-CN", "name": "Simplified Chinese"}
+GAME = {"id": "unknown_game", "prompt_template": "Translate {source_lang_name} into {target_lang_name}.\n"}
+INSTANT = {"latency_distribution": "fixed", "latency_mean_seconds": 0.0, "stream_chunk_chars": 7}
+TEXTS = [f"entry number {i}" for i in range(8)]
+
+
+@pytest.fixture(autouse=True)
+def streaming(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.STREAMING_RESPONSES", True)
+    # aborted streams keep their completed items through the id-tagged salvage format
+    monkeypatch.setattr("scripts.core.base_handler.PARTIAL_SALVAGE", True)
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+    monkeypatch.delenv("MOCK_LLM_BASE_URL", raising=False)
+    transport_registry.reset()
+    yield
+    transport_registry.reset()
+
+
+def _behaviour(monkeypatch, **overrides):
+    monkeypatch.setitem(API_PROVIDERS["mock"], "mock_behaviour", dict(INSTANT, **overrides))
+
+
+def _batch(texts):
+    file_task = FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang=EN, game_profile=GAME, mod_context="",
+        provider_name="mock", output_folder_name="", source_dir="", dest_dir="", client=None, mod_name="",
+    )
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts), texts=texts,
+                     origins=[(0, i) for i in range(len(texts))])
+
+
+def _handler():
+    handler = api_handler.get_handler("mock")
+    handler._retry_delay = lambda attempt, rate_limited: 0
+    return handler
+
+
+@pytest.fixture
+def received():
+    """Records each early hand-off as {source text: translation}; retried sub-batches use their own positions."""
+    items_received = []
+    token = early_results.set(lambda task, items: items_received.append({task.texts[pos]: text for pos, text in items.items()}))
+    yield items_received
+    early_results.reset(token)
+
+
+def test_items_are_handed_off_while_the_response_streams(monkeypatch, received):
+    _behaviour(monkeypatch)
+    handler = _handler()
+
+    task = handler.translate_batch(_batch(TEXTS))
+
+    assert task.translated_texts == [f"[mock] {t}" for t in TEXTS]
+    assert len(received) > 1  # delivered in several pieces, not once at the end
+    assert {source: text for items in received for source, text in items.items()} == dict(zip(TEXTS, task.translated_texts))
+    assert handler.stream_stats["streams"] == 1 and handler.stream_stats["aborted"] == 0
+    assert handler.stream_stats["items_streamed"] == len(TEXTS)
+
+
+def test_runaway_output_is_cut_off_and_only_the_rest_is_retried(monkeypatch, received):
+    _behaviour(monkeypatch, runaway_rate=1.0, seed=1)
+    handler = _handler()
+
+    task = handler.translate_batch(_batch(TEXTS))
+
+    stats = handler.client.stats
+    assert stats["runaway"] >= 1
+    assert handler.stream_stats["aborted"] >= 1
+    assert set(handler.stream_stats["abort_reasons"]) <= {"repetition", "overflow"}
+    # every item is delivered exactly once, and never a looped duplicate
+    delivered = [(source, text) for items in received for source, text in items.items()]
+    assert sorted(delivered) == [(t, f"[mock] {t}") for t in TEXTS]
+    assert task.translated_texts == [f"[mock] {t}" for t in TEXTS]
+
+
+def test_long_preamble_aborts_before_any_json(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.BATCH_BISECT_AFTER_ATTEMPTS", 1)
+    _behaviour(monkeypatch, preamble_rate=0.5, seed=4)
+    handler = _handler()
+
+    task = handler.translate_batch(_batch(TEXTS))
+
+    assert handler.client.stats["preamble"] >= 1
+    assert handler.stream_stats["abort_reasons"].get("preamble") == handler.client.stats["preamble"]
+    assert task.translated_texts == [f"[mock] {t}" for t in TEXTS]
+
+
+def test_async_streaming_in_process(monkeypatch, received):
+    _behaviour(monkeypatch, runaway_rate=0.5, seed=2)
+    handler = _handler()
+
+    async def run():
+        return await asyncio.gather(*(handler.translate_batch_async(_batch([f"{t} {b}" for t in TEXTS])) for b in range(3)))
+
+    tasks = asyncio.run(run())
+
+    for b, task in enumerate(tasks):
+        assert task.translated_texts == [f"[mock] {t} {b}" for t in TEXTS]
+    assert handler.stream_stats["streams"] >= 3
+    assert sum(len(items) for items in received) == 3 * len(TEXTS)
+
+
+@pytest.mark.parametrize("mode", ["thread", "async"])
+def test_server_sent_events_through_the_openai_client(monkeypatch, mode, received):
+    behaviour = MockBehaviour(runaway_rate=0.5, stream_chunk_chars=5, seed=3)
+    with serve_mock_llm(behaviour) as server:
+        monkeypatch.setenv("MOCK_LLM_BASE_URL", server.base_url)
+        handler = _handler()
+        batches = [_batch([f"{t} {b}" for t in TEXTS]) for b in range(3)]
+
+        if mode == "async":
+            async def run():
+                return [await handler.translate_batch_async(batch) for batch in batches]
+            tasks = asyncio.run(run())
+        else:
+            tasks = [handler.translate_batch(batch) for batch in batches]
+
+    for b, task in enumerate(tasks):
+        assert task.translated_texts == [f"[mock] {t} {b}" for t in TEXTS]
+    assert server.mock.stats["runaway"] >= 1 and handler.stream_stats["aborted"] >= 1
+    assert sum(len(items) for items in received) == 3 * len(TEXTS)
+
+
+class _StallingStreamHandler(BaseApiHandler):
+    """Streams the first item straight away and holds the rest of the response back."""
+
+    def __init__(self, translations):
+        self.translations = translations
+        self.closed = False
+        super().__init__("mock")
+
+    def initialize_client(self):
+        return object()
+
+    def _call_api(self, client, prompt):
+        raise AssertionError("only the streaming path is expected")
+
+    def _stream_api(self, client, prompt):
+        first, *rest = [json.dumps({"id": i + 1, "text": text}) for i, text in enumerate(self.translations)]
+        yield "[" + first + ","
+        time.sleep(0.5)
+        self.closed = True
+        yield ", ".join(rest) + "]"
+
+
+def test_streamed_items_complete_their_file_before_the_response_ends():
+    handler = _StallingStreamHandler(["[zh] a", "[zh] b"])
+    files = [_batch([text]).file_task for text in ("a", "b")]
+    for name, file_task in zip(("a.yml", "b.yml"), files):
+        file_task.filename = name
+    processor = ParallelProcessor(max_workers=1, pack_small_files=True)
+
+    finished = [(ft.filename, texts, handler.closed)
+                for ft, texts, _, _ in processor.process_files_stream(iter(files), handler.translate_batch)]
+
+    # a.yml is written while b.yml's entry is still being generated
+    assert finished == [("a.yml", ["[zh] a"], False), ("b.yml", ["[zh] b"], True)]
+
+
+def test_a_file_finished_early_keeps_the_glossary_warnings_of_its_batch(monkeypatch):
+    glossary = {"entries": [{"translations": {"en": "Fleet", "zh-CN": "舰队"}}]}
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: glossary)
+    # a.yml drops the glossary term; its batch is still streaming b.yml when a.yml is written
+    handler = _StallingStreamHandler(["船", "你好"])
+    files = [_batch([text]).file_task for text in ("Fleet", "Hello")]
+    for name, file_task in zip(("a.yml", "b.yml"), files):
+        file_task.filename = name
+    processor = ParallelProcessor(max_workers=1, pack_small_files=True)
+
+    finished = [(ft.filename, [w["file_path"] for w in warnings], handler.closed)
+                for ft, _, warnings, _ in processor.process_files_stream(iter(files), handler.translate_batch)]
+
+    assert finished == [("a.yml", ["a.yml"], False), ("b.yml", [], True)]
+
+
+def test_default_format_hands_the_batch_off_once_its_item_count_is_confirmed(monkeypatch, received):
+    # Without PARTIAL_SALVAGE items are plain strings, whose positions are only known once the array closes
+    monkeypatch.setattr("scripts.core.base_handler.PARTIAL_SALVAGE", False)
+    _behaviour(monkeypatch)
+    handler = _handler()
+
+    task = handler.translate_batch(_batch(TEXTS))
+
+    assert task.translated_texts == [f"[mock] {t}" for t in TEXTS]
+    assert received == [dict(zip(TEXTS, task.translated_texts))]
+    assert handler.stream_stats["items_streamed"] == len(TEXTS)
+
+
+def test_default_format_hands_off_only_the_retry_of_an_aborted_stream(monkeypatch, received):
+    monkeypatch.setattr("scripts.core.base_handler.PARTIAL_SALVAGE", False)
+    _behaviour(monkeypatch, runaway_rate=0.5, seed=11)
+    handler = _handler()
+
+    task = handler.translate_batch(_batch(TEXTS))
+
+    assert handler.client.stats["runaway"] >= 1 and handler.stream_stats["aborted"] >= 1
+    assert task.translated_texts == [f"[mock] {t}" for t in TEXTS]
+    # the items completed before the abort were never handed off; the retry's were, once
+    assert received == [dict(zip(TEXTS, task.translated_texts))]
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from scripts.core.base_handler import BaseApiHandler
+from scripts.core.parallel_processor import BatchTask, FileTask
+from scripts.core.telemetry_ledger import TelemetryLedger, percentile
+
+ZH = {"code": "zh-CN", "name": "Simplified Chinese", "key": "l_simp_chinese"}
+
+
+class _MeteredHandler(BaseApiHandler):
+    """Reports usage like a real provider; answers with a wrong item count for batches containing 'BAD'."""
+
+    def __init__(self, report_usage=True):
+        self.report = report_usage
+        super().__init__("mock")
+
+    def initialize_client(self):
+        return object()
+
+    def _build_prompt(self, task):
+        return json.dumps(task.texts)
+
+    def _call_api(self, client, prompt):
+        texts = json.loads(prompt)
+        if self.report:
+            self._report_usage(100 + len(texts), 10 * len(texts))
+        if "BAD" in texts:
+            return json.dumps(["?"] * (len(texts) + 1))
+        return json.dumps([f"T({t})" for t in texts])
+
+    def _retry_delay(self, attempt, rate_limited):
+        return 0
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.glossary_manager.get_glossary_for_translation", lambda: None)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return TelemetryLedger(str(tmp_path / "telemetry.sqlite"))
+
+
+def _batch(texts):
+    file_task = FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang={"code": "en", "name": "English"},
+        game_profile={}, mod_context="", provider_name="mock", output_folder_name="", source_dir="", dest_dir="",
+        client=None, mod_name="",
+    )
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts),
+                     texts=texts, origins=[(0, i) for i in range(len(texts))])
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_summary_aggregates_per_run_and_provider(ledger):
+    for i, latency in enumerate([100, 200, 300, 400]):
+        ledger.record("run-1", "gemini", "flash", i, 10, 500, 50, False, latency, 0, "ok")
+    ledger.record("run-1", "openai", "mini", 4, 10, 500, 0, True, 1000, 1, "error", "RateLimitError")
+    ledger.record("run-2", "gemini", "flash", 0, 10, 500, 50, False, 5, 0, "ok")
+
+    summary = ledger.summary("run-1")
+
+    assert summary["requests"] == 5
+    assert summary["retries"] == 1
+    assert summary["prompt_tokens"] == 2500
+    assert summary["latency_ms"]["p50"] == 300
+    assert summary["latency_ms"]["p99"] == 1000
+    assert summary["outcomes"] == {"ok": 4, "error": 1}
+    assert summary["errors"] == {"RateLimitError": 1}
+    by_provider = {p["provider"]: p for p in summary["providers"]}
+    assert by_provider["gemini"]["requests"] == 4
+    assert by_provider["openai"]["estimated_requests"] == 1
+
+
+def test_handler_records_every_attempt(ledger, monkeypatch):
+    monkeypatch.setattr("scripts.core.base_handler.BATCH_BISECT_AFTER_ATTEMPTS", 1)
+    handler = _MeteredHandler()
+    handler.telemetry = ledger.session("run", "mock", "m")
+
+    handler.translate_batch(_batch(["a", "BAD"]))
+
+    records = ledger.records("run")
+    # Whole batch fails to parse, then each half is sent on its own; the bad entry uses up its retries
+    assert [(r["batch_size"], r["attempt"], r["outcome"]) for r in records] == [
+        (2, 0, "parse_error"), (1, 0, "ok"), (1, 0, "parse_error"), (1, 1, "parse_error"),
+    ]
+    assert records[0]["prompt_tokens"] == 102 and records[0]["completion_tokens"] == 20
+    assert records[0]["error_class"] == "ValueError"
+    assert not any(r["tokens_estimated"] for r in records)
+
+
+def test_missing_usage_is_estimated(ledger):
+    handler = _MeteredHandler(report_usage=False)
+    handler.telemetry = ledger.session("run", "mock", "m")
+
+    handler.translate_batch(_batch(["hello world"]))
+
+    [record] = ledger.records("run")
+    assert record["outcome"] == "ok"
+    assert record["tokens_estimated"] == 1
+    assert record["prompt_tokens"] > 0 and record["completion_tokens"] > 0
@@ -0,0 +1,241 @@
+import threading
+
+import pytest
+
+from scripts.core.parallel_processor import ParallelProcessor, FileTask, BatchTask
+from scripts.core.translation_memory import TranslationMemory, normalize_source, prompt_fingerprint
+
+ZH = {"code": "zh-CN", "name": "Chinese"}
+FR = {"code": "fr", "name": "French"}
+
+
+@pytest.fixture(autouse=True)
+def no_glossary(monkeypatch):
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: None)
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return TranslationMemory(str(tmp_path / "tm.sqlite"))
+
+
+def _file_task(texts, companions=(), mod_context=""):
+    return FileTask(
+        filename="a.yml", root="", original_lines=[], texts_to_translate=texts, key_map={},
+        is_custom_loc=False, target_lang=ZH, source_lang={"code": "en"},
+        game_profile={"id": "unknown_game", "prompt_template": "p"}, mod_context=mod_context,
+        provider_name="mock", output_folder_name="", source_dir="", dest_dir="", client=None,
+        mod_name="", companion_langs=list(companions),
+    )
+
+
+def _batch(file_task):
+    texts = file_task.texts_to_translate
+    return BatchTask(file_task=file_task, batch_index=0, start_index=0, end_index=len(texts),
+                     texts=texts, origins=[(0, i) for i in range(len(texts))])
+
+
+class _Translator:
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, batch_task):
+        self.sent.append(list(batch_task.texts))
+        batch_task.translated_texts = [f"zh:{t}" for t in batch_task.texts]
+        for lang in batch_task.file_task.companion_langs:
+            batch_task.companion_results[lang["code"]] = [f"{lang['code']}:{t}" for t in batch_task.texts]
+        return batch_task
+
+
+def _translate(processor, file_task):
+    [(_, texts, _, failed)] = list(processor.process_files_stream(iter([file_task]), processor.translator))
+    return texts, failed
+
+
+def _processor(session):
+    processor = ParallelProcessor(max_workers=1, translation_memory=session)
+    processor.translator = _Translator()
+    return processor
+
+
+def test_only_misses_are_sent_and_results_keep_order(memory):
+    first = _processor(memory.session("mock:model"))
+    _translate(first, _file_task(["A", "B"]))
+
+    session = memory.session("mock:model")
+    second = _processor(session)
+    texts, failed = _translate(second, _file_task(["A", "C", "B"]))
+
+    assert second.translator.sent == [["C"]]
+    assert texts == ["zh:A", "zh:C", "zh:B"]
+    assert not failed
+    assert session.snapshot() == {"tm_hits": 2, "tm_misses": 1}
+
+
+def test_fully_cached_batch_skips_translation_but_reports_completion(memory):
+    _translate(_processor(memory.session("mock:model")), _file_task(["A"]))
+
+    completed = []
+    processor = _processor(memory.session("mock:model"))
+    processor.on_batch_complete = completed.append
+    texts, _ = _translate(processor, _file_task(["A"]))
+
+    assert processor.translator.sent == []
+    assert texts == ["zh:A"]
+    assert len(completed) == 1
+
+
+def test_memory_hits_are_labelled_in_entry_providers(memory):
+    _translate(_processor(memory.session("mock:model")), _file_task(["A"]))
+
+    processor = _processor(memory.session("mock:model"))
+    file_task = _file_task(["A", "C"], companions=[FR])
+    streamed = {ft.target_lang["code"]: ft.entry_providers
+                for ft, _, _, _ in processor.process_files_stream(iter([file_task]), processor.translator)}
+
+    # "A" was only remembered for zh-CN, so the multi-target batch sends both entries
+    assert streamed == {"zh-CN": ["mock", "mock"], "fr": ["mock", "mock"]}
+
+    processor = _processor(memory.session("mock:model"))
+    [(file_task, _, _, _)] = list(processor.process_files_stream(iter([_file_task(["A", "D"])]), processor.translator))
+    assert file_task.entry_providers == ["translation_memory", "mock"]
+
+
+def test_key_includes_model_and_prompt(memory):
+    _translate(_processor(memory.session("mock:model")), _file_task(["A"]))
+
+    other_model = _processor(memory.session("mock:other"))
+    _translate(other_model, _file_task(["A"]))
+    other_context = _processor(memory.session("mock:model"))
+    _translate(other_context, _file_task(["A"], mod_context="different"))
+
+    assert other_model.translator.sent == [["A"]]
+    assert other_context.translator.sent == [["A"]]
+
+
+def test_key_includes_the_loaded_glossary(memory, monkeypatch):
+    glossary = {"entries": [{"id": "fleet", "translations": {"en": "fleet", "zh-CN": "舰队"}}]}
+    monkeypatch.setattr("scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation", lambda: glossary)
+    _translate(_processor(memory.session("mock:model")), _file_task(["A"]))
+
+    unchanged = _processor(memory.session("mock:model"))
+    _translate(unchanged, _file_task(["A"]))
+    glossary["entries"][0]["translations"]["zh-CN"] = "星舰队"
+    edited = _processor(memory.session("mock:model"))
+    _translate(edited, _file_task(["A"]))
+
+    assert unchanged.translator.sent == []
+    assert edited.translator.sent == [["A"]]
+
+
+@pytest.mark.parametrize("setting, value", [("PROMPT_LAYOUT", "stable_prefix"), ("PARTIAL_SALVAGE", True)])
+def test_key_includes_the_prompt_layout_and_response_format(memory, monkeypatch, setting, value):
+    _translate(_processor(memory.session("mock:model")), _file_task(["A"]))
+
+    monkeypatch.setattr(f"scripts.core.translation_memory.{setting}", value)
+    changed = _processor(memory.session("mock:model"))
+    _translate(changed, _file_task(["A"]))
+
+    assert changed.translator.sent == [["A"]]
+
+
+def test_key_includes_the_punctuation_rules_of_the_language_pair():
+    profile = {"id": "unknown_game", "prompt_template": "p"}
+
+    # zh-CN -> en and zh-CN -> fr get different punctuation conversion instructions
+    assert prompt_fingerprint(profile, "", "zh-CN", "en") != prompt_fingerprint(profile, "", "zh-CN", "fr")
+    assert prompt_fingerprint(profile, "", "zh-CN", "fr") == prompt_fingerprint(profile, "", "zh-CN", "fr")
+
+
+def test_concurrent_first_use_sees_the_created_table(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    errors = []
+
+    def use():
+        try:
+            memory.store([("A", "a")], "en", "zh-CN", "m", "p")
+            assert memory.lookup(["A"], "en", "zh-CN", "m", "p") == {0: "a"}
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+
+
+def test_bypass_forces_retranslation_and_refreshes_memory(memory):
+    _translate(_processor(memory.session("mock:model")), _file_task(["A"]))
+
+    forced = _processor(memory.session("mock:model", bypass=True))
+    _translate(forced, _file_task(["A"]))
+
+    assert forced.translator.sent == [["A"]]
+
+
+def test_multi_target_hit_requires_every_language(memory):
+    _translate(_processor(memory.session("mock:model")), _file_task(["A"]))
+
+    processor = _processor(memory.session("mock:model"))
+    results = {ft.target_lang["code"]: texts
+               for ft, texts, _, _ in processor.process_files_stream(iter([_file_task(["A"], companions=[FR])]), processor.translator)}
+
+    assert processor.translator.sent == [["A"]]
+    assert results == {"zh-CN": ["zh:A"], "fr": ["fr:A"]}
+
+
+def test_failed_batches_are_not_stored(memory):
+    def failing(batch_task):
+        batch_task.failed = True
+        batch_task.translated_texts = batch_task.texts
+        return batch_task
+
+    session = memory.session("mock:model")
+    processor = ParallelProcessor(max_workers=1, translation_memory=session)
+    list(processor.process_files_stream(iter([_file_task(["A"])]), failing))
+
+    assert memory.lookup(["A"], "en", "zh-CN", "mock:model", session._prompt_hash(_batch(_file_task(["A"])))) == {}
+
+
+def test_normalization_unifies_line_endings():
+    assert normalize_source("a\r\nb") == normalize_source("a\nb")
+
+
+def test_entries_isolated_as_failed_are_not_remembered(memory):
+    first = _processor(memory.session("mock:model"))
+    _translate(first, _file_task(["cached"]))
+
+    def translate_with_one_failure(batch_task):
+        batch_task.translated_texts = [t if t == "broken" else f"zh:{t}" for t in batch_task.texts]
+        batch_task.failed_positions = [batch_task.texts.index("broken")]
+        return batch_task
+
+    second = _processor(memory.session("mock:model"))
+    second.translator = translate_with_one_failure
+    texts, failed = _translate(second, _file_task(["cached", "broken", "fine"]))
+
+    assert texts == ["zh:cached", "broken", "zh:fine"]
+    assert failed
+    found = memory.lookup(["broken", "fine"], "en", "zh-CN", "mock:model", second.translation_memory._prompt_hash(_batch(_file_task(["x"]))))
+    assert list(found) == [1]
+
+
+def test_failed_over_entries_are_remembered_under_the_model_that_produced_them(memory):
+    def failed_over(batch_task):
+        batch_task.translated_texts = [f"zh:{t}" for t in batch_task.texts]
+        batch_task.entry_providers = ["openai"] * len(batch_task.texts)
+        return batch_task
+
+    known = _processor(memory.session("mock:model", fallback_models={"openai": "openai:gpt"}))
+    known.translator = failed_over
+    _translate(known, _file_task(["A"]))
+    unknown = _processor(memory.session("mock:model"))
+    unknown.translator = failed_over
+    _translate(unknown, _file_task(["B"]))
+
+    prompt_hash = known.translation_memory._prompt_hash(_batch(_file_task(["x"])))
+    assert memory.lookup(["A", "B"], "en", "zh-CN", "mock:model", prompt_hash) == {}
+    assert memory.lookup(["A", "B"], "en", "zh-CN", "openai:gpt", prompt_hash) == {0: "zh:A"}
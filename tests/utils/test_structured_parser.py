@@ -3,7 +3,10 @@ import pytest
 from pydantic import BaseModel, Field
 from typing import List, Dict
 
-from scripts.utils.structured_parser import parse_response
+from scripts.utils.structured_parser import (
+    parse_response, parse_identified_response, IncrementalResponseParser,
+    ABORT_PREAMBLE, ABORT_OVERFLOW, ABORT_RUNAWAY, ABORT_REPETITION,
+)
 from scripts.core.schemas import TranslationResponse
 
 # --- Test Fixtures ---
@@ -148,3 +151,77 @@ def test_parse_composite_pollution_format():
     assert result is not None
     assert isinstance(result, TranslationResponse)
     assert result.translations == ["Final", "Test"]
+
+# --- Salvage Format ---
+
+def test_identified_response_keeps_well_formed_items():
+    """Malformed, duplicate and out-of-range items are dropped; the rest is kept by id."""
+    response = '[{"id": 2, "text": "b"}, {"id": 1, "text": "a"}, {"id": 3}, {"id": 2, "text": "dup"}, {"id": 9, "text": "x"}]'
+    assert parse_identified_response(response, 4) == {0: "a", 1: "b"}
+
+def test_identified_response_drops_truncated_last_item():
+    """A response cut off mid-item must not salvage the half-written translation."""
+    response = '[{"id": 1, "text": "a"}, {"id": 2, "text": "half wri'
+    assert parse_identified_response(response, 3) == {0: "a"}
+
+def test_identified_response_accepts_plain_array_only_when_aligned():
+    assert parse_identified_response('["a", "b"]', 2) == {0: "a", 1: "b"}
+    assert parse_identified_response('["a"]', 2) == {}
+
+def test_identified_response_unwraps_gemini_cli_payload():
+    composite_string = '{"response": "```json\\n[{\\"id\\": 1, \\"text\\": \\"Final\\"}]\\n```"}'
+    assert parse_identified_response(composite_string, 1) == {0: "Final"}
+
+# --- Incremental (Streaming) Parser ---
+
+def _feed_all(parser, text, size=5):
+    released = {}
+    for i in range(0, len(text), size):
+        released.update(parser.feed(text[i:i + size]))
+        if parser.abort_reason:
+            break
+    released.update(parser.finish())
+    return released
+
+def test_incremental_parser_releases_items_as_they_complete():
+    parser = IncrementalResponseParser(3, source_texts=["a", "b", "c"])
+    assert parser.feed('Here you go: ["one", "tw') == {0: "one"}
+    assert parser.feed('o", "three"]') == {1: "two", 2: "three"}
+    assert parser.done and parser.abort_reason is None
+    assert parse_identified_response(parser.result_text(), 3) == {0: "one", 1: "two", 2: "three"}
+
+def test_incremental_parser_accepts_wrapped_and_identified_arrays():
+    wrapped = IncrementalResponseParser(2)
+    assert _feed_all(wrapped, '{"translations": ["x", "y"]}') == {0: "x", 1: "y"}
+
+    identified = IncrementalResponseParser(3, identified=True)
+    assert _feed_all(identified, '[{"id": 3, "text": "c"}, {"id": 1, "text": "a"}]') == {2: "c", 0: "a"}
+
+def test_incremental_parser_aborts_on_long_preamble():
+    parser = IncrementalResponseParser(2, preamble_limit=20)
+    assert _feed_all(parser, "Sure, let me explain every line in detail first ... ") == {}
+    assert parser.abort_reason == ABORT_PREAMBLE
+
+def test_incremental_parser_aborts_on_overflow_and_runaway_items():
+    overflow = IncrementalResponseParser(2, source_texts=["a", "b"])
+    _feed_all(overflow, '["a1", "b1", "c1", "d1"]')
+    assert overflow.abort_reason == ABORT_OVERFLOW
+
+    runaway = IncrementalResponseParser(2, source_texts=["a", "b"], item_length_ratio=1)
+    assert _feed_all(runaway, '["ok", "' + "la" * 300) == {0: "ok"}
+    assert runaway.abort_reason == ABORT_RUNAWAY
+
+def test_incremental_parser_holds_back_repeated_items():
+    sources = ["a", "b", "c", "d", "e", "f"]
+    parser = IncrementalResponseParser(6, identified=True, source_texts=sources, repetition_limit=3)
+    response = '[{"id": 1, "text": "A"}, {"id": 2, "text": "B"}, {"id": 3, "text": "B"}, {"id": 4, "text": "B"}, {"id": 5, "text": "B"}]'
+
+    assert _feed_all(parser, response) == {0: "A", 1: "B"}
+    assert parser.abort_reason == ABORT_REPETITION
+    # the rebuilt response only contains the items released before the loop started
+    assert parse_identified_response(parser.result_text(), 6) == {0: "A", 1: "B"}
+
+def test_incremental_parser_keeps_identical_translations_of_identical_sources():
+    parser = IncrementalResponseParser(4, source_texts=["ok", "ok", "ok", "ok"], repetition_limit=2)
+    assert _feed_all(parser, '["OK", "OK", "OK", "OK"]') == {0: "OK", 1: "OK", 2: "OK", 3: "OK"}
+    assert parser.abort_reason is None
@@ -0,0 +1,199 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from scripts.core.rate_limiter import ProviderLimiter
+from scripts.core.translation_memory import TranslationMemory
+from scripts.core.telemetry_ledger import TelemetryLedger
+from scripts.workflows import initial_translate
+
+TARGETS = [
+    {"code": "zh-CN", "name": "Chinese", "key": "l_simp_chinese"},
+    {"code": "fr", "name": "French", "key": "l_french"},
+    {"code": "de", "name": "German", "key": "l_german"},
+]
+
+
+@pytest.fixture
+def mock_env(tmp_path):
+    with patch('scripts.workflows.initial_translate.translation_memory', TranslationMemory(str(tmp_path / "tm.sqlite"))), \
+         patch('scripts.workflows.initial_translate.telemetry_ledger', TelemetryLedger(str(tmp_path / "telemetry.sqlite"))), \
+         patch('scripts.workflows.initial_translate.discover_files') as mock_discover, \
+         patch('scripts.workflows.initial_translate.file_parser') as mock_parser, \
+         patch('scripts.workflows.initial_translate.archive_manager') as mock_archive, \
+         patch('scripts.workflows.initial_translate.CheckpointManager') as mock_checkpoint_cls, \
+         patch('scripts.workflows.initial_translate.api_handler') as mock_api, \
+         patch('scripts.workflows.initial_translate.directory_handler'), \
+         patch('scripts.workflows.initial_translate.asset_handler'), \
+         patch('scripts.workflows.initial_translate.glossary_manager'), \
+         patch('scripts.core.parallel_processor.glossary_manager.get_glossary_for_translation', return_value=None), \
+         patch('scripts.workflows.initial_translate.create_proofreading_tracker') as mock_tracker, \
+         patch('scripts.workflows.initial_translate.file_builder') as mock_builder, \
+         patch('scripts.workflows.initial_translate.process_metadata_for_language'), \
+         patch('scripts.workflows.initial_translate._run_post_processing') as mock_post:
+
+        mock_discover.return_value = [
+            {"path": f"/fake/f{i}.yml", "filename": f"f{i}.yml", "root": "/fake", "is_custom_loc": False, "loc_root": ""}
+            for i in range(2)
+        ]
+        mock_parser.extract_translatable_content.return_value = (["l1", "l2"], ["text1", "text2"], {})
+        mock_archive.get_or_create_mod_entry.return_value = 1
+        mock_archive.create_source_version.side_effect = lambda mod_id, files: (list(files), 7)[1]
+
+        calls = []
+
+        def translate_batch(batch_task):
+            code = batch_task.file_task.target_lang["code"]
+            calls.append(code)
+            batch_task.translated_texts = [f"{code}:{t}" for t in batch_task.texts]
+            for lang in batch_task.file_task.companion_langs:
+                batch_task.companion_results[lang["code"]] = [f"{lang['code']}:{t}" for t in batch_task.texts]
+            return batch_task
+
+        handler = MagicMock()
+        handler.provider_name = "test_provider"
+        handler.translate_batch.side_effect = translate_batch
+        handler.rate_limiter = ProviderLimiter("test")
+        mock_api.get_handler.return_value = handler
+
+        # One checkpoint manager per language
+        checkpoints = {}
+
+        def make_checkpoint(output_dir, current_config, checkpoint_filename):
+            checkpoint = MagicMock()
+            checkpoint.is_file_completed.return_value = False
+            checkpoints[current_config["target_lang_code"]] = checkpoint
+            return checkpoint
+
+        mock_checkpoint_cls.side_effect = make_checkpoint
+        mock_tracker.side_effect = lambda *args: MagicMock()
+        mock_builder.rebuild_and_write_file.return_value = "/out/file.yml"
+
+        yield {
+            "parser": mock_parser, "archive": mock_archive, "builder": mock_builder,
+            "checkpoints": checkpoints, "calls": calls, "post": mock_post,
+        }
+
+
+def _run(progress_callback=None, multi_target=False):
+    initial_translate.run(
+        mod_name="TestMod",
+        source_lang={"code": "en", "name": "English", "key": "l_english"},
+        target_languages=TARGETS,
+        game_profile={"id": "test", "source_localization_folder": "localization"},
+        mod_context="",
+        selected_provider="test_provider",
+        progress_callback=progress_callback,
+        execution_mode="thread",
+        multi_target=multi_target,
+    )
+
+
+def test_source_is_parsed_once_for_all_languages(mock_env):
+    _run()
+
+    assert mock_env["parser"].extract_translatable_content.call_count == 2
+    assert sorted(set(mock_env["calls"])) == sorted(t["code"] for t in TARGETS)
+
+
+def test_outputs_checkpoints_and_archive_stay_per_language(mock_env):
+    _run()
+
+    written = [(c.args[5], c.args[7]["code"], c.args[2]) for c in mock_env["builder"].rebuild_and_write_file.call_args_list]
+    assert len(written) == 6
+    for filename, code, translated in written:
+        assert translated == [f"{code}:text1", f"{code}:text2"]
+
+    for code, checkpoint in mock_env["checkpoints"].items():
+        marked = sorted(c.args[0] for c in checkpoint.mark_file_completed.call_args_list)
+        assert marked == ["f0.yml", "f1.yml"]
+        checkpoint.clear_checkpoint.assert_called_once()
+
+    archived_codes = sorted(c.args[3] for c in mock_env["archive"].archive_translated_results.call_args_list)
+    assert archived_codes == sorted([t["code"] for t in TARGETS] * 2)
+    assert mock_env["post"].call_count == len(TARGETS)
+
+
+def test_progress_reports_combined_total(mock_env):
+    updates = []
+
+    def progress_callback(*args, **kwargs):
+        if "total_batches" in kwargs and "current_batch" in kwargs:
+            updates.append((kwargs["current_batch"], kwargs["total_batches"]))
+
+    _run(progress_callback)
+
+    totals = {total for _, total in updates}
+    assert len(totals) == 1
+    total = totals.pop()
+    assert total == len(mock_env["calls"])
+    assert max(current for current, _ in updates) == total
+
+
+def test_multi_target_mode_sends_one_request_per_batch_for_all_languages(mock_env, monkeypatch):
+    monkeypatch.setattr("scripts.workflows.initial_translate.CROSS_FILE_PACKING", True)
+    _run(multi_target=True)
+
+    # Both files are packed into a single request carrying all three languages
+    assert mock_env["calls"] == ["zh-CN"]
+    written = sorted((c.args[5], c.args[7]["code"]) for c in mock_env["builder"].rebuild_and_write_file.call_args_list)
+    assert written == sorted((f"f{i}.yml", t["code"]) for i in range(2) for t in TARGETS)
+    for checkpoint in mock_env["checkpoints"].values():
+        assert checkpoint.mark_file_completed.call_count == 2
+
+
+def test_rerun_is_served_from_translation_memory(mock_env, monkeypatch):
+    monkeypatch.setattr("scripts.workflows.initial_translate.TRANSLATION_MEMORY_ENABLED", True)
+    monkeypatch.setattr("scripts.workflows.initial_translate.INTRA_RUN_DEDUP", True)
+    updates = []
+    _run()
+    first_calls = len(mock_env["calls"])
+
+    _run(lambda *args, **kwargs: updates.append(kwargs))
+
+    assert len(mock_env["calls"]) == first_calls  # no new API calls
+    # Both files hold the same two texts, so intra-run dedup only looks up one copy
+    assert updates[-1]["tm_hits"] == 2 * len(TARGETS)
+    assert updates[-1]["dedup_duplicates"] == 2 * len(TARGETS)
+    assert updates[-1]["tm_misses"] == 0
+    written = [c.args[2] for c in mock_env["builder"].rebuild_and_write_file.call_args_list[-6:]]
+    assert sorted(written) == sorted([[f"{t['code']}:text1", f"{t['code']}:text2"] for t in TARGETS] * 2)
+
+
+def test_files_past_memory_ceiling_are_reparsed_lazily(mock_env):
+    with patch('scripts.workflows.initial_translate.SOURCE_MEMORY_CEILING_MB', 0):
+        _run()
+
+    # Once for the snapshot, once more when each file's turn comes
+    assert mock_env["parser"].extract_translatable_content.call_count == 4
+    written = [c.args[2] for c in mock_env["builder"].rebuild_and_write_file.call_args_list]
+    assert sorted(written) == sorted([[f"{t['code']}:text1", f"{t['code']}:text2"] for t in TARGETS] * 2)
+
+
+def test_dry_run_plans_without_calling_the_api_or_writing_output(mock_env, monkeypatch):
+    monkeypatch.setattr("scripts.workflows.initial_translate.CROSS_FILE_PACKING", True)
+    monkeypatch.setattr("scripts.workflows.initial_translate.INTRA_RUN_DEDUP", True)
+    with patch('scripts.core.base_handler.glossary_manager.get_glossary_for_translation', return_value=None):
+        report = initial_translate.run(
+            mod_name="TestMod",
+            source_lang={"code": "en", "name": "English", "key": "l_english"},
+            target_languages=TARGETS,
+            game_profile={"id": "test", "source_localization_folder": "localization"},
+            mod_context="",
+            selected_provider="gemini",
+            compare_providers=["ollama", "no_such_provider"],
+            dry_run=True,
+        )
+
+    assert mock_env["calls"] == []
+    mock_env["archive"].create_source_version.assert_not_called()
+    mock_env["builder"].rebuild_and_write_file.assert_not_called()
+    assert not mock_env["checkpoints"]
+
+    assert (report["files"], report["source_entries"]) == (2, 4)
+    assert [p["provider"] for p in report["providers"]] == ["gemini", "ollama"]
+    gemini = report["providers"][0]
+    # Both files hold the same two texts: one packed request per language
+    assert gemini["requests"] == len(TARGETS)
+    assert gemini["duplicates"] == 2 * len(TARGETS)
+    assert gemini["input_tokens"] > 0 and gemini["cost_usd"] is not None